@@ -1,9 +1,10 @@
 from django.contrib import admin
+from django.db.models import Count
 from .models import (
     Producto, Venta, Compra, MateriaPrima, ProductoMateriaPrima, 
     MovimientoMateriaPrima, PerfilUsuario, LoteMateriaPrima,
     HistorialCosto, ConfiguracionCostos, Receta, RecetaMateriaPrima,
-    HistorialPreciosMateriaPrima
+    HistorialPreciosMateriaPrima, RecalculoPendiente, ReporteJob
 )
 
 # Registros existentes (mantener)
@@ -13,7 +14,7 @@ class ProductoAdmin(admin.ModelAdmin):
         'nombre', 'tipo_producto', 'precio', 'stock', 'categoria', 
         'costo_base', 'margen_ganancia', 'precio_venta_calculado', 'estado_stock'
     ]
-    list_filter = ['categoria', 'tipo_producto', 'fecha_creacion']
+    list_filter = ['categoria', 'tipo_producto', 'estado_stock', 'fecha_creacion']
     search_fields = ['nombre', 'descripcion']
     fieldsets = (
         ('Información Básica', {
@@ -42,10 +43,14 @@ class ProductoAdmin(admin.ModelAdmin):
             ),
             'classes': ('collapse',)
         }),
+        ('Ventas', {
+            'fields': ('ultima_venta', 'unidades_7d', 'unidades_30d', 'ingresos_mes'),
+            'classes': ('collapse',)
+        }),
     )
     
     def get_readonly_fields(self, request, obj=None):
-        readonly = ['precio_venta_calculado']
+        readonly = ['precio_venta_calculado', 'ultima_venta', 'unidades_7d', 'unidades_30d', 'ingresos_mes']
         if obj and obj.tipo_producto == 'receta':
             readonly.append('costo_base')
         return readonly
@@ -73,23 +78,23 @@ class CompraAdmin(admin.ModelAdmin):
 class LoteMateriaPrimaInline(admin.TabularInline):
     model = LoteMateriaPrima
     extra = 0
-    readonly_fields = ("cantidad", "cantidad_disponible", "precio_unitario", "fecha_entrada", "fecha_consumo", "observaciones")
+    readonly_fields = ("cantidad", "cantidad_disponible", "precio_unitario", "fecha_entrada", "fecha_vencimiento", "fecha_consumo", "observaciones")
     can_delete = False
 
 @admin.register(MateriaPrima)
 class MateriaPrimaAdmin(admin.ModelAdmin):
     list_display = ['nombre', 'unidad_medida', 'stock_actual', 'stock_minimo', 'costo_unitario', 'necesita_restock', 'proveedor']
-    list_filter = ['unidad_medida', 'activo', 'proveedor']
+    list_filter = ['unidad_medida', 'activo', 'estado_stock', 'proveedor']
     search_fields = ['nombre', 'descripcion']
     list_editable = ['stock_actual', 'stock_minimo', 'costo_unitario']
     inlines = [LoteMateriaPrimaInline]
     actions = ['actualizar_productos_relacionados']
     
     def actualizar_productos_relacionados(self, request, queryset):
-        productos_actualizados = 0
-        for materia_prima in queryset:
-            productos_afectados = materia_prima.actualizar_productos_relacionados(usuario=request.user)
-            productos_actualizados += len(productos_afectados)
+        from gestion.services.cost_graph import CostGraph
+        # Un único recorrido del grafo para todas las materias primas seleccionadas
+        productos_afectados = CostGraph(queryset).propagar(usuario=request.user)
+        productos_actualizados = len(productos_afectados)
         
         self.message_user(
             request,
@@ -104,9 +109,9 @@ class ProductoMateriaPrimaAdmin(admin.ModelAdmin):
 
 @admin.register(MovimientoMateriaPrima)
 class MovimientoMateriaPrimaAdmin(admin.ModelAdmin):
-    list_display = ['materia_prima', 'tipo_movimiento', 'cantidad', 'usuario', 'fecha']
+    list_display = ['materia_prima', 'tipo_movimiento', 'cantidad', 'costo_total', 'usuario', 'fecha']
     list_filter = ['tipo_movimiento', 'fecha', 'materia_prima']
-    readonly_fields = ['fecha', 'cantidad_anterior', 'cantidad_nueva']
+    readonly_fields = ['fecha', 'cantidad_anterior', 'cantidad_nueva', 'costo_total']
 
 @admin.register(PerfilUsuario)
 class PerfilUsuarioAdmin(admin.ModelAdmin):
@@ -115,7 +120,7 @@ class PerfilUsuarioAdmin(admin.ModelAdmin):
 
 @admin.register(LoteMateriaPrima)
 class LoteMateriaPrimaAdmin(admin.ModelAdmin):
-    list_display = ("materia_prima", "cantidad", "cantidad_disponible", "precio_unitario", "fecha_entrada", "fecha_consumo")
+    list_display = ("materia_prima", "cantidad", "cantidad_disponible", "precio_unitario", "fecha_entrada", "fecha_vencimiento", "fecha_consumo")
     search_fields = ("materia_prima__nombre",)
     list_filter = ("materia_prima", "fecha_entrada", "fecha_consumo")
     readonly_fields = ("materia_prima", "cantidad", "precio_unitario", "fecha_entrada", "fecha_consumo", "observaciones")
@@ -130,15 +135,33 @@ class RecetaMateriaPrimaInline(admin.TabularInline):
 
 @admin.register(Receta)
 class RecetaAdmin(admin.ModelAdmin):
-    list_display = ['nombre', 'productos_count', 'materias_count', 'fecha_creacion', 'costo_total_display', 'activa']
+    list_display = ['nombre', 'productos_count_display', 'materias_count_display', 'fecha_creacion', 'costo_total_display', 'activa']
     list_filter = ['fecha_creacion', 'activa', 'creador']
     search_fields = ['nombre', 'descripcion']
     inlines = [RecetaMateriaPrimaInline]
     filter_horizontal = ['productos']
     
+    def get_queryset(self, request):
+        # Conteos por fila en la misma query del listado
+        return super().get_queryset(request).annotate(
+            n_productos=Count('productos', distinct=True),
+            n_materias=Count('materias_primas', distinct=True),
+        )
+    
+    def productos_count_display(self, obj):
+        return obj.n_productos
+    productos_count_display.short_description = 'Productos'
+    productos_count_display.admin_order_field = 'n_productos'
+    
+    def materias_count_display(self, obj):
+        return obj.n_materias
+    materias_count_display.short_description = 'Materias primas'
+    materias_count_display.admin_order_field = 'n_materias'
+    
     def costo_total_display(self, obj):
-        return f"${obj.costo_total():.2f}"
+        return f"${obj.costo_cache:.2f}"
     costo_total_display.short_description = 'Costo Total'
+    costo_total_display.admin_order_field = 'costo_cache'
 
 @admin.register(RecetaMateriaPrima)
 class RecetaMateriaPrimaAdmin(admin.ModelAdmin):
@@ -258,4 +281,39 @@ class HistorialPreciosMateriaPrimaAdmin(admin.ModelAdmin):
     
     def has_change_permission(self, request, obj=None):
         # Solo lectura - no modificar historial
-        return False
\ No newline at end of file
+        return False
+
+
+@admin.register(RecalculoPendiente)
+class RecalculoPendienteAdmin(admin.ModelAdmin):
+    list_display = [
+        'materia_prima', 'precio_anterior', 'precio_nuevo', 'fecha_creacion',
+        'procesado', 'fecha_procesado', 'intentos'
+    ]
+    list_filter = ['procesado', 'fecha_creacion']
+    search_fields = ['materia_prima__nombre', 'error']
+    readonly_fields = [
+        'materia_prima', 'precio_anterior', 'precio_nuevo', 'fecha_creacion',
+        'fecha_procesado', 'error'
+    ]
+    
+    def has_add_permission(self, request):
+        # Los eventos se encolan automáticamente al cambiar precios
+        return False
+
+
+@admin.register(ReporteJob)
+class ReporteJobAdmin(admin.ModelAdmin):
+    list_display = [
+        'tipo', 'formato', 'estado', 'usuario', 'fecha_creacion', 'fecha_fin', 'intentos'
+    ]
+    list_filter = ['estado', 'tipo', 'formato', 'fecha_creacion']
+    search_fields = ['clave', 'error']
+    readonly_fields = [
+        'tipo', 'formato', 'parametros', 'clave', 'version_datos', 'archivo',
+        'usuario', 'fecha_creacion', 'fecha_inicio', 'fecha_fin', 'error'
+    ]
+
+    def has_add_permission(self, request):
+        # Los jobs se crean desde la exportación de reportes
+        return False
@@ -8,7 +8,7 @@ from decimal import Decimal, ROUND_HALF_UP
 from datetime import datetime, timedelta
 from django.db.models import Sum, F, Q, Avg, Max, Min, Count
 from django.utils import timezone
-from .models import Producto, VentaDetalle, Venta, MateriaPrima, Compra
+from .models import Producto, VentaDetalle, Venta, MateriaPrima, Compra, filtro_sin_ventas_desde
 import json
 
 
@@ -131,20 +131,18 @@ class AnalyticsRentabilidad:
                 'accion': 'Revisar estrategia de precios'
             })
         
-        # Productos sin ventas pero con stock
+        # Productos sin ventas pero con stock (rango sobre Producto.ultima_venta)
+        inicio_mes = timezone.make_aware(datetime.combine(self.mes_actual, datetime.min.time()))
         productos_sin_ventas = Producto.objects.filter(
-            stock__gt=0
-        ).exclude(
-            id__in=VentaDetalle.objects.filter(
-                venta__fecha__date__gte=self.mes_actual
-            ).values_list('producto_id', flat=True)
+            filtro_sin_ventas_desde(inicio_mes), stock__gt=0
         )
+        cantidad_sin_ventas = productos_sin_ventas.count()
         
-        if productos_sin_ventas.exists():
+        if cantidad_sin_ventas:
             alertas.append({
                 'tipo': 'sin_rotacion',
                 'severidad': 'media',
-                'titulo': f'{productos_sin_ventas.count()} productos sin rotación',
+                'titulo': f'{cantidad_sin_ventas} productos sin rotación',
                 'descripcion': 'Productos con stock pero sin ventas este mes',
                 'productos': list(productos_sin_ventas[:5]),
                 'accion': 'Revisar demanda y promociones'
@@ -1,11 +1,107 @@
+from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
-from django.views.decorators.http import require_GET
+from django.views.decorators.http import require_GET, condition
 from django.core import serializers
-from django.db.models import Q
-from .models import Producto, Venta, MateriaPrima
+from django.db.models import Q, Count, Max
+from django.utils.dateparse import parse_datetime
+from .models import Producto, Venta, MateriaPrima, Compra, AjusteInventario, MovimientoMateriaPrima
+from . import search
+from .paginacion import CursorInvalido, KeysetPaginator, LIMITE_CONTEO_DEFAULT
+import base64
+import hashlib
 import json
 from datetime import datetime, timedelta
 
+
+# ==================== SINCRONIZACIÓN INCREMENTAL ====================
+#
+# Las APIs de sync aceptan:
+#   ?since=<cursor>  → solo filas modificadas después del cursor
+#   ?limit=<n>       → tamaño de página (default 500, máximo 1000)
+# y devuelven `next_cursor` + `has_more`. El cliente guarda next_cursor y lo
+# envía en el próximo poll. Con If-None-Match responden 304 si la tabla no
+# cambió, sin leer filas.
+
+SYNC_LIMITE_DEFAULT = 500
+SYNC_LIMITE_MAXIMO = 1000
+
+
+def codificar_cursor(fecha_modificacion, pk):
+    """Cursor opaco (fecha_modificacion, id) para keyset pagination."""
+    crudo = f'{fecha_modificacion.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(crudo.encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    """Retorna (fecha_modificacion, pk). Lanza ValueError si el cursor es inválido."""
+    try:
+        fecha, pk = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+        fecha = parse_datetime(fecha)
+        if fecha is None:
+            raise ValueError
+        return fecha, int(pk)
+    except (ValueError, UnicodeDecodeError, base64.binascii.Error):
+        raise ValueError('Cursor inválido')
+
+
+def _pagina_sync(queryset, request):
+    """
+    Aplica ?since/?limit con keyset pagination sobre (fecha_modificacion, id).
+    Retorna (filas, next_cursor, has_more).
+    """
+    try:
+        limite = min(int(request.GET.get('limit', SYNC_LIMITE_DEFAULT)), SYNC_LIMITE_MAXIMO)
+    except ValueError:
+        limite = SYNC_LIMITE_DEFAULT
+    limite = max(limite, 1)
+
+    since = request.GET.get('since')
+    if since:
+        fecha, pk = decodificar_cursor(since)
+        queryset = queryset.filter(
+            Q(fecha_modificacion__gt=fecha) | Q(fecha_modificacion=fecha, id__gt=pk)
+        )
+
+    filas = list(queryset.order_by('fecha_modificacion', 'id')[:limite + 1])
+    has_more = len(filas) > limite
+    filas = filas[:limite]
+
+    if filas:
+        next_cursor = codificar_cursor(filas[-1].fecha_modificacion, filas[-1].id)
+    else:
+        next_cursor = since  # Sin cambios: el cliente conserva su cursor
+    return filas, next_cursor, has_more
+
+
+def _etag_sync(queryset_base):
+    """
+    ETag barato: una sola agregación (MAX fecha_modificacion, COUNT) sobre la
+    tabla, combinada con los parámetros del request.
+    """
+    def etag_func(request, *args, **kwargs):
+        estado = queryset_base().aggregate(ultima=Max('fecha_modificacion'), total=Count('id'))
+        clave = '|'.join([
+            request.path,
+            request.GET.get('since', ''),
+            request.GET.get('limit', ''),
+            str(estado['ultima']),
+            str(estado['total']),
+        ])
+        return hashlib.md5(clave.encode()).hexdigest()
+    return etag_func
+
+
+def _respuesta_sync(data, next_cursor, has_more):
+    return JsonResponse({
+        'status': 'success',
+        'data': data,
+        'count': len(data),
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+        'last_updated': datetime.now().isoformat()
+    })
+
+
 @require_GET
 def producto_precio(request, pk):
     try:
@@ -20,10 +116,11 @@ def producto_precio(request, pk):
         return JsonResponse({'error': 'Producto no encontrado'}, status=404)
 
 @require_GET
+@condition(etag_func=_etag_sync(lambda: Producto.objects.all()))
 def api_productos(request):
-    """API para sincronización de productos"""
+    """API para sincronización incremental de productos"""
     try:
-        productos = Producto.objects.all()
+        productos, next_cursor, has_more = _pagina_sync(Producto.objects.all(), request)
         data = []
         for producto in productos:
             data.append({
@@ -32,23 +129,21 @@ def api_productos(request):
                 'precio': float(producto.precio),
                 'stock': producto.stock,
                 'descripcion': producto.descripcion or '',
-                'updated_at': producto.id  # Simular timestamp
+                'updated_at': producto.fecha_modificacion.isoformat()
             })
         
-        return JsonResponse({
-            'status': 'success',
-            'data': data,
-            'count': len(data),
-            'last_updated': datetime.now().isoformat()
-        })
+        return _respuesta_sync(data, next_cursor, has_more)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 @require_GET
+@condition(etag_func=_etag_sync(lambda: MateriaPrima.objects.all()))
 def api_inventario(request):
-    """API para sincronización de inventario/materias primas"""
+    """API para sincronización incremental de inventario/materias primas"""
     try:
-        materias_primas = MateriaPrima.objects.all()
+        materias_primas, next_cursor, has_more = _pagina_sync(MateriaPrima.objects.all(), request)
         data = []
         for materia in materias_primas:
             data.append({
@@ -59,24 +154,27 @@ def api_inventario(request):
                 'unidad_medida': materia.unidad_medida,
                 'costo_unitario': float(materia.costo_unitario),
                 'proveedor': materia.proveedor or '',
-                'updated_at': materia.id
+                'updated_at': materia.fecha_modificacion.isoformat()
             })
         
-        return JsonResponse({
-            'status': 'success', 
-            'data': data,
-            'count': len(data),
-            'last_updated': datetime.now().isoformat()
-        })
+        return _respuesta_sync(data, next_cursor, has_more)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 @require_GET
+@condition(etag_func=_etag_sync(lambda: Venta.todos.all()))
 def api_ventas(request):
-    """API para sincronización de ventas"""
+    """
+    API para sincronización incremental de ventas.
+    La sincronización inicial trae solo ventas activas; los deltas (?since)
+    incluyen las eliminadas/restauradas con su flag `eliminada`.
+    """
     try:
-        # Últimas 100 ventas para no saturar
-        ventas = Venta.objects.all().order_by('-fecha')[:100]
+        manager = Venta.todos if request.GET.get('since') else Venta.objects
+        ventas = manager.annotate(items_count=Count('detalles'))
+        ventas, next_cursor, has_more = _pagina_sync(ventas, request)
         data = []
         for venta in ventas:
             data.append({
@@ -84,15 +182,115 @@ def api_ventas(request):
                 'fecha': venta.fecha.isoformat(),
                 'total': float(venta.total),
                 'cliente': venta.cliente or '',
-                'items_count': venta.detalles.count(),
-                'updated_at': venta.id
+                'items_count': venta.items_count,
+                'eliminada': venta.eliminada,
+                'updated_at': venta.fecha_modificacion.isoformat()
             })
         
-        return JsonResponse({
-            'status': 'success',
-            'data': data, 
-            'count': len(data),
-            'last_updated': datetime.now().isoformat()
-        })
+        return _respuesta_sync(data, next_cursor, has_more)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+# ==================== LISTAS PAGINADAS (KEYSET) ====================
+#
+# Mismo esquema de cursores que las listas HTML (gestion.paginacion):
+#   ?cursor=<cursor>  → página siguiente/anterior (next_cursor / previous_cursor)
+#   ?limit=<n>        → tamaño de página (default 25, máximo 100)
+#   ?contar=exacto    → total exacto en lugar del estimado acotado
+
+LISTAS_LIMITE_MAXIMO = 100
+
+
+def _movimientos(request):
+    movimientos = MovimientoMateriaPrima.objects.all()
+    materia_prima = request.GET.get('materia_prima', '')
+    if materia_prima.isdigit():
+        movimientos = movimientos.filter(materia_prima_id=materia_prima)
+    return movimientos
+
+
+# nombre → (queryset, orden, campos)
+LISTAS = {
+    'ventas': (
+        lambda request: Venta.objects.all(),
+        ('-fecha', '-id'),
+        ('id', 'fecha', 'cliente', 'total'),
+    ),
+    'compras': (
+        lambda request: Compra.objects.all(),
+        ('-fecha_compra', '-id'),
+        ('id', 'fecha_compra', 'proveedor', 'materia_prima_id', 'total'),
+    ),
+    'ajustes': (
+        lambda request: AjusteInventario.objects.all(),
+        ('-fecha', '-id'),
+        ('id', 'fecha', 'tipo', 'producto_id', 'materia_prima_id', 'stock_anterior', 'stock_nuevo', 'diferencia'),
+    ),
+    'movimientos': (
+        _movimientos,
+        ('-fecha', '-id'),
+        ('id', 'fecha', 'materia_prima_id', 'tipo_movimiento', 'cantidad', 'costo_total'),
+    ),
+}
+
+
+@login_required
+@require_GET
+def api_lista(request, nombre):
+    """Historial paginado por keyset de ventas, compras, ajustes o movimientos."""
+    if nombre not in LISTAS:
+        return JsonResponse({'error': f'Lista desconocida: {nombre}'}, status=404)
+    queryset, orden, campos = LISTAS[nombre]
+    try:
+        limite = min(max(int(request.GET.get('limit', 25)), 1), LISTAS_LIMITE_MAXIMO)
+    except ValueError:
+        limite = 25
+
+    paginator = KeysetPaginator(
+        queryset(request).values(*campos),
+        orden=orden,
+        por_pagina=limite,
+        limite_conteo=0 if request.GET.get('contar') == 'exacto' else LIMITE_CONTEO_DEFAULT,
+    )
+    try:
+        pagina = paginator.pagina(request.GET.get('cursor'))
+    except CursorInvalido as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'status': 'success',
+        'data': list(pagina),
+        'count': len(pagina),
+        **pagina.a_dict(),
+    })
+
+
+# ==================== BÚSQUEDA ====================
+
+@login_required
+@require_GET
+def api_buscar(request):
+    """
+    Búsqueda global rankeada sobre el índice de texto.
+    ?q=<texto>&tipos=producto,venta&limite=20
+    """
+    tipos = [t for t in request.GET.get('tipos', '').split(',') if t] or None
+    try:
+        limite = min(max(int(request.GET.get('limite', 20)), 1), 100)
+    except ValueError:
+        limite = 20
+
+    resultados = search.buscar(request.GET.get('q', ''), tipos=tipos, limite=limite)
+    data = [
+        {
+            'tipo': resultado['tipo'],
+            'id': resultado['id'],
+            'titulo': str(resultado['objeto']),
+            'puntaje': round(resultado['puntaje'], 4),
+        }
+        for resultado in resultados
+    ]
+    return JsonResponse({'status': 'success', 'data': data, 'count': len(data)})
@@ -0,0 +1,28 @@
+"""
+Cache compartido para LINO SALUDABLE
+Los cachés en memoria del proceso (dicts de clase, LocMemCache) solo son
+coherentes si todos los workers ven las mismas invalidaciones. Eso pasa
+con Redis, Memcached, el cache en DB o en archivo, pero no con DummyCache
+(no guarda nada) ni con LocMemCache (uno por proceso de gunicorn).
+
+    if cache_compartido():
+        ...validar contra un sello guardado en el cache...
+    else:
+        ...leer de la DB (o con un TTL corto)...
+"""
+
+from django.conf import settings
+
+# Backends que no comparten datos entre procesos
+BACKENDS_LOCALES = (
+    'django.core.cache.backends.dummy.DummyCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+def cache_compartido(alias='default'):
+    """True si el backend del cache `alias` lo ven todos los procesos."""
+    configuracion = settings.CACHES.get(alias)
+    if not configuracion:
+        return False
+    return configuracion['BACKEND'] not in BACKENDS_LOCALES
@@ -0,0 +1,92 @@
+"""
+Escrituras serializadas con reintento para LINO SALUDABLE
+SQLite admite un solo escritor a la vez. Con varios workers de gunicorn,
+las ventas, compras y ajustes simultáneos compiten por ese lock y algunas
+terminan en "database is locked". Esta capa:
+
+- Serializa las escrituras de los hilos de un mismo proceso con un lock
+  en memoria, para que no compitan entre sí por el lock del archivo.
+- Reintenta la transacción completa con espera exponencial (y jitter)
+  cuando SQLite responde "database is locked" / "database is busy".
+
+Entre procesos la serialización la hace la propia base con el perfil
+SQLITE_OPCIONES_PRODUCCION (BEGIN IMMEDIATE + busy_timeout, ver settings).
+
+    @escritura_serializada
+    def registrar_venta(self, lineas, ...):
+        with transaction.atomic():
+            ...
+
+    compra = ejecutar_escritura(_registrar_compra, request)
+
+Dentro de una transacción ya abierta la función se ejecuta tal cual: solo
+la transacción más externa puede reintentarse.
+"""
+
+import functools
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection
+
+logger = logging.getLogger('lino.escrituras')
+
+# Reentrante: una escritura serializada puede llamar a otra
+_candado = threading.RLock()
+
+MENSAJES_BLOQUEO = ('database is locked', 'database table is locked', 'database is busy')
+
+
+def es_bloqueo(error):
+    """True si el OperationalError es un lock de SQLite (reintentable)."""
+    mensaje = str(error).lower()
+    return any(texto in mensaje for texto in MENSAJES_BLOQUEO)
+
+
+def _activa():
+    return getattr(settings, 'LINO_ESCRITURAS_SERIALIZADAS', True)
+
+
+def ejecutar_escritura(funcion, *args, **kwargs):
+    """
+    Ejecuta `funcion` serializada y con reintentos ante locks de SQLite.
+
+    Settings:
+        LINO_ESCRITURAS_SERIALIZADAS: activa la capa (default: True)
+        LINO_ESCRITURAS_REINTENTOS: intentos totales (default: 5)
+        LINO_ESCRITURAS_ESPERA_MS: espera inicial entre intentos, se duplica en cada uno (default: 50)
+    """
+    if not _activa() or connection.in_atomic_block:
+        return funcion(*args, **kwargs)
+
+    intentos = max(1, getattr(settings, 'LINO_ESCRITURAS_REINTENTOS', 5))
+    espera = getattr(settings, 'LINO_ESCRITURAS_ESPERA_MS', 50) / 1000
+    serializar = connection.vendor == 'sqlite'
+
+    for intento in range(1, intentos + 1):
+        try:
+            if serializar:
+                with _candado:
+                    return funcion(*args, **kwargs)
+            return funcion(*args, **kwargs)
+        except OperationalError as e:
+            if not es_bloqueo(e) or intento == intentos:
+                raise
+            # Fuera del candado: los demás hilos avanzan mientras esperamos
+            pausa = espera * (2 ** (intento - 1)) * random.uniform(0.5, 1.5)
+            logger.warning(
+                'Escritura bloqueada (%s), reintento %s/%s en %.0f ms',
+                getattr(funcion, '__qualname__', funcion), intento, intentos - 1, pausa * 1000,
+            )
+            time.sleep(pausa)
+
+
+def escritura_serializada(funcion):
+    """Decorador de ejecutar_escritura()."""
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        return ejecutar_escritura(funcion, *args, **kwargs)
+    return envoltura
@@ -782,8 +782,13 @@ class AjusteMateriaPrimaForm(forms.ModelForm):
             ajuste.stock_anterior = ajuste.materia_prima.stock_actual
             
         if commit:
+            from gestion.services.lotes_service import LoteAllocator
             ajuste.save()
-            # Actualizar el stock de la materia prima
+            # Actualizar el stock de la materia prima y sus lotes
+            LoteAllocator().ajustar(
+                ajuste.materia_prima, ajuste.stock_anterior, ajuste.stock_nuevo,
+                motivo=f'Ajuste {ajuste.tipo_display}'
+            )
             ajuste.materia_prima.stock_actual = ajuste.stock_nuevo
             ajuste.materia_prima.save()
             
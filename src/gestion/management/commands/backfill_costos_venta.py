@@ -0,0 +1,63 @@
+"""
+Management Command: backfill_costos_venta
+Completa el costo congelado (VentaDetalle.costo_unitario) de las líneas de
+venta históricas que no lo tienen, con el costo vigente de cada producto.
+Las líneas completadas quedan con metodo_costo='estimado'.
+
+Uso:
+    python manage.py backfill_costos_venta
+    python manage.py backfill_costos_venta --lote 200
+"""
+
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, DecimalField, Value, When
+
+from gestion.models import VentaDetalle
+from gestion.services.cost_matrix import CostMatrix
+
+
+class Command(BaseCommand):
+    help = 'Completa el costo unitario de las líneas de venta sin costo congelado'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=500,
+            help='Productos por UPDATE (default: 500)'
+        )
+
+    def handle(self, *args, **options):
+        lote = max(1, options['lote'])
+        inicio = time.perf_counter()
+
+        pendientes = VentaDetalle.objects.filter(costo_unitario__isnull=True)
+        producto_ids = sorted(set(pendientes.values_list('producto_id', flat=True).distinct()))
+        if not producto_ids:
+            self.stdout.write(self.style.SUCCESS('✅ Todas las líneas de venta ya tienen costo'))
+            return
+
+        self.stdout.write(f'📸 Calculando costos de {len(producto_ids)} productos...')
+        matriz = CostMatrix()
+
+        lineas = 0
+        for i in range(0, len(producto_ids), lote):
+            ids = producto_ids[i:i + lote]
+            costo = Case(
+                *[
+                    When(producto_id=pid, then=Value(matriz.costo(pid).quantize(Decimal('0.01'))))
+                    for pid in ids
+                ],
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )
+            with transaction.atomic():
+                lineas += pendientes.filter(producto_id__in=ids).update(
+                    costo_unitario=costo, metodo_costo='estimado'
+                )
+            self.stdout.write(f'  • {min(i + lote, len(producto_ids))}/{len(producto_ids)} productos')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {lineas} líneas de venta completadas en {time.perf_counter() - inicio:.1f}s'
+        ))
@@ -0,0 +1,243 @@
+"""
+Management Command: benchmark_lino
+Mide las vistas más pesadas y las APIs a varias escalas de datos y escribe
+un archivo JSON comparable entre versiones.
+
+Por defecto crea una base de datos temporal (la de tests), la llena con
+generar_dataset para cada escala y la destruye al terminar: nunca toca los
+datos reales. Con --bd-actual mide sobre la base configurada, sin generar
+datos (cada request corre en una transacción que se revierte).
+
+Uso:
+    python manage.py benchmark_lino
+    python manage.py benchmark_lino --escalas chico,mediano,grande --repeticiones 5
+    python manage.py benchmark_lino --salida benchmarks/v3.json --comparar benchmarks/v2.json
+    python manage.py benchmark_lino --bd-actual
+"""
+
+import json
+import logging
+import platform
+import statistics
+import time
+from io import StringIO
+
+import django
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from gestion.models import Compra, Producto, Venta
+
+ESCALAS = {
+    'mini': {'productos': 50, 'ventas': 500, 'compras': 50},
+    'chico': {'productos': 200, 'ventas': 5000, 'compras': 500},
+    'mediano': {'productos': 1000, 'ventas': 50000, 'compras': 5000},
+    'grande': {'productos': 2000, 'ventas': 500000, 'compras': 20000},
+}
+
+# (nombre, método, url name)
+BENCHMARKS = [
+    ('dashboard_inteligente', 'GET', 'gestion:dashboard_inteligente'),
+    ('reportes_lino', 'GET', 'gestion:reportes'),
+    ('dashboard_rentabilidad', 'GET', 'gestion:dashboard_rentabilidad'),
+    ('lista_inventario', 'GET', 'gestion:lista_inventario'),
+    ('crear_venta_v3', 'POST', 'gestion:crear_venta'),
+    ('api_productos', 'GET', 'gestion:api_productos'),
+    ('api_inventario', 'GET', 'gestion:api_inventario'),
+    ('api_ventas', 'GET', 'gestion:api_ventas'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de vistas y APIs a varias escalas de datos (resultado en JSON)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--escalas', type=str, default='chico,mediano',
+            help=f'Escalas separadas por coma: {", ".join(ESCALAS)} (default: chico,mediano)',
+        )
+        parser.add_argument('--repeticiones', type=int, default=5, help='Requests medidos por vista (default: 5)')
+        parser.add_argument(
+            '--salida', type=str, default='benchmark_lino.json',
+            help='Archivo JSON de resultados (default: benchmark_lino.json)',
+        )
+        parser.add_argument('--comparar', type=str, help='Archivo JSON anterior contra el cual comparar')
+        parser.add_argument(
+            '--umbral', type=float, default=20.0,
+            help='%% de aumento de la mediana que se reporta como regresión (default: 20)',
+        )
+        parser.add_argument(
+            '--bd-actual', action='store_true',
+            help='Medir sobre la base configurada, sin generar datos ni crear base temporal',
+        )
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] < 1:
+            raise CommandError('--repeticiones debe ser al menos 1')
+        escalas = [e.strip() for e in options['escalas'].split(',') if e.strip()]
+        desconocidas = [e for e in escalas if e not in ESCALAS]
+        if desconocidas:
+            raise CommandError(f'Escalas desconocidas: {", ".join(desconocidas)}')
+
+        anterior = None
+        if options['comparar']:
+            try:
+                with open(options['comparar'], encoding='utf-8') as archivo:
+                    anterior = json.load(archivo)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'No se pudo leer {options["comparar"]}: {e}')
+
+        self.repeticiones = options['repeticiones']
+        resultado = {
+            'generado': timezone.now().isoformat(),
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'motor': connection.vendor,
+            'repeticiones': self.repeticiones,
+            'escalas': [],
+        }
+
+        # Las advertencias N+1 de PerfMiddleware ensuciarían el reporte
+        perf_logger = logging.getLogger('lino.perf')
+        nivel_original = perf_logger.level
+        perf_logger.setLevel(logging.ERROR)
+        try:
+            with override_settings(ALLOWED_HOSTS=['*']):
+                self._ejecutar(resultado, escalas, options['bd_actual'])
+        finally:
+            perf_logger.setLevel(nivel_original)
+
+        with open(options['salida'], 'w', encoding='utf-8') as archivo:
+            json.dump(resultado, archivo, ensure_ascii=False, indent=2, sort_keys=True)
+        self.stdout.write(self.style.SUCCESS(f'✅ Resultados en {options["salida"]}'))
+
+        if anterior:
+            self._comparar(anterior, resultado, options['umbral'])
+
+    def _ejecutar(self, resultado, escalas, bd_actual):
+        if bd_actual:
+            resultado['escalas'].append(self._medir_escala('actual'))
+            return
+
+        nombre_original = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            for escala in escalas:
+                resultado['escalas'].append(self._medir_escala(escala, ESCALAS[escala]))
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+
+    # ==================== MEDICIÓN ====================
+
+    def _medir_escala(self, nombre, parametros=None):
+        datos = {'nombre': nombre}
+        if parametros:
+            self.stdout.write(f'\n🌱 Escala {nombre}: generando {parametros}...')
+            inicio = time.perf_counter()
+            call_command('generar_dataset', limpiar=True, stdout=StringIO(), **parametros)
+            datos['generacion_s'] = round(time.perf_counter() - inicio, 2)
+        else:
+            self.stdout.write('\n📦 Base de datos actual')
+        datos.update({
+            'productos': Producto.objects.count(),
+            'ventas': Venta.todos.count(),
+            'compras': Compra.objects.count(),
+        })
+
+        usuario = User.objects.filter(is_superuser=True).order_by('id').first()
+        if usuario is None:
+            usuario = User.objects.create_superuser(username='benchmark', password=None)
+        cliente = Client()
+        cliente.force_login(usuario)
+
+        datos['resultados'] = []
+        for vista, metodo, url_name in BENCHMARKS:
+            medicion = self._medir_vista(cliente, vista, metodo, reverse(url_name))
+            datos['resultados'].append(medicion)
+            self.stdout.write(
+                f"  • {vista:<24} {medicion['mediana_ms']:>9.1f} ms  "
+                f"p95 {medicion['p95_ms']:>9.1f} ms  {medicion['queries']:>4} queries  [{medicion['status']}]"
+            )
+        return datos
+
+    def _post_venta(self):
+        producto = Producto.objects.filter(stock__gt=0).order_by('-stock').first()
+        if producto is None:
+            return {}
+        return {
+            'cliente': 'Benchmark',
+            'productos[0][producto_id]': producto.id,
+            'productos[0][cantidad]': 1,
+            'productos[0][precio_unitario]': producto.precio,
+        }
+
+    def _medir_vista(self, cliente, vista, metodo, url):
+        datos_post = self._post_venta() if metodo == 'POST' else None
+        tiempos, queries, status = [], 0, None
+
+        # Un request de calentamiento (caches, imports) y luego los medidos;
+        # cada uno se revierte para no acumular ventas entre repeticiones
+        for repeticion in range(self.repeticiones + 1):
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as ctx:
+                    inicio = time.perf_counter()
+                    if metodo == 'POST':
+                        respuesta = cliente.post(url, datos_post)
+                    else:
+                        respuesta = cliente.get(url)
+                    transcurrido = (time.perf_counter() - inicio) * 1000
+                transaction.set_rollback(True)
+            if repeticion:
+                tiempos.append(transcurrido)
+                queries = len(ctx.captured_queries)
+                status = respuesta.status_code
+
+        tiempos.sort()
+        return {
+            'vista': vista,
+            'metodo': metodo,
+            'url': url,
+            'status': status,
+            'queries': queries,
+            'mediana_ms': round(statistics.median(tiempos), 2),
+            'p95_ms': round(tiempos[min(len(tiempos) - 1, int(round(0.95 * (len(tiempos) - 1))))], 2),
+            'min_ms': round(tiempos[0], 2),
+        }
+
+    # ==================== COMPARACIÓN ====================
+
+    def _comparar(self, anterior, actual, umbral):
+        previos = {
+            (escala['nombre'], fila['vista']): fila
+            for escala in anterior.get('escalas', [])
+            for fila in escala.get('resultados', [])
+        }
+        self.stdout.write(f'\n📊 Comparación contra {anterior.get("generado", "archivo anterior")}')
+        regresiones = 0
+        for escala in actual['escalas']:
+            for fila in escala['resultados']:
+                previo = previos.get((escala['nombre'], fila['vista']))
+                if not previo or not previo.get('mediana_ms'):
+                    continue
+                delta = (fila['mediana_ms'] - previo['mediana_ms']) / previo['mediana_ms'] * 100
+                linea = (
+                    f"  {escala['nombre']:<8} {fila['vista']:<24} "
+                    f"{previo['mediana_ms']:>9.1f} → {fila['mediana_ms']:>9.1f} ms ({delta:+.0f}%)  "
+                    f"queries {previo['queries']} → {fila['queries']}"
+                )
+                if delta > umbral or fila['queries'] > previo['queries']:
+                    regresiones += 1
+                    self.stdout.write(self.style.WARNING(linea))
+                else:
+                    self.stdout.write(linea)
+
+        if regresiones:
+            self.stdout.write(self.style.WARNING(f'⚠️ {regresiones} posibles regresiones'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ Sin regresiones'))
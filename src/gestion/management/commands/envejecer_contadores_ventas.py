@@ -0,0 +1,48 @@
+"""
+Management Command: envejecer_contadores_ventas
+Corre las ventanas de los contadores de ventas de Producto (unidades de 7
+y 30 días, ingresos del mes): las ventas registradas los suman al momento,
+pero las que quedan fuera de la ventana solo salen con esta corrida.
+Programarlo una vez por día, pasada la medianoche (cron / scheduler).
+
+Uso:
+    python manage.py envejecer_contadores_ventas
+    python manage.py envejecer_contadores_ventas --completo   # también la última venta, sobre todo el historial
+    python manage.py envejecer_contadores_ventas --hoy 2025-11-30
+"""
+
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las ventanas de 7/30 días y del mes de los contadores de ventas de productos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completo',
+            action='store_true',
+            help='Recalcular también la última venta leyendo todo el historial de ventas',
+        )
+        parser.add_argument(
+            '--hoy',
+            type=str,
+            help='Día de referencia de las ventanas (YYYY-MM-DD). Por defecto: hoy.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            hoy = date.fromisoformat(options['hoy']) if options.get('hoy') else None
+        except ValueError as e:
+            raise CommandError(f'Fecha inválida: {e}')
+
+        self.stdout.write('📈 Recalculando contadores de ventas de productos...')
+        inicio = time.perf_counter()
+        actualizados = Producto.reconstruir_contadores(hoy=hoy, completo=options['completo'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {actualizados} productos actualizados en {time.perf_counter() - inicio:.1f}s'
+        ))
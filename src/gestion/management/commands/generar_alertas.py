@@ -51,51 +51,32 @@ class Command(BaseCommand):
             except User.DoesNotExist:
                 raise CommandError(f'Usuario "{username}" no encontrado')
         else:
-            usuarios = User.objects.filter(is_active=True)
-            self.stdout.write(f"👥 Generando para {usuarios.count()} usuarios activos")
+            usuarios = list(User.objects.filter(is_active=True))
+            self.stdout.write(f"👥 Generando para {len(usuarios)} usuarios activos")
         
         self.stdout.write(f"📋 Tipo de alertas: {tipo}\n")
         
-        # Generar alertas
-        service = AlertasService()
-        total_generadas = 0
+        # Generar alertas: candidatas una sola vez, bulk_create para todos los usuarios
+        generadores = None if tipo == 'todas' else [tipo]
         
-        for usuario in usuarios:
-            if verbose:
-                self.stdout.write(f"\nProcesando: {usuario.username}")
-            
-            try:
-                if tipo == 'todas':
-                    resultado = service.generar_todas_alertas(usuario)
-                    alertas_generadas = sum(resultado.values())
-                    
-                    if verbose:
-                        for tipo_alerta, count in resultado.items():
-                            if count > 0:
-                                self.stdout.write(f"  • {tipo_alerta}: {count} alertas")
-                    
-                elif tipo == 'stock':
-                    alertas_generadas = service.generar_alertas_stock(usuario)
-                elif tipo == 'vencimiento':
-                    alertas_generadas = service.generar_alertas_vencimiento(usuario)
-                elif tipo == 'rentabilidad':
-                    alertas_generadas = service.generar_alertas_rentabilidad(usuario)
-                elif tipo == 'stock_muerto':
-                    alertas_generadas = service.generar_alertas_stock_muerto(usuario)
-                elif tipo == 'oportunidades':
-                    alertas_generadas = service.generar_alertas_oportunidades(usuario)
-                else:
-                    alertas_generadas = 0
-                
-                total_generadas += alertas_generadas
-                
-                if not verbose and alertas_generadas > 0:
-                    self.stdout.write(self.style.SUCCESS(f"✓ {usuario.username}: {alertas_generadas} alertas generadas"))
-                
-            except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(f"✗ Error procesando {usuario.username}: {str(e)}")
-                )
+        try:
+            resultado, tiempos = AlertasService.generar_alertas_bulk(usuarios, generadores)
+        except Exception as e:
+            raise CommandError(f'Error generando alertas: {str(e)}')
+        
+        total_generadas = resultado.pop('total')
+        
+        self.stdout.write("⏱️  Tiempos por tipo de alerta:")
+        for tipo_alerta, segundos in tiempos.items():
+            count = resultado.get(tipo_alerta)
+            detalle = f" ({count} alertas)" if count is not None else ""
+            self.stdout.write(f"  • {tipo_alerta}: {segundos * 1000:.1f} ms{detalle}")
+        
+        if verbose:
+            self.stdout.write("")
+            for tipo_alerta, count in resultado.items():
+                if count > 0:
+                    self.stdout.write(self.style.SUCCESS(f"✓ {tipo_alerta}: {count} alertas generadas"))
         
         # Resumen final
         self.stdout.write("\n" + "="*60)
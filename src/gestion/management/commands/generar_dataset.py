@@ -0,0 +1,433 @@
+"""
+Management Command: generar_dataset
+Genera un dataset sintético realista con inserciones en bloque (bulk_create)
+para pruebas de carga y benchmarks: materias primas, recetas, productos de
+reventa / fraccionados / con receta, ventas con varias líneas (algunas
+eliminadas) y compras con detalle y legacy.
+
+Uso:
+    python manage.py generar_dataset
+    python manage.py generar_dataset --productos 2000 --ventas 500000 --compras 20000
+    python manage.py generar_dataset --limpiar --semilla 7
+"""
+
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, time as dtime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+
+from gestion.models import (
+    AjusteInventario, Alerta, Compra, CompraDetalle, ConfiguracionCostos, CoocurrenciaProducto, HistorialCosto,
+    HistorialPreciosMateriaPrima, LoteMateriaPrima, MateriaPrima, MovimientoMateriaPrima, Producto,
+    ProductoMateriaPrima, Receta, RecetaMateriaPrima, RecalculoPendiente, ResumenDiario, Venta,
+    VentaDetalle,
+    calcular_estado_stock,
+)
+from gestion import search
+from gestion.services.alertas_tiempo_real import ContadorAlertas
+from gestion.services.cost_matrix import CostMatrix
+
+MATERIAS_BASE = [
+    ('Avena arrollada', 'kg', 900), ('Harina integral', 'kg', 700), ('Harina de almendras', 'kg', 9000),
+    ('Almendras', 'kg', 12000), ('Nueces', 'kg', 11000), ('Castañas de cajú', 'kg', 14000),
+    ('Semillas de chía', 'kg', 6000), ('Semillas de lino', 'kg', 3000), ('Quinoa', 'kg', 5000),
+    ('Pasas de uva', 'kg', 4000), ('Coco rallado', 'kg', 5500), ('Miel', 'kg', 4500),
+    ('Azúcar mascabo', 'kg', 2500), ('Aceite de coco', 'l', 9500), ('Cacao amargo', 'kg', 8000),
+    ('Maní', 'kg', 3500), ('Arroz yamaní', 'kg', 2200), ('Lentejas', 'kg', 2000),
+    ('Yerba mate', 'kg', 4200), ('Té verde', 'kg', 16000), ('Frascos de vidrio', 'unidad', 600),
+]
+PRODUCTOS_BASE = [
+    'Granola', 'Barrita de cereal', 'Mix de frutos secos', 'Galletas de avena', 'Budín integral',
+    'Müesli', 'Pan de molde integral', 'Alfajor de algarroba', 'Crackers de semillas', 'Pasta de maní',
+]
+VARIANTES = ['clásica', 'sin TACC', 'orgánica', 'con miel', 'vegana', 'light', 'premium', 'familiar']
+PRESENTACIONES = [('100g', Decimal('0.1')), ('250g', Decimal('0.25')), ('500g', Decimal('0.5')), ('1kg', Decimal('1'))]
+PROVEEDORES = ['Molino del Sur', 'Distribuidora Natural', 'Frutos del Valle', 'Apícola Norte', 'Granos Andinos']
+CLIENTES = [None, None, None, 'Consumidor final', 'Dietética Centro', 'Almacén Orgánico', 'Café Verde']
+
+
+class Command(BaseCommand):
+    help = 'Genera un dataset sintético en bloque para pruebas de carga y benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=200, help='Cantidad de productos (default: 200)')
+        parser.add_argument('--ventas', type=int, default=5000, help='Cantidad de ventas (default: 5000)')
+        parser.add_argument('--compras', type=int, default=500, help='Cantidad de compras (default: 500)')
+        parser.add_argument(
+            '--materias', type=int,
+            help='Cantidad de materias primas (default: productos / 10, mínimo 20)',
+        )
+        parser.add_argument('--dias', type=int, default=365, help='Días de historial (default: 365)')
+        parser.add_argument(
+            '--eliminadas', type=float, default=0.02,
+            help='Proporción de ventas eliminadas (soft delete, default: 0.02)',
+        )
+        parser.add_argument('--semilla', type=int, default=42, help='Semilla aleatoria (default: 42)')
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por bulk_create (default: 5000)')
+        parser.add_argument(
+            '--limpiar', action='store_true',
+            help='Borra productos, materias primas, ventas, compras y alertas existentes antes de generar',
+        )
+
+    def handle(self, *args, **options):
+        for opcion in ('productos', 'ventas', 'compras', 'dias', 'lote'):
+            if options[opcion] < 0 or (opcion in ('dias', 'lote') and options[opcion] == 0):
+                raise CommandError(f'--{opcion} debe ser un número positivo')
+        if not 0 <= options['eliminadas'] < 1:
+            raise CommandError('--eliminadas debe estar entre 0 y 1')
+
+        self.rnd = random.Random(options['semilla'])
+        self.lote = options['lote']
+        self.dias = options['dias']
+        self.hoy = timezone.localdate()
+        self.tiempos = {}
+
+        n_materias = options['materias'] or max(20, options['productos'] // 10)
+
+        self.stdout.write('🌱 Generando dataset sintético...')
+        inicio = time.perf_counter()
+
+        with transaction.atomic():
+            if options['limpiar']:
+                self._etapa('limpieza', self._limpiar)
+            self.usuario = self._usuario()
+            ConfiguracionCostos.get_config()
+
+            materias = self._etapa('materias primas', self._crear_materias, n_materias)
+            recetas = self._etapa('recetas', self._crear_recetas, materias, max(1, options['productos'] // 8))
+            productos = self._etapa('productos', self._crear_productos, options['productos'], materias, recetas)
+            self._etapa('costos', self._calcular_costos, productos)
+            self._etapa('ventas', self._crear_ventas, options['ventas'], productos, options['eliminadas'])
+            self._etapa('compras', self._crear_compras, options['compras'], materias)
+            self._etapa('resumen diario', ResumenDiario.reconstruir)
+            self._etapa('co-ocurrencias', CoocurrenciaProducto.reconstruir)
+            self._etapa('contadores de ventas', Producto.reconstruir_contadores, completo=True)
+            self._etapa('índice de búsqueda', search.reindexar)
+
+        ConfiguracionCostos.invalidar_cache()
+
+        for etapa, segundos in self.tiempos.items():
+            self.stdout.write(f'  • {etapa}: {segundos:.2f}s')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Dataset generado en {time.perf_counter() - inicio:.1f}s: '
+            f'{len(materias)} materias primas, {len(productos)} productos, '
+            f'{options["ventas"]} ventas, {options["compras"]} compras'
+        ))
+
+    def _etapa(self, nombre, funcion, *args, **kwargs):
+        inicio = time.perf_counter()
+        resultado = funcion(*args, **kwargs)
+        self.tiempos[nombre] = time.perf_counter() - inicio
+        return resultado
+
+    # ==================== LIMPIEZA ====================
+
+    @staticmethod
+    def _limpiar():
+        """DELETE directo por tabla (sin cargar filas en memoria), hijos primero."""
+        # Todas las tablas con FK a productos, materias primas, recetas, ventas o compras
+        modelos = [
+            Alerta, HistorialCosto, RecalculoPendiente, CoocurrenciaProducto, AjusteInventario,
+            VentaDetalle, Venta, LoteMateriaPrima, CompraDetalle, Compra,
+            MovimientoMateriaPrima, HistorialPreciosMateriaPrima, ProductoMateriaPrima,
+            RecetaMateriaPrima, Receta.productos.through, Producto, Receta, MateriaPrima, ResumenDiario,
+        ]
+        # Los productos fraccionados referencian a su producto_origen
+        Producto.objects.update(producto_origen=None)
+        with connection.cursor() as cursor:
+            for modelo in modelos:
+                cursor.execute(f'DELETE FROM {connection.ops.quote_name(modelo._meta.db_table)}')
+        # El DELETE directo no dispara signals: descartar los contadores de alertas
+        ContadorAlertas.invalidar(User.objects.values_list('id', flat=True))
+
+    def _usuario(self):
+        usuario = User.objects.filter(is_superuser=True).order_by('id').first()
+        if usuario is None:
+            usuario, _ = User.objects.get_or_create(username='dataset', defaults={'is_staff': True})
+        return usuario
+
+    # ==================== CATÁLOGO ====================
+
+    def _crear_materias(self, cantidad):
+        # MateriaPrima.nombre es único: no chocar con datos previos (sin --limpiar)
+        usados = set(MateriaPrima.objects.values_list('nombre', flat=True))
+        materias = []
+        for i in range(cantidad):
+            nombre_base, unidad, costo = MATERIAS_BASE[i % len(MATERIAS_BASE)]
+            nombre, sufijo = nombre_base, i // len(MATERIAS_BASE)
+            while nombre in usados:
+                sufijo += 1
+                nombre = f'{nombre_base} lote {sufijo}'
+            usados.add(nombre)
+            costo = Decimal(costo) * Decimal(str(round(self.rnd.uniform(0.8, 1.25), 2)))
+            materia = MateriaPrima(
+                nombre=nombre,
+                unidad_medida=unidad,
+                costo_unitario=costo.quantize(Decimal('0.01')),
+                stock_actual=Decimal(self.rnd.randint(0, 300)),
+                stock_minimo=Decimal(self.rnd.choice([5, 10, 20])),
+                proveedor=self.rnd.choice(PROVEEDORES),
+            )
+            # bulk_create no pasa por save(): el estado de stock va a mano
+            materia.estado_stock = calcular_estado_stock(materia.stock_actual, materia.stock_minimo)
+            materias.append(materia)
+        return MateriaPrima.objects.bulk_create(materias, batch_size=self.lote)
+
+    def _crear_recetas(self, materias, cantidad):
+        recetas = Receta.objects.bulk_create([
+            Receta(nombre=f'Receta {PRODUCTOS_BASE[i % len(PRODUCTOS_BASE)]} #{i + 1}', creador=self.usuario)
+            for i in range(cantidad)
+        ], batch_size=self.lote)
+
+        ingredientes = []
+        for receta in recetas:
+            for materia in self.rnd.sample(materias, k=min(len(materias), self.rnd.randint(2, 5))):
+                ingredientes.append(RecetaMateriaPrima(
+                    receta=receta,
+                    materia_prima=materia,
+                    cantidad=Decimal(str(round(self.rnd.uniform(0.02, 0.4), 3))),
+                    unidad=materia.unidad_medida,
+                ))
+        RecetaMateriaPrima.objects.bulk_create(ingredientes, batch_size=self.lote)
+        # bulk_create no dispara los signals de ingredientes: costo_cache en un UPDATE
+        Receta.actualizar_costos()
+        return recetas
+
+    def _crear_productos(self, cantidad, materias, recetas):
+        """
+        Mezcla de tipos: ~15% con receta, ~25% fraccionados de un producto de
+        reventa, el resto reventa (la mitad asociada a una materia prima).
+        """
+        categorias = [codigo for codigo, _ in Producto.CATEGORIAS_DIETETICA]
+        base, fraccionados = [], []
+        for i in range(cantidad):
+            nombre_base = PRODUCTOS_BASE[i % len(PRODUCTOS_BASE)]
+            presentacion, peso = self.rnd.choice(PRESENTACIONES)
+            producto = Producto(
+                nombre=f'{nombre_base} {self.rnd.choice(VARIANTES)} {presentacion} #{i + 1}',
+                categoria=self.rnd.choice(categorias),
+                stock=self.rnd.choice([0, 2, 5] + [self.rnd.randint(6, 400)] * 7),
+                stock_minimo=self.rnd.choice([3, 5, 10]),
+                margen_ganancia=Decimal(self.rnd.choice([25, 30, 40, 50])),
+                cantidad_fraccion=peso,
+                marca=self.rnd.choice(['', 'Lino', 'Natural Food', 'Campo Verde']),
+            )
+            producto.estado_stock = calcular_estado_stock(producto.stock, producto.stock_minimo)
+            sorteo = self.rnd.random()
+            if sorteo < 0.15 and recetas:
+                producto.tipo_producto = 'receta'
+                producto.tiene_receta = True
+                producto.receta = self.rnd.choice(recetas)
+                base.append(producto)
+            elif sorteo < 0.40 and base:
+                producto.tipo_producto = 'fraccionamiento'
+                producto.factor_conversion = Decimal(self.rnd.choice([2, 4, 5, 10]))
+                fraccionados.append(producto)
+            else:
+                producto.tipo_producto = 'reventa'
+                if self.rnd.random() < 0.5:
+                    producto.materia_prima_asociada = self.rnd.choice(materias)
+                else:
+                    costo = Decimal(self.rnd.randint(300, 8000))
+                    producto.costo_base = costo
+                    producto.precio = float(costo * Decimal('1.4'))
+                base.append(producto)
+
+        base = Producto.objects.bulk_create(base, batch_size=self.lote)
+        origenes = [p for p in base if p.tipo_producto == 'reventa'] or base
+        for producto in fraccionados:
+            producto.producto_origen = self.rnd.choice(origenes)
+        fraccionados = Producto.objects.bulk_create(fraccionados, batch_size=self.lote)
+        return base + fraccionados
+
+    def _calcular_costos(self, productos):
+        """Costo y precio de venta de todo el catálogo con la CostMatrix."""
+        matriz = CostMatrix(productos=productos)
+        for producto in productos:
+            producto.costo_base = matriz.costo(producto.id)
+            producto.precio_venta_calculado = matriz.precio_venta(producto.id)
+            if producto.precio_venta_calculado:
+                producto.precio = round(float(producto.precio_venta_calculado))
+            elif not producto.precio:
+                producto.precio = float(self.rnd.randint(500, 5000))
+        Producto.objects.bulk_update(
+            productos, ['costo_base', 'precio_venta_calculado', 'precio'], batch_size=self.lote
+        )
+
+    # ==================== MOVIMIENTOS ====================
+
+    def _fechas_aleatorias(self, cantidad):
+        """
+        Fechas en horario comercial (9 a 21 hs) de los últimos `dias` días,
+        ordenadas: los ids quedan en orden cronológico, como en producción.
+        """
+        aperturas = [
+            timezone.make_aware(datetime.combine(self.hoy - timedelta(days=d), dtime(9)))
+            for d in range(self.dias)
+        ]
+        fechas = [
+            self.rnd.choice(aperturas) + timedelta(seconds=self.rnd.randrange(12 * 3600))
+            for _ in range(cantidad)
+        ]
+        fechas.sort()
+        return fechas
+
+    def _insertar(self, modelo, filas):
+        """
+        INSERT masivo con executemany, sin instanciar modelos (las ventas son
+        millones de filas). `filas` son dicts por attname con el id ya asignado;
+        las columnas omitidas toman el default del campo.
+        """
+        campos = modelo._meta.concrete_fields
+        columnas = ', '.join(connection.ops.quote_name(f.column) for f in campos)
+        marcadores = ', '.join(['%s'] * len(campos))
+        sql = f'INSERT INTO {connection.ops.quote_name(modelo._meta.db_table)} ({columnas}) VALUES ({marcadores})'
+
+        ahora = timezone.now()
+        conversores = []
+        for campo in campos:
+            if getattr(campo, 'auto_now', False) or getattr(campo, 'auto_now_add', False):
+                default = ahora
+            else:
+                default = campo.get_default()
+            # Decimal y tipos simples los adapta el driver; las fechas pasan por el backend
+            preparar = {
+                'DateTimeField': connection.ops.adapt_datetimefield_value,
+                'DateField': connection.ops.adapt_datefield_value,
+            }.get(campo.get_internal_type())
+            if preparar is not None and default is not None:
+                default = preparar(default)
+            conversores.append((campo.attname, default, preparar))
+
+        valores = []
+        for fila in filas:
+            registro = []
+            for attname, default, preparar in conversores:
+                if attname in fila:
+                    valor = fila[attname]
+                    if preparar is not None and valor is not None:
+                        valor = preparar(valor)
+                else:
+                    valor = default
+                registro.append(valor)
+            valores.append(registro)
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, valores)
+
+    @staticmethod
+    def _siguiente_id(modelo):
+        ultimo = modelo._base_manager.order_by('-pk').values_list('pk', flat=True).first()
+        return (ultimo or 0) + 1
+
+    def _crear_ventas(self, cantidad, productos, proporcion_eliminadas):
+        """
+        Ventas de 1 a 6 líneas con popularidad tipo Pareto: pocos productos
+        concentran la mayoría de las unidades vendidas.
+        """
+        if not productos or not cantidad:
+            return
+        orden = productos[:]
+        self.rnd.shuffle(orden)
+        acumulado, pesos = 0.0, []
+        for rango in range(1, len(orden) + 1):
+            acumulado += 1 / rango ** 0.9
+            pesos.append(acumulado)
+        precios = {p.id: Decimal(str(p.precio)).quantize(Decimal('0.01')) for p in orden}
+        # costo_base ya es el costo de la CostMatrix (etapa "costos"): se congela en cada línea
+        costos = {p.id: (Decimal(str(p.costo_base or 0)).quantize(Decimal('0.01')), p.metodo_costo) for p in orden}
+
+        fechas = iter(self._fechas_aleatorias(cantidad))
+        venta_id = self._siguiente_id(Venta)
+        detalle_id = self._siguiente_id(VentaDetalle)
+        creadas = 0
+        while creadas < cantidad:
+            tamanio = min(self.lote, cantidad - creadas)
+            ventas, detalles = [], []
+            for n_lineas in self.rnd.choices([1, 2, 3, 4, 6], weights=[40, 25, 18, 12, 5], k=tamanio):
+                elegidos = {p.id for p in self.rnd.choices(orden, cum_weights=pesos, k=n_lineas)}
+                cantidades = self.rnd.choices([1, 2, 3, 5], weights=[60, 25, 10, 5], k=len(elegidos))
+                total = Decimal('0')
+                for producto_id, unidades in zip(elegidos, cantidades):
+                    precio = precios[producto_id]
+                    costo, metodo = costos[producto_id]
+                    subtotal = precio * unidades
+                    total += subtotal
+                    detalles.append({
+                        'id': detalle_id, 'venta_id': venta_id, 'producto_id': producto_id,
+                        'cantidad': unidades, 'precio_unitario': precio, 'subtotal': subtotal,
+                        'costo_unitario': costo, 'metodo_costo': metodo,
+                    })
+                    detalle_id += 1
+
+                fecha = next(fechas)
+                venta = {
+                    'id': venta_id, 'fecha': fecha, 'cliente': self.rnd.choice(CLIENTES),
+                    'usuario_id': self.usuario.id, 'total': total,
+                }
+                if self.rnd.random() < proporcion_eliminadas:
+                    venta.update({
+                        'eliminada': True,
+                        'fecha_eliminacion': fecha + timedelta(hours=1),
+                        'razon_eliminacion': 'Venta cargada por error',
+                        'usuario_eliminacion_id': self.usuario.id,
+                    })
+                ventas.append(venta)
+                venta_id += 1
+
+            self._insertar(Venta, ventas)
+            self._insertar(VentaDetalle, detalles)
+            creadas += tamanio
+
+        # Los ids se asignaron a mano: sincronizar las secuencias (PostgreSQL)
+        sql_secuencias = connection.ops.sequence_reset_sql(no_style(), [Venta, VentaDetalle])
+        with connection.cursor() as cursor:
+            for sql in sql_secuencias:
+                cursor.execute(sql)
+
+    def _crear_compras(self, cantidad, materias):
+        """~80% compras con CompraDetalle, ~20% compras legacy (precio_mayoreo)."""
+        if not materias or not cantidad:
+            return
+        compras, lineas = [], []
+        fechas = [timezone.localdate(fecha) for fecha in self._fechas_aleatorias(cantidad)]
+        for _ in range(cantidad):
+            compra = Compra(proveedor=self.rnd.choice(PROVEEDORES), usuario=self.usuario)
+            detalle = []
+            if self.rnd.random() < 0.2:
+                materia = self.rnd.choice(materias)
+                cantidad_mayoreo = Decimal(self.rnd.randint(5, 50))
+                compra.materia_prima = materia
+                compra.cantidad_mayoreo = cantidad_mayoreo
+                compra.precio_mayoreo = (cantidad_mayoreo * materia.costo_unitario).quantize(Decimal('0.01'))
+                compra.precio_unitario_mayoreo = materia.costo_unitario
+                compra.total = compra.precio_mayoreo
+            else:
+                for materia in self.rnd.sample(materias, k=min(len(materias), self.rnd.randint(1, 4))):
+                    unidades = Decimal(self.rnd.randint(1, 40))
+                    detalle.append((materia, unidades, materia.costo_unitario, unidades * materia.costo_unitario))
+                compra.total = sum(subtotal for *_, subtotal in detalle)
+            compras.append(compra)
+            lineas.append(detalle)
+
+        Compra.objects.bulk_create(compras, batch_size=self.lote)
+        CompraDetalle.objects.bulk_create([
+            CompraDetalle(compra=compra, materia_prima=materia, cantidad=unidades,
+                          precio_unitario=precio, subtotal=subtotal)
+            for compra, detalle in zip(compras, lineas)
+            for materia, unidades, precio, subtotal in detalle
+        ], batch_size=self.lote)
+
+        # fecha_compra es auto_now_add: se retrocede con un UPDATE por día
+        por_dia = defaultdict(list)
+        for compra, fecha in zip(compras, fechas):
+            por_dia[fecha].append(compra.pk)
+        for fecha, ids in por_dia.items():
+            for i in range(0, len(ids), 500):
+                Compra.objects.filter(pk__in=ids[i:i + 500]).update(fecha_compra=fecha)
@@ -0,0 +1,70 @@
+"""
+Management Command: procesar_recalculos
+Drena la cola RecalculoPendiente y propaga los cambios de precio de
+materias primas a los productos (modo LINO_RECALCULO_DIFERIDO)
+
+Uso:
+    python manage.py procesar_recalculos
+    python manage.py procesar_recalculos --loop --intervalo 30
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from gestion.services.recalculo_service import RecalculoService
+
+
+class Command(BaseCommand):
+    help = 'Procesa los recálculos de costos pendientes (agrupados por materia prima)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Quedarse ejecutando y revisar la cola periódicamente',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=int,
+            default=30,
+            help='Segundos entre revisiones en modo --loop (default: 30)',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Cantidad máxima de eventos por lote (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        service = RecalculoService(lote=options['lote'])
+
+        if not options['loop']:
+            self._procesar(service)
+            return
+
+        self.stdout.write(f"🔁 Procesando cola cada {options['intervalo']}s (Ctrl+C para salir)")
+        try:
+            while True:
+                self._procesar(service)
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write('\n👋 Worker detenido')
+
+    def _procesar(self, service):
+        totales = service.procesar_todo()
+        pendientes = service.pendientes().count()
+
+        if totales['eventos'] == 0 and pendientes == 0:
+            self.stdout.write('💤 No hay recálculos pendientes')
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {totales['eventos']} eventos → {totales['materias']} materias primas "
+            f"recalculadas, {totales['productos']} productos actualizados"
+        ))
+        if pendientes:
+            self.stdout.write(self.style.WARNING(
+                f'⚠️ Quedan {pendientes} eventos pendientes (ver campo error en el admin)'
+            ))
@@ -0,0 +1,89 @@
+"""
+Management Command: procesar_reportes
+Genera los reportes PDF / XLSX pedidos desde la UI (cola ReporteJob)
+con un pool de hilos
+
+Uso:
+    python manage.py procesar_reportes
+    python manage.py procesar_reportes --loop --intervalo 5 --hilos 4
+    python manage.py procesar_reportes --purgar 7
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from gestion.services.reporte_jobs import ReporteJobService
+
+
+class Command(BaseCommand):
+    help = 'Procesa los reportes pendientes (PDF / XLSX) en segundo plano'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Quedarse ejecutando y revisar la cola periódicamente',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=int,
+            default=5,
+            help='Segundos entre revisiones en modo --loop (default: 5)',
+        )
+        parser.add_argument(
+            '--hilos',
+            type=int,
+            default=2,
+            help='Reportes generados en paralelo (default: 2)',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=50,
+            help='Cantidad máxima de jobs por lote (default: 50)',
+        )
+        parser.add_argument(
+            '--purgar',
+            type=int,
+            metavar='DIAS',
+            help='Borrar jobs y archivos con más de DIAS días y salir',
+        )
+
+    def handle(self, *args, **options):
+        if options['purgar'] is not None:
+            jobs, archivos = ReporteJobService.purgar(options['purgar'])
+            self.stdout.write(self.style.SUCCESS(f'🧹 {jobs} jobs y {archivos} archivos eliminados'))
+            return
+
+        service = ReporteJobService(hilos=options['hilos'], lote=options['lote'])
+
+        if not options['loop']:
+            self._procesar(service)
+            return
+
+        self.stdout.write(
+            f"🔁 Procesando reportes cada {options['intervalo']}s con {service.hilos} hilos (Ctrl+C para salir)"
+        )
+        try:
+            while True:
+                self._procesar(service, silencioso=True)
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write('\n👋 Worker detenido')
+
+    def _procesar(self, service, silencioso=False):
+        totales = service.procesar_pendientes()
+
+        if totales['jobs'] == 0:
+            if not silencioso:
+                self.stdout.write('💤 No hay reportes pendientes')
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {totales['completados']} reportes generados de {totales['jobs']}"
+        ))
+        if totales['errores']:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️ {totales['errores']} reportes con error (ver campo error en el admin)"
+            ))
@@ -0,0 +1,76 @@
+"""
+Management Command: producir
+Ejecuta una orden de producción de varios productos en una sola transacción
+(ver OrdenProduccion): descuenta las materias primas de todas las recetas y
+suma lo producido al stock de cada producto.
+
+Uso:
+    python manage.py producir 12:30 15:24 40:10
+    python manage.py producir 12:30 15:24 --usuario admin
+    python manage.py producir 12:30 --verificar
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.services.produccion_service import MateriaPrimaInsuficienteError, OrdenProduccion
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Produce varios productos a la vez descontando sus materias primas en bloque'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'items', nargs='+', metavar='producto_id:cantidad',
+            help='Productos a producir, ej: 12:30 15:24',
+        )
+        parser.add_argument(
+            '--usuario', type=str,
+            help='Username que queda registrado en los movimientos (opcional)',
+        )
+        parser.add_argument(
+            '--verificar', action='store_true',
+            help='Solo informar faltantes de materia prima, sin producir',
+        )
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options['usuario']:
+            try:
+                usuario = User.objects.get(username=options['usuario'])
+            except User.DoesNotExist:
+                raise CommandError(f'Usuario "{options["usuario"]}" no encontrado')
+
+        orden = OrdenProduccion(usuario=usuario)
+        for item in options['items']:
+            producto_id, _, cantidad = item.partition(':')
+            try:
+                orden.agregar(int(producto_id), int(cantidad))
+            except ValueError:
+                raise CommandError(f'Item inválido "{item}": se espera producto_id:cantidad (cantidad > 0)')
+
+        try:
+            if options['verificar']:
+                faltantes = orden.verificar()
+                if faltantes:
+                    raise MateriaPrimaInsuficienteError(faltantes)
+                self.stdout.write(self.style.SUCCESS('✅ Hay materia prima suficiente para la orden'))
+                return
+            resultado = orden.ejecutar()
+        except MateriaPrimaInsuficienteError as e:
+            for faltante in e.faltantes:
+                self.stdout.write(self.style.ERROR(
+                    f"  ❌ {faltante['materia_prima']}: necesaria {faltante['necesaria']} "
+                    f"{faltante['unidad']}, disponible {faltante['disponible']}"
+                ))
+            raise CommandError('Stock de materias primas insuficiente')
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        unidades = sum(int(cantidad) for cantidad in orden.items.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Producidas {unidades} unidades de {len(orden.items)} productos '
+            f'({len(resultado["movimientos"])} movimientos, costo ${resultado["costo_total"]:,.2f})'
+        ))
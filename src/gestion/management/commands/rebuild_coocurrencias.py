@@ -0,0 +1,26 @@
+"""
+Management Command: rebuild_coocurrencias
+Reconstruye la tabla CoocurrenciaProducto (pares de productos vendidos
+juntos, usada por el cross-selling) desde las ventas activas
+
+Uso:
+    python manage.py rebuild_coocurrencias
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from gestion.models import CoocurrenciaProducto
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los pares de productos vendidos juntos usados por el cross-selling'
+
+    def handle(self, *args, **options):
+        self.stdout.write('🛒 Reconstruyendo co-ocurrencias de productos...')
+        inicio = time.perf_counter()
+        filas = CoocurrenciaProducto.reconstruir()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {filas} pares reconstruidos en {time.perf_counter() - inicio:.1f}s'
+        ))
@@ -0,0 +1,44 @@
+"""
+Management Command: rebuild_rollups
+Reconstruye la tabla ResumenDiario (rollup del dashboard) desde ventas y compras
+
+Uso:
+    python manage.py rebuild_rollups
+    python manage.py rebuild_rollups --desde 2025-11-01 --hasta 2025-11-30
+"""
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.models import ResumenDiario
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los resúmenes diarios de ventas/compras usados por el dashboard'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde',
+            type=str,
+            help='Fecha inicial (YYYY-MM-DD). Por defecto: todo el historial.',
+        )
+        parser.add_argument(
+            '--hasta',
+            type=str,
+            help='Fecha final (YYYY-MM-DD). Por defecto: hasta hoy.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            desde = date.fromisoformat(options['desde']) if options.get('desde') else None
+            hasta = date.fromisoformat(options['hasta']) if options.get('hasta') else None
+        except ValueError as e:
+            raise CommandError(f'Fecha inválida: {e}')
+
+        if desde and hasta and desde > hasta:
+            raise CommandError('--desde debe ser anterior o igual a --hasta')
+
+        self.stdout.write('📊 Reconstruyendo resúmenes diarios...')
+        dias = ResumenDiario.reconstruir(desde=desde, hasta=hasta)
+        self.stdout.write(self.style.SUCCESS(f'✅ {dias} días reconstruidos'))
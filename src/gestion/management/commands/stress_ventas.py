@@ -0,0 +1,237 @@
+"""
+Management Command: stress_ventas
+Prueba de concurrencia del POS sobre SQLite: varios procesos (como los
+workers de gunicorn), cada uno con varios hilos, registran ventas en
+paralelo con VentaPostingService. Mide ventas/s, latencia y cuántas
+ventas fallan con "database is locked" en cada perfil:
+
+- base: SQLite por defecto de Django (journal DELETE, BEGIN DEFERRED,
+  sin la capa de gestion.escrituras)
+- produccion: SQLITE_OPCIONES_PRODUCCION (WAL, BEGIN IMMEDIATE,
+  busy_timeout...) + escrituras serializadas con reintento
+
+Trabaja sobre un archivo SQLite propio (migrado al inicio y borrado al
+final), nunca sobre la base configurada.
+
+Uso:
+    python manage.py stress_ventas
+    python manage.py stress_ventas --procesos 8 --hilos 2 --ventas 50
+    python manage.py stress_ventas --perfiles produccion --json resultado.json
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.test.utils import override_settings
+
+from gestion.escrituras import es_bloqueo
+from gestion.models import Producto
+from gestion.services.venta_posting_service import VentaPostingService
+
+PERFILES = {
+    'base': {'journal_mode': 'DELETE', 'opciones': {}, 'serializadas': False},
+    'produccion': {
+        'journal_mode': 'WAL',
+        'opciones': settings.SQLITE_OPCIONES_PRODUCCION,
+        'serializadas': True,
+    },
+}
+
+
+def _hilo_pos(producto_ids, usuario, ventas, lineas, semilla, totales, candado):
+    """Un puesto de caja: registra `ventas` ventas seguidas."""
+    azar = random.Random(semilla)
+    servicio = VentaPostingService(usuario=usuario)
+    ok, bloqueos, errores, latencias = 0, 0, 0, []
+    try:
+        for _ in range(ventas):
+            canasta = [
+                {'producto_id': pid, 'cantidad': azar.randint(1, 3), 'precio_unitario': Decimal('1000')}
+                for pid in azar.sample(producto_ids, lineas)
+            ]
+            inicio = time.perf_counter()
+            try:
+                servicio.registrar_venta(canasta, cliente='Stress')
+                ok += 1
+                latencias.append((time.perf_counter() - inicio) * 1000)
+            except OperationalError as e:
+                if es_bloqueo(e):
+                    bloqueos += 1
+                else:
+                    errores += 1
+    finally:
+        connection.close()
+    with candado:
+        totales['ok'] += ok
+        totales['bloqueos'] += bloqueos
+        totales['errores'] += errores
+        totales['latencias'].extend(latencias)
+
+
+def _proceso_pos(indice, hilos, producto_ids, usuario_id, ventas, lineas, barrera, cola):
+    """Un worker: espera la largada y corre `hilos` puestos de caja en paralelo."""
+    usuario = User.objects.get(pk=usuario_id)
+    connection.close()
+    totales = {'ok': 0, 'bloqueos': 0, 'errores': 0, 'latencias': []}
+    candado = threading.Lock()
+    puestos = [
+        threading.Thread(
+            target=_hilo_pos,
+            args=(producto_ids, usuario, ventas, lineas, indice * 1000 + h, totales, candado),
+        )
+        for h in range(hilos)
+    ]
+    barrera.wait()
+    for puesto in puestos:
+        puesto.start()
+    for puesto in puestos:
+        puesto.join()
+    cola.put(totales)
+
+
+class Command(BaseCommand):
+    help = 'Prueba de concurrencia de ventas en SQLite: perfil base vs perfil de producción'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=4, help='Workers en paralelo (default: 4)')
+        parser.add_argument('--hilos', type=int, default=2, help='Hilos por worker (default: 2)')
+        parser.add_argument('--ventas', type=int, default=25, help='Ventas por hilo (default: 25)')
+        parser.add_argument('--lineas', type=int, default=3, help='Productos por venta (default: 3)')
+        parser.add_argument('--productos', type=int, default=50, help='Productos del catálogo (default: 50)')
+        parser.add_argument(
+            '--perfiles', type=str, default='base,produccion',
+            help=f'Perfiles separados por coma: {", ".join(PERFILES)} (default: base,produccion)',
+        )
+        parser.add_argument('--json', type=str, help='Archivo donde guardar los resultados')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('stress_ventas mide el perfil de SQLite: la base configurada no es SQLite')
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('stress_ventas necesita multiprocessing con fork')
+        perfiles = [p.strip() for p in options['perfiles'].split(',') if p.strip()]
+        desconocidos = [p for p in perfiles if p not in PERFILES]
+        if desconocidos:
+            raise CommandError(f'Perfiles desconocidos: {", ".join(desconocidos)}')
+        if min(options['procesos'], options['hilos'], options['ventas'], options['lineas']) < 1:
+            raise CommandError('--procesos, --hilos, --ventas y --lineas deben ser al menos 1')
+        if options['lineas'] > options['productos']:
+            raise CommandError('--lineas no puede superar --productos')
+
+        original = {'NAME': connection.settings_dict['NAME'], 'OPTIONS': connection.settings_dict.get('OPTIONS', {})}
+        descriptor, ruta = tempfile.mkstemp(prefix='lino_stress_', suffix='.sqlite3')
+        os.close(descriptor)
+
+        # Los reintentos de gestion.escrituras ensuciarían la salida
+        escrituras_logger = logging.getLogger('lino.escrituras')
+        nivel_original = escrituras_logger.level
+        escrituras_logger.setLevel(logging.ERROR)
+        try:
+            connection.close()
+            connection.settings_dict.update(NAME=ruta, OPTIONS={})
+            self.stdout.write(f'🗄️  Base temporal {ruta}: migrando...')
+            call_command('migrate', verbosity=0, interactive=False, stdout=StringIO())
+            producto_ids, usuario_id = self._preparar(options['productos'])
+
+            resultados = []
+            for perfil in perfiles:
+                resultado = self._correr(perfil, ruta, producto_ids, usuario_id, options)
+                resultados.append(resultado)
+                self.stdout.write(
+                    f"  • {perfil:<11} {resultado['ventas_por_s']:>8.1f} ventas/s  "
+                    f"ok {resultado['ok']:>5}  bloqueadas {resultado['bloqueos']:>5}  "
+                    f"p50 {resultado['p50_ms']:>7.1f} ms  p95 {resultado['p95_ms']:>7.1f} ms"
+                )
+        finally:
+            connection.close()
+            connection.settings_dict.update(original)
+            escrituras_logger.setLevel(nivel_original)
+            for sufijo in ('', '-wal', '-shm', '-journal'):
+                if os.path.exists(ruta + sufijo):
+                    os.remove(ruta + sufijo)
+
+        por_perfil = {r['perfil']: r for r in resultados}
+        if 'base' in por_perfil and 'produccion' in por_perfil and por_perfil['base']['ventas_por_s']:
+            mejora = por_perfil['produccion']['ventas_por_s'] / por_perfil['base']['ventas_por_s']
+            self.stdout.write(self.style.SUCCESS(
+                f'🚀 Perfil de producción: {mejora:.1f}x ventas/s, '
+                f"{por_perfil['base']['bloqueos']} → {por_perfil['produccion']['bloqueos']} ventas bloqueadas"
+            ))
+
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultados, archivo, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"✅ Resultados en {options['json']}"))
+
+    def _preparar(self, cantidad):
+        usuario = User.objects.create_user(username='stress_pos', password=None)
+        Producto.objects.bulk_create([
+            Producto(
+                nombre=f'Stress {i}', precio=1000, costo_base=Decimal('400'), stock=10 ** 9,
+                stock_minimo=1, categoria='test', tipo_producto='reventa',
+            )
+            for i in range(cantidad)
+        ])
+        return list(Producto.objects.values_list('id', flat=True)), usuario.id
+
+    def _correr(self, perfil, ruta, producto_ids, usuario_id, options):
+        config = PERFILES[perfil]
+        connection.close()
+        # journal_mode queda grabado en el archivo: se fija antes de largar
+        with sqlite3.connect(ruta) as conexion:
+            conexion.execute(f"PRAGMA journal_mode={config['journal_mode']}")
+        conexion.close()
+        # Los workers heredan el settings_dict (compartido por los hilos) al hacer fork
+        connection.settings_dict['OPTIONS'] = dict(config['opciones'])
+
+        contexto = multiprocessing.get_context('fork')
+        barrera = contexto.Barrier(options['procesos'] + 1)
+        cola = contexto.Queue()
+        with override_settings(LINO_ESCRITURAS_SERIALIZADAS=config['serializadas']):
+            procesos = [
+                contexto.Process(
+                    target=_proceso_pos,
+                    args=(i, options['hilos'], producto_ids, usuario_id,
+                          options['ventas'], options['lineas'], barrera, cola),
+                )
+                for i in range(options['procesos'])
+            ]
+            for proceso in procesos:
+                proceso.start()
+            barrera.wait()
+            inicio = time.perf_counter()
+            parciales = [cola.get() for _ in procesos]
+            segundos = time.perf_counter() - inicio
+            for proceso in procesos:
+                proceso.join()
+
+        ok = sum(p['ok'] for p in parciales)
+        latencias = sorted(l for p in parciales for l in p['latencias'])
+        return {
+            'perfil': perfil,
+            'procesos': options['procesos'],
+            'hilos': options['hilos'],
+            'intentadas': options['procesos'] * options['hilos'] * options['ventas'],
+            'ok': ok,
+            'bloqueos': sum(p['bloqueos'] for p in parciales),
+            'errores': sum(p['errores'] for p in parciales),
+            'segundos': round(segundos, 3),
+            'ventas_por_s': round(ok / segundos, 1) if segundos else 0.0,
+            'p50_ms': round(statistics.median(latencias), 1) if latencias else 0.0,
+            'p95_ms': round(latencias[int(len(latencias) * 0.95) - 1], 1) if latencias else 0.0,
+        }
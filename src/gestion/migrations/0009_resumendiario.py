@@ -0,0 +1,61 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:01
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def poblar_resumenes(apps, schema_editor):
+    """Genera los resúmenes diarios del historial existente."""
+    Venta = apps.get_model('gestion', 'Venta')
+    VentaDetalle = apps.get_model('gestion', 'VentaDetalle')
+    Compra = apps.get_model('gestion', 'Compra')
+    ResumenDiario = apps.get_model('gestion', 'ResumenDiario')
+
+    dias = {}
+
+    def _dia(fecha):
+        return dias.setdefault(fecha, ResumenDiario(fecha=fecha))
+
+    ventas = Venta.objects.filter(eliminada=False).annotate(dia=TruncDate('fecha'))
+    for fila in ventas.values('dia').annotate(total=Sum('total'), cantidad=Count('id')):
+        resumen = _dia(fila['dia'])
+        resumen.ventas_total = fila['total'] or 0
+        resumen.ventas_count = fila['cantidad']
+
+    detalles = VentaDetalle.objects.filter(venta__eliminada=False).annotate(dia=TruncDate('venta__fecha'))
+    for fila in detalles.values('dia').annotate(unidades=Sum('cantidad')):
+        _dia(fila['dia']).unidades_vendidas = fila['unidades'] or 0
+
+    for fila in Compra.objects.values('fecha_compra').annotate(total=Sum('total')):
+        _dia(fila['fecha_compra']).compras_total = fila['total'] or 0
+
+    ResumenDiario.objects.bulk_create(dias.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0008_stock_no_negativo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True, verbose_name='Día')),
+                ('ventas_total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total Vendido')),
+                ('ventas_count', models.IntegerField(default=0, verbose_name='Cantidad de Ventas')),
+                ('unidades_vendidas', models.IntegerField(default=0, verbose_name='Unidades Vendidas')),
+                ('compras_total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total Comprado')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario',
+                'verbose_name_plural': 'Resúmenes Diarios',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.RunPython(poblar_resumenes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0009_resumendiario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecalculoPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('precio_anterior', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('precio_nuevo', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('procesado', models.BooleanField(default=False)),
+                ('fecha_procesado', models.DateTimeField(blank=True, null=True)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'verbose_name': 'Recálculo Pendiente',
+                'verbose_name_plural': 'Recálculos Pendientes',
+                'ordering': ['fecha_creacion'],
+            },
+        ),
+        migrations.AddField(
+            model_name='recalculopendiente',
+            name='materia_prima',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recalculos_pendientes', to='gestion.materiaprima'),
+        ),
+        migrations.AddIndex(
+            model_name='recalculopendiente',
+            index=models.Index(fields=['procesado', 'fecha_creacion'], name='gestion_rec_procesa_9891cc_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0011_fecha_modificacion_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lotemateriaprima',
+            name='fecha_vencimiento',
+            field=models.DateField(blank=True, help_text='Si está cargada, el lote se consume antes (FEFO)', null=True, verbose_name='Fecha de Vencimiento'),
+        ),
+        migrations.AddField(
+            model_name='movimientomateriaprima',
+            name='costo_total',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Costo de los lotes consumidos (FIFO/FEFO) en salidas y producción', max_digits=12, null=True, verbose_name='Costo Real'),
+        ),
+        migrations.AddIndex(
+            model_name='lotemateriaprima',
+            index=models.Index(condition=models.Q(('cantidad_disponible__gt', 0)), fields=['materia_prima', 'fecha_vencimiento', 'fecha_entrada', 'id'], name='lote_mp_disponible_idx'),
+        ),
+    ]
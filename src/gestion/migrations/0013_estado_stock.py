@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:34
+
+from django.db import migrations, models
+from django.db.models import Case, F, Value, When
+
+
+def _estado(campo_stock):
+    return Case(
+        When(**{f'{campo_stock}__lte': 0}, then=Value('agotado')),
+        When(**{f'{campo_stock}__lte': F('stock_minimo')}, then=Value('critico')),
+        When(**{f'{campo_stock}__lte': F('stock_minimo') * 2}, then=Value('bajo')),
+        default=Value('normal'),
+    )
+
+
+def calcular_estados(apps, schema_editor):
+    """Completa estado_stock de las filas existentes con un UPDATE por tabla."""
+    apps.get_model('gestion', 'Producto').objects.update(estado_stock=_estado('stock'))
+    apps.get_model('gestion', 'MateriaPrima').objects.update(estado_stock=_estado('stock_actual'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0012_lotes_fefo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='materiaprima',
+            name='estado_stock',
+            field=models.CharField(choices=[('agotado', 'Agotado'), ('critico', 'Crítico'), ('bajo', 'Bajo'), ('normal', 'Normal')], db_index=True, default='normal', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='estado_stock',
+            field=models.CharField(choices=[('agotado', 'Agotado'), ('critico', 'Crítico'), ('bajo', 'Bajo'), ('normal', 'Normal')], db_index=True, default='normal', editable=False, max_length=10),
+        ),
+        migrations.RunPython(calcular_estados, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:38
+
+from django.db import migrations, models
+
+SQLITE_FTS = [
+    # Tabla FTS5 de contenido externo: el texto vive en gestion_documentobusqueda
+    """CREATE VIRTUAL TABLE gestion_busqueda_fts USING fts5(
+        texto,
+        content='gestion_documentobusqueda',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )""",
+    """CREATE TRIGGER gestion_busqueda_ai AFTER INSERT ON gestion_documentobusqueda BEGIN
+        INSERT INTO gestion_busqueda_fts(rowid, texto) VALUES (new.id, new.texto);
+    END""",
+    """CREATE TRIGGER gestion_busqueda_ad AFTER DELETE ON gestion_documentobusqueda BEGIN
+        INSERT INTO gestion_busqueda_fts(gestion_busqueda_fts, rowid, texto) VALUES ('delete', old.id, old.texto);
+    END""",
+    """CREATE TRIGGER gestion_busqueda_au AFTER UPDATE ON gestion_documentobusqueda BEGIN
+        INSERT INTO gestion_busqueda_fts(gestion_busqueda_fts, rowid, texto) VALUES ('delete', old.id, old.texto);
+        INSERT INTO gestion_busqueda_fts(rowid, texto) VALUES (new.id, new.texto);
+    END""",
+]
+
+SQLITE_FTS_REVERSA = [
+    'DROP TRIGGER IF EXISTS gestion_busqueda_au',
+    'DROP TRIGGER IF EXISTS gestion_busqueda_ad',
+    'DROP TRIGGER IF EXISTS gestion_busqueda_ai',
+    'DROP TABLE IF EXISTS gestion_busqueda_fts',
+]
+
+POSTGRES_TRGM = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS busqueda_texto_trgm ON gestion_documentobusqueda USING gin (texto gin_trgm_ops)',
+]
+
+POSTGRES_TRGM_REVERSA = ['DROP INDEX IF EXISTS busqueda_texto_trgm']
+
+# (modelo, campos indexados) - igual que gestion.search.TIPOS
+TIPOS = {
+    'producto': ('Producto', ('nombre', 'descripcion', 'marca')),
+    'materia_prima': ('MateriaPrima', ('nombre', 'descripcion', 'proveedor')),
+    'venta': ('Venta', ('cliente',)),
+    'compra': ('Compra', ('proveedor',)),
+}
+
+
+def _ejecutar(schema_editor, sentencias):
+    for sentencia in sentencias:
+        schema_editor.execute(sentencia)
+
+
+def crear_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _ejecutar(schema_editor, SQLITE_FTS)
+    elif vendor == 'postgresql':
+        _ejecutar(schema_editor, POSTGRES_TRGM)
+
+
+def borrar_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _ejecutar(schema_editor, SQLITE_FTS_REVERSA)
+    elif vendor == 'postgresql':
+        _ejecutar(schema_editor, POSTGRES_TRGM_REVERSA)
+
+
+def poblar_documentos(apps, schema_editor):
+    """Indexa los objetos existentes (los nuevos los indexan los signals)."""
+    from gestion.search import normalizar
+
+    DocumentoBusqueda = apps.get_model('gestion', 'DocumentoBusqueda')
+    for tipo, (nombre_modelo, campos) in TIPOS.items():
+        modelo = apps.get_model('gestion', nombre_modelo)
+        documentos = []
+        for objeto_id, *valores in modelo._base_manager.values_list('id', *campos).iterator(chunk_size=2000):
+            texto = ' '.join(filter(None, (normalizar(valor) for valor in valores)))
+            if texto:
+                documentos.append(DocumentoBusqueda(tipo=tipo, objeto_id=objeto_id, texto=texto))
+        DocumentoBusqueda.objects.bulk_create(documentos, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0013_estado_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('producto', 'Producto'), ('materia_prima', 'Materia Prima'), ('venta', 'Venta'), ('compra', 'Compra')], max_length=20)),
+                ('objeto_id', models.PositiveIntegerField()),
+                ('texto', models.TextField()),
+            ],
+            options={
+                'verbose_name': 'Documento de Búsqueda',
+                'verbose_name_plural': 'Documentos de Búsqueda',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='documentobusqueda',
+            constraint=models.UniqueConstraint(fields=('tipo', 'objeto_id'), name='busqueda_documento_unico'),
+        ),
+        migrations.RunPython(crear_indice, borrar_indice),
+        migrations.RunPython(poblar_documentos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0014_busqueda'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='compra',
+            index=models.Index(fields=['fecha_compra', 'id'], name='compra_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientomateriaprima',
+            index=models.Index(fields=['materia_prima', 'fecha', 'id'], name='movimiento_mp_fecha_idx'),
+        ),
+    ]
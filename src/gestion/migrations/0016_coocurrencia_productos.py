@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0015_paginacion_keyset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoocurrenciaProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ventas', models.IntegerField(default=0, verbose_name='Ventas en común')),
+                ('ultima_venta', models.DateTimeField(verbose_name='Última venta en común')),
+            ],
+            options={
+                'verbose_name': 'Co-ocurrencia de Productos',
+                'verbose_name_plural': 'Co-ocurrencias de Productos',
+            },
+        ),
+        migrations.AddField(
+            model_name='coocurrenciaproducto',
+            name='producto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coocurrencias', to='gestion.producto'),
+        ),
+        migrations.AddField(
+            model_name='coocurrenciaproducto',
+            name='relacionado',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gestion.producto'),
+        ),
+        migrations.AddIndex(
+            model_name='coocurrenciaproducto',
+            index=models.Index(fields=['producto', '-ventas'], name='coocurrencia_producto_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='coocurrenciaproducto',
+            index=models.Index(fields=['-ventas'], name='coocurrencia_ventas_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='coocurrenciaproducto',
+            constraint=models.UniqueConstraint(fields=('producto', 'relacionado'), name='coocurrencia_par_unico'),
+        ),
+    ]
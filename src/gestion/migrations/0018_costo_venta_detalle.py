@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0017_reporte_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ventadetalle',
+            name='costo_unitario',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, verbose_name='Costo unitario al vender'),
+        ),
+        migrations.AddField(
+            model_name='ventadetalle',
+            name='metodo_costo',
+            field=models.CharField(blank=True, choices=[('receta', 'Costo de la receta'), ('materia_prima', 'Materia prima asociada'), ('fraccionamiento', 'Producto origen / factor'), ('costo_base', 'Costo base cargado'), ('precio', 'Precio de venta (sin costo cargado)'), ('indirectos', 'Solo costos indirectos'), ('estimado', 'Estimado con el costo vigente (backfill)')], max_length=20),
+        ),
+    ]
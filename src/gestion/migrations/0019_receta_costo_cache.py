@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:18
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+
+
+def calcular_costos(apps, schema_editor):
+    """Completa costo_cache de las recetas existentes con un único UPDATE."""
+    Receta = apps.get_model('gestion', 'Receta')
+    RecetaMateriaPrima = apps.get_model('gestion', 'RecetaMateriaPrima')
+    total = RecetaMateriaPrima.objects.filter(receta=OuterRef('pk')).order_by().values('receta').annotate(
+        total=Sum(F('cantidad') * F('materia_prima__costo_unitario'))
+    ).values('total')
+    Receta.objects.update(costo_cache=Round(
+        Coalesce(Subquery(total, output_field=models.DecimalField()), Value(Decimal('0.00'))),
+        2,
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0018_costo_venta_detalle'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receta',
+            name='costo_cache',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12, verbose_name='Costo total'),
+        ),
+        migrations.AddField(
+            model_name='receta',
+            name='costo_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(calcular_costos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:36
+
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+
+
+def calcular_contadores(apps, schema_editor):
+    """Completa los contadores de ventas desde el historial con un único GROUP BY."""
+    Producto = apps.get_model('gestion', 'Producto')
+    VentaDetalle = apps.get_model('gestion', 'VentaDetalle')
+    hoy = timezone.localdate()
+
+    def _inicio(dia):
+        return timezone.make_aware(datetime.combine(dia, time.min))
+
+    filas = VentaDetalle.objects.filter(venta__eliminada=False).values('producto_id').annotate(
+        u7d=Sum('cantidad', filter=Q(venta__fecha__gte=_inicio(hoy - timedelta(days=6)))),
+        u30d=Sum('cantidad', filter=Q(venta__fecha__gte=_inicio(hoy - timedelta(days=29)))),
+        ingresos=Sum('subtotal', filter=Q(venta__fecha__gte=_inicio(hoy.replace(day=1)))),
+        ultima=Max('venta__fecha'),
+    ).order_by()
+    productos = []
+    for fila in filas:
+        productos.append(Producto(
+            id=fila['producto_id'],
+            ultima_venta=fila['ultima'],
+            unidades_7d=fila['u7d'] or 0,
+            unidades_30d=fila['u30d'] or 0,
+            ingresos_mes=Decimal(str(fila['ingresos'] or 0)).quantize(Decimal('0.01')),
+        ))
+    Producto.objects.bulk_update(
+        productos, ['ultima_venta', 'unidades_7d', 'unidades_30d', 'ingresos_mes'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0019_receta_costo_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='ingresos_mes',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14, verbose_name='Ingresos del mes'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='ultima_venta',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True, verbose_name='Última venta'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='unidades_30d',
+            field=models.IntegerField(db_index=True, default=0, editable=False, verbose_name='Unidades vendidas (30 días)'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='unidades_7d',
+            field=models.IntegerField(db_index=True, default=0, editable=False, verbose_name='Unidades vendidas (7 días)'),
+        ),
+        migrations.RunPython(calcular_contadores, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,14 @@
-from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, models, transaction
+from django.db.models.functions import Coalesce, Round
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 
+import copy
+import uuid
+from datetime import datetime, time, timedelta
 from decimal import Decimal
 
 
@@ -18,6 +24,71 @@ class VentaManager(models.Manager):
     pass
 
 
+# ==================== ESTADO DE STOCK ====================
+# Columna persistida (e indexada) en Producto y MateriaPrima para que los
+# filtros y KPIs no evalúen `stock <= stock_minimo * 2` fila por fila.
+ESTADOS_STOCK = [
+    ('agotado', 'Agotado'),
+    ('critico', 'Crítico'),
+    ('bajo', 'Bajo'),
+    ('normal', 'Normal'),
+]
+
+
+def calcular_estado_stock(stock, stock_minimo):
+    """Estado del stock: agotado (≤ 0), crítico (≤ mínimo), bajo (≤ 2 × mínimo) o normal."""
+    if stock <= 0:
+        return 'agotado'
+    if stock <= stock_minimo:
+        return 'critico'
+    if stock <= stock_minimo * 2:
+        return 'bajo'
+    return 'normal'
+
+
+def expresion_estado_stock(stock, stock_minimo=None):
+    """
+    Mismo cálculo que calcular_estado_stock() como expresión SQL, para los
+    UPDATE masivos. `stock` puede ser un campo (F('stock')) o una expresión
+    con el valor nuevo (F('stock') - 3), evaluada sobre la fila actual.
+    """
+    from django.db.models.lookups import LessThanOrEqual
+    if stock_minimo is None:
+        stock_minimo = models.F('stock_minimo')
+    return models.Case(
+        models.When(LessThanOrEqual(stock, 0), then=models.Value('agotado')),
+        models.When(LessThanOrEqual(stock, stock_minimo), then=models.Value('critico')),
+        models.When(LessThanOrEqual(stock, stock_minimo * 2), then=models.Value('bajo')),
+        default=models.Value('normal'),
+        output_field=models.CharField(),
+    )
+
+
+def resumen_estados_stock(queryset, valor=None):
+    """
+    Cuenta un queryset de Producto o MateriaPrima por estado de stock con un
+    único GROUP BY estado_stock.
+
+    Args:
+        queryset: QuerySet de Producto o MateriaPrima
+        valor: expresión opcional a sumar por grupo (ej: F('stock') * F('precio'))
+
+    Returns:
+        dict con una clave por estado, 'total' y 'valor' (Decimal)
+    """
+    resumen = {estado: 0 for estado, _ in ESTADOS_STOCK}
+    resumen.update(total=0, valor=Decimal('0'))
+    anotaciones = {'cantidad': models.Count('pk')}
+    if valor is not None:
+        anotaciones['valor'] = models.Sum(valor)
+    filas = queryset.order_by().values('estado_stock').annotate(**anotaciones)
+    for fila in filas:
+        resumen[fila['estado_stock']] = fila['cantidad']
+        resumen['total'] += fila['cantidad']
+        resumen['valor'] += Decimal(str(fila.get('valor') or 0))
+    return resumen
+
+
 # ==================== MODELOS ====================
 class Venta(models.Model):
     fecha = models.DateTimeField(default=timezone.now)
@@ -49,6 +120,8 @@ class Venta(models.Model):
         related_name='ventas_eliminadas',
         verbose_name="Usuario que Eliminó"
     )
+    # Cursor de sincronización (API ?since=), también cambia al eliminar/restaurar
+    fecha_modificacion = models.DateTimeField(auto_now=True, db_index=True)
     
     # 🚀 CUSTOM MANAGERS
     # Por defecto, solo ventas activas (NO eliminadas)
@@ -71,6 +144,31 @@ class Venta(models.Model):
             models.Index(fields=['usuario'], name='venta_usuario_idx'),
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Estado al cargar: save() suma al resumen diario la diferencia de total
+        cargados = instancia.__dict__
+        if {'total', 'eliminada'} <= cargados.keys():
+            instancia._estado_resumen = (instancia.total, instancia.eliminada)
+        return instancia
+
+    def save(self, *args, **kwargs):
+        nueva = self._state.adding
+        anterior = getattr(self, '_estado_resumen', None)
+        super().save(*args, **kwargs)
+        # 📊 Resumen diario: una venta nueva suma su total y cuenta; después,
+        # un cambio de total (calcular_total, formularios) suma la diferencia.
+        # Las líneas suman sus unidades en VentaDetalle.save y el soft delete /
+        # restauración revierten o reaplican la venta completa.
+        if nueva and not self.eliminada:
+            ResumenDiario.acumular(self.fecha, ventas_total=self.total or 0, ventas_count=1)
+        elif anterior is not None and not anterior[1] and not self.eliminada and self.total != anterior[0]:
+            ResumenDiario.acumular(
+                self.fecha, ventas_total=Decimal(str(self.total or 0)) - Decimal(str(anterior[0] or 0))
+            )
+        self._estado_resumen = (self.total, self.eliminada)
+
     def calcular_total(self):
         total = sum([detalle.subtotal for detalle in self.detalles.all()])
         self.total = total
@@ -78,32 +176,120 @@ class Venta(models.Model):
     
     def eliminar_venta(self, usuario, razon=""):
         """🔒 MÉTODO SEGURO PARA ELIMINAR VENTAS"""
+        estaba_activa = not self.eliminada
         self.eliminada = True
         self.fecha_eliminacion = timezone.now()
         self.razon_eliminacion = razon
         self.usuario_eliminacion = usuario
         self.save()
         
+        # 📊 Descontar la venta del resumen diario, de los pares de cross-selling
+        # y de los contadores de ventas de sus productos
+        if estaba_activa:
+            ResumenDiario.acumular_venta(self, signo=-1)
+            CoocurrenciaProducto.acumular_venta(self, signo=-1)
+            Producto.acumular_venta(self, signo=-1)
+        
     def restaurar_venta(self, usuario):
         """♻️ MÉTODO PARA RESTAURAR VENTAS"""
+        estaba_eliminada = self.eliminada
         self.eliminada = False
         self.fecha_eliminacion = None
         self.razon_eliminacion = ""
         self.usuario_eliminacion = None
         self.save()
+        
+        # 📊 Volver a sumar la venta al resumen diario, a los pares de cross-selling
+        # y a los contadores de ventas de sus productos
+        if estaba_eliminada:
+            ResumenDiario.acumular_venta(self, signo=1)
+            CoocurrenciaProducto.acumular_venta(self, signo=1)
+            Producto.acumular_venta(self, signo=1)
 
 
 # Modelo para los detalles de cada venta (productos vendidos, cantidad, precio unitario, subtotal)
 class VentaDetalle(models.Model):
+    METODOS_COSTO = [
+        ('receta', 'Costo de la receta'),
+        ('materia_prima', 'Materia prima asociada'),
+        ('fraccionamiento', 'Producto origen / factor'),
+        ('costo_base', 'Costo base cargado'),
+        ('precio', 'Precio de venta (sin costo cargado)'),
+        ('indirectos', 'Solo costos indirectos'),
+        ('estimado', 'Estimado con el costo vigente (backfill)'),
+    ]
+
     venta = models.ForeignKey(Venta, on_delete=models.CASCADE, related_name='detalles')
     producto = models.ForeignKey('Producto', on_delete=models.CASCADE)
     cantidad = models.PositiveIntegerField(default=1)
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
     subtotal = models.DecimalField(max_digits=12, decimal_places=2)
+    # 📸 Costo congelado al registrar la venta: los reportes de CMV y margen
+    # suman cantidad × costo_unitario sin recalcular costos (null = pendiente de backfill)
+    costo_unitario = models.DecimalField(
+        max_digits=12, decimal_places=2, null=True, blank=True,
+        verbose_name='Costo unitario al vender'
+    )
+    metodo_costo = models.CharField(max_length=20, choices=METODOS_COSTO, blank=True)
 
     def __str__(self):
         return f"{self.producto.nombre} x{self.cantidad} (${self.subtotal})"
 
+    def save(self, *args, **kwargs):
+        # Las líneas cargadas una a una toman el costo vigente del producto;
+        # VentaPostingService lo resuelve en bloque para toda la canasta
+        if self.costo_unitario is None and self.producto_id:
+            self.costo_unitario = self.producto.calcular_costo_unitario().quantize(Decimal('0.01'))
+            self.metodo_costo = self.producto.metodo_costo
+        nueva = self._state.adding
+        super().save(*args, **kwargs)
+        # Ídem para los contadores de ventas del producto (el posting los suma
+        # en el mismo UPDATE que descuenta el stock), las unidades del resumen
+        # diario y los pares de cross-selling
+        if nueva and not self.venta.eliminada:
+            Producto.acumular_venta(self.venta, lineas={self.producto_id: (self.cantidad, Decimal(str(self.subtotal)))})
+            ResumenDiario.acumular(self.venta.fecha, unidades_vendidas=self.cantidad)
+            CoocurrenciaProducto.acumular_linea(self)
+
+
+def expresion_costo_vendido():
+    """Costo de una línea de venta (cantidad × costo congelado), para agregados SQL."""
+    return models.ExpressionWrapper(
+        models.F('cantidad') * models.F('costo_unitario'),
+        output_field=models.DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+# ==================== CONTADORES DE VENTAS ====================
+# Columnas de Producto mantenidas en cada venta para que "última venta" y
+# "unidades de los últimos N días" sean filtros por rango sobre índices y no
+# un GROUP BY de VentaDetalle (o una query por producto) en cada request.
+# Las ventanas se cuentan en días locales incluyendo hoy; entre una corrida
+# nocturna de `envejecer_contadores_ventas` y la siguiente pueden incluir
+# ventas de un día de más. Producto.save() no los escribe salvo al insertar.
+CAMPOS_CONTADORES_VENTAS = ('ultima_venta', 'unidades_7d', 'unidades_30d', 'ingresos_mes')
+DIAS_VENTANA_CORTA = 7
+DIAS_VENTANA_LARGA = 30
+
+
+def ventanas_contadores(fecha, hoy=None):
+    """Contadores de ventana (unidades_7d, unidades_30d, ingresos_mes) en los que cae una venta de `fecha`."""
+    hoy = hoy or timezone.localdate()
+    dia = ResumenDiario.dia_de(fecha)
+    ventanas = set()
+    if dia > hoy - timedelta(days=DIAS_VENTANA_CORTA):
+        ventanas.add('unidades_7d')
+    if dia > hoy - timedelta(days=DIAS_VENTANA_LARGA):
+        ventanas.add('unidades_30d')
+    if (dia.year, dia.month) >= (hoy.year, hoy.month):
+        ventanas.add('ingresos_mes')
+    return ventanas
+
+
+def filtro_sin_ventas_desde(limite):
+    """Q de los productos sin ventas desde `limite`: nunca vendidos o con la última venta anterior."""
+    return models.Q(ultima_venta__isnull=True) | models.Q(ultima_venta__lt=limite)
+
 
 # ==================== SISTEMA DE ALERTAS INTELIGENTES ====================
 class Alerta(models.Model):
@@ -249,6 +435,20 @@ class Alerta(models.Model):
         estado = "📖" if self.leida else "🔔"
         return f"{estado} {self.get_tipo_display()} - {self.producto.nombre}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Estado al cargar: el signal del contador de alertas calcula la diferencia
+        instancia._estado_contador = instancia.estado_contador()
+        return instancia
+    
+    def estado_contador(self):
+        """(usuario_id, cuenta_como_no_leída) o None si los campos están diferidos."""
+        cargados = self.__dict__
+        if not {'usuario_id', 'leida', 'archivada'} <= cargados.keys():
+            return None
+        return self.usuario_id, not self.leida and not self.archivada
+    
     def marcar_como_leida(self):
         """Marca la alerta como leída con timestamp."""
         if not self.leida:
@@ -358,20 +558,26 @@ class Producto(models.Model):
     tiene_receta = models.BooleanField(default=False, verbose_name='¿Usa receta?', help_text='Marcar si el producto se produce a partir de una receta')
     receta = models.ForeignKey('Receta', null=True, blank=True, on_delete=models.SET_NULL, related_name='productos_con_receta', verbose_name='Receta principal', help_text='Selecciona la receta principal si corresponde')
     fecha_creacion = models.DateTimeField(auto_now_add=True)
-    
+    # Cursor de sincronización (API ?since=); los UPDATE masivos deben setearlo a mano
+    fecha_modificacion = models.DateTimeField(auto_now=True, db_index=True)
+    # Derivado de stock/stock_minimo en save(); los UPDATE masivos deben setearlo a mano
+    estado_stock = models.CharField(
+        max_length=10, choices=ESTADOS_STOCK, default='normal', db_index=True, editable=False
+    )
+    # 📈 Contadores de ventas desnormalizados (ver CONTADORES DE VENTAS): los
+    # suman las ventas registradas, los revierte el soft delete y
+    # `envejecer_contadores_ventas` corre las ventanas cada noche
+    ultima_venta = models.DateTimeField(null=True, blank=True, db_index=True, editable=False, verbose_name='Última venta')
+    unidades_7d = models.IntegerField(default=0, db_index=True, editable=False, verbose_name='Unidades vendidas (7 días)')
+    unidades_30d = models.IntegerField(default=0, db_index=True, editable=False, verbose_name='Unidades vendidas (30 días)')
+    ingresos_mes = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False, verbose_name='Ingresos del mes')
+
     def get_estado_stock(self):
         """
         Devuelve el estado del stock basado en el stock actual y mínimo.
         Retorna: 'agotado', 'critico', 'bajo', 'normal'
         """
-        if self.stock == 0:
-            return 'agotado'
-        elif self.stock <= self.stock_minimo:
-            return 'critico'
-        elif self.stock <= self.stock_minimo * 1.5:  # 50% más que el mínimo
-            return 'bajo'
-        else:
-            return 'normal'
+        return calcular_estado_stock(self.stock, self.stock_minimo)
     
     def get_estado_stock_display(self):
         """
@@ -655,53 +861,19 @@ class Producto(models.Model):
     def descontar_materias_primas(self, cantidad, usuario):
         """
         Descuenta del stock de materias primas lo necesario para producir 'cantidad' unidades de este producto.
-        Registra movimientos de inventario.
+        Consume los lotes FIFO/FEFO y registra movimientos de inventario con el costo real.
+        Es una OrdenProduccion de un solo producto que no suma stock al producto.
+
+        Returns:
+            Decimal: costo real (según lotes) de las materias primas consumidas
+
+        Raises:
+            MateriaPrimaInsuficienteError: si alguna materia prima no alcanza
         """
-        from .models import MovimientoMateriaPrima
-        from decimal import Decimal
-        
-        # Convertir cantidad a Decimal para evitar errores de tipo
-        cantidad = Decimal(str(cantidad))
-        
-        # Para productos con receta
-        if self.tipo_producto == 'receta':
-            if self.receta:
-                # Descontar ingredientes de la receta
-                for ingrediente in self.receta.recetamateriaprima_set.all():
-                    materia = ingrediente.materia_prima
-                    necesaria = ingrediente.cantidad * cantidad
-                    stock_anterior = materia.stock_actual
-                    materia.stock_actual -= necesaria
-                    materia.save()
-                    MovimientoMateriaPrima.objects.create(
-                        materia_prima=materia,
-                        tipo_movimiento='produccion',
-                        cantidad=necesaria,
-                        cantidad_anterior=stock_anterior,
-                        cantidad_nueva=materia.stock_actual,
-                        motivo=f'Producción de {cantidad} x {self.nombre}',
-                        usuario=usuario
-                    )
-        
-        # Para productos de fraccionamiento o reventa con materia prima asociada
-        elif self.tipo_producto in ['fraccionamiento', 'reventa']:
-            if self.materia_prima_asociada:
-                materia = self.materia_prima_asociada
-                necesaria = cantidad * (self.cantidad_fraccion or Decimal('1'))
-                stock_anterior = materia.stock_actual
-                materia.stock_actual -= necesaria
-                materia.save()
-                MovimientoMateriaPrima.objects.create(
-                    materia_prima=materia,
-                    tipo_movimiento='fraccionamiento',
-                    cantidad=necesaria,
-                    cantidad_anterior=stock_anterior,
-                    cantidad_nueva=materia.stock_actual,
-                    motivo=f'Producción/Fraccionamiento de {cantidad} x {self.nombre}',
-                    usuario=usuario
-                )
-        
-        # Para productos de reventa SIN materia prima asociada, no se necesita descontar nada
+        from .services.produccion_service import OrdenProduccion
+
+        orden = OrdenProduccion(usuario=usuario).agregar(self, cantidad)
+        return orden.ejecutar(sumar_stock=False)['costo_total']
 
     @property
     def necesita_restock(self):
@@ -735,17 +907,6 @@ class Producto(models.Model):
         }
         return colores.get(atributo, 'bg-light text-dark')
 
-    def estado_stock(self):
-        if self.stock <= 0:
-            return 'Agotado'
-        elif self.stock <= self.stock_minimo:
-            return 'Crítico'
-        elif self.stock <= self.stock_minimo * 2:
-            return 'Bajo'
-        else:
-            return 'Normal'
-    estado_stock.short_description = 'Estado Stock'
-
     # ==================== CAMPOS PARA SISTEMA DE COSTOS AVANZADO ====================
     
     # Tipo de producto
@@ -873,7 +1034,7 @@ class Producto(models.Model):
         
         # Agregar costos indirectos si están configurados
         try:
-            config = ConfiguracionCostos.objects.first()
+            config = ConfiguracionCostos.get_config()
             if config:
                 peso_kg = float(self.cantidad_fraccion or 1000) / 1000  # Convertir gramos a kg
                 es_fraccionamiento = self.tipo_producto == 'fraccionamiento'
@@ -884,6 +1045,23 @@ class Producto(models.Model):
         
         return costo_base
 
+    @property
+    def metodo_costo(self):
+        """Qué rama de calcular_costo_unitario() determina el costo (sin queries)."""
+        if self.tipo_producto == 'reventa':
+            if self.materia_prima_asociada_id and self.cantidad_fraccion:
+                return 'materia_prima'
+            return 'costo_base' if self.costo_base else 'precio'
+        if self.tipo_producto == 'fraccionamiento':
+            if self.producto_origen_id and self.factor_conversion > 0:
+                return 'fraccionamiento'
+        elif self.tipo_producto == 'receta':
+            if self.tiene_receta and self.receta_id:
+                return 'receta'
+            if self.materia_prima_asociada_id and self.cantidad_fraccion:
+                return 'materia_prima'
+        return 'indirectos'
+
     def calcular_precio_venta(self):
         """Calcula el precio de venta basado en costo + margen."""
         from decimal import Decimal
@@ -894,7 +1072,7 @@ class Producto(models.Model):
             
             # Redondear si está configurado
             try:
-                config = ConfiguracionCostos.objects.first()
+                config = ConfiguracionCostos.get_config()
                 if config and config.redondear_precios:
                     # Redondear al peso más cercano (múltiplo de 50 centavos)
                     precio = (precio / Decimal('0.50')).quantize(Decimal('1')) * Decimal('0.50')
@@ -959,8 +1137,138 @@ class Producto(models.Model):
             if not self.precio or self.precio == 0:
                 self.precio = round(float(self.precio_venta_calculado))
         
+        self.estado_stock = calcular_estado_stock(self.stock, self.stock_minimo)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'stock', 'stock_minimo'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'estado_stock'}
+
         super().save(*args, **kwargs)
 
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        # Los contadores de ventas solo los escriben UPDATE con F(): el UPDATE de
+        # un save() completo los deja afuera para que una instancia cargada antes
+        # de una venta no los pise. Si la fila ya no existe, el INSERT que sigue
+        # los incluye como cualquier otro campo.
+        if update_fields is None:
+            values = [valor for valor in values if valor[0].name not in CAMPOS_CONTADORES_VENTAS]
+        return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+
+    # ==================== CONTADORES DE VENTAS ====================
+
+    @staticmethod
+    def lineas_contadores(filas):
+        """Agrupa filas (producto_id, cantidad, subtotal) en {producto_id: (unidades, importe)}."""
+        lineas = {}
+        for producto_id, cantidad, subtotal in filas:
+            unidades, importe = lineas.get(producto_id, (0, Decimal('0')))
+            lineas[producto_id] = (unidades + int(cantidad), importe + Decimal(str(subtotal or 0)))
+        return lineas
+
+    @classmethod
+    def expresiones_contadores(cls, fecha, lineas, signo=1):
+        """
+        Asignaciones de UPDATE que suman (signo=1) o restan (signo=-1) una
+        venta de `fecha` a los contadores de los productos de `lineas`. Se
+        pueden sumar a otro UPDATE sobre esos mismos productos (el descuento
+        de stock de VentaPostingService) para no agregar queries.
+        """
+        ventanas = ventanas_contadores(fecha)
+        expresiones = {}
+        for campo in ('unidades_7d', 'unidades_30d'):
+            if campo in ventanas:
+                expresiones[campo] = models.Case(
+                    *[models.When(pk=pid, then=models.F(campo) + signo * unidades) for pid, (unidades, _) in lineas.items()],
+                    default=models.F(campo),
+                    output_field=models.IntegerField(),
+                )
+        if 'ingresos_mes' in ventanas:
+            expresiones['ingresos_mes'] = models.Case(
+                *[models.When(pk=pid, then=models.F('ingresos_mes') + signo * importe) for pid, (_, importe) in lineas.items()],
+                default=models.F('ingresos_mes'),
+                output_field=models.DecimalField(max_digits=14, decimal_places=2),
+            )
+        if signo > 0:
+            expresiones['ultima_venta'] = models.Case(
+                models.When(
+                    models.Q(ultima_venta__isnull=True) | models.Q(ultima_venta__lt=fecha),
+                    then=models.Value(fecha),
+                ),
+                default=models.F('ultima_venta'),
+            )
+        else:
+            # Una baja puede retroceder la última venta: se busca la anterior activa
+            expresiones['ultima_venta'] = models.Subquery(
+                VentaDetalle.objects.filter(
+                    producto_id=models.OuterRef('pk'), venta__eliminada=False
+                ).order_by('-venta__fecha').values('venta__fecha')[:1]
+            )
+        return expresiones
+
+    @classmethod
+    def acumular_venta(cls, venta, signo=1, lineas=None):
+        """Aplica (signo=1) o revierte (signo=-1) una venta en los contadores de sus productos."""
+        if lineas is None:
+            lineas = cls.lineas_contadores(venta.detalles.values_list('producto_id', 'cantidad', 'subtotal'))
+        if lineas:
+            cls.objects.filter(pk__in=list(lineas)).update(
+                **cls.expresiones_contadores(venta.fecha, lineas, signo)
+            )
+
+    @classmethod
+    def reconstruir_contadores(cls, hoy=None, completo=False):
+        """
+        Recalcula los contadores desde las ventas activas con un único GROUP
+        BY: saca de las ventanas las ventas que quedaron fuera de los 7/30
+        días o del mes. Sin `completo` solo se leen las ventas de la ventana
+        más larga y la última venta guardada se conserva si es más reciente;
+        con `completo` se recalcula también sobre todo el historial.
+        Retorna la cantidad de productos actualizados.
+        """
+        hoy = hoy or timezone.localdate()
+
+        def _inicio(dia):
+            return timezone.make_aware(datetime.combine(dia, time.min))
+
+        desde_7d = _inicio(hoy - timedelta(days=DIAS_VENTANA_CORTA - 1))
+        desde_30d = _inicio(hoy - timedelta(days=DIAS_VENTANA_LARGA - 1))
+        desde_mes = _inicio(hoy.replace(day=1))
+
+        detalles = VentaDetalle.objects.filter(venta__eliminada=False)
+        if not completo:
+            detalles = detalles.filter(venta__fecha__gte=min(desde_30d, desde_mes))
+
+        with transaction.atomic():
+            filas = {
+                fila['producto_id']: fila
+                for fila in detalles.values('producto_id').annotate(
+                    u7d=models.Sum('cantidad', filter=models.Q(venta__fecha__gte=desde_7d)),
+                    u30d=models.Sum('cantidad', filter=models.Q(venta__fecha__gte=desde_30d)),
+                    ingresos=models.Sum('subtotal', filter=models.Q(venta__fecha__gte=desde_mes)),
+                    ultima=models.Max('venta__fecha'),
+                ).order_by()
+            }
+
+            cambiados = []
+            for producto in cls.objects.select_for_update().only('id', *CAMPOS_CONTADORES_VENTAS):
+                fila = filas.get(producto.id, {})
+                valores = {
+                    'unidades_7d': fila.get('u7d') or 0,
+                    'unidades_30d': fila.get('u30d') or 0,
+                    'ingresos_mes': Decimal(str(fila.get('ingresos') or 0)).quantize(Decimal('0.01')),
+                    'ultima_venta': fila.get('ultima'),
+                }
+                if not completo and producto.ultima_venta and (
+                    valores['ultima_venta'] is None or producto.ultima_venta > valores['ultima_venta']
+                ):
+                    valores['ultima_venta'] = producto.ultima_venta
+                if any(getattr(producto, campo) != valor for campo, valor in valores.items()):
+                    for campo, valor in valores.items():
+                        setattr(producto, campo, valor)
+                    cambiados.append(producto)
+
+            cls.objects.bulk_update(cambiados, CAMPOS_CONTADORES_VENTAS, batch_size=500)
+        return len(cambiados)
+
     def __str__(self):
         return self.nombre
 
@@ -1019,6 +1327,10 @@ class Compra(models.Model):
         verbose_name = "Compra al Mayoreo"
         verbose_name_plural = "Compras al Mayoreo"
         ordering = ['-fecha_compra']
+        indexes = [
+            # Paginación por keyset (fecha_compra, id)
+            models.Index(fields=['fecha_compra', 'id'], name='compra_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"Compra #{self.id} - {self.proveedor} ({self.fecha_compra})"
@@ -1042,7 +1354,14 @@ class Compra(models.Model):
         # Calcula el precio unitario y actualiza el stock/costo de la materia prima
         if self.cantidad_mayoreo and self.precio_mayoreo:
             self.precio_unitario_mayoreo = self.precio_mayoreo / self.cantidad_mayoreo
+        # Legacy: el total del pedido es el precio de mayoreo (lo que suma el resumen diario)
+        es_nueva_legacy = self._state.adding and self.materia_prima_id and self.precio_mayoreo
+        if es_nueva_legacy and not self.total:
+            self.total = self.precio_mayoreo
         super().save(*args, **kwargs)
+        # 📊 Sumar al resumen diario de compras (las compras con detalles suman en CompraDetalle.save)
+        if es_nueva_legacy:
+            ResumenDiario.acumular(self.fecha_compra, compras_total=self.total)
         materia = self.materia_prima
         # Aplica promedio ponderado para el costo unitario
         if materia:
@@ -1122,10 +1441,15 @@ class CompraDetalle(models.Model):
         """Calcula el subtotal y actualiza stock/costo de materia prima."""
         # 1. Calcular subtotal
         self.subtotal = self.cantidad * self.precio_unitario
+        es_nuevo = self.pk is None
         
         # 2. Guardar el detalle
         super().save(*args, **kwargs)
         
+        # 📊 Sumar al resumen diario de compras
+        if es_nuevo:
+            ResumenDiario.acumular(self.compra.fecha_compra, compras_total=self.subtotal)
+        
         # 3. Actualizar stock y costo de materia prima (promedio ponderado)
         materia = self.materia_prima
         stock_anterior = materia.stock_actual
@@ -1166,6 +1490,12 @@ class LoteMateriaPrima(models.Model):
     cantidad_disponible = models.DecimalField(max_digits=10, decimal_places=2)
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
     fecha_entrada = models.DateField()
+    fecha_vencimiento = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name="Fecha de Vencimiento",
+        help_text="Si está cargada, el lote se consume antes (FEFO)"
+    )
     fecha_consumo = models.DateField(null=True, blank=True)
     observaciones = models.TextField(blank=True, null=True)
 
@@ -1173,6 +1503,14 @@ class LoteMateriaPrima(models.Model):
         verbose_name = "Lote de Materia Prima"
         verbose_name_plural = "Lotes de Materias Primas"
         ordering = ['fecha_entrada', 'id']
+        indexes = [
+            # ⚡ Lectura de lotes con saldo en orden FEFO/FIFO (LoteAllocator)
+            models.Index(
+                fields=['materia_prima', 'fecha_vencimiento', 'fecha_entrada', 'id'],
+                condition=models.Q(cantidad_disponible__gt=0),
+                name='lote_mp_disponible_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.materia_prima.nombre} | {self.cantidad_disponible}/{self.cantidad} @ ${self.precio_unitario} ({self.fecha_entrada})"
@@ -1214,7 +1552,12 @@ class MateriaPrima(models.Model):
     )
     proveedor = models.CharField(max_length=200, blank=True, null=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_modificacion = models.DateTimeField(auto_now=True, db_index=True)
     activo = models.BooleanField(default=True)
+    # Derivado de stock_actual/stock_minimo en save() (ver ESTADOS_STOCK)
+    estado_stock = models.CharField(
+        max_length=10, choices=ESTADOS_STOCK, default='normal', db_index=True, editable=False
+    )
     
     class Meta:
         verbose_name = "Materia Prima"
@@ -1239,32 +1582,13 @@ class MateriaPrima(models.Model):
         return self.stock_actual * self.costo_unitario
 
     def actualizar_productos_relacionados(self, usuario=None):
-        """Actualiza costos de productos que usan esta materia prima."""
-        productos_afectados = []
-        
-        # Buscar productos que usan esta materia prima en recetas
-        for receta_mp in self.recetas_materia_prima.all():
-            producto = receta_mp.receta.producto
-            if producto.tipo_producto == 'receta':
-                if producto.actualizar_costos_y_precios(
-                    usuario=usuario,
-                    motivo=f"Cambio en precio de {self.nombre}",
-                    materia_prima_afectada=self
-                ):
-                    productos_afectados.append(producto)
-        
-        # También buscar productos que derivan de productos que usan esta materia prima
-        for producto in productos_afectados:
-            # Buscar productos fraccionados de este producto
-            for producto_fraccionado in producto.productos_fraccionados.all():
-                if producto_fraccionado.actualizar_costos_y_precios(
-                    usuario=usuario,
-                    motivo=f"Cambio por actualización en {producto.nombre}",
-                    materia_prima_afectada=self
-                ):
-                    productos_afectados.append(producto_fraccionado)
-        
-        return productos_afectados
+        """
+        Actualiza costos de productos que usan esta materia prima.
+        Recorre el grafo materia prima → receta → producto → fraccionados
+        y aplica los cambios en bloque (ver CostGraph).
+        """
+        from gestion.services.cost_graph import CostGraph
+        return CostGraph([self]).propagar(usuario=usuario)
 
     def save(self, *args, **kwargs):
         """🚀 Override save para versionado automático y actualizaciones."""
@@ -1279,12 +1603,21 @@ class MateriaPrima(models.Model):
             except MateriaPrima.DoesNotExist:
                 pass
         
+        self.estado_stock = calcular_estado_stock(self.stock_actual, self.stock_minimo)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'stock_actual', 'stock_minimo'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'estado_stock'}
+        
         super().save(*args, **kwargs)
         
         # 🎯 CREAR HISTORIAL AUTOMÁTICO CUANDO CAMBIA EL PRECIO
         if costo_anterior is not None and costo_anterior != self.costo_unitario:
             from django.contrib.auth.models import AnonymousUser
             
+            # El costo de las recetas se actualiza siempre (un UPDATE), antes de
+            # propagar a productos: la CostMatrix lee costo_cache
+            Receta.actualizar_costos(materia_prima_ids=[self.pk])
+            
             # Contar productos afectados
             productos_count = self.productos.count() if hasattr(self, 'productos') else 0
             
@@ -1301,9 +1634,17 @@ class MateriaPrima(models.Model):
             
             # Actualizar productos relacionados si está configurado
             try:
-                config = ConfiguracionCostos.objects.first()
+                config = ConfiguracionCostos.get_config()
                 if config and config.actualizar_automaticamente:
-                    self.actualizar_productos_relacionados()
+                    if getattr(settings, 'LINO_RECALCULO_DIFERIDO', False):
+                        # Modo diferido: lo procesa `procesar_recalculos`
+                        RecalculoPendiente.objects.create(
+                            materia_prima=self,
+                            precio_anterior=costo_anterior,
+                            precio_nuevo=self.costo_unitario,
+                        )
+                    else:
+                        self.actualizar_productos_relacionados()
             except:
                 pass  # Si no hay configuración, no hacer nada
     
@@ -1355,6 +1696,14 @@ class MovimientoMateriaPrima(models.Model):
     cantidad_anterior = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     cantidad_nueva = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     motivo = models.TextField(blank=True, null=True)
+    costo_total = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name="Costo Real",
+        help_text="Costo de los lotes consumidos (FIFO/FEFO) en salidas y producción"
+    )
     usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     fecha = models.DateTimeField(auto_now_add=True)
     
@@ -1362,6 +1711,10 @@ class MovimientoMateriaPrima(models.Model):
         verbose_name = "Movimiento de Materia Prima"
         verbose_name_plural = "Movimientos de Materias Primas"
         ordering = ['-fecha']
+        indexes = [
+            # Historial por materia prima paginado por keyset (fecha, id)
+            models.Index(fields=['materia_prima', 'fecha', 'id'], name='movimiento_mp_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"{self.get_tipo_movimiento_display()} - {self.materia_prima.nombre}: {self.cantidad}"
@@ -1426,6 +1779,13 @@ class Receta(models.Model):
         blank=True,
         verbose_name="Creado por"
     )
+    # 💾 Costo de los ingredientes persistido: lo mantiene actualizar_costos() cuando
+    # cambia un ingrediente o el costo_unitario de una materia prima
+    costo_cache = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal('0.00'), editable=False,
+        verbose_name="Costo total"
+    )
+    costo_version = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         verbose_name = "Receta"
@@ -1436,11 +1796,54 @@ class Receta(models.Model):
         return self.nombre
 
     def costo_total(self):
-        """Calcula el costo total de la receta basado en las materias primas."""
-        total = Decimal('0.00')
-        for relacion in self.recetamateriaprima_set.all():
-            total += relacion.costo_ingrediente()
-        return total
+        """Costo total de la receta (columna costo_cache, sin queries)."""
+        return self.costo_cache
+
+    def calcular_costo_total(self):
+        """Costo total recalculado desde los ingredientes en una sola query."""
+        return self.recetamateriaprima_set.aggregate(
+            total=models.Sum(models.F('cantidad') * models.F('materia_prima__costo_unitario'))
+        )['total'] or Decimal('0.00')
+
+    @classmethod
+    def actualizar_costos(cls, receta_ids=None, materia_prima_ids=None):
+        """
+        Recalcula costo_cache con un único UPDATE: de las recetas indicadas, de
+        las que usan las materias primas indicadas, o de todas si no se indica
+        nada. costo_version avanza solo en las recetas cuyo costo cambió.
+
+        Returns:
+            int con la cantidad de recetas recalculadas
+        """
+        total = RecetaMateriaPrima.objects.filter(receta=models.OuterRef('pk')).order_by().values(
+            'receta'
+        ).annotate(
+            total=models.Sum(models.F('cantidad') * models.F('materia_prima__costo_unitario'))
+        ).values('total')
+        costo = Round(
+            Coalesce(
+                models.Subquery(total, output_field=models.DecimalField()),
+                models.Value(Decimal('0.00')),
+            ),
+            2,
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        )
+
+        recetas = cls.objects.all()
+        if receta_ids is not None:
+            recetas = recetas.filter(pk__in=list(receta_ids))
+        if materia_prima_ids is not None:
+            recetas = recetas.filter(pk__in=RecetaMateriaPrima.objects.filter(
+                materia_prima_id__in=list(materia_prima_ids)
+            ).values('receta_id'))
+        # Ambas expresiones ven la fila previa: la versión compara contra el costo anterior
+        return recetas.update(
+            costo_version=models.Case(
+                models.When(costo_cache=costo, then=models.F('costo_version')),
+                default=models.F('costo_version') + 1,
+            ),
+            costo_cache=costo,
+        )
 
     def productos_count(self):
         return self.productos.count()
@@ -1622,14 +2025,47 @@ class ConfiguracionCostos(models.Model):
     def __str__(self):
         return f"Configuración de Costos - {self.fecha_modificacion.strftime('%d/%m/%Y')}"
     
+    # Caché por proceso validado contra un sello de versión en el cache de
+    # Django, solo cuando ese cache es compartido entre workers (Redis/
+    # Memcached/DB). Con un cache local (DummyCache, LocMem) el sello no viaja
+    # entre procesos: cada llamada lee la fila.
+    CACHE_VERSION_KEY = 'lino:configuracion_costos:version'
+    _cache_local = {'version': None, 'config': None}
+
     @classmethod
     def get_config(cls):
         """
         Obtiene o crea la configuración única del sistema.
         Garantiza que siempre exista exactamente una configuración.
+        
+        Con cache compartido la instancia se cachea en el proceso y solo se
+        vuelve a leer de la DB cuando cambia el sello de versión (ver
+        invalidar_cache); sin él se lee en cada llamada. Devuelve una copia
+        por llamada: para persistir cambios, leer una instancia con
+        objects.first().
         """
-        config, created = cls.objects.get_or_create(pk=1)
-        return config
+        from gestion.caches import cache_compartido
+
+        if not cache_compartido():
+            return cls.objects.first() or cls.objects.create()
+
+        version = cache.get(cls.CACHE_VERSION_KEY)
+        local = cls._cache_local
+        if local['config'] is not None and local['version'] == version:
+            return copy.copy(local['config'])
+        
+        config = cls.objects.first()
+        if config is None:
+            config = cls.objects.create()
+            version = cache.get(cls.CACHE_VERSION_KEY)
+        cls._cache_local = {'version': version, 'config': config}
+        return copy.copy(config)
+
+    @classmethod
+    def invalidar_cache(cls):
+        """Descarta el caché local y renueva el sello compartido (post_save/post_delete)."""
+        cls._cache_local = {'version': None, 'config': None}
+        cache.set(cls.CACHE_VERSION_KEY, uuid.uuid4().hex, None)
 
     def calcular_costos_indirectos(self, peso_kg=1, es_fraccionamiento=False):
         """Calcula los costos indirectos para un producto."""
@@ -1902,4 +2338,386 @@ class AjusteInventario(models.Model):
     def save(self, *args, **kwargs):
         """Sobrescribe save para calcular la diferencia automáticamente."""
         self.diferencia = self.stock_nuevo - self.stock_anterior
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+# ==================== 📊 RESUMEN DIARIO (ROLLUP MATERIALIZADO) ====================
+class ResumenDiario(models.Model):
+    """
+    Totales de ventas y compras por día, mantenidos incrementalmente.
+
+    Lo actualizan Venta.save (total y cantidad), VentaDetalle.save y el
+    registro de ventas (unidades), el soft delete y la restauración de
+    ventas, y cada compra nueva (CompraDetalle o legacy). El dashboard lee
+    estas filas en lugar de re-agregar Venta/Compra en cada request.
+    Reconstruible con: python manage.py rebuild_rollups
+    """
+    fecha = models.DateField(unique=True, verbose_name='Día')
+    ventas_total = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0,
+        verbose_name='Total Vendido'
+    )
+    ventas_count = models.IntegerField(default=0, verbose_name='Cantidad de Ventas')
+    unidades_vendidas = models.IntegerField(default=0, verbose_name='Unidades Vendidas')
+    compras_total = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0,
+        verbose_name='Total Comprado'
+    )
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Resumen Diario'
+        verbose_name_plural = 'Resúmenes Diarios'
+        ordering = ['-fecha']
+
+    def __str__(self):
+        return f"Resumen {self.fecha}: ventas ${self.ventas_total} / compras ${self.compras_total}"
+
+    @staticmethod
+    def dia_de(fecha):
+        """Normaliza un datetime/date al día local usado por los filtros fecha__date."""
+        if hasattr(fecha, 'hour'):
+            if timezone.is_aware(fecha):
+                fecha = timezone.localtime(fecha)
+            return fecha.date()
+        return fecha
+
+    @classmethod
+    def acumular(cls, fecha, ventas_total=0, ventas_count=0, unidades_vendidas=0, compras_total=0):
+        """
+        Suma (o resta, con valores negativos) deltas al resumen del día.
+        Usa F() para que escrituras concurrentes no se pisen.
+        """
+        from django.db import IntegrityError
+
+        dia = cls.dia_de(fecha)
+        deltas = {
+            'ventas_total': Decimal(str(ventas_total)),
+            'ventas_count': ventas_count,
+            'unidades_vendidas': unidades_vendidas,
+            'compras_total': Decimal(str(compras_total)),
+        }
+
+        def _actualizar():
+            return cls.objects.filter(fecha=dia).update(
+                fecha_actualizacion=timezone.now(),
+                **{campo: models.F(campo) + valor for campo, valor in deltas.items()}
+            )
+
+        if _actualizar():
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(fecha=dia, **deltas)
+        except IntegrityError:
+            # Otro proceso creó el día entre el UPDATE y el INSERT
+            _actualizar()
+
+    @classmethod
+    def acumular_venta(cls, venta, signo=1, unidades=None):
+        """Aplica (signo=1) o revierte (signo=-1) una venta en su día."""
+        if unidades is None:
+            unidades = venta.detalles.aggregate(total=models.Sum('cantidad'))['total'] or 0
+        cls.acumular(
+            venta.fecha,
+            ventas_total=signo * Decimal(str(venta.total or 0)),
+            ventas_count=signo,
+            unidades_vendidas=signo * unidades,
+        )
+
+    @classmethod
+    def reconstruir(cls, desde=None, hasta=None):
+        """
+        Recalcula los resúmenes desde las tablas de ventas y compras.
+        Retorna la cantidad de días generados.
+        """
+        from django.db.models.functions import TruncDate
+
+        ventas = Venta.objects.filter(eliminada=False)
+        detalles = VentaDetalle.objects.filter(venta__eliminada=False)
+        compras = Compra.objects.all()
+        resumenes = cls.objects.all()
+        if desde:
+            ventas = ventas.filter(fecha__date__gte=desde)
+            detalles = detalles.filter(venta__fecha__date__gte=desde)
+            compras = compras.filter(fecha_compra__gte=desde)
+            resumenes = resumenes.filter(fecha__gte=desde)
+        if hasta:
+            ventas = ventas.filter(fecha__date__lte=hasta)
+            detalles = detalles.filter(venta__fecha__date__lte=hasta)
+            compras = compras.filter(fecha_compra__lte=hasta)
+            resumenes = resumenes.filter(fecha__lte=hasta)
+
+        dias = {}
+
+        def _dia(fecha):
+            return dias.setdefault(fecha, cls(fecha=fecha))
+
+        for fila in ventas.annotate(dia=TruncDate('fecha')).values('dia').annotate(
+            total=models.Sum('total'), cantidad=models.Count('id')
+        ):
+            resumen = _dia(fila['dia'])
+            resumen.ventas_total = fila['total'] or 0
+            resumen.ventas_count = fila['cantidad']
+
+        for fila in detalles.annotate(dia=TruncDate('venta__fecha')).values('dia').annotate(
+            unidades=models.Sum('cantidad')
+        ):
+            _dia(fila['dia']).unidades_vendidas = fila['unidades'] or 0
+
+        for fila in compras.values('fecha_compra').annotate(total=models.Sum('total')):
+            _dia(fila['fecha_compra']).compras_total = fila['total'] or 0
+
+        with transaction.atomic():
+            resumenes.delete()
+            cls.objects.bulk_create(dias.values(), batch_size=500)
+        return len(dias)
+
+
+# ==================== 🛒 CO-OCURRENCIA DE PRODUCTOS (CROSS-SELLING) ====================
+class CoocurrenciaProducto(models.Model):
+    """
+    Cantidad de ventas activas en las que se vendieron juntos dos productos.
+
+    Se guardan las dos direcciones del par (A→B y B→A) para que "se compra
+    junto con X" sea una lectura por índice de `producto`, y la diagonal
+    (X→X) cuenta las ventas que incluyen a X, base del % de coincidencia.
+    La mantienen incrementalmente el registro de ventas (VentaPostingService),
+    cada línea guardada una a una (VentaDetalle.save), el soft delete y la
+    restauración. `ultima_venta` es la venta más reciente
+    en la que se vio el par (una baja no la retrocede).
+    Reconstruible con: python manage.py rebuild_coocurrencias
+    """
+    producto = models.ForeignKey(
+        'Producto', on_delete=models.CASCADE, related_name='coocurrencias'
+    )
+    relacionado = models.ForeignKey(
+        'Producto', on_delete=models.CASCADE, related_name='+'
+    )
+    ventas = models.IntegerField(default=0, verbose_name='Ventas en común')
+    ultima_venta = models.DateTimeField(verbose_name='Última venta en común')
+
+    class Meta:
+        verbose_name = 'Co-ocurrencia de Productos'
+        verbose_name_plural = 'Co-ocurrencias de Productos'
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'relacionado'], name='coocurrencia_par_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['producto', '-ventas'], name='coocurrencia_producto_idx'),
+            models.Index(fields=['-ventas'], name='coocurrencia_ventas_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} + {self.relacionado_id}: {self.ventas} ventas"
+
+    @classmethod
+    def acumular_venta(cls, venta, signo=1, producto_ids=None, solo_producto=None):
+        """
+        Aplica (signo=1) o revierte (signo=-1) los pares de una venta.
+
+        Siempre dos queries, sin importar el tamaño de la canasta: un INSERT
+        ... SELECT que crea en cero los pares que faltan (ON CONFLICT DO
+        NOTHING, seguro ante ventas concurrentes) y un UPDATE con F() sobre
+        todo el producto cartesiano. Al revertir, el segundo paso borra los
+        pares que quedaron en cero. Con `solo_producto` se tocan únicamente
+        los pares de ese producto (ver acumular_linea).
+        """
+        if producto_ids is None:
+            producto_ids = venta.detalles.values_list('producto_id', flat=True)
+        producto_ids = sorted(set(producto_ids))
+        if not producto_ids:
+            return
+
+        pares = cls.objects.filter(producto_id__in=producto_ids, relacionado_id__in=producto_ids)
+        if solo_producto is not None:
+            pares = pares.filter(models.Q(producto_id=solo_producto) | models.Q(relacionado_id=solo_producto))
+        if signo < 0:
+            pares.update(ventas=models.F('ventas') + signo)
+            pares.filter(ventas__lte=0).delete()
+            return
+
+        tabla = connection.ops.quote_name(cls._meta.db_table)
+        productos = connection.ops.quote_name(Producto._meta.db_table)
+        marcas = ', '.join(['%s'] * len(producto_ids))
+        fecha = cls._meta.get_field('ultima_venta').get_db_prep_value(venta.fecha, connection)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {tabla} (producto_id, relacionado_id, ventas, ultima_venta) '
+                f'SELECT a.id, b.id, 0, %s FROM {productos} a CROSS JOIN {productos} b '
+                f'WHERE a.id IN ({marcas}) AND b.id IN ({marcas}) '
+                f'ON CONFLICT (producto_id, relacionado_id) DO NOTHING',
+                [fecha, *producto_ids, *producto_ids],
+            )
+        pares.update(
+            ventas=models.F('ventas') + signo,
+            ultima_venta=models.Case(
+                models.When(ultima_venta__lt=venta.fecha, then=models.Value(venta.fecha)),
+                default=models.F('ultima_venta'),
+            ),
+        )
+
+    @classmethod
+    def acumular_linea(cls, detalle):
+        """
+        Suma los pares de una línea agregada a una venta ya registrada
+        (VentaDetalle.save): los del producto nuevo con los que ya estaban y
+        su diagonal. Si el producto ya estaba en la venta no cambia nada.
+        """
+        otros = set(detalle.venta.detalles.exclude(pk=detalle.pk).values_list('producto_id', flat=True))
+        if detalle.producto_id in otros:
+            return
+        cls.acumular_venta(detalle.venta, producto_ids=otros | {detalle.producto_id}, solo_producto=detalle.producto_id)
+
+    @classmethod
+    def reconstruir(cls):
+        """
+        Recalcula la tabla completa desde las ventas activas con un único
+        INSERT ... SELECT (sin traer los pares a memoria).
+        Retorna la cantidad de filas generadas.
+        """
+        pares = VentaDetalle.objects.filter(venta__eliminada=False).values(
+            'producto_id', relacionado=models.F('venta__detalles__producto_id')
+        ).annotate(
+            cantidad=models.Count('venta_id', distinct=True),
+            ultima=models.Max('venta__fecha'),
+        ).order_by()
+        select, params = pares.query.sql_with_params()
+        tabla = connection.ops.quote_name(cls._meta.db_table)
+        columnas = ', '.join(
+            connection.ops.quote_name(cls._meta.get_field(campo).column)
+            for campo in ('producto', 'relacionado', 'ventas', 'ultima_venta')
+        )
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            with connection.cursor() as cursor:
+                cursor.execute(f'INSERT INTO {tabla} ({columnas}) {select}', params)
+        return cls.objects.count()
+
+
+# ==================== COLA DE RECÁLCULO DE COSTOS ====================
+class RecalculoPendiente(models.Model):
+    """
+    Cambio de precio de una materia prima pendiente de propagar a los productos.
+    Se usa cuando LINO_RECALCULO_DIFERIDO está activo; el worker
+    `procesar_recalculos` agrupa los cambios de una misma materia prima
+    en un único recálculo.
+    """
+    MAX_INTENTOS = 5
+
+    materia_prima = models.ForeignKey(
+        MateriaPrima,
+        on_delete=models.CASCADE,
+        related_name='recalculos_pendientes'
+    )
+    precio_anterior = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    precio_nuevo = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    procesado = models.BooleanField(default=False)
+    fecha_procesado = models.DateTimeField(null=True, blank=True)
+    intentos = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+
+    class Meta:
+        verbose_name = "Recálculo Pendiente"
+        verbose_name_plural = "Recálculos Pendientes"
+        ordering = ['fecha_creacion']
+        indexes = [
+            models.Index(fields=['procesado', 'fecha_creacion']),
+        ]
+
+    def __str__(self):
+        estado = 'procesado' if self.procesado else 'pendiente'
+        return f"{self.materia_prima.nombre}: {self.precio_anterior} → {self.precio_nuevo} ({estado})"
+
+
+# ==================== ÍNDICE DE BÚSQUEDA ====================
+class DocumentoBusqueda(models.Model):
+    """
+    Texto normalizado (sin acentos, minúsculas) de un objeto buscable.
+    Lo mantienen los signals de guardado; en SQLite lo indexa la tabla FTS5
+    gestion_busqueda_fts y en PostgreSQL un índice de trigramas (ver gestion.search).
+    """
+    TIPOS = [
+        ('producto', 'Producto'),
+        ('materia_prima', 'Materia Prima'),
+        ('venta', 'Venta'),
+        ('compra', 'Compra'),
+    ]
+
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    objeto_id = models.PositiveIntegerField()
+    texto = models.TextField()
+
+    class Meta:
+        verbose_name = "Documento de Búsqueda"
+        verbose_name_plural = "Documentos de Búsqueda"
+        constraints = [
+            models.UniqueConstraint(fields=['tipo', 'objeto_id'], name='busqueda_documento_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.objeto_id}: {self.texto[:60]}"
+
+
+# ==================== 📄 REPORTES EN SEGUNDO PLANO ====================
+class ReporteJob(models.Model):
+    """
+    Pedido de generación de un reporte (PDF / XLSX) que se procesa fuera del
+    request: el worker `procesar_reportes` o el pool de hilos interno.
+
+    El archivo generado queda en disco con una clave que combina tipo,
+    formato, parámetros y la versión de los datos usados; un pedido con la
+    misma clave se sirve directamente (ver gestion.services.reporte_jobs).
+    """
+    MAX_INTENTOS = 3
+
+    TIPOS = [
+        ('stock_materias', 'Stock de Materias Primas'),
+        ('costos_produccion', 'Costos de Producción'),
+    ]
+    FORMATOS = [
+        ('pdf', 'PDF'),
+        ('xlsx', 'Excel'),
+    ]
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completado', 'Completado'),
+        ('error', 'Error'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tipo = models.CharField(max_length=30, choices=TIPOS)
+    formato = models.CharField(max_length=10, choices=FORMATOS, default='pdf')
+    parametros = models.JSONField(default=dict, blank=True)
+    clave = models.CharField(max_length=64, db_index=True, help_text="Hash de tipo, formato, parámetros y versión de datos")
+    version_datos = models.CharField(max_length=64)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    archivo = models.CharField(max_length=255, blank=True, default='', help_text="Ruta relativa a LINO_REPORTES_DIR")
+    intentos = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='reportes')
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Reporte en Segundo Plano"
+        verbose_name_plural = "Reportes en Segundo Plano"
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'fecha_creacion'], name='reportejob_estado_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} ({self.formato}) - {self.get_estado_display()}"
+
+    @property
+    def terminado(self):
+        return self.estado in ('completado', 'error')
+
+    @property
+    def nombre_descarga(self):
+        fecha = (self.fecha_fin or self.fecha_creacion or timezone.now()).strftime('%Y%m%d')
+        return f"reporte_{self.tipo}_{fecha}.{self.formato}"
@@ -0,0 +1,242 @@
+"""
+Paginación por keyset (seek) para listas con historial largo
+=============================================================
+
+En lugar de OFFSET + COUNT(*) (Paginator de Django), cada página se pide
+con un cursor opaco que contiene las claves de orden de la última (o
+primera) fila vista. La query es siempre:
+
+    WHERE (fecha, id) < (cursor) ORDER BY fecha DESC, id DESC LIMIT n + 1
+
+y recorre el índice desde el cursor, así que la página 1 y la 10.000
+cuestan lo mismo. El total es opcional y acotado: se cuentan como máximo
+`limite_conteo` filas y la página informa si el total es exacto.
+
+Uso:
+    from gestion.paginacion import KeysetPaginator
+
+    paginator = KeysetPaginator(Venta.objects.all(), orden=('-fecha', '-id'))
+    pagina = paginator.pagina(request.GET.get('cursor'))
+    pagina.next_cursor, pagina.has_next, pagina.total_texto
+"""
+
+import base64
+import datetime
+import json
+from decimal import Decimal
+
+from django.db.models import Q
+
+POR_PAGINA_DEFAULT = 25
+LIMITE_CONTEO_DEFAULT = 1000
+
+SIGUIENTE = 's'
+ANTERIOR = 'a'
+
+
+class CursorInvalido(ValueError):
+    """El cursor no se puede decodificar o no corresponde al orden de la lista."""
+
+
+def _serializar(valor):
+    # isoformat completo: DjangoJSONEncoder trunca los microsegundos y el
+    # cursor dejaría de coincidir con la fila
+    if isinstance(valor, (datetime.datetime, datetime.date, datetime.time)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def codificar_cursor(valores, direccion=SIGUIENTE):
+    crudo = json.dumps({'k': [_serializar(valor) for valor in valores], 'd': direccion}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Retorna (valores, dirección). Lanza CursorInvalido si el cursor está mal formado."""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode((cursor + relleno).encode()).decode())
+        valores, direccion = datos['k'], datos['d']
+    except (ValueError, TypeError, KeyError, UnicodeDecodeError):
+        raise CursorInvalido('Cursor inválido')
+    if not isinstance(valores, list) or direccion not in (SIGUIENTE, ANTERIOR):
+        raise CursorInvalido('Cursor inválido')
+    return valores, direccion
+
+
+class PaginaKeyset:
+    """
+    Página de resultados. Se itera como una lista y expone los cursores
+    para pedir la página siguiente o la anterior.
+    """
+
+    def __init__(self, object_list, next_cursor, previous_cursor, total=None, total_exacto=True):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.total = total
+        self.total_exacto = total_exacto
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, indice):
+        return self.object_list[indice]
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def total_texto(self):
+        """Total para mostrar: '37' o '1000+' cuando se cortó el conteo."""
+        if self.total is None:
+            return ''
+        return str(self.total) if self.total_exacto else f'{self.total}+'
+
+    def a_dict(self):
+        """Metadatos de paginación para respuestas JSON."""
+        return {
+            'next_cursor': self.next_cursor,
+            'previous_cursor': self.previous_cursor,
+            'has_next': self.has_next,
+            'has_previous': self.has_previous,
+            'total': self.total,
+            'total_exacto': self.total_exacto,
+        }
+
+
+class KeysetPaginator:
+    """
+    Paginador por keyset sobre un queryset.
+
+    Args:
+        queryset: queryset ya filtrado (su order_by se reemplaza)
+        orden: campos de orden, con '-' para descendente. El último debe ser
+               único (normalmente 'id' / '-id') y ninguno puede ser NULL.
+        por_pagina: filas por página
+        limite_conteo: máximo de filas a contar para el total; None no cuenta
+                       y 0 cuenta exacto (COUNT completo)
+    """
+
+    def __init__(self, queryset, orden=('-fecha', '-id'), por_pagina=POR_PAGINA_DEFAULT,
+                 limite_conteo=LIMITE_CONTEO_DEFAULT):
+        self.queryset = queryset
+        self.campos = [(campo.lstrip('-'), campo.startswith('-')) for campo in orden]
+        self.por_pagina = max(int(por_pagina), 1)
+        self.limite_conteo = limite_conteo
+        modelo = queryset.model
+        self._convertir = [
+            (modelo._meta.pk if nombre in ('id', 'pk') else modelo._meta.get_field(nombre)).to_python
+            for nombre, _ in self.campos
+        ]
+
+    # ---------- cursores ----------
+
+    def _claves(self, fila):
+        if isinstance(fila, dict):
+            return [fila[nombre] for nombre, _ in self.campos]
+        return [getattr(fila, nombre) for nombre, _ in self.campos]
+
+    def _valores_cursor(self, cursor):
+        valores, direccion = decodificar_cursor(cursor)
+        if len(valores) != len(self.campos):
+            raise CursorInvalido('El cursor no corresponde a esta lista')
+        try:
+            valores = [convertir(valor) for convertir, valor in zip(self._convertir, valores)]
+        except Exception:
+            raise CursorInvalido('Cursor inválido')
+        return valores, direccion
+
+    def _despues_de(self, valores, direccion):
+        """
+        Condición "fila posterior al cursor" en el sentido de `direccion`:
+        (a < x) OR (a = x AND b < y) ... más una cota simple sobre el
+        primer campo para que la base de datos pueda hacer un range scan.
+        """
+        condicion = Q()
+        iguales = {}
+        for (nombre, descendente), valor in zip(self.campos, valores):
+            hacia_abajo = descendente == (direccion == SIGUIENTE)
+            condicion |= Q(**iguales, **{f'{nombre}__{"lt" if hacia_abajo else "gt"}': valor})
+            iguales[nombre] = valor
+
+        primero, descendente = self.campos[0]
+        hacia_abajo = descendente == (direccion == SIGUIENTE)
+        return Q(**{f'{primero}__{"lte" if hacia_abajo else "gte"}': valores[0]}) & condicion
+
+    def _orden(self, invertido=False):
+        return [
+            f'{"-" if descendente != invertido else ""}{nombre}'
+            for nombre, descendente in self.campos
+        ]
+
+    # ---------- páginas ----------
+
+    def contar(self):
+        """Retorna (total, exacto) leyendo como máximo limite_conteo + 1 filas."""
+        if self.limite_conteo is None:
+            return None, False
+        queryset = self.queryset.order_by()
+        if not self.limite_conteo:
+            return queryset.count(), True
+        total = queryset[:self.limite_conteo + 1].count()
+        if total > self.limite_conteo:
+            return self.limite_conteo, False
+        return total, True
+
+    def pagina(self, cursor=None):
+        """
+        Retorna la PaginaKeyset correspondiente al cursor (None = primera
+        página). Lanza CursorInvalido si el cursor está mal formado.
+        """
+        queryset = self.queryset
+        direccion = SIGUIENTE
+        if cursor:
+            valores, direccion = self._valores_cursor(cursor)
+            queryset = queryset.filter(self._despues_de(valores, direccion))
+
+        filas = list(queryset.order_by(*self._orden(invertido=direccion == ANTERIOR))[:self.por_pagina + 1])
+        hay_mas = len(filas) > self.por_pagina
+        filas = filas[:self.por_pagina]
+
+        if direccion == ANTERIOR:
+            filas.reverse()
+            hay_siguiente, hay_anterior = True, hay_mas
+        else:
+            hay_siguiente, hay_anterior = hay_mas, bool(cursor)
+
+        next_cursor = previous_cursor = None
+        if filas and hay_siguiente:
+            next_cursor = codificar_cursor(self._claves(filas[-1]), SIGUIENTE)
+        if filas and hay_anterior:
+            previous_cursor = codificar_cursor(self._claves(filas[0]), ANTERIOR)
+
+        total, exacto = self.contar()
+        return PaginaKeyset(filas, next_cursor, previous_cursor, total, exacto)
+
+
+def paginar(request, queryset, orden=('-fecha', '-id'), por_pagina=POR_PAGINA_DEFAULT):
+    """
+    Atajo para vistas: lee ?cursor del request y, con ?contar=exacto, hace
+    el COUNT completo. Un cursor inválido (ej: de otra lista) vuelve a la
+    primera página en lugar de fallar.
+    """
+    limite_conteo = 0 if request.GET.get('contar') == 'exacto' else LIMITE_CONTEO_DEFAULT
+    paginator = KeysetPaginator(queryset, orden=orden, por_pagina=por_pagina, limite_conteo=limite_conteo)
+    try:
+        return paginator.pagina(request.GET.get('cursor'))
+    except CursorInvalido:
+        return paginator.pagina()
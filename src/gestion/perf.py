@@ -0,0 +1,301 @@
+"""
+Instrumentación de rendimiento por vista para LINO SALUDABLE
+Mide en cada request: cantidad de queries SQL, tiempo en SQL, tiempo de
+render de templates y latencia total. Detecta queries repetidas (firmas
+N+1) y controla presupuestos declarados junto a cada vista:
+
+    @login_required
+    @presupuesto(queries=25, ms=400)
+    def lista_productos(request):
+        ...
+
+Las métricas se acumulan en memoria (ventana móvil por vista) y se
+exponen en /gestion/sistema/perf/ (solo staff) y en un volcado JSON
+periódico (settings.LINO_PERF_DUMP).
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+
+perf_logger = logging.getLogger('lino.perf')
+
+# Colector del request en curso (None fuera de un request instrumentado)
+_colector_actual = ContextVar('lino_perf_colector', default=None)
+
+
+class PresupuestoExcedido(Exception):
+    """Se lanza cuando una vista excede su presupuesto y LINO_PERF_ESTRICTO=True."""
+
+
+def presupuesto(queries=None, ms=None):
+    """
+    Declara el presupuesto de una vista (máximo de queries y/o de latencia en ms).
+    El decorador no envuelve la vista: solo la anota para PerfMiddleware.
+    """
+    def decorador(vista):
+        vista.perf_presupuesto = {'queries': queries, 'ms': ms}
+        return vista
+    return decorador
+
+
+# ==================== MEDICIÓN POR REQUEST ====================
+
+class Colector:
+    """Mediciones de un único request."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.firmas = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        """execute_wrapper: cuenta y cronometra cada query de la conexión."""
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_ms += (time.perf_counter() - inicio) * 1000
+            self.queries += 1
+            # La firma es el SQL parametrizado: misma firma con distintos
+            # parámetros = la misma query ejecutada dentro de un bucle
+            self.firmas[sql] += 1
+
+    def duplicadas(self, umbral):
+        return {sql: veces for sql, veces in self.firmas.items() if veces >= umbral}
+
+
+def _instrumentar_templates():
+    """
+    Cronometra el render de templates envolviendo una única vez
+    django.template.backends.django.Template.render (punto de entrada de
+    render()/render_to_string; los {% include %} quedan dentro de la medición).
+    """
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, '_lino_perf', False):
+        return
+    render_original = Template.render
+
+    def render(self, context=None, request=None):
+        colector = _colector_actual.get()
+        if colector is None:
+            return render_original(self, context, request)
+        inicio = time.perf_counter()
+        try:
+            return render_original(self, context, request)
+        finally:
+            colector.template_ms += (time.perf_counter() - inicio) * 1000
+
+    render._lino_perf = True
+    Template.render = render
+
+
+# ==================== REGISTRO ACUMULADO ====================
+
+class PerfRegistry:
+    """Ventana móvil de mediciones por vista, compartida por el proceso."""
+
+    def __init__(self, ventana=200):
+        self.ventana = ventana
+        self._lock = threading.Lock()
+        self._muestras = defaultdict(lambda: deque(maxlen=self.ventana))
+        self._presupuestos = {}
+        self._excedidos = Counter()
+        self._n_mas_uno = defaultdict(Counter)
+        self._ultimo_volcado = 0.0
+
+    def registrar(self, vista, muestra, presupuesto=None, duplicadas=None, excedido=False):
+        with self._lock:
+            self._muestras[vista].append(muestra)
+            if presupuesto:
+                self._presupuestos[vista] = presupuesto
+            if excedido:
+                self._excedidos[vista] += 1
+            for sql, veces in (duplicadas or {}).items():
+                anterior = self._n_mas_uno[vista][sql]
+                self._n_mas_uno[vista][sql] = max(anterior, veces)
+
+    def limpiar(self):
+        with self._lock:
+            self._muestras.clear()
+            self._presupuestos.clear()
+            self._excedidos.clear()
+            self._n_mas_uno.clear()
+
+    @staticmethod
+    def _percentil(valores, p):
+        ordenados = sorted(valores)
+        indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+        return ordenados[indice]
+
+    def resumen(self):
+        """
+        Estadísticas por vista, ordenadas por latencia p95 descendente.
+
+        Returns:
+            list de dicts con vista, requests, latencia (prom/p95/máx),
+            queries (prom/máx), sql_ms, template_ms, presupuesto,
+            excedidos y las firmas N+1 más repetidas
+        """
+        with self._lock:
+            copia = {vista: list(muestras) for vista, muestras in self._muestras.items()}
+            presupuestos = dict(self._presupuestos)
+            excedidos = dict(self._excedidos)
+            n_mas_uno = {vista: firmas.most_common(5) for vista, firmas in self._n_mas_uno.items()}
+
+        filas = []
+        for vista, muestras in copia.items():
+            latencias = [m['total_ms'] for m in muestras]
+            queries = [m['queries'] for m in muestras]
+            filas.append({
+                'vista': vista,
+                'requests': len(muestras),
+                'latencia_prom_ms': round(sum(latencias) / len(latencias), 1),
+                'latencia_p95_ms': round(self._percentil(latencias, 95), 1),
+                'latencia_max_ms': round(max(latencias), 1),
+                'queries_prom': round(sum(queries) / len(queries), 1),
+                'queries_max': max(queries),
+                'sql_prom_ms': round(sum(m['sql_ms'] for m in muestras) / len(muestras), 1),
+                'template_prom_ms': round(sum(m['template_ms'] for m in muestras) / len(muestras), 1),
+                'presupuesto': presupuestos.get(vista),
+                'excedidos': excedidos.get(vista, 0),
+                'n_mas_uno': [{'sql': sql, 'veces': veces} for sql, veces in n_mas_uno.get(vista, [])],
+                'ultima': muestras[-1]['fecha'],
+            })
+        filas.sort(key=lambda fila: fila['latencia_p95_ms'], reverse=True)
+        return filas
+
+    def volcar(self, ruta, intervalo=0):
+        """
+        Escribe el resumen como JSON (reemplazo atómico del archivo).
+        Con `intervalo` > 0 no escribe más de una vez cada `intervalo` segundos.
+        """
+        ahora = time.time()
+        with self._lock:
+            if intervalo and ahora - self._ultimo_volcado < intervalo:
+                return False
+            self._ultimo_volcado = ahora
+
+        contenido = {'generado': ahora, 'pid': os.getpid(), 'vistas': self.resumen()}
+        directorio = os.path.dirname(os.path.abspath(ruta))
+        fd, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as archivo:
+                json.dump(contenido, archivo, ensure_ascii=False, indent=2)
+            os.replace(temporal, ruta)
+        except OSError:
+            perf_logger.exception("No se pudo escribir el volcado de rendimiento en %s", ruta)
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            return False
+        return True
+
+
+registro = PerfRegistry(ventana=getattr(settings, 'LINO_PERF_VENTANA', 200))
+
+
+# ==================== MIDDLEWARE ====================
+
+class PerfMiddleware:
+    """
+    Mide cada request que resuelve a una vista y lo acumula en `registro`.
+    Agrega el header Server-Timing (db, tpl, total) solo a las respuestas
+    de usuarios staff: no exponer queries ni tiempos a anónimos o empleados.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.activo = getattr(settings, 'LINO_PERF_ENABLE', True)
+        self.umbral_duplicadas = getattr(settings, 'LINO_PERF_UMBRAL_DUPLICADAS', 5)
+        self.estricto = getattr(settings, 'LINO_PERF_ESTRICTO', False)
+        self.ruta_volcado = getattr(settings, 'LINO_PERF_DUMP', '')
+        self.intervalo_volcado = getattr(settings, 'LINO_PERF_DUMP_INTERVALO', 60)
+        if self.activo:
+            _instrumentar_templates()
+
+    def __call__(self, request):
+        if not self.activo:
+            return self.get_response(request)
+
+        colector = Colector()
+        token = _colector_actual.set(colector)
+        try:
+            with connection.execute_wrapper(colector):
+                response = self.get_response(request)
+        finally:
+            _colector_actual.reset(token)
+
+        vista = getattr(request, '_perf_vista', None)
+        if vista is None:
+            return response
+
+        total_ms = (time.perf_counter() - colector.inicio) * 1000
+        usuario = getattr(request, 'user', None)
+        if usuario is not None and usuario.is_authenticated and usuario.is_staff:
+            response['Server-Timing'] = (
+                f'db;dur={colector.sql_ms:.1f};desc="{colector.queries} queries", '
+                f'tpl;dur={colector.template_ms:.1f}, total;dur={total_ms:.1f}'
+            )
+        self._registrar(request, response, vista, colector, total_ms)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = getattr(request, 'resolver_match', None)
+        request._perf_vista = (
+            match.view_name if match and match.view_name
+            else f'{view_func.__module__}.{view_func.__name__}'
+        )
+        request._perf_presupuesto = getattr(view_func, 'perf_presupuesto', None)
+        return None
+
+    def _registrar(self, request, response, vista, colector, total_ms):
+        presupuesto = request._perf_presupuesto
+        duplicadas = colector.duplicadas(self.umbral_duplicadas)
+
+        violaciones = []
+        if presupuesto:
+            if presupuesto['queries'] is not None and colector.queries > presupuesto['queries']:
+                violaciones.append(f"{colector.queries} queries (máx {presupuesto['queries']})")
+            if presupuesto['ms'] is not None and total_ms > presupuesto['ms']:
+                violaciones.append(f"{total_ms:.0f} ms (máx {presupuesto['ms']})")
+
+        registro.registrar(
+            vista,
+            {
+                'fecha': time.time(),
+                'metodo': request.method,
+                'status': response.status_code,
+                'queries': colector.queries,
+                'sql_ms': colector.sql_ms,
+                'template_ms': colector.template_ms,
+                'total_ms': total_ms,
+            },
+            presupuesto=presupuesto,
+            duplicadas=duplicadas,
+            excedido=bool(violaciones),
+        )
+
+        if duplicadas:
+            perf_logger.warning(
+                "N+1 en %s: %s",
+                vista, '; '.join(f"{veces}x {sql[:120]}" for sql, veces in duplicadas.items())
+            )
+        if violaciones:
+            mensaje = f"Presupuesto excedido en {vista}: {', '.join(violaciones)}"
+            perf_logger.warning(mensaje)
+            if self.estricto:
+                raise PresupuestoExcedido(mensaje)
+
+        if self.ruta_volcado:
+            registro.volcar(self.ruta_volcado, intervalo=self.intervalo_volcado)
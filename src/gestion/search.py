@@ -0,0 +1,248 @@
+"""
+Búsqueda - Índice de texto para productos, materias primas, ventas y compras
+=============================================================================
+
+Cada objeto buscable tiene una fila en DocumentoBusqueda con su texto
+normalizado (minúsculas, sin acentos). Sobre esa tabla:
+
+- SQLite: tabla virtual FTS5 (gestion_busqueda_fts) sincronizada por triggers
+- PostgreSQL: índice GIN pg_trgm sobre `texto`
+
+Los documentos guardan solo el texto propio de cada objeto. Las relaciones
+(ventas que contienen un producto, compras de una materia prima) se
+resuelven con un semi-join sobre las FK indexadas, así renombrar un
+producto no obliga a reindexar sus ventas.
+
+Uso:
+    from gestion import search
+
+    search.buscar('almendra')                           # ranking global
+    search.filtrar(Venta.objects.all(), 'almendra')     # filtro para listas
+    search.reindexar()                                  # reconstrucción completa
+"""
+
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import (
+    Compra, CompraDetalle, DocumentoBusqueda, MateriaPrima, Producto, Venta, VentaDetalle
+)
+
+TABLA_FTS = 'gestion_busqueda_fts'
+
+# tipo → (modelo, campos indexados)
+TIPOS = {
+    'producto': (Producto, ('nombre', 'descripcion', 'marca')),
+    'materia_prima': (MateriaPrima, ('nombre', 'descripcion', 'proveedor')),
+    'venta': (Venta, ('cliente',)),
+    'compra': (Compra, ('proveedor',)),
+}
+
+_NO_ALFANUMERICO = re.compile(r'[^0-9a-z]+')
+
+
+def normalizar(texto):
+    """Minúsculas, sin acentos y solo letras/números separados por un espacio."""
+    if not texto:
+        return ''
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return _NO_ALFANUMERICO.sub(' ', texto).strip()
+
+
+def _tipo_de(modelo):
+    for tipo, (clase, _) in TIPOS.items():
+        if issubclass(modelo, clase):
+            return tipo
+    return None
+
+
+def _manager(tipo):
+    modelo = TIPOS[tipo][0]
+    # Venta.objects oculta las eliminadas: el índice cubre todas
+    return modelo.todos if modelo is Venta else modelo._default_manager
+
+
+def _texto(tipo, valores):
+    return ' '.join(filter(None, (normalizar(valor) for valor in valores)))
+
+
+# ==================== MANTENIMIENTO ====================
+
+def indexar(objeto, update_fields=None, creado=False):
+    """
+    Crea o actualiza el documento de un objeto (un único upsert).
+    Si el save() no tocó campos indexados, o el objeto es nuevo y no tiene
+    texto (ej: venta sin cliente), no ejecuta ninguna query.
+    """
+    tipo = _tipo_de(type(objeto))
+    if tipo is None:
+        return
+    campos = TIPOS[tipo][1]
+    if update_fields is not None and not set(campos) & set(update_fields):
+        return
+
+    texto = _texto(tipo, (getattr(objeto, campo) for campo in campos))
+    if not texto:
+        if not creado:
+            DocumentoBusqueda.objects.filter(tipo=tipo, objeto_id=objeto.pk).delete()
+        return
+    DocumentoBusqueda.objects.bulk_create(
+        [DocumentoBusqueda(tipo=tipo, objeto_id=objeto.pk, texto=texto)],
+        update_conflicts=True,
+        unique_fields=['tipo', 'objeto_id'],
+        update_fields=['texto'],
+    )
+
+
+def desindexar(objeto):
+    tipo = _tipo_de(type(objeto))
+    if tipo is not None:
+        DocumentoBusqueda.objects.filter(tipo=tipo, objeto_id=objeto.pk).delete()
+
+
+def reindexar(tipos=None, lote=2000):
+    """
+    Reconstruye el índice de los tipos indicados (default: todos) leyendo
+    solo las columnas indexadas en bloques.
+
+    Returns:
+        dict {tipo: documentos creados}
+    """
+    resultado = {}
+    for tipo in tipos or TIPOS:
+        campos = TIPOS[tipo][1]
+        DocumentoBusqueda.objects.filter(tipo=tipo).delete()
+        documentos, total = [], 0
+        filas = _manager(tipo).order_by().values_list('id', *campos).iterator(chunk_size=lote)
+        for objeto_id, *valores in filas:
+            texto = _texto(tipo, valores)
+            if texto:
+                documentos.append(DocumentoBusqueda(tipo=tipo, objeto_id=objeto_id, texto=texto))
+            if len(documentos) >= lote:
+                DocumentoBusqueda.objects.bulk_create(documentos)
+                total += len(documentos)
+                documentos = []
+        DocumentoBusqueda.objects.bulk_create(documentos)
+        resultado[tipo] = total + len(documentos)
+    return resultado
+
+
+# ==================== CONSULTA ====================
+
+def _terminos(consulta):
+    return normalizar(consulta).split()
+
+
+def _consulta(terminos, columnas):
+    """
+    SELECT de `columnas` (alias d = gestion_documentobusqueda) que exige todos
+    los términos como prefijo de palabra. Retorna (sql, parámetros) sin el
+    filtro por tipo, que agrega quien llama.
+    """
+    if connection.vendor == 'sqlite':
+        # Los términos ya son alfanuméricos: se citan y se buscan como prefijo.
+        # CROSS JOIN fija el orden: primero el MATCH de FTS5, luego el documento por PK
+        expresion = ' '.join(f'"{termino}"*' for termino in terminos)
+        return (
+            f'SELECT {columnas} FROM {TABLA_FTS} f CROSS JOIN gestion_documentobusqueda d '
+            f'ON d.id = f.rowid WHERE {TABLA_FTS} MATCH %s',
+            [expresion],
+        )
+
+    condiciones = ' AND '.join(['d.texto LIKE %s'] * len(terminos))
+    parametros = [f'%{termino}%' for termino in terminos]
+    if connection.vendor == 'postgresql':
+        # Tolerancia a errores de tipeo con similitud de trigramas
+        condiciones = f'(({condiciones}) OR %s <%% d.texto)'
+        parametros.append(' '.join(terminos))
+    return f'SELECT {columnas} FROM gestion_documentobusqueda d WHERE {condiciones}', parametros
+
+
+def coincidencias(tipo, consulta):
+    """
+    Subconsulta con los ids de `tipo` que coinciden con la consulta, para
+    usar en filtros `id__in` sin traer los ids a Python.
+    """
+    terminos = _terminos(consulta)
+    if not terminos:
+        return RawSQL('SELECT NULL WHERE 1 = 0', [])
+    sql, parametros = _consulta(terminos, 'd.objeto_id')
+    return RawSQL(f'{sql} AND d.tipo = %s', parametros + [tipo])
+
+
+def filtrar(queryset, consulta):
+    """
+    Filtra un queryset de Producto, MateriaPrima, Venta o Compra con el
+    índice. Las ventas también coinciden por los productos vendidos y las
+    compras por las materias primas compradas.
+    """
+    consulta = (consulta or '').strip()
+    if not consulta:
+        return queryset
+    tipo = _tipo_de(queryset.model)
+    if tipo is None:
+        raise ValueError(f'{queryset.model.__name__} no está en el índice de búsqueda')
+
+    condicion = Q(id__in=coincidencias(tipo, consulta))
+    if tipo == 'venta':
+        condicion |= Q(id__in=VentaDetalle.objects.filter(
+            producto_id__in=coincidencias('producto', consulta)
+        ).values('venta_id'))
+    elif tipo == 'compra':
+        # Compras legacy (materia_prima en la cabecera) y compras con detalles
+        condicion |= Q(materia_prima_id__in=coincidencias('materia_prima', consulta))
+        condicion |= Q(id__in=CompraDetalle.objects.filter(
+            materia_prima_id__in=coincidencias('materia_prima', consulta)
+        ).values('compra_id'))
+    return queryset.filter(condicion)
+
+
+def buscar(consulta, tipos=None, limite=20):
+    """
+    Búsqueda global ordenada por relevancia (bm25 en SQLite, similitud de
+    trigramas en PostgreSQL).
+
+    Returns:
+        lista de dicts {'tipo', 'id', 'puntaje', 'objeto'} de mayor a menor puntaje
+    """
+    terminos = _terminos(consulta)
+    tipos = [tipo for tipo in (tipos or TIPOS) if tipo in TIPOS]
+    if not terminos or not tipos:
+        return []
+
+    marcadores = ', '.join(['%s'] * len(tipos))
+    if connection.vendor == 'sqlite':
+        sql, parametros = _consulta(terminos, 'd.tipo, d.objeto_id, -f.rank')
+        orden = 'f.rank'
+    elif connection.vendor == 'postgresql':
+        sql, parametros = _consulta(terminos, 'd.tipo, d.objeto_id, word_similarity(%s, d.texto) AS puntaje')
+        parametros = [' '.join(terminos)] + parametros
+        orden = 'puntaje DESC'
+    else:
+        sql, parametros = _consulta(terminos, 'd.tipo, d.objeto_id, 1')
+        orden = 'd.id'
+    sql = f'{sql} AND d.tipo IN ({marcadores}) ORDER BY {orden}, d.id LIMIT %s'
+    parametros = parametros + tipos + [limite]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        filas = cursor.fetchall()
+
+    # Un in_bulk por tipo para devolver los objetos
+    ids_por_tipo = {}
+    for tipo, objeto_id, _ in filas:
+        ids_por_tipo.setdefault(tipo, []).append(objeto_id)
+    objetos = {
+        tipo: _manager(tipo).in_bulk(ids)
+        for tipo, ids in ids_por_tipo.items()
+    }
+    return [
+        {'tipo': tipo, 'id': objeto_id, 'puntaje': float(puntaje), 'objeto': objetos[tipo].get(objeto_id)}
+        for tipo, objeto_id, puntaje in filas
+        if objetos[tipo].get(objeto_id) is not None
+    ]
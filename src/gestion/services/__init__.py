@@ -7,10 +7,13 @@ from .dashboard_service import DashboardService
 from .alertas_service import AlertasService
 from .analytics_service import AnalyticsService
 from .marketing_service import MarketingService
+from .venta_posting_service import VentaPostingService, StockInsuficienteError
 
 __all__ = [
     'DashboardService',
     'AlertasService',
     'AnalyticsService',
     'MarketingService',
+    'VentaPostingService',
+    'StockInsuficienteError',
 ]
@@ -0,0 +1,290 @@
+"""
+Alertas Engine - Generación de alertas en bloque
+Calcula las alertas candidatas del catálogo con un puñado de queries
+agrupadas, deduplica contra las alertas no leídas con una sola búsqueda
+por clave (tipo, producto, usuario) y crea todo con un único bulk_create
+para todos los usuarios.
+"""
+
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from gestion.models import Alerta, MateriaPrima, Producto, VentaDetalle
+from gestion.services.alertas_tiempo_real import ContadorAlertas
+from gestion.services.cost_matrix import CostMatrix
+
+
+class AlertasEngine:
+    """
+    Motor de alertas para un conjunto de usuarios.
+
+    Queries totales (independiente de productos y usuarios):
+    1. SELECT del catálogo de productos (con la última venta desnormalizada,
+       que alcanza para stock muerto)
+    2. Costos de materias primas y de recetas (solo si se evalúan márgenes o stock muerto)
+    3. Unidades vendidas en 30 días (GROUP BY) para oportunidades
+    4. Claves de alertas no leídas existentes
+    5. bulk_create de las alertas nuevas
+
+    Uso:
+        engine = AlertasEngine(User.objects.filter(is_active=True))
+        resultado = engine.generar()
+        engine.tiempos  # {'stock': 0.01, ..., 'persistencia': 0.05}
+    """
+
+    # Generador -> tipos de Alerta que produce
+    GENERADORES = {
+        'stock': ('stock_agotado', 'stock_critico'),
+        'vencimiento': ('vencimiento',),
+        'rentabilidad': ('margen_negativo', 'margen_bajo'),
+        'stock_muerto': ('stock_muerto',),
+        'oportunidades': ('oportunidad_venta',),
+    }
+
+    DIAS_STOCK_MUERTO = 60
+    DIAS_OPORTUNIDAD = 30
+    MIN_VENDIDOS_OPORTUNIDAD = 20
+
+    def __init__(self, usuarios):
+        self.usuarios = list(usuarios)
+        self.tiempos = {}
+        self._productos = None
+        self._costos_reales = None
+
+    # ==================== DATOS COMPARTIDOS ====================
+
+    @property
+    def productos(self):
+        if self._productos is None:
+            self._productos = {p.id: p for p in Producto.objects.all()}
+        return self._productos
+
+    @property
+    def costos_reales(self):
+        """Costo real por producto (equivalente a Producto.calcular_costo_real())."""
+        if self._costos_reales is None:
+            costos_mp = dict(MateriaPrima.objects.values_list('id', 'costo_unitario'))
+            costos_receta = CostMatrix._cargar_costos_recetas()
+            self._costos_reales = {}
+            for producto_id, producto in self.productos.items():
+                if producto.tiene_receta and producto.receta_id:
+                    costo = costos_receta[producto.receta_id]
+                elif producto.materia_prima_asociada_id and producto.cantidad_fraccion:
+                    costo_mp = Decimal(str(costos_mp.get(producto.materia_prima_asociada_id) or 0))
+                    cantidad = Decimal(str(producto.cantidad_fraccion))
+                    costo = (costo_mp * cantidad).quantize(Decimal('0.01'))
+                else:
+                    costo = Decimal('0.00')
+                self._costos_reales[producto_id] = costo
+        return self._costos_reales
+
+    @staticmethod
+    def _margen(precio_venta, costo_real):
+        return ((precio_venta - costo_real) / precio_venta) * 100
+
+    # ==================== CANDIDATAS ====================
+    # Cada generador devuelve una lista de dicts con los campos de Alerta
+    # (sin usuario): la misma alerta se replica luego para cada usuario.
+
+    def candidatas_stock(self):
+        candidatas = []
+        for producto in self.productos.values():
+            ventas_promedio_dia = getattr(producto, 'ventas_promedio_diarias', 1)
+
+            if producto.stock == 0:
+                perdida_estimada = ventas_promedio_dia * producto.precio * 30  # 30 días
+                candidatas.append({
+                    'tipo': 'stock_agotado',
+                    'nivel': 'danger',
+                    'producto': producto,
+                    'titulo': f'❌ Stock agotado: {producto.nombre}',
+                    'mensaje': f'El producto está agotado. Pérdida estimada: ${perdida_estimada:.2f}/mes sin stock.',
+                    'accion_sugerida': f'Reabastecer urgentemente. Pedido sugerido: {int(ventas_promedio_dia * 30)} unidades',
+                    'valor_impacto': perdida_estimada,
+                })
+
+            elif 0 < producto.stock <= producto.stock_minimo:
+                dias_restantes = producto.stock / max(ventas_promedio_dia, 1)
+                candidatas.append({
+                    'tipo': 'stock_critico',
+                    'nivel': 'warning',
+                    'producto': producto,
+                    'titulo': f'⚠️ Stock bajo: {producto.nombre}',
+                    'mensaje': f'Stock actual: {producto.stock} unidades. Stock para {dias_restantes:.1f} días aproximadamente.',
+                    'accion_sugerida': f'Reabastecer con {producto.stock_minimo * 2} unidades',
+                    'valor_impacto': producto.precio * 30,  # Pérdida potencial si se agota
+                })
+        return candidatas
+
+    def candidatas_vencimiento(self):
+        # Deshabilitado: Producto no tiene campo fecha_vencimiento
+        return []
+
+    def candidatas_rentabilidad(self):
+        candidatas = []
+        for producto_id, producto in self.productos.items():
+            precio_venta = Decimal(str(producto.precio))
+            costo_real = self.costos_reales[producto_id]
+            if precio_venta <= 0 or costo_real <= 0:
+                continue
+
+            margen = self._margen(precio_venta, costo_real)
+
+            # MARGEN NEGATIVO (pérdida)
+            if margen < 0:
+                precio_sugerido = costo_real * Decimal('1.30')  # +30% margen
+                perdida_por_unidad = abs(precio_venta - costo_real)
+                candidatas.append({
+                    'tipo': 'margen_negativo',
+                    'nivel': 'danger',
+                    'producto': producto,
+                    'titulo': f'💸 PÉRDIDA: {producto.nombre}',
+                    'mensaje': f'Margen negativo: {margen:.1f}%. Pérdida: ${perdida_por_unidad:.2f}/unidad. '
+                               f'Costo: ${costo_real}, Precio: ${precio_venta}',
+                    'accion_sugerida': f'URGENTE: Aumentar precio a ${precio_sugerido:.2f} (margen 30%) o discontinuar',
+                    'valor_impacto': perdida_por_unidad * producto.stock,
+                })
+
+            # MARGEN BAJO (<15%)
+            elif margen < 15:
+                precio_sugerido = costo_real * Decimal('1.20')  # +20% margen mínimo
+                candidatas.append({
+                    'tipo': 'margen_bajo',
+                    'nivel': 'warning',
+                    'producto': producto,
+                    'titulo': f'⚠️ Margen bajo: {producto.nombre}',
+                    'mensaje': f'Margen actual: {margen:.1f}%. Revisar estrategia de precios.',
+                    'accion_sugerida': f'Aumentar precio a ${precio_sugerido:.2f} o negociar mejor costo con proveedor',
+                })
+        return candidatas
+
+    def candidatas_stock_muerto(self):
+        ahora = timezone.now()
+        fecha_limite = ahora - timedelta(days=self.DIAS_STOCK_MUERTO)
+
+        # Producto.ultima_venta ya viene con el catálogo: sin queries extra
+        candidatas = []
+        for producto_id, producto in self.productos.items():
+            if producto.stock <= 0:
+                continue
+            ultima_venta = producto.ultima_venta
+            if ultima_venta and ultima_venta >= fecha_limite:
+                continue
+
+            capital_inmovilizado = self.costos_reales[producto_id] * producto.stock
+            dias_sin_venta = (ahora.date() - ultima_venta.date()).days if ultima_venta else 999
+            candidatas.append({
+                'tipo': 'stock_muerto',
+                'nivel': 'warning',
+                'producto': producto,
+                'titulo': f'📦 Stock muerto: {producto.nombre}',
+                'mensaje': f'Sin ventas hace {dias_sin_venta} días. Stock: {producto.stock} unidades. '
+                           f'Capital inmovilizado: ${capital_inmovilizado:.2f}',
+                'accion_sugerida': 'Promoción 2x1, descuento 25% o discontinuar producto',
+                'valor_impacto': capital_inmovilizado,
+            })
+        return candidatas
+
+    def candidatas_oportunidades(self):
+        fecha_inicio = timezone.now() - timedelta(days=self.DIAS_OPORTUNIDAD)
+
+        # Productos con alta demanda en el último mes
+        productos_vendidos = VentaDetalle.objects.filter(
+            venta__fecha__gte=fecha_inicio,
+            venta__eliminada=False
+        ).values('producto_id').annotate(
+            total_vendido=Sum('cantidad')
+        ).filter(total_vendido__gte=self.MIN_VENDIDOS_OPORTUNIDAD)
+
+        candidatas = []
+        for item in productos_vendidos:
+            producto = self.productos.get(item['producto_id'])
+            if producto is None:
+                continue
+
+            precio_venta = Decimal(str(producto.precio))
+            costo_real = self.costos_reales[producto.id]
+            if precio_venta <= 0 or costo_real <= 0:
+                continue
+
+            margen = self._margen(precio_venta, costo_real)
+
+            # Alta demanda + margen bajo = Oportunidad
+            if margen < 30:
+                precio_sugerido = costo_real * Decimal('1.40')  # 40% margen
+                candidatas.append({
+                    'tipo': 'oportunidad_venta',
+                    'nivel': 'success',
+                    'producto': producto,
+                    'titulo': f'💡 OPORTUNIDAD: {producto.nombre}',
+                    'mensaje': f'Alta demanda ({item["total_vendido"]} vendidos) y margen bajo ({margen:.1f}%). '
+                               f'Puedes aumentar precio sin afectar ventas.',
+                    'accion_sugerida': f'Aumentar precio a ${precio_sugerido:.2f} (margen 40%)',
+                    'valor_impacto': (precio_sugerido - precio_venta) * item['total_vendido'],
+                })
+        return candidatas
+
+    # ==================== GENERACIÓN ====================
+
+    def _existentes(self, tipos):
+        """Claves (tipo, producto_id, usuario_id) de alertas no leídas."""
+        return set(
+            Alerta.objects.filter(
+                usuario__in=self.usuarios,
+                tipo__in=tipos,
+                leida=False
+            ).values_list('tipo', 'producto_id', 'usuario_id')
+        )
+
+    def generar(self, generadores=None):
+        """
+        Genera las alertas nuevas para todos los usuarios.
+
+        Args:
+            generadores: nombres de GENERADORES a ejecutar (default: todos)
+
+        Returns:
+            dict con la cantidad creada por generador y 'total'.
+            Los tiempos (segundos) quedan en self.tiempos.
+        """
+        generadores = list(generadores or self.GENERADORES)
+        resultado = {nombre: 0 for nombre in generadores}
+        self.tiempos = {}
+        if not self.usuarios:
+            resultado['total'] = 0
+            return resultado
+
+        candidatas = []
+        for nombre in generadores:
+            inicio = time.perf_counter()
+            for candidata in getattr(self, f'candidatas_{nombre}')():
+                candidatas.append((nombre, candidata))
+            self.tiempos[nombre] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        tipos = [tipo for nombre in generadores for tipo in self.GENERADORES[nombre]]
+        existentes = self._existentes(tipos)
+
+        nuevas = []
+        for nombre, candidata in candidatas:
+            for usuario in self.usuarios:
+                clave = (candidata['tipo'], candidata['producto'].id, usuario.id)
+                if clave in existentes:
+                    continue
+                existentes.add(clave)
+                nuevas.append(Alerta(usuario=usuario, **candidata))
+                resultado[nombre] += 1
+
+        with transaction.atomic():
+            Alerta.objects.bulk_create(nuevas, batch_size=500)
+            # bulk_create no dispara signals: el contador de no leídas se ajusta aquí
+            ContadorAlertas.registrar_creadas(nuevas)
+        self.tiempos['persistencia'] = time.perf_counter() - inicio
+
+        resultado['total'] = len(nuevas)
+        return resultado
@@ -0,0 +1,219 @@
+"""
+Alertas en tiempo real - Contador por usuario en cache + stream SSE
+
+El badge del navbar y el panel de alertas ya no hacen polling contra la
+base de datos:
+
+- ContadorAlertas guarda en el cache 'alertas' la cantidad de alertas no
+  leídas de cada usuario y un número de versión. Las escrituras (signals de
+  Alerta y bulk_create de AlertasEngine) ajustan el contador y suben la
+  versión después del commit.
+- eventos_alertas() es el generador async del endpoint SSE: compara la
+  versión en cache cada LINO_ALERTAS_SSE_INTERVALO segundos y solo toca la
+  base de datos cuando cambió. Un cliente inactivo no genera queries.
+
+El contador y la versión solo sirven si el cache 'alertas' es compartido
+entre procesos (Redis). Con LocMem cada worker de gunicorn (y generar_alertas)
+vería solo sus propias escrituras, así que obtener() hace el COUNT y el
+stream compara un sello leído de la base.
+"""
+
+import asyncio
+import json
+import time
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Max
+
+from gestion.caches import cache_compartido
+from gestion.models import Alerta
+
+CACHE_ALIAS = 'alertas'
+PANEL_LIMITE = 5  # Mismas alertas que muestra el slide-in panel
+
+
+def _alias():
+    return getattr(settings, 'LINO_ALERTAS_CACHE', CACHE_ALIAS)
+
+
+def _cache():
+    return caches[_alias()]
+
+
+def _no_leidas(usuario_id):
+    return Alerta.objects.filter(usuario_id=usuario_id, leida=False, archivada=False)
+
+
+def serializar_alerta(alerta):
+    """Formato de alerta del slide-in panel (API y SSE)."""
+    return {
+        'id': alerta.id,
+        'tipo': alerta.tipo,
+        'nivel': alerta.nivel,
+        'titulo': alerta.titulo,
+        'mensaje': alerta.mensaje,
+        'fecha': alerta.fecha_creacion.strftime('%d/%m/%Y %H:%M'),
+        'icono': alerta.get_icono(),
+    }
+
+
+class ContadorAlertas:
+    """
+    Contador de alertas no leídas (ni archivadas) por usuario, mantenido en
+    cache. La primera lectura de un usuario hace un COUNT; a partir de ahí
+    las escrituras lo ajustan con incr y las lecturas no van a la base.
+    Con un cache local (LocMem) cada lectura hace el COUNT.
+    """
+
+    @staticmethod
+    def _clave(usuario_id):
+        return f'alertas:no_leidas:{usuario_id}'
+
+    @staticmethod
+    def _clave_version(usuario_id):
+        return f'alertas:version:{usuario_id}'
+
+    @classmethod
+    def obtener(cls, usuario_id):
+        """Cantidad de alertas no leídas del usuario (cache o un COUNT)."""
+        if not cache_compartido(_alias()):
+            return _no_leidas(usuario_id).count()
+
+        cache = _cache()
+        valor = cache.get(cls._clave(usuario_id))
+        if valor is not None:
+            return valor
+
+        version = cache.get(cls._clave_version(usuario_id), 0)
+        valor = _no_leidas(usuario_id).count()
+        # Si hubo una escritura mientras contábamos, no se guarda el valor:
+        # lo calculará la próxima lectura
+        if cache.get(cls._clave_version(usuario_id), 0) == version:
+            cache.add(cls._clave(usuario_id), valor, timeout=None)
+        return valor
+
+    @classmethod
+    def version(cls, usuario_id):
+        return _cache().get(cls._clave_version(usuario_id), 0)
+
+    @classmethod
+    async def aversion(cls, usuario_id):
+        return await _cache().aget(cls._clave_version(usuario_id), 0)
+
+    @classmethod
+    def _subir_version(cls, cache, usuario_id):
+        clave = cls._clave_version(usuario_id)
+        cache.add(clave, 0, timeout=None)
+        cache.incr(clave)
+
+    @classmethod
+    def sumar(cls, deltas):
+        """
+        Ajusta el contador de cada usuario ({usuario_id: delta}) y sube su
+        versión para que los streams SSE se enteren. Se aplica al confirmar
+        la transacción actual.
+        """
+        deltas = {usuario_id: delta for usuario_id, delta in deltas.items() if usuario_id}
+
+        def aplicar():
+            cache = _cache()
+            for usuario_id, delta in deltas.items():
+                if delta:
+                    try:
+                        if cache.incr(cls._clave(usuario_id), delta) < 0:
+                            cache.delete(cls._clave(usuario_id))
+                    except ValueError:
+                        pass  # Sin valor en cache: lo calcula la próxima lectura
+                cls._subir_version(cache, usuario_id)
+
+        if deltas:
+            transaction.on_commit(aplicar)
+
+    @classmethod
+    def invalidar(cls, usuario_ids):
+        """Descarta el contador (se recalcula en la próxima lectura) y sube la versión."""
+        usuario_ids = [usuario_id for usuario_id in set(usuario_ids) if usuario_id]
+
+        def aplicar():
+            cache = _cache()
+            cache.delete_many([cls._clave(usuario_id) for usuario_id in usuario_ids])
+            for usuario_id in usuario_ids:
+                cls._subir_version(cache, usuario_id)
+
+        if usuario_ids:
+            transaction.on_commit(aplicar)
+
+    @classmethod
+    def registrar_creadas(cls, alertas):
+        """Ajuste para alertas creadas con bulk_create (no disparan signals)."""
+        cls.sumar(Counter(
+            alerta.usuario_id for alerta in alertas
+            if not alerta.leida and not alerta.archivada
+        ))
+
+
+# ==================== STREAM SSE ====================
+
+def evento_sse(datos, evento='alertas'):
+    return f'event: {evento}\ndata: {json.dumps(datos)}\n\n'
+
+
+def snapshot(usuario_id, retry=None):
+    """Un único evento con el contador actual (respuesta SSE bajo WSGI)."""
+    prefijo = f'retry: {retry}\n' if retry else ''
+    return prefijo + evento_sse({'count': ContadorAlertas.obtener(usuario_id), 'nuevas': []})
+
+
+def _nuevas(usuario_id, desde_id):
+    alertas = list(_no_leidas(usuario_id).filter(id__gt=desde_id).order_by('-id')[:PANEL_LIMITE])
+    return [serializar_alerta(alerta) for alerta in alertas]
+
+
+async def _sello_db(usuario_id):
+    """Versión leída de la base cuando el cache no es compartido: (no leídas, última alerta)."""
+    sello = await _no_leidas(usuario_id).aaggregate(total=Count('id'), ultimo=Max('id'))
+    return sello['total'], sello['ultimo']
+
+
+async def eventos_alertas(usuario_id, intervalo=None, duracion=None, latido=15):
+    """
+    Generador async de eventos SSE para un usuario.
+
+    Emite un evento inicial con el contador y luego uno por cada cambio de
+    versión, con el contador nuevo y las alertas no leídas creadas desde el
+    último evento. Entre cambios solo lee la versión del cache (o, si el
+    cache no es compartido, un sello de la base) y manda un comentario de
+    keep-alive cada `latido` segundos. Termina a los `duracion` segundos;
+    EventSource se reconecta solo.
+    """
+    intervalo = intervalo or getattr(settings, 'LINO_ALERTAS_SSE_INTERVALO', 1)
+    duracion = duracion or getattr(settings, 'LINO_ALERTAS_SSE_DURACION', 300)
+    # Con un cache local las escrituras de otros procesos no suben la versión
+    leer_version = ContadorAlertas.aversion if cache_compartido(_alias()) else _sello_db
+
+    version = await leer_version(usuario_id)
+    ultimo = await Alerta.objects.filter(usuario_id=usuario_id).aaggregate(ultimo=Max('id'))
+    ultimo_id = ultimo['ultimo'] or 0
+    count = await sync_to_async(ContadorAlertas.obtener)(usuario_id)
+    yield 'retry: 5000\n' + evento_sse({'count': count, 'nuevas': []})
+
+    fin = time.monotonic() + duracion
+    ultimo_envio = time.monotonic()
+    while time.monotonic() < fin:
+        await asyncio.sleep(intervalo)
+        actual = await leer_version(usuario_id)
+        if actual != version:
+            version = actual
+            count = await sync_to_async(ContadorAlertas.obtener)(usuario_id)
+            nuevas = await sync_to_async(_nuevas)(usuario_id, ultimo_id)
+            if nuevas:
+                ultimo_id = nuevas[0]['id']
+            yield evento_sse({'count': count, 'nuevas': nuevas})
+            ultimo_envio = time.monotonic()
+        elif time.monotonic() - ultimo_envio >= latido:
+            yield ': ping\n\n'
+            ultimo_envio = time.monotonic()
@@ -7,7 +7,7 @@ from decimal import Decimal
 from datetime import timedelta
 from django.db.models import Sum, Avg, F, Q
 from django.utils import timezone
-from gestion.models import Producto, Venta, VentaDetalle, Compra
+from gestion.models import Producto, Venta, VentaDetalle, Compra, expresion_costo_vendido
 
 
 class AnalyticsService:
@@ -35,12 +35,12 @@ class AnalyticsService:
             eliminada=False
         ).aggregate(total=Sum('total'))['total'] or Decimal('0')
         
-        # Costos de productos vendidos
+        # Costos de productos vendidos (costo congelado en cada línea de venta)
         costos_vendidos = VentaDetalle.objects.filter(
             venta__fecha__date__gte=fecha_inicio,
             venta__eliminada=False
         ).aggregate(
-            total=Sum(F('cantidad') * F('producto__costo_base'))
+            total=Sum(expresion_costo_vendido())
         )['total'] or Decimal('0')
         
         # Inversión en inventario actual
@@ -162,12 +162,12 @@ class AnalyticsService:
         Returns:
             dict con rotacion, dias_inventario, costo_ventas, inventario_promedio
         """
-        # Costo de ventas del mes
+        # Costo de ventas del mes (costo congelado en cada línea de venta)
         costo_ventas_mes = VentaDetalle.objects.filter(
             venta__fecha__date__gte=self.inicio_mes,
             venta__eliminada=False
         ).aggregate(
-            total=Sum(F('cantidad') * F('producto__costo_base'))
+            total=Sum(expresion_costo_vendido())
         )['total'] or Decimal('0')
         
         # Inventario actual
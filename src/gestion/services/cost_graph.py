@@ -0,0 +1,135 @@
+"""
+Cost Graph - Propagación de costos por grafo de dependencias
+Cuando cambia el precio de una o más materias primas, recalcula solo los
+productos afectados (materia prima → receta → producto → fraccionados)
+y aplica los cambios en bloque.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from gestion.models import Producto, HistorialCosto
+from gestion.services.cost_matrix import CostMatrix
+
+
+class CostGraph:
+    """
+    Grafo de dependencias de costos a partir de un conjunto de materias primas.
+
+    Queries (independiente de la cantidad de productos afectados):
+    1. SELECT de los productos que usan directamente las materias primas
+    2. Un SELECT por nivel de la cadena producto_origen (fraccionados)
+    3. Carga de la CostMatrix restringida a los productos afectados
+    4. bulk_update de productos + bulk_create del historial
+    """
+
+    def __init__(self, materias_primas):
+        self.materias_primas = list(materias_primas)
+        self.materia_ids = [mp.pk for mp in self.materias_primas]
+
+    def productos_afectados(self):
+        """
+        Productos afectados en orden topológico: cada fraccionado aparece
+        después de su producto_origen. Cada nodo se visita una sola vez.
+        """
+        directos = Producto.objects.filter(
+            Q(
+                tipo_producto='receta',
+                tiene_receta=True,
+                receta__recetamateriaprima__materia_prima_id__in=self.materia_ids,
+            ) | Q(
+                tipo_producto__in=['reventa', 'receta'],
+                materia_prima_asociada_id__in=self.materia_ids,
+            )
+        ).distinct()
+
+        orden = {p.id: p for p in directos}
+        frontera = list(orden)
+        while frontera:
+            # Un nivel de la cadena producto_origen por query
+            hijos = Producto.objects.filter(
+                tipo_producto='fraccionamiento',
+                producto_origen_id__in=frontera,
+            ).exclude(id__in=list(orden))
+            frontera = []
+            for hijo in hijos:
+                orden[hijo.id] = hijo
+                frontera.append(hijo.id)
+        return orden
+
+    def _motivo(self, producto, afectados):
+        if producto.producto_origen_id in afectados:
+            return f"Cambio por actualización en {afectados[producto.producto_origen_id].nombre}"
+        nombres = ', '.join(mp.nombre for mp in self.materias_primas)
+        return f"Cambio en precio de {nombres}"
+
+    @staticmethod
+    def _sincronizar_precio(producto):
+        """Misma sincronización de `precio` que hace Producto.save()."""
+        calculado = producto.precio_venta_calculado
+        if producto.actualizar_precio_automatico:
+            producto.precio = round(float(calculado)) if calculado else float(calculado)
+        elif calculado and (not producto.precio or producto.precio == 0):
+            producto.precio = round(float(calculado))
+
+    def propagar(self, usuario=None):
+        """
+        Recalcula costo y precio de los productos afectados y persiste en bloque.
+
+        Returns:
+            list de productos cuyo costo o precio cambió
+        """
+        afectados = self.productos_afectados()
+        if not afectados:
+            return []
+
+        matriz = CostMatrix(productos=afectados.values())
+        materia_afectada = self.materias_primas[0] if len(self.materias_primas) == 1 else None
+
+        cambiados = []
+        historial = []
+        for producto_id, producto in afectados.items():
+            costo_anterior = producto.costo_base
+            precio_anterior = producto.precio_venta_calculado
+            nuevo_costo = matriz.costo(producto_id)
+            nuevo_precio = matriz.precio_venta(producto_id)
+
+            if (abs(nuevo_costo - (costo_anterior or Decimal('0.00'))) > Decimal('0.01') or
+                    abs(nuevo_precio - (precio_anterior or Decimal('0.00'))) > Decimal('0.01')):
+                historial.append(HistorialCosto(
+                    producto=producto,
+                    costo_anterior=costo_anterior,
+                    costo_nuevo=nuevo_costo,
+                    precio_anterior=precio_anterior,
+                    precio_nuevo=nuevo_precio,
+                    motivo=self._motivo(producto, afectados),
+                    usuario=usuario,
+                    materia_prima_afectada=materia_afectada,
+                ))
+
+            precio_previo = producto.precio
+            producto.costo_base = nuevo_costo
+            producto.precio_venta_calculado = nuevo_precio
+            self._sincronizar_precio(producto)
+
+            if (nuevo_costo != costo_anterior or nuevo_precio != precio_anterior
+                    or producto.precio != precio_previo):
+                cambiados.append(producto)
+
+        # bulk_update no aplica auto_now: marcar la modificación para la API de sync
+        ahora = timezone.now()
+        for producto in cambiados:
+            producto.fecha_modificacion = ahora
+
+        with transaction.atomic():
+            Producto.objects.bulk_update(
+                cambiados,
+                ['costo_base', 'precio_venta_calculado', 'precio', 'fecha_modificacion'],
+                batch_size=500
+            )
+            HistorialCosto.objects.bulk_create(historial, batch_size=500)
+
+        return cambiados
@@ -0,0 +1,191 @@
+"""
+Cost Matrix - Evaluador de costos y márgenes en bloque
+Calcula el costo unitario y el margen de todo el catálogo con un número
+constante de queries, replicando Producto.calcular_costo_unitario().
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Sum
+
+from gestion.models import (
+    Producto, MateriaPrima, Receta, VentaDetalle, ConfiguracionCostos
+)
+
+
+class CostMatrix:
+    """
+    Matriz de costos del catálogo completo.
+
+    Queries totales (independiente de la cantidad de productos):
+    1. SELECT de todos los productos
+    2. SELECT de los costos de materias primas (solo las asociadas si se pasa `productos`)
+    3. SELECT del costo persistido de las recetas (Receta.costo_cache)
+    4. Configuración de costos (cacheada, ver ConfiguracionCostos.get_config)
+    5. Agregado agrupado de ventas desde `desde` (si se indica)
+
+    Uso:
+        matriz = CostMatrix(desde=inicio_mes)
+        for fila in matriz:
+            fila['producto'], fila['costo'], fila['margen'], fila['cantidad_vendida']
+    """
+
+    def __init__(self, desde=None, config=None, productos=None):
+        """
+        Args:
+            desde: Fecha desde la cual agregar ventas (None = sin ventas)
+            config: ConfiguracionCostos ya cargada (opcional)
+            productos: QuerySet de productos a evaluar (default: todos)
+        """
+        self.desde = desde
+        self.config = config if config is not None else ConfiguracionCostos.get_config()
+
+        self.productos = {p.id: p for p in (productos if productos is not None else Producto.objects.all())}
+        materias = MateriaPrima.objects.all()
+        recetas = None
+        if productos is not None:
+            materias = materias.filter(
+                id__in={p.materia_prima_asociada_id for p in self.productos.values() if p.materia_prima_asociada_id}
+            )
+            recetas = {p.receta_id for p in self.productos.values() if p.receta_id}
+        self._costos_mp = dict(materias.values_list('id', 'costo_unitario'))
+        self._costos_receta = self._cargar_costos_recetas(recetas)
+        self._ventas = self._cargar_ventas()
+
+        self._origenes = {}
+        self._costos = {}
+        for producto_id in self.productos:
+            self.costo(producto_id)
+
+    # ==================== CARGA ====================
+
+    @staticmethod
+    def _cargar_costos_recetas(receta_ids=None):
+        """Costo total de cada receta (columna Receta.costo_cache, como Receta.costo_total())."""
+        costos = defaultdict(lambda: Decimal('0.00'))
+        recetas = Receta.objects.all()
+        if receta_ids is not None:
+            recetas = recetas.filter(pk__in=receta_ids)
+        costos.update(recetas.order_by().values_list('id', 'costo_cache'))
+        return costos
+
+    def _cargar_ventas(self):
+        """Cantidad y total vendido por producto en un único GROUP BY."""
+        if self.desde is None:
+            return {}
+        filas = VentaDetalle.objects.filter(
+            venta__fecha__date__gte=self.desde,
+            venta__eliminada=False
+        ).values('producto_id').annotate(
+            cantidad=Sum('cantidad'),
+            total=Sum('subtotal')
+        )
+        return {
+            f['producto_id']: (f['cantidad'] or 0, f['total'] or Decimal('0'))
+            for f in filas
+        }
+
+    # ==================== CÁLCULO ====================
+
+    def _costo_materia(self, producto):
+        """Costo de la MP asociada por la cantidad de la fracción."""
+        costo_mp = self._costos_mp.get(producto.materia_prima_asociada_id)
+        if costo_mp is None:
+            return Decimal('0.00')
+        return costo_mp * Decimal(str(producto.cantidad_fraccion))
+
+    def _costo_base(self, producto, visitados):
+        tipo = producto.tipo_producto
+
+        if tipo == 'reventa':
+            if producto.materia_prima_asociada_id and producto.cantidad_fraccion:
+                return self._costo_materia(producto)
+            return producto.costo_base or Decimal(str(producto.precio))
+
+        if tipo == 'fraccionamiento':
+            origen_id = producto.producto_origen_id
+            if origen_id and producto.factor_conversion > 0:
+                costo_origen = self.costo(origen_id, visitados)
+                return costo_origen / Decimal(str(producto.factor_conversion))
+
+        elif tipo == 'receta':
+            if producto.tiene_receta and producto.receta_id:
+                return self._costos_receta[producto.receta_id]
+            if producto.materia_prima_asociada_id and producto.cantidad_fraccion:
+                return self._costo_materia(producto)
+
+        return Decimal('0.00')
+
+    def _origen(self, producto_id):
+        """Producto origen fuera del subconjunto evaluado (query individual)."""
+        if producto_id not in self._origenes:
+            self._origenes[producto_id] = Producto.objects.filter(pk=producto_id).first()
+        return self._origenes[producto_id]
+
+    def costo(self, producto_id, visitados=None):
+        """
+        Costo unitario de un producto (con costos indirectos), memoizado.
+        Los productos de fraccionamiento resuelven su origen en la misma matriz.
+        """
+        if producto_id in self._costos:
+            return self._costos[producto_id]
+
+        producto = self.productos.get(producto_id) or self._origen(producto_id)
+        if producto is None:
+            return Decimal('0.00')
+
+        visitados = visitados or set()
+        if producto_id in visitados:
+            # Ciclo producto_origen -> ... -> producto: sin costo definido
+            return Decimal('0.00')
+        visitados.add(producto_id)
+
+        costo = self._costo_base(producto, visitados)
+
+        if self.config:
+            peso_kg = float(producto.cantidad_fraccion or 1000) / 1000
+            es_fraccionamiento = producto.tipo_producto == 'fraccionamiento'
+            costo += self.config.calcular_costos_indirectos(peso_kg, es_fraccionamiento)
+
+        self._costos[producto_id] = costo
+        return costo
+
+    def precio_venta(self, producto_id):
+        """Precio sugerido costo + margen_ganancia (equivalente a calcular_precio_venta())."""
+        producto = self.productos.get(producto_id) or self._origen(producto_id)
+        costo = self.costo(producto_id)
+        if costo > 0 and producto.margen_ganancia:
+            margen_decimal = Decimal(str(producto.margen_ganancia)) / Decimal('100')
+            precio = costo * (Decimal('1') + margen_decimal)
+            if self.config and self.config.redondear_precios:
+                precio = (precio / Decimal('0.50')).quantize(Decimal('1')) * Decimal('0.50')
+            return precio.quantize(Decimal('0.01'))
+        return Decimal('0.00')
+
+    def margen(self, producto_id):
+        """Margen porcentual sobre el precio de venta (0 si no tiene precio)."""
+        precio = Decimal(str(self.productos[producto_id].precio or 0))
+        if precio <= 0:
+            return Decimal('0')
+        return ((precio - self.costo(producto_id)) / precio) * 100
+
+    def ventas(self, producto_id):
+        """Tupla (cantidad, total) vendida desde `desde`."""
+        return self._ventas.get(producto_id, (0, Decimal('0')))
+
+    def __len__(self):
+        return len(self.productos)
+
+    def __iter__(self):
+        """Recorre el catálogo entregando una fila por producto."""
+        for producto_id, producto in self.productos.items():
+            cantidad, total = self.ventas(producto_id)
+            yield {
+                'producto': producto,
+                'costo': self._costos[producto_id],
+                'precio': Decimal(str(producto.precio or 0)),
+                'margen': self.margen(producto_id),
+                'cantidad_vendida': cantidad,
+                'total_vendido': total,
+            }
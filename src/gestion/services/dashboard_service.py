@@ -7,7 +7,7 @@ from datetime import timedelta, datetime
 from decimal import Decimal
 from django.db.models import Sum, Count, Avg, F, Q
 from django.utils import timezone
-from gestion.models import Producto, Venta, VentaDetalle, Compra
+from gestion.models import Producto, Venta, VentaDetalle, Compra, ResumenDiario, expresion_costo_vendido
 
 
 class DashboardService:
@@ -25,52 +25,19 @@ class DashboardService:
         ACTUALIZADO: Usa datos REALES de compras, ganancia calculada correctamente.
         """
         
-        # 💰 VENTAS DEL MES
-        ventas_mes = Venta.objects.filter(
-            fecha__date__gte=self.inicio_mes,
-            eliminada=False
-        )
-        total_ventas_mes = ventas_mes.aggregate(total=Sum('total'))['total'] or Decimal('0')
-        
-        # Ventas mes anterior para comparación
+        # 💰 VENTAS DEL MES (desde el rollup ResumenDiario)
         inicio_mes_anterior = (self.inicio_mes - timedelta(days=1)).replace(day=1)
         fin_mes_anterior = self.inicio_mes - timedelta(days=1)
-        ventas_mes_anterior = Venta.objects.filter(
-            fecha__date__gte=inicio_mes_anterior,
-            fecha__date__lte=fin_mes_anterior,
-            eliminada=False
-        ).aggregate(total=Sum('total'))['total'] or Decimal('0')
+        
+        total_ventas_mes = self._sumar_resumen('ventas_total', self.inicio_mes, self.hoy)
+        ventas_mes_anterior = self._sumar_resumen('ventas_total', inicio_mes_anterior, fin_mes_anterior)
         
         # Calcular variación ventas
         variacion_ventas = self._calcular_variacion(total_ventas_mes, ventas_mes_anterior)
         
-        # 🛒 COMPRAS DEL MES (DATO REAL - Compatible legacy + nuevo sistema)
-        # Calcular total usando ambos sistemas:
-        # - Legacy: precio_mayoreo (compras antiguas con 1 producto)
-        # - Nuevo: total (compras con múltiples productos vía CompraDetalle)
-        from django.db.models import Q, Case, When, F
-        total_compras_mes = Compra.objects.filter(
-            fecha_compra__gte=self.inicio_mes,
-            fecha_compra__lte=self.hoy
-        ).annotate(
-            importe=Case(
-                # Si tiene 'total' (nuevo sistema), usar total
-                When(total__isnull=False, then=F('total')),
-                # Si no, es legacy, usar precio_mayoreo
-                default=F('precio_mayoreo')
-            )
-        ).aggregate(total=Sum('importe'))['total'] or Decimal('0')
-        
-        # Compras mes anterior para comparación (mismo cálculo)
-        compras_mes_anterior = Compra.objects.filter(
-            fecha_compra__gte=inicio_mes_anterior,
-            fecha_compra__lte=fin_mes_anterior
-        ).annotate(
-            importe=Case(
-                When(total__isnull=False, then=F('total')),
-                default=F('precio_mayoreo')
-            )
-        ).aggregate(total=Sum('importe'))['total'] or Decimal('0')
+        # 🛒 COMPRAS DEL MES (DATO REAL - suma de Compra.total por día)
+        total_compras_mes = self._sumar_resumen('compras_total', self.inicio_mes, self.hoy)
+        compras_mes_anterior = self._sumar_resumen('compras_total', inicio_mes_anterior, fin_mes_anterior)
         
         # Calcular variación compras
         variacion_compras = self._calcular_variacion(total_compras_mes, compras_mes_anterior)
@@ -136,74 +103,62 @@ class DashboardService:
         else:
             return Decimal('0.0')
     
-    def _get_sparkline_ventas(self):
-        """Ventas de los últimos 7 días para sparkline"""
+    @property
+    def resumenes(self):
+        """
+        Filas de ResumenDiario desde el inicio del mes anterior hasta hoy
+        (≤ 62 filas), cargadas una sola vez por instancia.
+        """
+        if not hasattr(self, '_resumenes'):
+            desde = (self.inicio_mes - timedelta(days=1)).replace(day=1)
+            self._resumenes = {
+                r.fecha: r for r in ResumenDiario.objects.filter(fecha__gte=desde, fecha__lte=self.hoy)
+            }
+        return self._resumenes
+    
+    def _sumar_resumen(self, campo, desde, hasta):
+        """Suma un campo del rollup entre dos fechas (inclusive)."""
+        total = sum(
+            (getattr(r, campo) for fecha, r in self.resumenes.items() if desde <= fecha <= hasta),
+            0
+        )
+        return Decimal(str(total)) if campo.endswith('_total') else total
+    
+    def _get_sparkline(self, campo):
+        """Valores de un campo del rollup para los últimos 7 días."""
         sparkline = []
         for i in range(7):
             fecha = self.hoy - timedelta(days=6-i)
-            total = Venta.objects.filter(
-                fecha__date=fecha,
-                eliminada=False
-            ).aggregate(total=Sum('total'))['total'] or Decimal('0')
-            sparkline.append(float(total))
+            resumen = self.resumenes.get(fecha)
+            sparkline.append(getattr(resumen, campo) if resumen else 0)
         return sparkline
     
+    def _get_sparkline_ventas(self):
+        """Ventas de los últimos 7 días para sparkline"""
+        return [float(v) for v in self._get_sparkline('ventas_total')]
+    
     def _get_sparkline_productos(self):
         """Productos vendidos últimos 7 días para sparkline"""
-        sparkline = []
-        for i in range(7):
-            fecha = self.hoy - timedelta(days=6-i)
-            total = VentaDetalle.objects.filter(
-                venta__fecha__date=fecha,
-                venta__eliminada=False
-            ).aggregate(total=Sum('cantidad'))['total'] or 0
-            sparkline.append(total)
-        return sparkline
+        return self._get_sparkline('unidades_vendidas')
     
     def _get_sparkline_compras(self):
         """Compras de los últimos 7 días para sparkline (compatible legacy + nuevo)"""
-        from django.db.models import Q, Case, When, F
-        sparkline = []
-        for i in range(7):
-            fecha = self.hoy - timedelta(days=6-i)
-            total = Compra.objects.filter(
-                fecha_compra=fecha
-            ).annotate(
-                importe=Case(
-                    When(total__isnull=False, then=F('total')),
-                    default=F('precio_mayoreo')
-                )
-            ).aggregate(total=Sum('importe'))['total'] or Decimal('0')
-            sparkline.append(float(total))
-        return sparkline
+        return [float(v) for v in self._get_sparkline('compras_total')]
     
     def get_resumen_hoy(self):
         """Resumen del día actual"""
-        ventas_hoy = Venta.objects.filter(
-            fecha__date=self.hoy,
-            eliminada=False
-        )
-        
-        total_hoy = ventas_hoy.aggregate(total=Sum('total'))['total'] or Decimal('0')
-        cantidad_ventas_hoy = ventas_hoy.count()
-        productos_vendidos_hoy = VentaDetalle.objects.filter(
-            venta__fecha__date=self.hoy,
-            venta__eliminada=False
-        ).aggregate(total=Sum('cantidad'))['total'] or 0
+        hoy = self.resumenes.get(self.hoy)
+        ayer = self.resumenes.get(self.hoy - timedelta(days=1))
         
-        # Comparar con ayer
-        ayer = self.hoy - timedelta(days=1)
-        total_ayer = Venta.objects.filter(
-            fecha__date=ayer,
-            eliminada=False
-        ).aggregate(total=Sum('total'))['total'] or Decimal('0')
+        total_hoy = hoy.ventas_total if hoy else Decimal('0')
+        total_ayer = ayer.ventas_total if ayer else Decimal('0')
         
         variacion_dia = ((total_hoy - total_ayer) / total_ayer * 100) if total_ayer > 0 else 0
         
         return {
             'total_ventas': float(total_hoy),
-            'cantidad_ventas': cantidad_ventas_hoy,
-            'productos_vendidos': productos_vendidos_hoy,
+            'cantidad_ventas': hoy.ventas_count if hoy else 0,
+            'productos_vendidos': hoy.unidades_vendidas if hoy else 0,
             'variacion': float(variacion_dia)
         }
     
@@ -272,15 +227,16 @@ class DashboardService:
             'producto__costo_base'
         ).annotate(
             total_vendido=Sum('cantidad'),
-            ingresos=Sum(F('cantidad') * F('precio_unitario'))
+            ingresos=Sum(F('cantidad') * F('precio_unitario')),
+            costo_vendido=Sum(expresion_costo_vendido())
         ).order_by('-ingresos')[:limit]
         
-        # Agregar margen calculado
+        # Margen real del mes: ingresos vs. costo congelado al vender
         for item in top:
-            precio = Decimal(str(item['producto__precio']))
-            costo = Decimal(str(item['producto__costo_base'] or 0))
-            if precio > 0:
-                margen = ((precio - costo) / precio * 100)
+            ingresos = item['ingresos'] or Decimal('0')
+            costo = item['costo_vendido'] or Decimal('0')
+            if ingresos > 0:
+                margen = ((ingresos - costo) / ingresos * 100)
                 item['margen'] = float(margen)
             else:
                 item['margen'] = 0
@@ -309,33 +265,14 @@ class DashboardService:
         """
         desde = self.hoy - timedelta(days=dias-1)
         
-        # Agrupar ventas por día
-        ventas_periodo = Venta.objects.filter(
-            fecha__date__gte=desde,
-            fecha__date__lte=self.hoy,
-            eliminada=False
-        ).extra(
-            select={'fecha_dia': 'DATE(fecha)'}
-        ).values('fecha_dia').annotate(
-            total=Sum('total'),
-            cantidad=Count('id')
-        ).order_by('fecha_dia')
+        # Totales por día desde el rollup ResumenDiario (1 fila por día)
+        ventas_dict = self._ventas_por_dia(desde, self.hoy)
         
         # Crear estructura de datos completa (rellenar días sin ventas)
         labels = []
         datos = []
         fecha_actual = desde
         
-        # Convertir ventas_dict asegurando que las fechas sean objetos date
-        ventas_dict = {}
-        for v in ventas_periodo:
-            fecha = v['fecha_dia']
-            # Asegurar que sea un objeto date
-            if isinstance(fecha, str):
-                from datetime import datetime
-                fecha = datetime.strptime(fecha, '%Y-%m-%d').date()
-            ventas_dict[fecha] = float(v['total'])
-        
         while fecha_actual <= self.hoy:
             labels.append(fecha_actual.strftime('%d/%m'))
             valor = ventas_dict.get(fecha_actual, 0)
@@ -354,19 +291,9 @@ class DashboardService:
             desde_anterior = desde - timedelta(days=dias)
             hasta_anterior = desde - timedelta(days=1)
             
-            ventas_anterior = Venta.objects.filter(
-                fecha__date__gte=desde_anterior,
-                fecha__date__lte=hasta_anterior,
-                eliminada=False
-            ).extra(
-                select={'fecha_dia': 'DATE(fecha)'}
-            ).values('fecha_dia').annotate(
-                total=Sum('total')
-            ).order_by('fecha_dia')
-            
             datos_anterior = []
             fecha_actual = desde_anterior
-            ventas_anterior_dict = {v['fecha_dia']: float(v['total']) for v in ventas_anterior}
+            ventas_anterior_dict = self._ventas_por_dia(desde_anterior, hasta_anterior)
             
             while fecha_actual <= hasta_anterior:
                 datos_anterior.append(ventas_anterior_dict.get(fecha_actual, 0))
@@ -381,6 +308,15 @@ class DashboardService:
         
         return resultado
     
+    def _ventas_por_dia(self, desde, hasta):
+        """Dict fecha → total vendido leído del rollup ResumenDiario."""
+        return {
+            fecha: float(total)
+            for fecha, total in ResumenDiario.objects.filter(
+                fecha__gte=desde, fecha__lte=hasta
+            ).values_list('fecha', 'ventas_total')
+        }
+    
     def get_top_productos_grafico(self, dias=30, limit=5):
         """
         Obtiene los productos más vendidos para gráfico de barras
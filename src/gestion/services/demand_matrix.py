@@ -0,0 +1,193 @@
+"""
+Demand Matrix - Demanda diaria del catálogo en una matriz productos × días
+Carga las ventas de la ventana con un único GROUP BY (producto, día) y
+calcula con NumPy demanda diaria, cobertura, rotación, clases ABC/XYZ y
+productos sin movimiento, sin queries por producto.
+"""
+
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from gestion.models import VentaDetalle, expresion_costo_vendido
+from gestion.services.cost_matrix import CostMatrix
+
+# Cortes de participación acumulada en el importe vendido (Pareto)
+CORTE_A = 0.80
+CORTE_B = 0.95
+# Cortes del coeficiente de variación de la demanda diaria
+CORTE_X = 0.5
+CORTE_Y = 1.0
+
+
+class DemandMatrix:
+    """
+    Matriz de unidades vendidas por producto y por día.
+
+    Queries totales (independiente de la cantidad de productos):
+    1-4. CostMatrix: productos, costos de materias primas, costo de las
+         recetas y configuración de costos (cacheada)
+    5. SELECT agrupado de VentaDetalle por (producto, día) de la ventana
+
+    La columna 0 es `hoy - dias` y la última es `hoy`, ambas incluidas.
+
+    Uso:
+        matriz = DemandMatrix(dias=60)
+        matriz.demanda_diaria(30)          # unidades/día de cada producto
+        matriz.mediana_cobertura(30)
+        matriz.clases_abc(), matriz.clases_xyz()
+    """
+
+    def __init__(self, hoy=None, dias=60, config=None, costos=None):
+        """
+        Args:
+            hoy: último día de la ventana (default: hoy)
+            dias: días hacia atrás que cubre la matriz
+            config: ConfiguracionCostos ya cargada (opcional)
+            costos: CostMatrix ya construida (opcional)
+        """
+        self.hoy = hoy or timezone.localdate()
+        self.dias = dias
+        self.desde = self.hoy - timedelta(days=dias)
+
+        self.costos = costos if costos is not None else CostMatrix(config=config)
+        self.productos = self.costos.productos
+        self.ids = np.fromiter(self.productos.keys(), dtype=np.int64, count=len(self.productos))
+        self._indice = {producto_id: i for i, producto_id in enumerate(self.ids.tolist())}
+
+        self.stock = np.array([p.stock for p in self.productos.values()], dtype=np.float64)
+        self.costo_unitario = np.array(
+            [float(self.costos.costo(producto_id)) for producto_id in self.productos], dtype=np.float64
+        )
+
+        self.unidades = np.zeros((len(self.ids), dias + 1), dtype=np.float64)
+        self.importes = np.zeros(len(self.ids), dtype=np.float64)
+        self.costo_diario = np.zeros(dias + 1, dtype=np.float64)
+        self._cargar_ventas()
+
+    # ==================== CARGA ====================
+
+    def _cargar_ventas(self):
+        inicio = timezone.make_aware(datetime.combine(self.desde, time.min))
+        fin = timezone.make_aware(datetime.combine(self.hoy + timedelta(days=1), time.min))
+        filas = VentaDetalle.objects.filter(
+            venta__eliminada=False,
+            venta__fecha__gte=inicio,
+            venta__fecha__lt=fin,
+        ).values('producto_id', dia=TruncDate('venta__fecha')).annotate(
+            unidades=Sum('cantidad'),
+            total=Sum('subtotal'),
+            costo=Sum(expresion_costo_vendido()),
+            sin_costo=Sum('cantidad', filter=Q(costo_unitario__isnull=True)),
+        ).order_by()
+
+        posiciones, columnas, cantidades, importes, costos, sin_costo = [], [], [], [], [], []
+        for fila in filas:
+            posicion = self._indice.get(fila['producto_id'])
+            if posicion is None:
+                continue
+            posiciones.append(posicion)
+            columnas.append((fila['dia'] - self.desde).days)
+            cantidades.append(fila['unidades'] or 0)
+            importes.append(float(fila['total'] or 0))
+            costos.append(float(fila['costo'] or 0))
+            sin_costo.append(fila['sin_costo'] or 0)
+
+        if posiciones:
+            posiciones = np.array(posiciones, dtype=np.intp)
+            columnas = np.array(columnas, dtype=np.intp)
+            np.add.at(self.unidades, (posiciones, columnas), cantidades)
+            np.add.at(self.importes, posiciones, importes)
+            # Líneas anteriores al costo congelado (sin backfill): costo vigente
+            costos = np.array(costos) + np.array(sin_costo) * self.costo_unitario[posiciones]
+            np.add.at(self.costo_diario, columnas, costos)
+
+    def _columna(self, fecha):
+        """Índice de la columna de `fecha`, acotado a la ventana."""
+        return min(max((fecha - self.desde).days, 0), self.dias + 1)
+
+    def posicion(self, producto_id):
+        return self._indice.get(producto_id)
+
+    # ==================== DEMANDA Y COBERTURA ====================
+
+    def unidades_desde(self, fecha):
+        """Unidades vendidas por producto desde `fecha` hasta hoy (vector)."""
+        return self.unidades[:, self._columna(fecha):].sum(axis=1)
+
+    def demanda_diaria(self, dias=30):
+        """Unidades por día de cada producto: ventas de [hoy - dias, hoy] / dias."""
+        if dias <= 0:
+            return np.zeros(len(self.ids))
+        return self.unidades_desde(self.hoy - timedelta(days=dias)) / dias
+
+    def cobertura(self, dias=30):
+        """
+        Días de stock al ritmo de venta de los últimos `dias` días.
+        NaN para productos sin stock o sin ventas (cobertura indefinida).
+        """
+        demanda = self.demanda_diaria(dias)
+        validos = (self.stock > 0) & (demanda > 0)
+        cobertura = np.full(len(self.ids), np.nan)
+        np.divide(self.stock, demanda, out=cobertura, where=validos)
+        return cobertura
+
+    def mediana_cobertura(self, dias=30):
+        """Mediana de la cobertura de los productos con stock y ventas (None si no hay)."""
+        cobertura = self.cobertura(dias)
+        cobertura = cobertura[~np.isnan(cobertura)]
+        return float(np.median(cobertura)) if cobertura.size else None
+
+    # ==================== ROTACIÓN ====================
+
+    def costo_vendido(self, desde):
+        """Costo de las unidades vendidas desde `desde`, con el costo congelado de cada línea."""
+        return Decimal(str(round(float(self.costo_diario[self._columna(desde):].sum()), 2)))
+
+    def sin_movimiento(self, desde):
+        """Posiciones de los productos con stock y sin ventas desde `desde`."""
+        return np.flatnonzero((self.stock > 0) & (self.unidades_desde(desde) == 0))
+
+    # ==================== CLASIFICACIÓN ====================
+
+    def clases_abc(self):
+        """
+        Clase ABC por importe vendido en la ventana: A hasta el 80% acumulado,
+        B hasta el 95%, C el resto (incluye los productos sin ventas).
+        """
+        clases = np.full(len(self.ids), 'C', dtype='<U1')
+        total = self.importes.sum()
+        if total <= 0:
+            return clases
+        orden = np.argsort(-self.importes, kind='stable')
+        # Participación acumulada *antes* de cada producto: el que cruza el corte queda adentro
+        previo = (np.cumsum(self.importes[orden]) - self.importes[orden]) / total
+        vendidos = self.importes[orden] > 0
+        clases[orden[vendidos & (previo < CORTE_B)]] = 'B'
+        clases[orden[vendidos & (previo < CORTE_A)]] = 'A'
+        return clases
+
+    def clases_xyz(self):
+        """
+        Clase XYZ por coeficiente de variación de la demanda diaria: X estable
+        (CV ≤ 0.5), Y variable (≤ 1.0), Z errática o sin ventas.
+        """
+        media = self.unidades.mean(axis=1)
+        desvio = self.unidades.std(axis=1)
+        cv = np.full(len(self.ids), np.inf)
+        np.divide(desvio, media, out=cv, where=media > 0)
+        return np.where(cv <= CORTE_X, 'X', np.where(cv <= CORTE_Y, 'Y', 'Z'))
+
+    def clasificacion(self):
+        """Dict {producto_id: 'AX' | 'BZ' | ...}."""
+        return {
+            producto_id: abc + xyz
+            for producto_id, abc, xyz in zip(self.ids.tolist(), self.clases_abc(), self.clases_xyz())
+        }
+
+    def __len__(self):
+        return len(self.ids)
@@ -0,0 +1,145 @@
+"""
+Export Service - Exportaciones en streaming (CSV / XLSX)
+Recorre los QuerySets con .iterator() para que el consumo de memoria no
+dependa de la cantidad de filas exportadas.
+"""
+
+import csv
+import tempfile
+from datetime import datetime
+
+from django.http import FileResponse, StreamingHttpResponse
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class _Echo:
+    """Pseudo-buffer para csv.writer: devuelve la línea en lugar de escribirla."""
+
+    def write(self, value):
+        return value
+
+
+class ExportService:
+    """
+    Exportación tabular genérica.
+
+    Uso:
+        service = ExportService.desde_resource(VentaResource(), titulo='Ventas')
+        return service.respuesta(request.GET.get('formato'), 'ventas')
+    """
+
+    CHUNK_SIZE = 2000
+    MUESTRA_ANCHOS = 200  # filas usadas para estimar el ancho de columnas
+    ANCHO_MAXIMO = 50
+
+    def __init__(self, headers, filas, titulo='Datos'):
+        """
+        Args:
+            headers: lista de encabezados
+            filas: iterable (idealmente un generador) de listas de valores
+            titulo: nombre de la hoja en XLSX
+        """
+        self.headers = list(headers)
+        self.filas = filas
+        self.titulo = titulo
+
+    @classmethod
+    def desde_resource(cls, resource, queryset=None, titulo='Datos'):
+        """Construye la exportación a partir de un ModelResource de import_export."""
+        if queryset is None:
+            queryset = resource.get_queryset()
+        filas = (
+            resource.export_resource(obj)
+            for obj in queryset.iterator(chunk_size=cls.CHUNK_SIZE)
+        )
+        return cls(resource.get_export_headers(), filas, titulo=titulo)
+
+    @staticmethod
+    def nombre_archivo(prefijo, extension):
+        return f'{prefijo}_{datetime.now().strftime("%Y%m%d")}.{extension}'
+
+    def respuesta(self, formato, prefijo):
+        """Respuesta HTTP según el formato pedido ('csv' o 'xlsx', default xlsx)."""
+        if formato == 'csv':
+            return self.respuesta_csv(prefijo)
+        return self.respuesta_xlsx(prefijo)
+
+    # ==================== CSV ====================
+
+    def _lineas_csv(self):
+        writer = csv.writer(_Echo())
+        yield '﻿'  # BOM para que Excel detecte UTF-8
+        yield writer.writerow(self.headers)
+        for fila in self.filas:
+            yield writer.writerow(fila)
+
+    def respuesta_csv(self, prefijo):
+        """CSV generado fila por fila mientras se envía la respuesta."""
+        response = StreamingHttpResponse(self._lineas_csv(), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{self.nombre_archivo(prefijo, "csv")}"'
+        return response
+
+    # ==================== XLSX ====================
+
+    def _anchos(self, muestra):
+        """Ancho de cada columna según encabezados y una muestra de filas."""
+        anchos = [len(str(h)) for h in self.headers]
+        for fila in muestra:
+            for i, valor in enumerate(fila):
+                if i < len(anchos) and valor is not None:
+                    anchos[i] = max(anchos[i], len(str(valor)))
+        return [min(ancho + 2, self.ANCHO_MAXIMO) for ancho in anchos]
+
+    def escribir_xlsx(self, destino):
+        """
+        Escribe el libro en modo write_only: openpyxl vuelca cada fila a disco
+        en lugar de mantener la hoja completa en memoria.
+        """
+        import openpyxl
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font, PatternFill
+        from openpyxl.utils import get_column_letter
+
+        filas = iter(self.filas)
+        muestra = []
+        for fila in filas:
+            muestra.append(fila)
+            if len(muestra) >= self.MUESTRA_ANCHOS:
+                break
+
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet(title=self.titulo[:31])
+
+        # En write_only los anchos deben fijarse antes de escribir filas
+        for i, ancho in enumerate(self._anchos(muestra), 1):
+            ws.column_dimensions[get_column_letter(i)].width = ancho
+
+        header_font = Font(bold=True, color="FFFFFF")
+        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+        encabezado = []
+        for header in self.headers:
+            cell = WriteOnlyCell(ws, value=header)
+            cell.font = header_font
+            cell.fill = header_fill
+            encabezado.append(cell)
+        ws.append(encabezado)
+
+        for fila in muestra:
+            ws.append(fila)
+        for fila in filas:
+            ws.append(fila)
+
+        wb.save(destino)
+
+    def respuesta_xlsx(self, prefijo):
+        """XLSX generado en un archivo temporal y enviado por partes."""
+        archivo = tempfile.TemporaryFile()
+        self.escribir_xlsx(archivo)
+        archivo.seek(0)
+        return FileResponse(
+            archivo,
+            as_attachment=True,
+            filename=self.nombre_archivo(prefijo, 'xlsx'),
+            content_type=XLSX_CONTENT_TYPE,
+        )
@@ -4,43 +4,58 @@ Proporciona indicadores avanzados de gestión de inventario
 """
 
 from decimal import Decimal
-from django.db.models import Sum, Avg, Count, F, Q
+from django.db.models import Sum, Count, F, Q
 from django.utils import timezone
 from datetime import timedelta
-import statistics
+import numpy as np
 
-from gestion.models import (
-    Producto, VentaDetalle, Compra, ConfiguracionCostos, MateriaPrima
-)
+from gestion.models import Compra, ConfiguracionCostos, MateriaPrima, Producto, filtro_sin_ventas_desde
+from gestion.services.cost_matrix import CostMatrix
+from gestion.services.demand_matrix import DemandMatrix
 
 
 class InventarioService:
     """
     Servicio centralizado para análisis de inventario.
     Métricas predictivas: rotación, cobertura, valor, etc.
+
+    Las métricas por producto salen de una única DemandMatrix (ventas de los
+    últimos 60 días agrupadas por producto y día), así que el costo en queries
+    no depende de la cantidad de SKUs.
     """
     
+    # Días que cubre la matriz: 30 de demanda, el mes en curso y 60 de rotación lenta
+    DIAS_DEMANDA = 60
+    
     def __init__(self):
         self.hoy = timezone.now().date()
         self.inicio_mes = self.hoy.replace(day=1)
         self._config = None
+        self._demanda = None
+        self._valor_inventario = None
     
     @property
     def config(self):
         """Lazy loading de configuración"""
         if self._config is None:
-            self._config = ConfiguracionCostos.objects.first()
-            if self._config is None:
-                self._config = ConfiguracionCostos.objects.create()
+            self._config = ConfiguracionCostos.get_config()
         return self._config
     
+    @property
+    def demanda(self):
+        """Matriz productos × días compartida por todas las métricas (lazy)"""
+        if self._demanda is None:
+            self._demanda = DemandMatrix(hoy=self.hoy, dias=self.DIAS_DEMANDA, config=self.config)
+        return self._demanda
+    
     def get_kpis_inventario(self):
         """
         Obtiene los 4 KPIs principales de inventario.
         Optimizado con queries eficientes.
         
         Returns:
-            dict con: cobertura_dias, stock_critico, ultima_compra, valor_total
+            dict con: cobertura_dias, stock_critico, ultima_compra, valor_total,
+            rotacion y clasificacion (ABC/XYZ)
         """
         # Calcular cobertura
         cobertura = self._calcular_cobertura_dias()
@@ -52,7 +67,8 @@ class InventarioService:
             'stock_critico': self._contar_stock_critico(),
             'ultima_compra': self._dias_desde_ultima_compra(),
             'valor_total': self._calcular_valor_inventario(),
-            'rotacion': self._calcular_rotacion_inventario()
+            'rotacion': self._calcular_rotacion_inventario(),
+            'clasificacion': self.get_clasificacion_abc_xyz()
         }
     
     def _calcular_cobertura_dias(self):
@@ -67,31 +83,20 @@ class InventarioService:
         Returns:
             dict con días promedio, estado y detalle
         """
-        productos = Producto.objects.filter(stock__gt=0).select_related()
+        matriz = self.demanda
         
-        if not productos.exists():
+        if not (matriz.stock > 0).any():
             return {
                 'dias': 0,
                 'estado': 'sin_stock',
                 'mensaje': 'No hay productos en stock'
             }
         
-        coberturas = []
-        productos_criticos = 0
+        # Ventas diarias promedio del último mes; NaN sin stock o sin ventas
+        coberturas = matriz.cobertura(dias=30)
+        coberturas = coberturas[~np.isnan(coberturas)]
         
-        for producto in productos:
-            # Calcular ventas diarias promedio del último mes
-            ventas_diarias = self._calcular_ventas_diarias_promedio(producto)
-            
-            if ventas_diarias > 0:
-                cobertura = producto.stock / ventas_diarias
-                coberturas.append(cobertura)
-                
-                # Contar productos con poca cobertura (< objetivo)
-                if cobertura < self.config.cobertura_objetivo_dias:
-                    productos_criticos += 1
-        
-        if not coberturas:
+        if not coberturas.size:
             # Hay stock pero no hay ventas históricas
             return {
                 'dias': 999,  # Infinito prácticamente
@@ -99,8 +104,11 @@ class InventarioService:
                 'mensaje': 'Stock disponible sin historial de ventas'
             }
         
+        # Contar productos con poca cobertura (< objetivo)
+        productos_criticos = int((coberturas < self.config.cobertura_objetivo_dias).sum())
+        
         # Usar mediana (más robusta que promedio)
-        cobertura_promedio = statistics.median(coberturas)
+        cobertura_promedio = float(np.median(coberturas))
         objetivo = self.config.cobertura_objetivo_dias
         
         # Determinar estado
@@ -132,55 +140,47 @@ class InventarioService:
         
         Args:
             producto: Instancia de Producto
-            dias: Días hacia atrás para el cálculo (default 30)
+            dias: Días hacia atrás para el cálculo (default 30, máximo DIAS_DEMANDA)
         
         Returns:
             float con unidades vendidas por día
         """
-        desde = self.hoy - timedelta(days=dias)
-        
-        total_vendido = VentaDetalle.objects.filter(
-            producto=producto,
-            venta__fecha__date__gte=desde,
-            venta__fecha__date__lte=self.hoy,
-            venta__eliminada=False
-        ).aggregate(total=Sum('cantidad'))['total'] or 0
-        
-        # Dividir por días reales del período
-        return float(total_vendido) / dias if dias > 0 else 0
+        posicion = self.demanda.posicion(producto.pk)
+        if posicion is None or dias <= 0:
+            return 0
+        return float(self.demanda.demanda_diaria(dias)[posicion])
     
     def _contar_stock_critico(self):
         """
         Cuenta MATERIAS PRIMAS con stock crítico (≤ stock_minimo).
+        Los contadores salen de un único GROUP BY sobre la columna estado_stock.
         
         Returns:
             dict con cantidad, porcentaje, lista de materias primas y estado
         """
-        from gestion.models import MateriaPrima
+        from gestion.models import MateriaPrima, resumen_estados_stock
         
-        # Total de materias primas activas
-        total_mps = MateriaPrima.objects.filter(activo=True).count()
+        activas = MateriaPrima.objects.filter(activo=True)
+        conteo = resumen_estados_stock(activas)
+        total_mps = conteo['total']
         
         # Críticos = stock actual <= stock mínimo (incluye agotados)
-        criticos = MateriaPrima.objects.filter(
-            activo=True,
-            stock_actual__lte=F('stock_minimo')
-        ).select_related()
-        
-        cantidad = criticos.count()
+        agotados = conteo['agotado']
+        solo_bajos = conteo['critico']
+        cantidad = agotados + solo_bajos
         
         # Calcular porcentaje
         porcentaje = (cantidad / total_mps * 100) if total_mps > 0 else 0
         
-        # Contar agotados vs solo bajos
-        agotados = criticos.filter(stock_actual=0).count()
-        solo_bajos = cantidad - agotados
+        criticos = activas.filter(estado_stock__in=['agotado', 'critico']) if cantidad else activas.none()
         
         return {
             'cantidad': cantidad,
             'porcentaje': round(porcentaje, 1),
             'agotados': agotados,
             'solo_bajos': solo_bajos,
+            'total': total_mps,
+            'con_stock': total_mps - agotados,
             'productos': list(criticos[:5]),  # Top 5 para mostrar
             'estado': 'critico' if agotados > 0 else ('warning' if solo_bajos > 0 else 'normal')
         }
@@ -247,23 +247,20 @@ class InventarioService:
         Returns:
             dict con valor total, cantidad de materias primas y desglose
         """
-        # Calcular valor de MATERIAS PRIMAS (no productos elaborados)
-        materias_primas = MateriaPrima.objects.filter(activo=True, stock_actual__gt=0)
-        
-        valor_total = Decimal('0')
-        cantidad_items = 0
-        
-        for mp in materias_primas:
-            try:
-                # Valor = stock_actual * costo_unitario
-                if mp.costo_unitario:
-                    valor_mp = Decimal(str(mp.stock_actual)) * Decimal(str(mp.costo_unitario))
-                    valor_total += valor_mp
-                    cantidad_items += 1
-            except Exception:
-                continue
+        if self._valor_inventario is not None:
+            return self._valor_inventario
+        
+        # Valor de MATERIAS PRIMAS (no productos elaborados) en un solo agregado
+        totales = MateriaPrima.objects.filter(
+            activo=True, stock_actual__gt=0
+        ).exclude(costo_unitario=0).aggregate(
+            valor=Sum(F('stock_actual') * F('costo_unitario')),
+            items=Count('id', filter=Q(costo_unitario__isnull=False)),
+        )
+        valor_total = Decimal(str(totales['valor'] or 0))
+        cantidad_items = totales['items']
         
-        return {
+        self._valor_inventario = {
             'valor': float(valor_total.quantize(Decimal('0.01'))),
             'total': float(valor_total.quantize(Decimal('0.01'))),  # Alias para compatibilidad
             'productos': cantidad_items,  # "productos" es el label en template
@@ -272,6 +269,7 @@ class InventarioService:
                 (valor_total / cantidad_items).quantize(Decimal('0.01'))
             ) if cantidad_items > 0 else 0
         }
+        return self._valor_inventario
     
     def _calcular_rotacion_inventario(self):
         """
@@ -288,19 +286,8 @@ class InventarioService:
         # Valor de inventario actual
         inventario_actual = self._calcular_valor_inventario()['total']
         
-        # Costo de productos vendidos este mes
-        productos_vendidos = VentaDetalle.objects.filter(
-            venta__fecha__date__gte=self.inicio_mes,
-            venta__eliminada=False
-        ).select_related('producto')
-        
-        costo_vendido = Decimal('0')
-        for detalle in productos_vendidos:
-            try:
-                costo = detalle.producto.calcular_costo_unitario()
-                costo_vendido += costo * detalle.cantidad
-            except Exception:
-                continue
+        # Costo de productos vendidos este mes (costo congelado en cada línea de venta)
+        costo_vendido = self.demanda.costo_vendido(self.inicio_mes)
         
         # Calcular rotación (simplificado: inventario actual como promedio)
         # TODO: Mejorar usando inventario inicial + final / 2
@@ -328,18 +315,10 @@ class InventarioService:
         # Identificar productos con rotación lenta
         productos_rotacion_lenta = []
         if rotacion < objetivo:
-            # Productos con ventas muy bajas en el mes
-            productos = Producto.objects.filter(stock__gt=0).annotate(
-                ventas_mes=Sum(
-                    'ventadetalle__cantidad',
-                    filter=Q(
-                        ventadetalle__venta__fecha__date__gte=self.inicio_mes,
-                        ventadetalle__venta__eliminada=False
-                    )
-                )
-            )
+            # Productos con stock y sin ventas en el mes
+            productos = list(self.demanda.productos.values())
             productos_rotacion_lenta = [
-                p for p in productos if (p.ventas_mes or 0) == 0
+                productos[i] for i in self.demanda.sin_movimiento(self.inicio_mes)
             ]
         
         return {
@@ -376,44 +355,59 @@ class InventarioService:
         
         return sparkline
     
-    def get_productos_rotacion_lenta(self, limit=10):
+    def get_productos_rotacion_lenta(self, limit=10, dias_sin_venta=60):
         """
         Identifica productos con rotación lenta (poco vendidos).
         Útil para identificar stock muerto.
         
         Args:
             limit: Número máximo de productos a retornar
+            dias_sin_venta: Días sin ventas para considerar rotación lenta
         
         Returns:
-            list de productos con baja rotación
+            list de productos con baja rotación, los de venta más antigua primero
         """
-        hace_60_dias = self.hoy - timedelta(days=60)
-        
-        # Productos con stock pero sin ventas en 60 días
-        productos = Producto.objects.filter(
-            stock__gt=0
-        ).annotate(
-            ventas_60d=Sum(
-                'ventadetalle__cantidad',
-                filter=Q(
-                    ventadetalle__venta__fecha__date__gte=hace_60_dias,
-                    ventadetalle__venta__eliminada=False
-                )
-            )
-        ).filter(
-            Q(ventas_60d__isnull=True) | Q(ventas_60d=0)
-        ).select_related()
+        ahora = timezone.now()
+        
+        # Productos con stock pero sin ventas en el período: rango sobre Producto.ultima_venta
+        productos = list(
+            Producto.objects.filter(
+                filtro_sin_ventas_desde(ahora - timedelta(days=dias_sin_venta)), stock__gt=0
+            ).order_by(F('ultima_venta').asc(nulls_first=True), 'id')[:limit]
+        )
+        # Si la matriz de demanda ya se cargó, sus costos sirven; si no, solo los de estos productos
+        costos = self._demanda.costos if self._demanda is not None else CostMatrix(productos=productos, config=self.config)
         
         resultado = []
-        for producto in productos[:limit]:
-            costo = producto.calcular_costo_unitario()
-            valor_inmovilizado = costo * producto.stock
+        for producto in productos:
+            valor_inmovilizado = costos.costo(producto.id) * producto.stock
             
             resultado.append({
                 'producto': producto,
                 'stock': producto.stock,
-                'dias_sin_venta': 60,  # Simplificado
+                'dias_sin_venta': (ahora.date() - producto.ultima_venta.date()).days if producto.ultima_venta else 999,
                 'valor_inmovilizado': float(valor_inmovilizado.quantize(Decimal('0.01')))
             })
         
         return resultado
+    
+    def get_clasificacion_abc_xyz(self):
+        """
+        Cruza la clase ABC (importe vendido) con la XYZ (variabilidad de la
+        demanda diaria) de los productos con ventas en la ventana de la matriz.
+        
+        Returns:
+            dict con la cantidad de productos por clase y por combinación (AX, BZ, ...)
+        """
+        matriz = self.demanda
+        vendidos = matriz.unidades.sum(axis=1) > 0
+        abc = matriz.clases_abc()[vendidos]
+        xyz = matriz.clases_xyz()[vendidos]
+        combinaciones, cantidades = np.unique(np.char.add(abc, xyz), return_counts=True)
+        
+        return {
+            'abc': {clase: int((abc == clase).sum()) for clase in 'ABC'},
+            'xyz': {clase: int((xyz == clase).sum()) for clase in 'XYZ'},
+            'matriz': dict(zip(combinaciones.tolist(), cantidades.tolist())),
+            'sin_ventas': int((~vendidos).sum()),
+        }
@@ -0,0 +1,157 @@
+"""
+Lotes Service - Asignación FIFO/FEFO de lotes de materia prima
+Consume los lotes en orden (primero los que vencen antes, luego los más
+antiguos) y devuelve el costo real de lo consumido, en lugar del costo
+promedio ponderado de la materia prima.
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from gestion.models import LoteMateriaPrima, MateriaPrima
+
+CENTAVO = Decimal('0.01')
+
+
+def _redondear(valor):
+    return Decimal(valor).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+
+
+class LoteAllocator:
+    """
+    Asignador de lotes para todos los caminos que consumen stock de
+    materias primas (producción, fraccionamiento, salidas y ajustes).
+
+    Cada llamada a `consumir` hace, sin importar cuántas materias primas
+    ni cuántos lotes intervengan:
+    1. Un SELECT de los lotes con saldo (índice lote_mp_disponible_idx)
+    2. Un UPDATE masivo de los lotes tocados (bulk_update)
+    3. Solo si faltan lotes: un SELECT del costo promedio de respaldo
+
+    Si los lotes no alcanzan (stock cargado antes de que existieran los
+    lotes, ajustes viejos, etc.) el remanente se valoriza al costo
+    unitario promedio de la materia prima y se informa como `sin_lote`.
+    """
+
+    # FEFO primero (lotes con vencimiento), luego FIFO por fecha de entrada
+    ORDEN = (F('fecha_vencimiento').asc(nulls_last=True), 'fecha_entrada', 'id')
+
+    def __init__(self, fecha=None):
+        self.fecha = fecha or timezone.localdate()
+
+    def consumir(self, requerimientos, costos_respaldo=None):
+        """
+        Descuenta de los lotes las cantidades pedidas.
+
+        Args:
+            requerimientos: dict {materia_prima_id: cantidad}
+            costos_respaldo: dict opcional {materia_prima_id: costo_unitario}
+                             para valorizar lo que no cubren los lotes
+
+        Returns:
+            dict {materia_prima_id: {
+                'cantidad': Decimal, 'costo': Decimal, 'sin_lote': Decimal,
+                'lotes': [(lote_id, cantidad, precio_unitario), ...]
+            }}
+        """
+        pendientes = {}
+        for materia_id, cantidad in requerimientos.items():
+            cantidad = _redondear(cantidad)
+            if cantidad > 0:
+                pendientes[materia_id] = pendientes.get(materia_id, Decimal('0')) + cantidad
+
+        asignaciones = {
+            materia_id: {'cantidad': cantidad, 'costo': Decimal('0'), 'sin_lote': Decimal('0'), 'lotes': []}
+            for materia_id, cantidad in pendientes.items()
+        }
+        if not pendientes:
+            return asignaciones
+
+        with transaction.atomic():
+            lotes = (
+                LoteMateriaPrima.objects
+                .select_for_update()
+                .filter(materia_prima_id__in=list(pendientes), cantidad_disponible__gt=0)
+                .order_by('materia_prima_id', *self.ORDEN)
+                .only('id', 'materia_prima_id', 'cantidad_disponible', 'precio_unitario', 'fecha_consumo')
+            )
+            modificados = []
+            for lote in lotes:
+                restante = pendientes[lote.materia_prima_id]
+                if restante <= 0:
+                    continue
+                tomado = min(lote.cantidad_disponible, restante)
+                lote.cantidad_disponible -= tomado
+                if lote.cantidad_disponible <= 0:
+                    lote.fecha_consumo = self.fecha
+                pendientes[lote.materia_prima_id] = restante - tomado
+                modificados.append(lote)
+
+                asignacion = asignaciones[lote.materia_prima_id]
+                asignacion['costo'] += tomado * lote.precio_unitario
+                asignacion['lotes'].append((lote.id, tomado, lote.precio_unitario))
+
+            if modificados:
+                LoteMateriaPrima.objects.bulk_update(modificados, ['cantidad_disponible', 'fecha_consumo'])
+
+        faltantes = {materia_id: resto for materia_id, resto in pendientes.items() if resto > 0}
+        if faltantes:
+            costos = dict(costos_respaldo or {})
+            sin_costo = [materia_id for materia_id in faltantes if materia_id not in costos]
+            if sin_costo:
+                costos.update(
+                    MateriaPrima.objects.filter(id__in=sin_costo).values_list('id', 'costo_unitario')
+                )
+            for materia_id, resto in faltantes.items():
+                asignaciones[materia_id]['sin_lote'] = resto
+                asignaciones[materia_id]['costo'] += resto * Decimal(str(costos.get(materia_id) or 0))
+
+        for asignacion in asignaciones.values():
+            asignacion['costo'] = _redondear(asignacion['costo'])
+        return asignaciones
+
+    def consumir_materia(self, materia_prima, cantidad):
+        """Atajo de `consumir` para una sola materia prima."""
+        asignaciones = self.consumir(
+            {materia_prima.id: cantidad},
+            costos_respaldo={materia_prima.id: materia_prima.costo_unitario}
+        )
+        return asignaciones.get(materia_prima.id) or {
+            'cantidad': Decimal('0'), 'costo': Decimal('0'), 'sin_lote': Decimal('0'), 'lotes': []
+        }
+
+    def registrar_entrada(self, materia_prima, cantidad, precio_unitario=None,
+                          fecha_vencimiento=None, observaciones=None):
+        """Crea un lote para una entrada que no viene de una compra (devolución, ajuste positivo)."""
+        cantidad = _redondear(cantidad)
+        if cantidad <= 0:
+            return None
+        if precio_unitario is None:
+            precio_unitario = materia_prima.costo_unitario
+        return LoteMateriaPrima.objects.create(
+            materia_prima=materia_prima,
+            cantidad=cantidad,
+            cantidad_disponible=cantidad,
+            precio_unitario=_redondear(precio_unitario),
+            fecha_entrada=self.fecha,
+            fecha_vencimiento=fecha_vencimiento,
+            observaciones=observaciones,
+        )
+
+    def ajustar(self, materia_prima, stock_anterior, stock_nuevo, motivo='Ajuste de inventario'):
+        """
+        Lleva los lotes al nuevo stock: una reducción consume lotes FIFO/FEFO
+        y un incremento crea un lote al costo promedio vigente.
+
+        Returns:
+            Costo de lo consumido (Decimal) o None si el ajuste fue positivo o nulo
+        """
+        diferencia = Decimal(str(stock_nuevo)) - Decimal(str(stock_anterior))
+        if diferencia < 0:
+            return self.consumir_materia(materia_prima, -diferencia)['costo']
+        if diferencia > 0:
+            self.registrar_entrada(materia_prima, diferencia, observaciones=motivo)
+        return None
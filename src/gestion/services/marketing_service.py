@@ -6,8 +6,10 @@ from decimal import Decimal
 from datetime import timedelta
 from django.db.models import Sum, Count, F, Q, Avg
 from django.utils import timezone
-from gestion.models import Producto, Venta, VentaDetalle
-from collections import defaultdict, Counter
+from gestion.models import (
+    CoocurrenciaProducto, Producto, Venta, VentaDetalle, expresion_costo_vendido, filtro_sin_ventas_desde,
+)
+from collections import defaultdict
 
 
 class MarketingService:
@@ -101,20 +103,20 @@ class MarketingService:
             'producto__stock'
         ).annotate(
             cantidad_vendida=Sum('cantidad'),
-            ingresos=Sum(F('cantidad') * F('precio_unitario'))
+            ingresos=Sum(F('cantidad') * F('precio_unitario')),
+            costo_vendido=Sum(expresion_costo_vendido())
         )
         
-        # Calcular margen de ganancia total
+        # Calcular margen de ganancia total con el costo congelado al vender
         hero_products = []
         for item in ventas_mes:
-            precio = Decimal(str(item['producto__precio']))
-            costo = Decimal(str(item['producto__costo_base'] or 0))
+            ingresos = item['ingresos'] or Decimal('0')
+            costo = item['costo_vendido'] or Decimal('0')
             cantidad = item['cantidad_vendida']
             
-            if precio > 0 and costo > 0:
-                margen_unitario = precio - costo
-                ganancia_total = margen_unitario * cantidad
-                margen_porcentaje = ((precio - costo) / precio) * 100
+            if ingresos > 0 and costo > 0:
+                ganancia_total = ingresos - costo
+                margen_porcentaje = (ganancia_total / ingresos) * 100
                 
                 hero_products.append({
                     'producto_id': item['producto__id'],
@@ -150,6 +152,9 @@ class MarketingService:
         Cross-Selling Inteligente
         Productos que suelen comprarse juntos
         
+        Lee la tabla CoocurrenciaProducto (una query por índice) en lugar de
+        recorrer las ventas.
+        
         Args:
             producto_id: ID del producto base (opcional)
             limit: Número de recomendaciones
@@ -158,41 +163,32 @@ class MarketingService:
             list de productos relacionados con % de coincidencia
         """
         if producto_id:
-            # Buscar ventas que incluyan este producto
-            ventas_con_producto = Venta.objects.filter(
-                detalles__producto_id=producto_id,
-                eliminada=False
-            ).values_list('id', flat=True)
-            
-            # Otros productos vendidos en las mismas ventas
-            productos_relacionados = VentaDetalle.objects.filter(
-                venta_id__in=ventas_con_producto
-            ).exclude(
-                producto_id=producto_id
-            ).values(
-                'producto__id',
-                'producto__nombre'
-            ).annotate(
-                coincidencias=Count('venta', distinct=True)
+            # La diagonal (X, X) cuenta las ventas con el producto base y
+            # ningún par puede superarla: es siempre la primera fila
+            filas = list(
+                CoocurrenciaProducto.objects.filter(producto_id=producto_id)
+                .select_related('relacionado')
+                .order_by('-ventas')[:limit + 1]
             )
-            
-            total_ventas_base = len(ventas_con_producto)
+            if not filas:
+                return []
+            total_ventas_base = filas[0].ventas
             
             relaciones = []
-            for item in productos_relacionados:
-                if total_ventas_base > 0:
-                    porcentaje_coincidencia = (item['coincidencias'] / total_ventas_base) * 100
-                    
-                    if porcentaje_coincidencia >= 30:  # Mínimo 30% coincidencia
-                        relaciones.append({
-                            'producto_id': item['producto__id'],
-                            'producto_nombre': item['producto__nombre'],
-                            'coincidencias': item['coincidencias'],
-                            'porcentaje': float(porcentaje_coincidencia),
-                            'emoji': '⭐' if porcentaje_coincidencia >= 70 else '📦'
-                        })
+            for fila in filas:
+                if fila.relacionado_id == int(producto_id):
+                    continue
+                porcentaje_coincidencia = (fila.ventas / total_ventas_base) * 100
+                
+                if porcentaje_coincidencia >= 30:  # Mínimo 30% coincidencia
+                    relaciones.append({
+                        'producto_id': fila.relacionado_id,
+                        'producto_nombre': fila.relacionado.nombre,
+                        'coincidencias': fila.ventas,
+                        'porcentaje': float(porcentaje_coincidencia),
+                        'emoji': '⭐' if porcentaje_coincidencia >= 70 else '📦'
+                    })
             
-            relaciones.sort(key=lambda x: x['porcentaje'], reverse=True)
             return relaciones[:limit]
         
         else:
@@ -202,33 +198,25 @@ class MarketingService:
     def _get_pares_frecuentes(self, limit=5):
         """
         Encuentra los pares de productos que más se venden juntos
+        (una lectura del índice por cantidad de ventas en común)
         """
-        # Obtener todas las ventas con múltiples items
-        ventas = Venta.objects.filter(eliminada=False).prefetch_related('detalles')
-        
-        pares_contador = Counter()
-        
-        for venta in ventas:
-            productos_en_venta = list(venta.detalles.values_list('producto__id', 'producto__nombre'))
-            
-            # Generar todos los pares posibles
-            if len(productos_en_venta) >= 2:
-                for i, (id1, nombre1) in enumerate(productos_en_venta):
-                    for id2, nombre2 in productos_en_venta[i+1:]:
-                        # Ordenar para evitar duplicados (A,B) y (B,A)
-                        par = tuple(sorted([(id1, nombre1), (id2, nombre2)], key=lambda x: x[0]))
-                        pares_contador[par] += 1
+        # Cada par está guardado en las dos direcciones: tomar solo A < B
+        pares = (
+            CoocurrenciaProducto.objects
+            .filter(producto_id__lt=F('relacionado_id'))
+            .select_related('producto', 'relacionado')
+            .order_by('-ventas')[:limit]
+        )
         
-        # Convertir a lista ordenada
         pares_frecuentes = []
-        for par, frecuencia in pares_contador.most_common(limit):
-            (id1, nombre1), (id2, nombre2) = par
+        for par in pares:
+            nombre1, nombre2 = par.producto.nombre, par.relacionado.nombre
             pares_frecuentes.append({
-                'producto1_id': id1,
+                'producto1_id': par.producto_id,
                 'producto1_nombre': nombre1,
-                'producto2_id': id2,
+                'producto2_id': par.relacionado_id,
                 'producto2_nombre': nombre2,
-                'frecuencia': frecuencia,
+                'frecuencia': par.ventas,
                 'recomendacion': f'Combo: {nombre1} + {nombre2}'
             })
         
@@ -245,33 +233,30 @@ class MarketingService:
         Returns:
             list de productos con baja rotación
         """
-        fecha_limite = timezone.now() - timedelta(days=dias_sin_venta)
+        ahora = timezone.now()
+        fecha_limite = ahora - timedelta(days=dias_sin_venta)
         
-        # Productos con stock
-        productos_con_stock = Producto.objects.filter(stock__gt=0)
+        # Productos con stock y sin ventas desde la fecha límite: un rango sobre
+        # Producto.ultima_venta, con receta y materia prima para el costo real
+        productos_sin_rotacion = Producto.objects.filter(
+            filtro_sin_ventas_desde(fecha_limite), stock__gt=0
+        ).select_related('receta', 'materia_prima_asociada')
         
         baja_rotacion = []
-        for producto in productos_con_stock:
-            # Última venta del producto
-            ultima_venta = VentaDetalle.objects.filter(
-                producto=producto,
-                venta__eliminada=False
-            ).order_by('-venta__fecha').first()
+        for producto in productos_sin_rotacion:
+            dias_sin_venta_real = (ahora.date() - producto.ultima_venta.date()).days if producto.ultima_venta else 999
+            costo_real = producto.calcular_costo_real()
+            capital_inmovilizado = costo_real * producto.stock
             
-            if not ultima_venta or ultima_venta.venta.fecha < fecha_limite:
-                dias_sin_venta_real = (timezone.now().date() - ultima_venta.venta.fecha.date()).days if ultima_venta else 999
-                costo_real = producto.calcular_costo_real()
-                capital_inmovilizado = costo_real * producto.stock
-                
-                baja_rotacion.append({
-                    'producto_id': producto.id,
-                    'producto_nombre': producto.nombre,
-                    'stock': producto.stock,
-                    'dias_sin_venta': dias_sin_venta_real,
-                    'capital_inmovilizado': float(capital_inmovilizado),
-                    'descuento_sugerido': 25 if dias_sin_venta_real > 90 else 15,
-                    'emoji': '💤' if dias_sin_venta_real > 90 else '📦'
-                })
+            baja_rotacion.append({
+                'producto_id': producto.id,
+                'producto_nombre': producto.nombre,
+                'stock': producto.stock,
+                'dias_sin_venta': dias_sin_venta_real,
+                'capital_inmovilizado': float(capital_inmovilizado),
+                'descuento_sugerido': 25 if dias_sin_venta_real > 90 else 15,
+                'emoji': '💤' if dias_sin_venta_real > 90 else '📦'
+            })
         
         # Ordenar por capital inmovilizado (mayor impacto primero)
         baja_rotacion.sort(key=lambda x: x['capital_inmovilizado'], reverse=True)
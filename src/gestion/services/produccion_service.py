@@ -0,0 +1,311 @@
+"""
+Produccion Service - Órdenes de producción en bloque
+Produce muchos productos a la vez: explota todas las recetas, agrega la
+demanda por materia prima y descuenta el stock con un número constante
+de queries, sin importar cuántos productos ni ingredientes intervengan.
+"""
+
+from collections import OrderedDict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Case, CharField, DecimalField, F, IntegerField, Q, When
+from django.utils import timezone
+
+from gestion.escrituras import escritura_serializada
+from gestion.models import (
+    MateriaPrima, MovimientoMateriaPrima, Producto, RecetaMateriaPrima,
+    calcular_estado_stock, expresion_estado_stock,
+)
+from gestion.services.lotes_service import LoteAllocator
+
+CENTAVO = Decimal('0.01')
+
+
+def _redondear(valor):
+    return Decimal(valor).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+
+
+class MateriaPrimaInsuficienteError(ValueError):
+    """
+    Una o más materias primas no alcanzan para la orden. `faltantes` usa el
+    mismo formato que Producto.verificar_stock_materias_primas().
+    """
+
+    def __init__(self, faltantes):
+        self.faltantes = faltantes
+        super().__init__(
+            'Stock insuficiente de materias primas: ' + ', '.join(
+                f"{f['materia_prima']} (necesaria: {f['necesaria']} {f['unidad']}, disponible: {f['disponible']})"
+                for f in faltantes
+            )
+        )
+
+
+class OrdenProduccion:
+    """
+    Orden de producción de varios productos en una única transacción.
+
+    Queries por orden (independiente de productos e ingredientes):
+    1. SELECT de los productos que no se pasaron como instancia
+    2. SELECT de los ingredientes de todas las recetas involucradas
+    3. SELECT ... FOR UPDATE de las materias primas a descontar
+    4. LoteAllocator: SELECT + bulk UPDATE de lotes (+ costo de respaldo)
+    5. UPDATE condicional del stock de materias primas (CASE/WHEN con F())
+    6. INSERT masivo de los movimientos (bulk_create)
+    7. UPDATE del stock de los productos producidos (CASE/WHEN con F())
+
+    Uso:
+        orden = OrdenProduccion(usuario=request.user)
+        orden.agregar(pan_integral, 30)
+        orden.agregar(granola_id, 12)
+        resultado = orden.ejecutar()
+    """
+
+    def __init__(self, usuario=None):
+        self.usuario = usuario
+        # {producto_id: cantidad}, en el orden en que se agregaron
+        self.items = OrderedDict()
+        self._productos = {}
+
+    def agregar(self, producto, cantidad):
+        """
+        Agrega `cantidad` unidades de `producto` (instancia o id) a la orden.
+        Un producto repetido acumula su cantidad.
+        """
+        cantidad = Decimal(str(cantidad))
+        if cantidad <= 0:
+            raise ValueError('La cantidad a producir debe ser mayor a cero')
+        if isinstance(producto, Producto):
+            self._productos[producto.pk] = producto
+            producto_id = producto.pk
+        else:
+            producto_id = int(producto)
+        self.items[producto_id] = self.items.get(producto_id, Decimal('0')) + cantidad
+        return self
+
+    # ==================== EXPLOSIÓN DE RECETAS ====================
+
+    def _cargar_productos(self):
+        faltan = [pid for pid in self.items if pid not in self._productos]
+        if faltan:
+            self._productos.update(Producto.objects.in_bulk(faltan))
+        for pid in self.items:
+            if pid not in self._productos:
+                raise ValueError(f'Producto #{pid} no encontrado')
+        return self._productos
+
+    def consumos(self):
+        """
+        Lista de (producto, materia_prima_id, cantidad, tipo_movimiento) de
+        toda la orden, con las cantidades redondeadas a centavos.
+
+        Raises:
+            ValueError: si un producto de receta no tiene receta asignada
+        """
+        productos = self._cargar_productos()
+        receta_ids = set()
+        for pid in self.items:
+            producto = productos[pid]
+            if producto.tipo_producto == 'receta':
+                if not producto.receta_id:
+                    raise ValueError(f'{producto.nombre} no tiene receta asignada')
+                receta_ids.add(producto.receta_id)
+
+        ingredientes = {}
+        if receta_ids:
+            filas = RecetaMateriaPrima.objects.filter(receta_id__in=receta_ids).values_list(
+                'receta_id', 'materia_prima_id', 'cantidad'
+            ).order_by('id')
+            for receta_id, materia_id, cantidad in filas:
+                ingredientes.setdefault(receta_id, []).append((materia_id, cantidad))
+
+        consumos = []
+        for pid, cantidad in self.items.items():
+            producto = productos[pid]
+            if producto.tipo_producto == 'receta':
+                for materia_id, por_unidad in ingredientes.get(producto.receta_id, []):
+                    consumos.append((producto, materia_id, _redondear(por_unidad * cantidad), 'produccion'))
+            elif producto.tipo_producto in ['fraccionamiento', 'reventa'] and producto.materia_prima_asociada_id:
+                por_unidad = Decimal(str(producto.cantidad_fraccion or 1))
+                consumos.append((
+                    producto, producto.materia_prima_asociada_id,
+                    _redondear(por_unidad * cantidad), 'fraccionamiento',
+                ))
+        return [consumo for consumo in consumos if consumo[2] > 0]
+
+    @staticmethod
+    def requerimientos(consumos):
+        """Demanda agregada {materia_prima_id: cantidad} de una lista de consumos."""
+        demanda = OrderedDict()
+        for _, materia_id, cantidad, _ in consumos:
+            demanda[materia_id] = demanda.get(materia_id, Decimal('0')) + cantidad
+        return demanda
+
+    @staticmethod
+    def _faltantes(demanda, materias):
+        faltantes = []
+        for materia_id, necesaria in demanda.items():
+            materia = materias[materia_id]
+            if materia.stock_actual < necesaria:
+                faltantes.append({
+                    'materia_prima': materia.nombre,
+                    'necesaria': float(necesaria),
+                    'unidad': materia.get_unidad_medida_display(),
+                    'disponible': float(materia.stock_actual),
+                })
+        return faltantes
+
+    def verificar(self):
+        """Faltantes de materia prima de la orden, sin bloquear ni descontar ([] si alcanza)."""
+        demanda = self.requerimientos(self.consumos())
+        return self._faltantes(demanda, MateriaPrima.objects.in_bulk(list(demanda)))
+
+    # ==================== EJECUCIÓN ====================
+
+    @escritura_serializada
+    def ejecutar(self, sumar_stock=True):
+        """
+        Descuenta las materias primas de toda la orden y, si `sumar_stock`,
+        suma las unidades producidas al stock de cada producto.
+
+        Returns:
+            dict con 'costo_total' (Decimal, según lotes FIFO/FEFO),
+            'costos' ({producto_id: Decimal}) y 'movimientos' (lista creada)
+
+        Raises:
+            ValueError: orden vacía, producto inexistente o sin receta
+            MateriaPrimaInsuficienteError: si alguna materia prima no alcanza
+        """
+        if not self.items:
+            raise ValueError('La orden de producción no tiene productos')
+        if sumar_stock and any(cantidad != int(cantidad) for cantidad in self.items.values()):
+            raise ValueError('El stock de productos se produce en unidades enteras')
+
+        with transaction.atomic():
+            consumos = self.consumos()
+            demanda = self.requerimientos(consumos)
+
+            movimientos = []
+            costos = {pid: Decimal('0.00') for pid in self.items}
+            if demanda:
+                # 1️⃣ Bloquear y validar todas las materias primas en una sola lectura
+                materias = MateriaPrima.objects.select_for_update().in_bulk(list(demanda))
+                faltantes = self._faltantes(demanda, materias)
+                if faltantes:
+                    raise MateriaPrimaInsuficienteError(faltantes)
+
+                # 2️⃣ Consumir los lotes de toda la orden de una vez
+                asignaciones = LoteAllocator().consumir(
+                    demanda,
+                    costos_respaldo={mid: materias[mid].costo_unitario for mid in demanda},
+                )
+
+                # 3️⃣ Descontar el stock con un único UPDATE condicional
+                self._descontar_materias(demanda)
+
+                # 4️⃣ Movimientos por producto e ingrediente, con el costo de los lotes prorrateado
+                movimientos = self._movimientos(consumos, demanda, materias, asignaciones)
+                MovimientoMateriaPrima.objects.bulk_create(movimientos)
+                for (producto, _, _, _), movimiento in zip(consumos, movimientos):
+                    costos[producto.pk] += movimiento.costo_total
+
+            if sumar_stock:
+                self._sumar_stock_productos()
+
+        return {
+            'costo_total': sum(costos.values(), Decimal('0.00')),
+            'costos': costos,
+            'movimientos': movimientos,
+        }
+
+    def _descontar_materias(self, demanda):
+        """
+        Aplica todos los descuentos en un único UPDATE con F(). Igual que en
+        VentaPostingService, el WHERE exige stock suficiente por fila: si otro
+        proceso consumió entre la lectura y el UPDATE se aborta la orden.
+        """
+        condicion_stock = Q()
+        for materia_id, cantidad in demanda.items():
+            condicion_stock |= Q(pk=materia_id, stock_actual__gte=cantidad)
+
+        actualizadas = MateriaPrima.objects.filter(condicion_stock).update(
+            stock_actual=Case(
+                *[When(pk=mid, then=F('stock_actual') - cantidad) for mid, cantidad in demanda.items()],
+                default=F('stock_actual'),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            ),
+            estado_stock=Case(
+                *[When(pk=mid, then=expresion_estado_stock(F('stock_actual') - cantidad)) for mid, cantidad in demanda.items()],
+                default=F('estado_stock'),
+                output_field=CharField(),
+            ),
+            fecha_modificacion=timezone.now(),
+        )
+        if actualizadas != len(demanda):
+            raise ValueError(
+                'El stock de materias primas cambió mientras se producía. Intente nuevamente.'
+            )
+
+    def _movimientos(self, consumos, demanda, materias, asignaciones):
+        """
+        Un MovimientoMateriaPrima por consumo, con el stock anterior/nuevo
+        encadenado por materia prima. El costo de los lotes de cada materia
+        prima se reparte según la cantidad; el último consumo lleva el resto.
+        """
+        stock = {mid: materias[mid].stock_actual for mid in demanda}
+        costo_restante = {mid: asignaciones[mid]['costo'] for mid in demanda}
+        cantidad_restante = dict(demanda)
+
+        movimientos = []
+        for producto, materia_id, cantidad, tipo in consumos:
+            if cantidad == cantidad_restante[materia_id]:
+                costo = costo_restante[materia_id]
+            else:
+                costo = _redondear(asignaciones[materia_id]['costo'] * cantidad / demanda[materia_id])
+            costo_restante[materia_id] -= costo
+            cantidad_restante[materia_id] -= cantidad
+
+            anterior = stock[materia_id]
+            stock[materia_id] = anterior - cantidad
+            if tipo == 'produccion':
+                motivo = f'Producción de {self.items[producto.pk]} x {producto.nombre}'
+            else:
+                motivo = f'Producción/Fraccionamiento de {self.items[producto.pk]} x {producto.nombre}'
+            movimientos.append(MovimientoMateriaPrima(
+                materia_prima=materias[materia_id],
+                tipo_movimiento=tipo,
+                cantidad=cantidad,
+                cantidad_anterior=anterior,
+                cantidad_nueva=stock[materia_id],
+                motivo=motivo,
+                costo_total=costo,
+                usuario=self.usuario,
+            ))
+
+        # Reflejar el nuevo stock en las instancias ya cargadas
+        for materia_id, materia in materias.items():
+            materia.stock_actual = stock[materia_id]
+            materia.estado_stock = calcular_estado_stock(materia.stock_actual, materia.stock_minimo)
+        return movimientos
+
+    def _sumar_stock_productos(self):
+        """Suma lo producido al stock de todos los productos en un único UPDATE."""
+        unidades = {pid: int(cantidad) for pid, cantidad in self.items.items()}
+        Producto.objects.filter(pk__in=list(unidades)).update(
+            stock=Case(
+                *[When(pk=pid, then=F('stock') + cantidad) for pid, cantidad in unidades.items()],
+                default=F('stock'),
+                output_field=IntegerField(),
+            ),
+            estado_stock=Case(
+                *[When(pk=pid, then=expresion_estado_stock(F('stock') + cantidad)) for pid, cantidad in unidades.items()],
+                default=F('estado_stock'),
+                output_field=CharField(),
+            ),
+            fecha_modificacion=timezone.now(),
+        )
+        for pid, cantidad in unidades.items():
+            producto = self._productos[pid]
+            producto.stock += cantidad
+            producto.estado_stock = calcular_estado_stock(producto.stock, producto.stock_minimo)
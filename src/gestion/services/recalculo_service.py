@@ -0,0 +1,132 @@
+"""
+Recálculo Service - Cola de recálculo de costos diferido
+Drena RecalculoPendiente agrupando los cambios por materia prima y
+propagándolos con un único recorrido del grafo de costos.
+"""
+
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from gestion.models import MateriaPrima, RecalculoPendiente
+from gestion.services.cost_graph import CostGraph
+
+logger = logging.getLogger(__name__)
+
+
+class RecalculoService:
+    """
+    Worker de la cola RecalculoPendiente.
+
+    Varios cambios de precio de la misma materia prima (ej: una compra con
+    muchas líneas o varias compras seguidas) se resuelven con un solo
+    recálculo, porque CostGraph lee el costo vigente de la materia prima.
+    """
+
+    def __init__(self, lote=500):
+        self.lote = lote
+
+    def pendientes(self):
+        return RecalculoPendiente.objects.filter(
+            procesado=False,
+            intentos__lt=RecalculoPendiente.MAX_INTENTOS
+        )
+
+    def procesar(self):
+        """
+        Procesa un lote de la cola.
+
+        Returns:
+            dict con: eventos (filas consumidas), materias (recálculos
+            realizados tras agrupar) y productos (productos actualizados)
+        """
+        with transaction.atomic():
+            pendientes = self.pendientes()
+            if connection.features.has_select_for_update_skip_locked:
+                # Permite varios workers sin procesar dos veces el mismo evento
+                pendientes = pendientes.select_for_update(skip_locked=True)
+            eventos = list(pendientes.values_list('id', 'materia_prima_id')[:self.lote])
+            if not eventos:
+                return {'eventos': 0, 'materias': 0, 'productos': 0}
+
+            ids = [evento_id for evento_id, _ in eventos]
+            materias = MateriaPrima.objects.filter(
+                id__in={materia_id for _, materia_id in eventos}
+            )
+
+            try:
+                with transaction.atomic():
+                    productos = CostGraph(materias).propagar()
+            except Exception as e:
+                logger.exception('Error procesando recálculos pendientes')
+                RecalculoPendiente.objects.filter(id__in=ids).update(
+                    intentos=F('intentos') + 1, error=str(e)
+                )
+                return {'eventos': len(ids), 'materias': 0, 'productos': 0, 'error': str(e)}
+
+            RecalculoPendiente.objects.filter(id__in=ids).update(
+                procesado=True, fecha_procesado=timezone.now(), error=''
+            )
+
+        return {'eventos': len(ids), 'materias': len(materias), 'productos': len(productos)}
+
+    def procesar_todo(self):
+        """Drena la cola completa, lote por lote."""
+        totales = {'eventos': 0, 'materias': 0, 'productos': 0}
+        while True:
+            resultado = self.procesar()
+            if not resultado['eventos'] or 'error' in resultado:
+                return totales
+            for clave in totales:
+                totales[clave] += resultado[clave]
+
+
+# ==================== HILO INTERNO (OPCIONAL) ====================
+
+_worker = None
+
+
+def iniciar_worker(intervalo=None):
+    """
+    Inicia un hilo daemon que drena la cola cada `intervalo` segundos.
+    Pensado para despliegues de un solo proceso sin cron; con varios
+    procesos es preferible `manage.py procesar_recalculos --loop`.
+    """
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return _worker
+
+    intervalo = intervalo or getattr(settings, 'LINO_RECALCULO_INTERVALO', 30)
+    detener = threading.Event()
+
+    def _loop():
+        service = RecalculoService()
+        while not detener.wait(intervalo):
+            try:
+                service.procesar_todo()
+            except Exception:
+                logger.exception('Error en el hilo de recálculo de costos')
+            finally:
+                close_old_connections()
+
+    _worker = threading.Thread(target=_loop, name='lino-recalculo-costos', daemon=True)
+    _worker.detener = detener
+    _worker.start()
+    return _worker
+
+
+def iniciar_worker_si_configurado():
+    """
+    Inicia el hilo si LINO_RECALCULO_THREAD está activo. Lo llaman los entry
+    points wsgi.py / asgi.py: solo corre en los procesos que sirven requests
+    (workers de gunicorn, runserver) y nunca en migrate, shell ni en otros
+    management commands. Con `gunicorn --preload` el hilo quedaría en el
+    master y no en los workers: usar procesar_recalculos --loop.
+    """
+    if getattr(settings, 'LINO_RECALCULO_THREAD', False):
+        return iniciar_worker()
+    return None
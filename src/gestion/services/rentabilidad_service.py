@@ -11,6 +11,7 @@ from datetime import timedelta
 from gestion.models import (
     Producto, VentaDetalle, Venta, ConfiguracionCostos
 )
+from gestion.services.cost_matrix import CostMatrix
 
 
 class RentabilidadService:
@@ -23,71 +24,53 @@ class RentabilidadService:
         self.hoy = timezone.now().date()
         self.inicio_mes = self.hoy.replace(day=1)
         self._config = None  # Lazy loading de configuración
+        self._matriz = None  # Lazy loading de la matriz de costos
     
     @property
     def config(self):
         """Lazy loading de configuración (singleton pattern)"""
         if self._config is None:
-            self._config = ConfiguracionCostos.objects.first()
-            # Si no existe configuración, crear una con valores por defecto
-            if self._config is None:
-                self._config = ConfiguracionCostos.objects.create(
-                    margen_objetivo=Decimal('35.00'),
-                    rotacion_objetivo=Decimal('4.00'),
-                    cobertura_objetivo_dias=30
-                )
+            self._config = ConfiguracionCostos.get_config()
         return self._config
     
+    @property
+    def matriz(self):
+        """
+        Matriz de costos/márgenes/ventas del mes de todo el catálogo.
+        Se calcula una sola vez por instancia y la comparten todos los KPIs.
+        """
+        if self._matriz is None:
+            self._matriz = CostMatrix(desde=self.inicio_mes, config=self.config)
+        return self._matriz
+    
     def get_kpis_rentabilidad(self):
         """
         Obtiene los 4 KPIs principales de rentabilidad.
-        Optimizado para minimizar queries a la DB.
+        Usa la matriz de costos: cantidad de queries constante.
         
         Returns:
             dict con: objetivo_margen, rentables, en_perdida, margen_promedio
         """
-        # Query única para obtener todos los productos con sus datos
-        productos = Producto.objects.select_related().all()
-        
         total_productos = 0
         productos_rentables = 0
         productos_en_perdida = 0
         suma_margenes_ponderados = Decimal('0')
         suma_ventas_ponderacion = Decimal('0')
         
-        for producto in productos:
+        for fila in self.matriz:
             total_productos += 1
+            costo, precio, margen = fila['costo'], fila['precio'], fila['margen']
             
-            try:
-                costo = producto.calcular_costo_unitario()
-                precio = Decimal(str(producto.precio or 0))
-                
-                # Calcular margen
-                if precio > 0:
-                    margen = ((precio - costo) / precio) * 100
-                else:
-                    margen = Decimal('0')
-                
-                # Clasificar producto
-                if costo > precio:
-                    productos_en_perdida += 1
-                elif margen >= 20:  # Umbral rentable: 20%+
-                    productos_rentables += 1
-                
-                # Obtener ventas del mes para ponderar
-                ventas_mes = VentaDetalle.objects.filter(
-                    producto=producto,
-                    venta__fecha__date__gte=self.inicio_mes,
-                    venta__eliminada=False
-                ).aggregate(total=Sum('subtotal'))['total'] or Decimal('0')
-                
-                # Ponderación por ventas
-                suma_margenes_ponderados += margen * ventas_mes
-                suma_ventas_ponderacion += ventas_mes
-                
-            except Exception:
-                # Si hay error calculando un producto, continuar
-                continue
+            # Clasificar producto
+            if costo > precio:
+                productos_en_perdida += 1
+            elif margen >= 20:  # Umbral rentable: 20%+
+                productos_rentables += 1
+            
+            # Ponderación por ventas del mes
+            ventas_mes = fila['total_vendido']
+            suma_margenes_ponderados += margen * ventas_mes
+            suma_ventas_ponderacion += ventas_mes
         
         # Calcular porcentajes y margen promedio ponderado
         porcentaje_rentables = (
@@ -142,22 +125,13 @@ class RentabilidadService:
         kpis = self.get_kpis_rentabilidad()
         objetivo = kpis['objetivo_margen']
         
-        # Contar total de productos
-        productos = Producto.objects.all()
-        total_productos = productos.count()
+        total_productos = len(self.matriz)
         
         # Contar productos que cumplen objetivo
-        productos_cumpliendo = 0
-        for producto in productos:
-            try:
-                costo = producto.calcular_costo_unitario()
-                precio = Decimal(str(producto.precio or 0))
-                if precio > 0:
-                    margen = ((precio - costo) / precio) * 100
-                    if margen >= self.config.margen_objetivo:
-                        productos_cumpliendo += 1
-            except Exception:
-                continue
+        productos_cumpliendo = sum(
+            1 for fila in self.matriz
+            if fila['precio'] > 0 and fila['margen'] >= self.config.margen_objetivo
+        )
         
         # Obtener productos con margen bajo (< 25%)
         productos_bajos = self._obtener_productos_margen_bajo(threshold=25)
@@ -189,33 +163,19 @@ class RentabilidadService:
         Returns:
             list de dict con datos del producto y recomendaciones
         """
-        productos = Producto.objects.all()
         productos_bajos = []
         
-        for producto in productos:
+        for fila in self.matriz:
             try:
-                costo = producto.calcular_costo_unitario()
-                precio = Decimal(str(producto.precio or 0))
+                producto = fila['producto']
+                costo, precio, margen = fila['costo'], fila['precio'], fila['margen']
                 
                 if precio == 0:
                     continue
                 
-                margen = ((precio - costo) / precio) * 100
-                
                 # Solo productos con margen bajo
                 if margen < threshold:
-                    # Ventas del mes para calcular impacto
-                    ventas_mes = VentaDetalle.objects.filter(
-                        producto=producto,
-                        venta__fecha__date__gte=self.inicio_mes,
-                        venta__eliminada=False
-                    ).aggregate(
-                        cantidad=Sum('cantidad'),
-                        total=Sum('subtotal')
-                    )
-                    
-                    cantidad_vendida = ventas_mes['cantidad'] or 0
-                    total_vendido = ventas_mes['total'] or Decimal('0')
+                    cantidad_vendida = fila['cantidad_vendida']
                     
                     # Calcular precio sugerido para margen objetivo
                     precio_sugerido = self._calcular_precio_sugerido(
@@ -365,43 +325,20 @@ class RentabilidadService:
             list: Lista de productos con: nombre, costo, precio_actual, margen,
                   en_perdida, cumple_objetivo, ventas_mes
         """
-        from decimal import Decimal
-        from django.db.models import Sum, Count
-        from django.utils import timezone
-        from datetime import timedelta
-        
         objetivo_margen = float(self.config.margen_objetivo)
-        productos = Producto.objects.all()
-        
-        # Calcular ventas del mes actual para cada producto
-        fecha_inicio_mes = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
         
         lista_productos = []
-        for producto in productos:
-            costo = producto.calcular_costo_unitario()
-            precio_actual = Decimal(str(producto.precio or 0))
-            
-            if precio_actual > 0:
-                margen = float(((precio_actual - costo) / precio_actual * 100))
-            else:
-                margen = 0.0
-            
-            # Calcular ventas del mes
-            ventas_mes = VentaDetalle.objects.filter(
-                producto=producto,
-                venta__fecha__gte=fecha_inicio_mes
-            ).aggregate(
-                total=Sum('cantidad')
-            )['total'] or 0
+        for fila in self.matriz:
+            margen = float(fila['margen'])
             
             lista_productos.append({
-                'nombre': producto.nombre,
-                'costo': float(costo),
-                'precio_actual': float(precio_actual),
+                'nombre': fila['producto'].nombre,
+                'costo': float(fila['costo']),
+                'precio_actual': float(fila['precio']),
                 'margen': margen,
                 'en_perdida': margen < 0,
                 'cumple_objetivo': margen >= objetivo_margen,
-                'ventas_mes': int(ventas_mes)
+                'ventas_mes': int(fila['cantidad_vendida'])
             })
         
         return lista_productos
@@ -0,0 +1,412 @@
+"""
+Reporte Jobs - Generación de reportes PDF / XLSX en segundo plano
+El request solo registra un ReporteJob; el archivo lo genera el pool de
+hilos del proceso web (LINO_REPORTES_THREAD, activo por defecto) o el worker
+`procesar_reportes --loop`, y la UI consulta el estado hasta que está listo
+para descargar.
+
+Los archivos quedan en LINO_REPORTES_DIR/<tipo>/<clave>.<formato>, donde la
+clave es un hash de tipo, formato, parámetros y la versión de los datos.
+Mientras los datos no cambien, pedir el mismo reporte devuelve el archivo
+ya generado sin volver a calcular nada.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Sum
+from django.utils import timezone
+
+from gestion.models import MateriaPrima, Producto, ProductoMateriaPrima, ReporteJob
+
+logger = logging.getLogger(__name__)
+
+
+# ==================== DATOS DE LOS REPORTES ====================
+
+def analisis_costos_produccion(categoria=None):
+    """
+    Costo de materias primas, margen y % de margen de cada producto con
+    receta, en un único SELECT agrupado (antes: una query por producto).
+    Ordenado por % de margen descendente.
+    """
+    costo_ingrediente = ExpressionWrapper(
+        F('recetas__cantidad_necesaria') * F('recetas__materia_prima__costo_unitario'),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+    productos = Producto.objects.filter(recetas__isnull=False)
+    if categoria:
+        productos = productos.filter(categoria=categoria)
+
+    analisis = []
+    for producto in productos.annotate(costo_materias=Sum(costo_ingrediente)).order_by():
+        precio = Decimal(str(producto.precio or 0))
+        costo_materias = producto.costo_materias or Decimal('0.00')
+        margen = precio - costo_materias
+        analisis.append({
+            'producto': producto,
+            'costo_materias': costo_materias,
+            'precio_venta': precio,
+            'margen_ganancia': margen,
+            'porcentaje_margen': (margen / precio * 100) if precio > 0 else 0,
+        })
+    analisis.sort(key=lambda x: x['porcentaje_margen'], reverse=True)
+    return analisis
+
+
+def _datos_stock_materias(parametros):
+    materias = MateriaPrima.objects.filter(activo=True).only(
+        'nombre', 'unidad_medida', 'stock_actual', 'stock_minimo'
+    ).order_by('nombre')
+    if parametros.get('solo_criticos'):
+        materias = materias.filter(stock_actual__lte=F('stock_minimo'))
+    filas = (
+        [
+            mp.nombre,
+            f"{mp.stock_actual} {mp.get_unidad_medida_display()}",
+            f"{mp.stock_minimo} {mp.get_unidad_medida_display()}",
+            'CRÍTICO' if mp.necesita_restock else 'Normal',
+        ]
+        for mp in materias.iterator(chunk_size=2000)
+    )
+    return ['Nombre', 'Stock Actual', 'Stock Mínimo', 'Estado'], filas
+
+
+def _datos_costos_produccion(parametros):
+    filas = (
+        [
+            fila['producto'].nombre,
+            f"${fila['costo_materias']:.2f}",
+            f"${fila['precio_venta']:.2f}",
+            f"${fila['margen_ganancia']:.2f}",
+            f"{fila['porcentaje_margen']:.1f}%",
+        ]
+        for fila in analisis_costos_produccion(parametros.get('categoria'))
+    )
+    return ['Producto', 'Costo Materias', 'Precio Venta', 'Margen', '% Margen'], filas
+
+
+# ==================== VERSIÓN DE LOS DATOS ====================
+
+def _firma_catalogo(modelo):
+    """Cantidad de filas y última modificación: cambia con cada alta, baja o edición."""
+    return modelo.objects.aggregate(filas=Count('id'), ultima=Max('fecha_modificacion'))
+
+
+def _version_stock_materias():
+    return [_firma_catalogo(MateriaPrima)]
+
+
+def _version_costos_produccion():
+    # ProductoMateriaPrima no tiene timestamps: la suma de cantidades
+    # detecta las ediciones de una receta existente
+    recetas = ProductoMateriaPrima.objects.aggregate(
+        filas=Count('id'), ultimo=Max('id'), cantidades=Sum('cantidad_necesaria')
+    )
+    return [_firma_catalogo(Producto), _firma_catalogo(MateriaPrima), recetas]
+
+
+REPORTES = {
+    'stock_materias': {
+        'titulo': 'Reporte de Stock - Materias Primas',
+        'datos': _datos_stock_materias,
+        'version': _version_stock_materias,
+        'parametros': ('solo_criticos',),
+    },
+    'costos_produccion': {
+        'titulo': 'Reporte de Costos de Producción',
+        'datos': _datos_costos_produccion,
+        'version': _version_costos_produccion,
+        'parametros': ('categoria',),
+    },
+}
+
+
+def version_datos(tipo):
+    """Hash de las firmas de las tablas que usa el reporte (unas pocas queries agregadas)."""
+    firmas = REPORTES[tipo]['version']()
+    return hashlib.sha1(json.dumps(firmas, default=str, sort_keys=True).encode()).hexdigest()
+
+
+def calcular_clave(tipo, formato, parametros, version):
+    crudo = json.dumps([tipo, formato, parametros, version], sort_keys=True)
+    return hashlib.sha256(crudo.encode()).hexdigest()
+
+
+# ==================== ARCHIVOS ====================
+
+def directorio():
+    return Path(getattr(settings, 'LINO_REPORTES_DIR', Path(settings.BASE_DIR) / 'reportes_generados'))
+
+
+def ruta_archivo(job):
+    return directorio() / job.archivo
+
+
+def _archivo_relativo(tipo, clave, formato):
+    return f'{tipo}/{clave}.{formato}'
+
+
+def _escribir_pdf(titulo, headers, filas, destino):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        spaceAfter=30,
+        alignment=1  # Centrado
+    )
+    # repeatRows: el encabezado se repite en cada página de tablas largas
+    table = Table([headers] + [list(fila) for fila in filas], repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 14),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+    doc = SimpleDocTemplate(destino, pagesize=A4)
+    doc.build([Paragraph(titulo, title_style), Spacer(1, 12), table])
+
+
+def generar_archivo(tipo, formato, parametros, destino):
+    """Genera el reporte en `destino` (escritura atómica: temporal + rename)."""
+    from gestion.services.export_service import ExportService
+
+    reporte = REPORTES[tipo]
+    headers, filas = reporte['datos'](parametros)
+    destino = Path(destino)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+
+    descriptor, temporal = tempfile.mkstemp(dir=destino.parent, suffix=f'.{formato}.tmp')
+    os.close(descriptor)
+    os.chmod(temporal, 0o644)  # mkstemp crea el archivo con 0600
+    try:
+        if formato == 'xlsx':
+            ExportService(headers, filas, titulo=reporte['titulo']).escribir_xlsx(temporal)
+        else:
+            _escribir_pdf(reporte['titulo'], headers, filas, temporal)
+        os.replace(temporal, destino)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+
+# ==================== SERVICIO ====================
+
+class ReporteJobService:
+    """
+    Alta y procesamiento de ReporteJob.
+
+    Uso:
+        job = ReporteJobService.solicitar('costos_produccion', 'xlsx', usuario=request.user)
+        ReporteJobService(hilos=4).procesar_pendientes()   # worker
+    """
+
+    MINUTOS_COLGADO = 30  # Un job 'procesando' más viejo que esto se reintenta
+
+    def __init__(self, hilos=1, lote=50):
+        self.hilos = max(int(hilos), 1)
+        self.lote = lote
+
+    @staticmethod
+    def normalizar_parametros(tipo, parametros):
+        """Solo los parámetros que acepta el reporte, sin vacíos (la clave no depende de extras)."""
+        parametros = parametros or {}
+        return {
+            nombre: parametros[nombre]
+            for nombre in REPORTES[tipo]['parametros']
+            if parametros.get(nombre) not in (None, '', False)
+        }
+
+    @classmethod
+    def solicitar(cls, tipo, formato='pdf', parametros=None, usuario=None):
+        """
+        Registra el pedido de un reporte y retorna su ReporteJob.
+
+        - Si hay un job con la misma clave en curso o completado (con su
+          archivo en disco), se reutiliza. Uno pendiente se vuelve a
+          encolar: el proceso que lo recibió pudo reiniciarse antes de
+          generarlo.
+        - Si el archivo existe pero no su job (ej: jobs purgados), el job
+          nuevo nace completado.
+        - Si no, se crea uno pendiente (y se envía al pool interno si está activo).
+
+        Raises:
+            ValueError: tipo o formato desconocido
+        """
+        if tipo not in REPORTES:
+            raise ValueError(f'Tipo de reporte desconocido: {tipo}')
+        if formato not in dict(ReporteJob.FORMATOS):
+            raise ValueError(f'Formato de reporte desconocido: {formato}')
+
+        parametros = cls.normalizar_parametros(tipo, parametros)
+        version = version_datos(tipo)
+        clave = calcular_clave(tipo, formato, parametros, version)
+
+        existente = ReporteJob.objects.filter(
+            clave=clave, estado__in=('pendiente', 'procesando', 'completado')
+        ).order_by('-fecha_creacion').first()
+        if existente is not None and (existente.estado != 'completado' or ruta_archivo(existente).exists()):
+            if existente.estado == 'pendiente':
+                encolar(existente)
+            return existente
+
+        job = ReporteJob(
+            tipo=tipo, formato=formato, parametros=parametros, clave=clave,
+            version_datos=version, archivo=_archivo_relativo(tipo, clave, formato),
+            usuario=usuario,
+        )
+        if ruta_archivo(job).exists():
+            job.estado = 'completado'
+            job.fecha_fin = timezone.now()
+            job.save()
+            return job
+
+        job.save()
+        encolar(job)
+        return job
+
+    def pendientes(self):
+        return ReporteJob.objects.filter(estado='pendiente', intentos__lt=ReporteJob.MAX_INTENTOS)
+
+    def liberar_colgados(self):
+        """Vuelve a pendiente los jobs de un worker que murió a mitad de camino."""
+        limite = timezone.now() - timedelta(minutes=self.MINUTOS_COLGADO)
+        return ReporteJob.objects.filter(estado='procesando', fecha_inicio__lt=limite).update(estado='pendiente')
+
+    def procesar(self, job_id):
+        """
+        Genera el archivo de un job pendiente. Retorna el job actualizado, o
+        None si otro worker ya lo tomó.
+        """
+        # Tomar el job con un UPDATE condicional: dos workers no lo procesan dos veces
+        tomado = ReporteJob.objects.filter(pk=job_id, estado='pendiente').update(
+            estado='procesando', fecha_inicio=timezone.now(), intentos=F('intentos') + 1
+        )
+        if not tomado:
+            return None
+        job = ReporteJob.objects.get(pk=job_id)
+
+        try:
+            # Los datos pueden haber cambiado desde el pedido: se genera con
+            # los actuales y se guarda bajo la clave de la versión actual
+            version = version_datos(job.tipo)
+            if version != job.version_datos:
+                job.version_datos = version
+                job.clave = calcular_clave(job.tipo, job.formato, job.parametros, version)
+                job.archivo = _archivo_relativo(job.tipo, job.clave, job.formato)
+            destino = ruta_archivo(job)
+            if not destino.exists():
+                inicio = time.perf_counter()
+                generar_archivo(job.tipo, job.formato, job.parametros, destino)
+                logger.info('Reporte %s (%s) generado en %.2fs', job.tipo, job.formato, time.perf_counter() - inicio)
+        except Exception as e:
+            logger.exception('Error generando el reporte %s', job.pk)
+            job.estado = 'error' if job.intentos >= ReporteJob.MAX_INTENTOS else 'pendiente'
+            job.error = str(e)
+            job.save(update_fields=['estado', 'error'])
+            return job
+
+        job.estado = 'completado'
+        job.error = ''
+        job.fecha_fin = timezone.now()
+        job.save(update_fields=['estado', 'error', 'fecha_fin', 'version_datos', 'clave', 'archivo'])
+        return job
+
+    def procesar_pendientes(self):
+        """
+        Procesa un lote de jobs pendientes, en paralelo si hilos > 1.
+
+        Returns:
+            dict con: jobs (tomados), completados y errores
+        """
+        self.liberar_colgados()
+        ids = list(self.pendientes().order_by('fecha_creacion').values_list('id', flat=True)[:self.lote])
+        if self.hilos == 1:
+            jobs = [self.procesar(job_id) for job_id in ids]
+        else:
+            with ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix='lino-reportes') as pool:
+                jobs = list(pool.map(_procesar_en_hilo, ids))
+
+        jobs = [job for job in jobs if job is not None]
+        return {
+            'jobs': len(jobs),
+            'completados': sum(1 for job in jobs if job.estado == 'completado'),
+            'errores': sum(1 for job in jobs if job.estado != 'completado'),
+        }
+
+    @staticmethod
+    def purgar(dias=7):
+        """Borra jobs terminados y archivos con más de `dias` días. Retorna (jobs, archivos)."""
+        limite = timezone.now() - timedelta(days=dias)
+        jobs, _ = ReporteJob.objects.filter(
+            estado__in=('completado', 'error'), fecha_creacion__lt=limite
+        ).delete()
+        archivos = 0
+        raiz = directorio()
+        if raiz.exists():
+            corte = limite.timestamp()
+            for archivo in raiz.glob('*/*'):
+                if archivo.is_file() and archivo.stat().st_mtime < corte:
+                    archivo.unlink()
+                    archivos += 1
+        return jobs, archivos
+
+
+# ==================== POOL DE HILOS INTERNO ====================
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _procesar_en_hilo(job_id):
+    close_old_connections()
+    try:
+        return ReporteJobService().procesar(job_id)
+    except Exception:
+        logger.exception('Error en el hilo de reportes')
+    finally:
+        close_old_connections()
+
+
+def pool():
+    """
+    ThreadPoolExecutor del proceso web (LINO_REPORTES_THREAD). Se crea con
+    el primer job encolado; con varios workers de gunicorn cada uno procesa
+    los jobs que recibió (procesar() los toma con un UPDATE condicional, así
+    que encolar dos veces el mismo job no lo genera dos veces).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'LINO_REPORTES_HILOS', 2),
+                thread_name_prefix='lino-reportes',
+            )
+        return _pool
+
+
+def encolar(job):
+    """Envía el job al pool interno al confirmar la transacción (si está activo)."""
+    if getattr(settings, 'LINO_REPORTES_THREAD', False):
+        transaction.on_commit(lambda: pool().submit(_procesar_en_hilo, job.pk))
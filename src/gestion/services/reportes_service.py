@@ -0,0 +1,194 @@
+"""
+Reportes Service - Reporte financiero del período
+Calcula ingresos, gastos, variaciones e inventario con un número fijo de
+agregaciones SQL: el período actual y el anterior salen de la misma query.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Sum, Count, Q, F, DecimalField, FloatField, ExpressionWrapper
+
+from gestion.models import Venta, Compra, CompraDetalle, Producto, MateriaPrima
+
+
+class ReportesService:
+    """
+    Reporte de un rango de fechas comparado contra el período anterior
+    de la misma duración.
+
+    Queries totales (independiente del volumen de ventas/compras):
+    1. Ventas: ingresos y cantidad (actual + anterior)
+    2. Compras legacy: precio_mayoreo (actual + anterior) y cantidad
+    3. Detalles de compras nuevas: cantidad × precio (actual + anterior)
+    4. Productos: total, críticos y valor de inventario
+    5. Materias primas: proveedores distintos
+    """
+
+    def __init__(self, fecha_desde, fecha_hasta):
+        self.fecha_desde = fecha_desde
+        self.fecha_hasta = fecha_hasta
+
+        # Período anterior de la misma duración
+        dias_periodo = (fecha_hasta - fecha_desde).days
+        self.fecha_desde_anterior = fecha_desde - timedelta(days=dias_periodo + 1)
+        self.fecha_hasta_anterior = fecha_desde - timedelta(days=1)
+
+    @staticmethod
+    def calcular_variacion(actual, anterior):
+        if anterior > 0:
+            return float(((actual - anterior) / anterior) * 100)
+        elif actual > 0:
+            return 100.0  # Crecimiento del 100% si no había datos anteriores
+        else:
+            return 0.0
+
+    # ==================== AGREGACIONES ====================
+
+    def _ventas(self):
+        actual = Q(fecha__date__range=[self.fecha_desde, self.fecha_hasta])
+        anterior = Q(fecha__date__range=[self.fecha_desde_anterior, self.fecha_hasta_anterior])
+        return Venta.objects.filter(
+            fecha__date__range=[self.fecha_desde_anterior, self.fecha_hasta]
+        ).aggregate(
+            ingresos=Sum('total', filter=actual),
+            ingresos_anterior=Sum('total', filter=anterior),
+            cantidad=Count('id', filter=actual),
+            cantidad_anterior=Count('id', filter=anterior),
+        )
+
+    def _gastos(self):
+        """
+        Gasto por compra: precio_mayoreo (compras legacy) o, si no lo tiene,
+        la suma de sus detalles.
+        """
+        actual = Q(fecha_compra__range=[self.fecha_desde, self.fecha_hasta])
+        anterior = Q(fecha_compra__range=[self.fecha_desde_anterior, self.fecha_hasta_anterior])
+        legacy = Q(precio_mayoreo__isnull=False) & ~Q(precio_mayoreo=0)
+
+        compras = Compra.objects.filter(
+            fecha_compra__range=[self.fecha_desde_anterior, self.fecha_hasta]
+        ).aggregate(
+            mayoreo=Sum('precio_mayoreo', filter=actual & legacy),
+            mayoreo_anterior=Sum('precio_mayoreo', filter=anterior & legacy),
+            cantidad=Count('id', filter=actual),
+        )
+
+        importe = ExpressionWrapper(
+            F('precio_unitario') * F('cantidad'),
+            output_field=DecimalField(max_digits=14, decimal_places=2)
+        )
+        detalles = CompraDetalle.objects.filter(
+            Q(compra__precio_mayoreo__isnull=True) | Q(compra__precio_mayoreo=0),
+            compra__fecha_compra__range=[self.fecha_desde_anterior, self.fecha_hasta],
+        ).aggregate(
+            detalle=Sum(importe, filter=Q(compra__fecha_compra__range=[self.fecha_desde, self.fecha_hasta])),
+            detalle_anterior=Sum(importe, filter=Q(
+                compra__fecha_compra__range=[self.fecha_desde_anterior, self.fecha_hasta_anterior]
+            )),
+        )
+
+        return {
+            'gastos': (compras['mayoreo'] or Decimal('0')) + (detalles['detalle'] or Decimal('0')),
+            'gastos_anterior': (
+                (compras['mayoreo_anterior'] or Decimal('0')) + (detalles['detalle_anterior'] or Decimal('0'))
+            ),
+            'total_compras': compras['cantidad'],
+        }
+
+    @staticmethod
+    def _inventario():
+        productos = Producto.objects.aggregate(
+            total=Count('id'),
+            criticos=Count('id', filter=Q(stock__lte=F('stock_minimo'))),
+            valor=Sum(ExpressionWrapper(F('precio') * F('stock'), output_field=FloatField())),
+        )
+        proveedores = MateriaPrima.objects.exclude(
+            proveedor__isnull=True
+        ).exclude(
+            proveedor=''
+        ).aggregate(total=Count('proveedor', distinct=True))['total']
+        return productos, proveedores
+
+    # ==================== REPORTE ====================
+
+    def get_reporte(self):
+        """
+        Métricas del período con variaciones vs período anterior.
+
+        Returns:
+            dict listo para el contexto del template de reportes
+        """
+        ventas = self._ventas()
+        gastos = self._gastos()
+        productos, proveedores_activos = self._inventario()
+
+        ingresos_totales = ventas['ingresos'] or Decimal('0')
+        ingresos_anterior = ventas['ingresos_anterior'] or Decimal('0')
+        total_ventas = ventas['cantidad']
+        total_ventas_anterior = ventas['cantidad_anterior']
+        gastos_totales = gastos['gastos']
+        gastos_anterior = gastos['gastos_anterior']
+
+        ganancia_neta = ingresos_totales - gastos_totales
+        ganancia_anterior = ingresos_anterior - gastos_anterior
+
+        ticket_promedio = float(ingresos_totales / total_ventas) if total_ventas > 0 else 0
+        ticket_promedio_anterior = (
+            float(ingresos_anterior / total_ventas_anterior) if total_ventas_anterior > 0 else 0
+        )
+
+        variacion_ingresos = self.calcular_variacion(ingresos_totales, ingresos_anterior)
+        productos_criticos = productos['criticos']
+
+        return {
+            # Período actual
+            'ingresos_totales': float(ingresos_totales),
+            'gastos_totales': float(gastos_totales),
+            'ganancia_neta': float(ganancia_neta),
+            'margen_porcentaje': float((ganancia_neta / ingresos_totales) * 100) if ingresos_totales > 0 else 0,
+            'roi': float((ganancia_neta / gastos_totales) * 100) if gastos_totales > 0 else 0,
+            'total_ventas': total_ventas,
+            'total_compras': gastos['total_compras'],
+            'ticket_promedio': ticket_promedio,
+
+            # Variaciones vs período anterior
+            'variacion_ingresos': variacion_ingresos,
+            'variacion_gastos': self.calcular_variacion(gastos_totales, gastos_anterior),
+            'variacion_ganancia': self.calcular_variacion(ganancia_neta, ganancia_anterior),
+            'variacion_ventas': self.calcular_variacion(total_ventas, total_ventas_anterior),
+            'variacion_ticket': self.calcular_variacion(ticket_promedio, ticket_promedio_anterior),
+
+            # Inventario y productos
+            'total_productos': productos['total'],
+            'productos_criticos': productos_criticos,
+            'valor_inventario': float(productos['valor'] or 0),
+            'proveedores_activos': proveedores_activos,
+
+            'alertas': self._generar_alertas(productos_criticos, ganancia_neta, variacion_ingresos),
+        }
+
+    @staticmethod
+    def _generar_alertas(productos_criticos, ganancia_neta, variacion_ingresos):
+        alertas = []
+        if productos_criticos > 0:
+            alertas.append({
+                'tipo': 'warning',
+                'titulo': 'Stock Crítico',
+                'descripcion': f'{productos_criticos} productos requieren reposición'
+            })
+
+        if ganancia_neta < 0:
+            alertas.append({
+                'tipo': 'danger',
+                'titulo': 'Pérdidas Detectadas',
+                'descripcion': 'La ganancia neta es negativa, revisa los costos'
+            })
+
+        if variacion_ingresos < -10:
+            alertas.append({
+                'tipo': 'warning',
+                'titulo': 'Caída en Ventas',
+                'descripcion': f'Los ingresos bajaron {abs(variacion_ingresos):.1f}% vs período anterior'
+            })
+        return alertas
@@ -0,0 +1,228 @@
+"""
+Venta Posting Service - Registro de ventas en bloque
+Procesa una canasta completa con un número constante de queries,
+sin importar cuántas líneas tenga.
+"""
+
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, When, F, Q, CharField, IntegerField
+from django.utils import timezone
+
+from gestion.escrituras import escritura_serializada
+from gestion.models import (
+    CoocurrenciaProducto, Producto, Venta, VentaDetalle, ResumenDiario,
+    calcular_estado_stock, expresion_estado_stock,
+)
+from gestion.services.cost_matrix import CostMatrix
+
+
+class StockInsuficienteError(ValueError):
+    """Una o más líneas de la venta superan el stock disponible."""
+
+    def __init__(self, producto, disponible, solicitado):
+        self.producto = producto
+        self.disponible = disponible
+        self.solicitado = solicitado
+        super().__init__(
+            f'Stock insuficiente para {producto.nombre}. '
+            f'Disponible: {disponible}, Solicitado: {solicitado}'
+        )
+
+
+class VentaPostingService:
+    """
+    Servicio para registrar ventas multi-línea de forma set-based.
+
+    Queries por venta (independiente de la cantidad de líneas):
+    1. SELECT ... FOR UPDATE de todos los productos de la canasta
+    2. Costos de la canasta con una CostMatrix acotada a sus productos
+       (materias primas asociadas, costo de recetas y productos origen)
+    3. INSERT de la venta, con el upsert de su total en el ResumenDiario del día
+    4. INSERT masivo de los detalles con el costo congelado (bulk_create)
+    5. UPDATE condicional del stock (CASE/WHEN), que también suma los
+       contadores de ventas de cada producto (última venta, 7/30 días, mes)
+    6. Upsert de las unidades en el ResumenDiario del día
+    7. INSERT + UPDATE de los pares de CoocurrenciaProducto
+    """
+
+    def __init__(self, usuario=None):
+        self.usuario = usuario
+
+    @staticmethod
+    def parsear_lineas_post(post_data):
+        """
+        Convierte el formato del formulario V3 (productos[i][campo]) en una
+        lista de líneas. Omite las líneas sin producto; las cantidades las
+        valida registrar_venta.
+        """
+        lineas = []
+        index = 0
+        while f'productos[{index}][producto_id]' in post_data:
+            producto_id = post_data.get(f'productos[{index}][producto_id]')
+            cantidad = Decimal(post_data.get(f'productos[{index}][cantidad]', '0') or '0')
+            precio = Decimal(post_data.get(f'productos[{index}][precio_unitario]', '0') or '0')
+            subtotal = Decimal(post_data.get(f'productos[{index}][subtotal]', '0') or '0')
+
+            if producto_id:
+                lineas.append({
+                    'producto_id': int(producto_id),
+                    'cantidad': cantidad,
+                    'precio_unitario': precio,
+                    'subtotal': subtotal,
+                })
+            index += 1
+        return lineas
+
+    @escritura_serializada
+    def registrar_venta(self, lineas, cliente=None, fecha=None):
+        """
+        Registra una venta completa en una única transacción (serializada y
+        reintentada ante locks de SQLite, ver gestion.escrituras).
+
+        Args:
+            lineas: lista de dicts con producto_id, cantidad, precio_unitario
+                    y subtotal (opcional, se calcula si falta o es 0)
+            cliente: Nombre del cliente (opcional)
+            fecha: Fecha de la venta (default: ahora)
+
+        Returns:
+            Venta creada (con `total` ya calculado en memoria)
+
+        Raises:
+            ValueError: si la canasta está vacía, una cantidad no es un entero
+                        positivo o un producto no existe
+            StockInsuficienteError: si alguna línea supera el stock
+        """
+        if not lineas:
+            raise ValueError('La venta debe tener al menos un producto')
+        for linea in lineas:
+            cantidad = Decimal(str(linea['cantidad']))
+            if cantidad <= 0 or cantidad != cantidad.to_integral_value():
+                raise ValueError(f'Los productos se venden en unidades enteras mayores a cero (cantidad: {cantidad})')
+
+        # Demanda total por producto (un producto puede repetirse en la canasta)
+        demanda = OrderedDict()
+        for linea in lineas:
+            pid = int(linea['producto_id'])
+            demanda[pid] = demanda.get(pid, 0) + int(linea['cantidad'])
+
+        with transaction.atomic():
+            # 1️⃣ Cargar y bloquear todos los productos en una sola query
+            productos = Producto.objects.select_for_update().in_bulk(list(demanda.keys()))
+
+            # 2️⃣ Validar stock en memoria
+            for pid, cantidad in demanda.items():
+                producto = productos.get(pid)
+                if producto is None:
+                    raise ValueError(f'Producto #{pid} no encontrado')
+                if producto.stock < cantidad:
+                    raise StockInsuficienteError(producto, producto.stock, cantidad)
+
+            # 3️⃣ Construir detalles y total sin volver a leer la DB, con el costo del momento
+            costos = self._costos_canasta(productos)
+            detalles = []
+            total = Decimal('0.00')
+            for linea in lineas:
+                cantidad = int(linea['cantidad'])
+                precio = Decimal(str(linea['precio_unitario']))
+                subtotal = Decimal(str(linea.get('subtotal') or 0)) or precio * cantidad
+                total += subtotal
+                detalles.append(VentaDetalle(
+                    producto=productos[int(linea['producto_id'])],
+                    cantidad=cantidad,
+                    precio_unitario=precio,
+                    subtotal=subtotal,
+                    costo_unitario=costos.costo(int(linea['producto_id'])).quantize(Decimal('0.01')),
+                    metodo_costo=productos[int(linea['producto_id'])].metodo_costo,
+                ))
+
+            venta = Venta.objects.create(
+                cliente=cliente,
+                fecha=self._normalizar_fecha(fecha),
+                total=total,
+                usuario=self.usuario,
+            )
+            for detalle in detalles:
+                detalle.venta = venta
+            VentaDetalle.objects.bulk_create(detalles)
+
+            # 4️⃣ Descontar stock y sumar los contadores de ventas con un único UPDATE condicional
+            lineas_contadores = Producto.lineas_contadores(
+                (detalle.producto_id, detalle.cantidad, detalle.subtotal) for detalle in detalles
+            )
+            self._descontar_stock(demanda, productos, venta, lineas_contadores)
+
+            # 5️⃣ Acumular las unidades en el resumen diario (total y cantidad los suma Venta.save)
+            ResumenDiario.acumular(venta.fecha, unidades_vendidas=sum(demanda.values()))
+
+            # 6️⃣ Sumar los pares de productos para cross-selling
+            CoocurrenciaProducto.acumular_venta(venta, producto_ids=demanda.keys())
+
+            return venta
+
+    @staticmethod
+    def _costos_canasta(productos):
+        """
+        CostMatrix de los productos de la canasta. Los productos origen de los
+        fraccionamientos se cargan juntos para no resolverlos uno por uno.
+        """
+        origenes = {
+            p.producto_origen_id for p in productos.values()
+            if p.producto_origen_id and p.producto_origen_id not in productos
+        }
+        catalogo = list(productos.values())
+        if origenes:
+            catalogo += list(Producto.objects.filter(pk__in=origenes))
+        return CostMatrix(productos=catalogo)
+
+    @staticmethod
+    def _normalizar_fecha(fecha):
+        """Acepta datetime, date o string del formulario y retorna un datetime aware."""
+        if not fecha:
+            return timezone.now()
+        fecha = Venta._meta.get_field('fecha').to_python(fecha)
+        if timezone.is_naive(fecha):
+            fecha = timezone.make_aware(fecha)
+        return fecha
+
+    def _descontar_stock(self, demanda, productos, venta, lineas_contadores):
+        """
+        Aplica todos los descuentos de stock en un único UPDATE, que también
+        suma la venta a los contadores de ventas de Producto.
+
+        El WHERE exige stock suficiente por producto: si otro proceso vendió
+        entre la validación y el UPDATE (ej: SQLite sin FOR UPDATE), la
+        cantidad de filas afectadas no coincide y se aborta la transacción.
+        """
+        condicion_stock = Q()
+        for pid, cantidad in demanda.items():
+            condicion_stock |= Q(pk=pid, stock__gte=cantidad)
+
+        actualizados = Producto.objects.filter(condicion_stock).update(
+            stock=Case(
+                *[When(pk=pid, then=F('stock') - cantidad) for pid, cantidad in demanda.items()],
+                default=F('stock'),
+                output_field=IntegerField(),
+            ),
+            # Se evalúa sobre el stock previo de la fila, igual que el CASE de stock
+            estado_stock=Case(
+                *[When(pk=pid, then=expresion_estado_stock(F('stock') - cantidad)) for pid, cantidad in demanda.items()],
+                default=F('estado_stock'),
+                output_field=CharField(),
+            ),
+            fecha_modificacion=timezone.now(),
+            **Producto.expresiones_contadores(venta.fecha, lineas_contadores),
+        )
+
+        if actualizados != len(demanda):
+            raise ValueError(
+                'El stock cambió mientras se registraba la venta. Intente nuevamente.'
+            )
+
+        # Reflejar el nuevo stock en las instancias ya cargadas
+        for pid, cantidad in demanda.items():
+            productos[pid].stock -= cantidad
+            productos[pid].estado_stock = calcular_estado_stock(productos[pid].stock, productos[pid].stock_minimo)
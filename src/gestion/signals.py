@@ -6,12 +6,21 @@ Manejo automático de inventario y costos:
 - Descuento automático de inventario al crear/reabastecer productos
 - Promedio ponderado en compras de materias primas
 - Actualización de ventas y stock al agregar/eliminar detalles
+- Invalidación del caché de ConfiguracionCostos
+- Mantenimiento del índice de búsqueda (gestion.search)
+- Contador de alertas no leídas por usuario (badge y stream SSE)
+- Costo persistido de las recetas (Receta.costo_cache)
 """
 
-from django.db.models.signals import pre_save, post_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from decimal import Decimal
-from .models import Producto, Compra, MateriaPrima, VentaDetalle
+from .models import (
+    Producto, Compra, MateriaPrima, Venta, VentaDetalle, ConfiguracionCostos, Alerta,
+    Receta, RecetaMateriaPrima,
+)
+from . import search
+from .services.alertas_tiempo_real import ContadorAlertas
 
 
 # ==================== SIGNALS PARA PRODUCTOS ====================
@@ -98,3 +107,86 @@ def actualizar_venta_al_eliminar_detalle(sender, instance, **kwargs):
     
     # Recalcular total de la venta
     instance.venta.calcular_total()
+
+
+# ==================== SIGNALS PARA CONFIGURACIÓN ====================
+
+@receiver(post_save, sender=ConfiguracionCostos)
+@receiver(post_delete, sender=ConfiguracionCostos)
+def invalidar_cache_configuracion(sender, instance, **kwargs):
+    """Renueva el sello de versión para que todos los procesos relean la configuración."""
+    ConfiguracionCostos.invalidar_cache()
+
+
+# ==================== SIGNALS PARA BÚSQUEDA ====================
+
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=MateriaPrima)
+@receiver(post_save, sender=Venta)
+@receiver(post_save, sender=Compra)
+def indexar_para_busqueda(sender, instance, created=False, update_fields=None, **kwargs):
+    """Upsert del documento de búsqueda (se omite si no cambió ningún campo indexado)."""
+    search.indexar(instance, update_fields=update_fields, creado=created)
+
+
+@receiver(post_delete, sender=Producto)
+@receiver(post_delete, sender=MateriaPrima)
+@receiver(post_delete, sender=Venta)
+@receiver(post_delete, sender=Compra)
+def desindexar_de_busqueda(sender, instance, **kwargs):
+    search.desindexar(instance)
+
+
+# ==================== SIGNALS PARA CONTADOR DE ALERTAS ====================
+
+@receiver(post_save, sender=Alerta)
+def actualizar_contador_alertas(sender, instance, created=False, **kwargs):
+    """
+    Ajusta el contador de no leídas del usuario con la diferencia entre el
+    estado cargado (Alerta.from_db) y el guardado. Sin estado previo
+    conocido, invalida el contador.
+    """
+    anterior = None if created else getattr(instance, '_estado_contador', None)
+    actual = instance.estado_contador()
+
+    if created and actual:
+        ContadorAlertas.sumar({actual[0]: int(actual[1])})
+    elif anterior and actual and anterior[0] == actual[0]:
+        if anterior[1] != actual[1]:
+            ContadorAlertas.sumar({actual[0]: int(actual[1]) - int(anterior[1])})
+    else:
+        ContadorAlertas.invalidar([instance.usuario_id, anterior[0] if anterior else None])
+    instance._estado_contador = actual
+
+
+@receiver(post_delete, sender=Alerta)
+def descontar_alerta_borrada(sender, instance, **kwargs):
+    estado = getattr(instance, '_estado_contador', None) or instance.estado_contador()
+    if estado is None:
+        ContadorAlertas.invalidar([instance.usuario_id])
+    elif estado[1]:
+        ContadorAlertas.sumar({estado[0]: -1})
+
+
+# ==================== SIGNALS PARA COSTO DE RECETAS ====================
+
+@receiver(post_save, sender=RecetaMateriaPrima)
+@receiver(post_delete, sender=RecetaMateriaPrima)
+def actualizar_costo_receta(sender, instance, **kwargs):
+    """Recalcula costo_cache de la receta del ingrediente (un UPDATE)."""
+    Receta.actualizar_costos(receta_ids=[instance.receta_id])
+
+
+@receiver(m2m_changed, sender=Receta.materias_primas.through)
+def actualizar_costo_receta_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    """Altas y bajas vía receta.materias_primas (add/remove/clear no disparan post_save)."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        Receta.actualizar_costos(receta_ids=[instance.pk])
+    elif pk_set:
+        # materia_prima.recetas_materia.add(...): pk_set son las recetas
+        Receta.actualizar_costos(receta_ids=pk_set)
+    else:
+        # clear() desde la materia prima no informa qué recetas la usaban
+        Receta.actualizar_costos()
@@ -22,6 +22,7 @@ urlpatterns = [
     path('ventas/<int:pk>/', views.detalle_venta, name='detalle_venta'),
     path('ventas/<int:pk>/eliminar/', views.eliminar_venta, name='eliminar_venta'),
     path('ventas/exportar/', views.exportar_ventas, name='exportar_ventas'),
+    path('ventas/exportar/detalle/', views.exportar_ventas_detalle, name='exportar_ventas_detalle'),
     path('api/productos/<int:pk>/precio/', views.producto_precio, name='producto_precio'),
     # REPORTES - Vista enterprise unificada
     path('reportes/', views.reportes_lino, name='reportes'),
@@ -30,6 +31,7 @@ urlpatterns = [
     # Demo de componentes - Solo para desarrollo
     path('demo/componentes/', views.demo_componentes, name='demo_componentes'),
     path('configuracion/', views.configuracion, name='configuracion'),
+    path('sistema/perf/', views.perf_sistema, name='perf_sistema'),
     # NUEVAS URLs - COMPRAS (Ahora principales)
     path('compras/', views.lista_compras, name='lista_compras'),
     path('compras/crear/', views.crear_compra_v3, name='crear_compra'),
@@ -55,6 +57,10 @@ urlpatterns = [
     # NUEVAS URLs - EXPORTACIÓN
     path('exportar/materias-primas/excel/', views.exportar_materias_primas_excel, name='exportar_materias_primas_excel'),
     path('exportar/reporte/<str:tipo_reporte>/pdf/', views.exportar_reporte_pdf, name='exportar_reporte_pdf'),
+    path('exportar/reporte/<str:tipo_reporte>/<str:formato>/', views.exportar_reporte_pdf, name='exportar_reporte'),
+    path('api/reportes/<str:tipo_reporte>/solicitar/', views.solicitar_reporte, name='solicitar_reporte'),
+    path('api/reportes/jobs/<uuid:job_id>/', views.estado_reporte, name='estado_reporte'),
+    path('reportes/jobs/<uuid:job_id>/descargar/', views.descargar_reporte, name='descargar_reporte'),
     # NUEVAS URLs - API
     path('api/verificar-stock/<int:producto_id>/', views.api_verificar_stock_producto, name='api_verificar_stock_producto'),
     path('api/receta/<int:pk>/costo/', views.api_costo_receta, name='api_costo_receta'),
@@ -62,6 +68,8 @@ urlpatterns = [
     path('api/productos/', views.api_productos, name='api_productos'),
     path('api/inventario/', views.api_inventario, name='api_inventario'), 
     path('api/ventas/', views.api_ventas, name='api_ventas'),
+    path('api/buscar/', views.api_buscar, name='api_buscar'),
+    path('api/listas/<str:nombre>/', views.api_lista, name='api_lista'),
     
     # NUEVAS URLs - CONTROL DE RENTABILIDAD Y ANALYTICS
     path('rentabilidad/', views.dashboard_rentabilidad, name='dashboard_rentabilidad'),
@@ -84,6 +92,7 @@ urlpatterns = [
     # API Endpoints
     path('api/alertas/count/', views.alertas_count_api, name='alertas_count'),
     path('api/alertas/no-leidas/', views.alertas_no_leidas_api, name='alertas_no_leidas'),
+    path('api/alertas/stream/', views.alertas_stream, name='alertas_stream'),
     path('api/alertas/<int:alerta_id>/marcar-leida/', views.marcar_alerta_leida, name='marcar_alerta_leida'),
     
     # UI Endpoints
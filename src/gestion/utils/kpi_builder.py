@@ -58,21 +58,21 @@ def prepare_product_kpis(productos_queryset):
     Returns:
         list: Lista de 4 KPIs formateados
     """
-    total = productos_queryset.count()
-    en_stock = productos_queryset.filter(stock__gt=0).count()
+    from gestion.models import resumen_estados_stock
+    
+    # Conteos y valor del inventario en un único GROUP BY estado_stock
+    conteo = resumen_estados_stock(productos_queryset, valor=F('stock') * F('precio'))
+    total = conteo['total']
+    en_stock = total - conteo['agotado']
     
     # Stock Bajo = productos con stock <= stock_minimo (incluye stock=0)
     # Esto cubre tanto productos agotados como productos con stock bajo
-    bajo_stock = productos_queryset.filter(
-        stock__lte=F('stock_minimo')
-    ).count()
+    bajo_stock = conteo['agotado'] + conteo['critico']
     
-    sin_stock = productos_queryset.filter(stock=0).count()
+    sin_stock = conteo['agotado']
     
     # Valor total del inventario
-    valor_total = productos_queryset.aggregate(
-        total=Sum(F('stock') * F('precio'))
-    )['total'] or Decimal('0')
+    valor_total = conteo['valor']
     
     return [
         build_kpi(
@@ -291,19 +291,17 @@ def prepare_compras_kpis(compras_queryset):
 
 
 def prepare_recetas_kpis(recetas_queryset):
-    """Prepara KPIs para la vista de recetas."""
-    from gestion.models import Receta
-    from decimal import Decimal
-    
-    total_recetas = recetas_queryset.count()
-    recetas_activas = recetas_queryset.filter(activa=True).count()
+    """Prepara KPIs para la vista de recetas (costos desde la columna costo_cache)."""
+    from django.db.models import Avg
     
-    # Costo promedio de recetas (calculado en Python porque costo_total es un método)
-    costo_promedio = Decimal('0')
-    if total_recetas > 0:
-        costos = [receta.costo_total() for receta in recetas_queryset]
-        total_costos = sum(costos) if costos else Decimal('0')
-        costo_promedio = total_costos / total_recetas if total_recetas > 0 else Decimal('0')
+    totales = recetas_queryset.order_by().aggregate(
+        total=Count('id'),
+        activas=Count('id', filter=Q(activa=True)),
+        costo_promedio=Avg('costo_cache'),
+    )
+    total_recetas = totales['total']
+    recetas_activas = totales['activas']
+    costo_promedio = totales['costo_promedio'] or Decimal('0')
     
     # Receta más usada (por productos que la usan)
     receta_destacada = recetas_queryset.annotate(
@@ -311,6 +309,49 @@ def prepare_recetas_kpis(recetas_queryset):
     ).order_by('-productos_count').first()
     
     receta_destacada_nombre = receta_destacada.nombre if receta_destacada else "N/A"
+    
+    return [
+        build_kpi(
+            icon='book',
+            badge='Recetas Registradas',
+            label='📖 Recetas',
+            value=total_recetas,
+            variant='primary',
+            trend_icon='collection',
+            trend_text='Total',
+            trend_variant='info'
+        ),
+        build_kpi(
+            icon='check-circle',
+            badge='Recetas Activas',
+            label='✅ Activas',
+            value=recetas_activas,
+            variant='success',
+            trend_icon='check',
+            trend_text=f'De {total_recetas}',
+            trend_variant='success'
+        ),
+        build_kpi(
+            icon='cash-stack',
+            badge='Costo Promedio',
+            label='💰 Costo',
+            value=f"${float(costo_promedio):,.0f}",
+            variant='warning',
+            trend_icon='calculator',
+            trend_text='Por receta',
+            trend_variant='warning'
+        ),
+        build_kpi(
+            icon='star',
+            badge='Más Usada',
+            label='⭐ Destacada',
+            value=receta_destacada_nombre,
+            variant='info',
+            trend_icon='box-seam',
+            trend_text=f'{receta_destacada.productos_count} productos' if receta_destacada else 'Sin productos',
+            trend_variant='info'
+        ),
+    ]
 
 
 def format_currency(value):
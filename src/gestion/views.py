@@ -1,6 +1,7 @@
 # ==================== IMPORTS PRINCIPALES ====================
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponse
 from decimal import Decimal
@@ -11,9 +12,9 @@ from django.views.decorators.http import require_GET, require_http_methods, requ
 from django.views.decorators.csrf import csrf_exempt
 from django.core.paginator import Paginator
 from decimal import Decimal
-from .models import Producto, Venta, Compra, MateriaPrima, ProductoMateriaPrima, MovimientoMateriaPrima, PerfilUsuario, VentaDetalle, LoteMateriaPrima, Receta, RecetaMateriaPrima, AjusteInventario
+from .models import Producto, Venta, Compra, MateriaPrima, ProductoMateriaPrima, MovimientoMateriaPrima, PerfilUsuario, VentaDetalle, LoteMateriaPrima, Receta, RecetaMateriaPrima, AjusteInventario, ESTADOS_STOCK, resumen_estados_stock
 from .forms import ProductoForm, VentaForm, VentaDetalleFormSet, CompraForm, MateriaPrimaForm, ProductoMateriaPrimaForm, MovimientoMateriaPrimaForm, VentaConMateriasForm, BusquedaMateriaPrimaForm, RecetaForm, AjusteProductoForm, AjusteMateriaPrimaForm
-from .resources import ProductoResource, VentaResource
+from .resources import ProductoResource, VentaResource, VentaDetalleResource
 from django.contrib.auth.models import User
 from django.db.models import Sum, Count, Q, F
 from django.utils import timezone
@@ -25,6 +26,10 @@ from django.conf import settings
 
 # ==================== IMPORTS PARA LOGGING ROBUSTO ====================
 from .logging_system import LinoLogger, log_business_operation, get_request_info
+from .perf import presupuesto, registro as perf_registro
+from .escrituras import ejecutar_escritura
+from . import search
+from .paginacion import paginar
 from .analytics import get_analytics_dashboard, AnalyticsRentabilidad
 import logging
 import traceback
@@ -126,7 +131,7 @@ def editar_receta(request, pk):
     
     # Obtener ingredientes actuales para mostrar en el formulario
     ingredientes_actuales = []
-    for ingrediente in receta.recetamateriaprima_set.all():
+    for ingrediente in receta.recetamateriaprima_set.select_related('materia_prima'):
         ingredientes_actuales.append({
             'materia_prima_id': ingrediente.materia_prima.id,
             'materia_prima_nombre': ingrediente.materia_prima.nombre,
@@ -189,22 +194,23 @@ def detalle_receta(request, pk):
     """Vista para ver el detalle de una receta."""
     receta = get_object_or_404(Receta, pk=pk)
     
-    # Calcular información adicional
-    total_ingredientes = receta.recetamateriaprima_set.count()
-    costo_total = receta.costo_total()
+    # Calcular información adicional (costo total desde la columna costo_cache)
+    costo_total = receta.costo_cache
     productos_usando = receta.productos.all()
     
-    # Obtener ingredientes con información detallada
+    # Obtener ingredientes con información detallada (una query con su materia prima)
     ingredientes = []
-    for ingrediente in receta.recetamateriaprima_set.all():
+    for ingrediente in receta.recetamateriaprima_set.select_related('materia_prima'):
+        costo_ingrediente = ingrediente.costo_ingrediente()
         ingredientes.append({
             'materia_prima': ingrediente.materia_prima,
             'cantidad': ingrediente.cantidad,
             'unidad': ingrediente.unidad,
             'costo_unitario': ingrediente.materia_prima.costo_unitario,
-            'costo_total': ingrediente.costo_ingrediente(),
-            'porcentaje_costo': (ingrediente.costo_ingrediente() / costo_total * 100) if costo_total > 0 else 0
+            'costo_total': costo_ingrediente,
+            'porcentaje_costo': (costo_ingrediente / costo_total * 100) if costo_total > 0 else 0
         })
+    total_ingredientes = len(ingredientes)
     
     # Preparar subtitle con estado e ingredientes
     estado_text = "Receta Activa" if receta.activa else "Receta Inactiva"
@@ -287,6 +293,27 @@ def configuracion(request):
     }
     return render(request, 'modules/configuracion/panel.html', context)
 
+@staff_member_required
+def perf_sistema(request):
+    """
+    Rendimiento por vista medido por PerfMiddleware (ventana móvil del proceso).
+    ?formato=json devuelve el mismo resumen que el volcado JSON.
+    """
+    vistas = perf_registro.resumen()
+    if request.GET.get('formato') == 'json':
+        return JsonResponse({'vistas': vistas}, json_dumps_params={'ensure_ascii': False})
+
+    context = {
+        'title': 'Rendimiento',
+        'subtitle': 'Queries, SQL, templates y latencia por vista',
+        'icon': 'speedometer2',
+        'vistas': vistas,
+        'con_excesos': sum(1 for v in vistas if v['excedidos']),
+        'con_n_mas_uno': sum(1 for v in vistas if v['n_mas_uno']),
+        'perf_activo': getattr(settings, 'LINO_PERF_ENABLE', True),
+    }
+    return render(request, 'modules/sistema/perf.html', context)
+
 # ==================== VISTA CREAR COMPRA MEJORADA ====================
 @login_required
 @ratelimit(key='user', rate=getattr(settings, 'RATELIMIT_COMPRAS', '20/h'), method='POST', block=True)
@@ -671,12 +698,8 @@ def dashboard_inteligente(request):
         # NOTA: Las alertas se generan manualmente via management command o panel admin
         # No se generan automáticamente para evitar duplicados en cada carga de página
         if request.user.is_authenticated:
-            from gestion.models import Alerta
-            alertas_no_leidas = Alerta.objects.filter(
-                usuario=request.user,
-                leida=False,
-                archivada=False
-            ).count()
+            from gestion.services.alertas_tiempo_real import ContadorAlertas
+            alertas_no_leidas = ContadorAlertas.obtener(request.user.id)
         else:
             alertas_no_leidas = 0
         
@@ -796,31 +819,30 @@ def dashboard_inteligente(request):
 def verificar_alertas_stock(request):
     """Función para verificar y mostrar alertas de stock usando stock_minimo personalizado"""
     try:
-        productos_agotados = Producto.objects.filter(stock=0)
-        productos_criticos = Producto.objects.filter(stock__gt=0, stock__lte=F('stock_minimo'))
-        productos_bajos = Producto.objects.filter(stock__gt=F('stock_minimo'), stock__lte=F('stock_minimo') * 2)
+        # Un único GROUP BY estado_stock para los tres contadores
+        conteo = resumen_estados_stock(Producto.objects.all())
 
         alertas = []
-        if productos_agotados.exists():
+        if conteo['agotado']:
             alertas.append({
                 'tipo': 'danger',
                 'titulo': 'Productos Agotados',
-                'mensaje': f'{productos_agotados.count()} producto(s) sin stock',
-                'productos': productos_agotados
+                'mensaje': f"{conteo['agotado']} producto(s) sin stock",
+                'productos': Producto.objects.filter(estado_stock='agotado')
             })
-        if productos_criticos.exists():
+        if conteo['critico']:
             alertas.append({
                 'tipo': 'warning',
                 'titulo': 'Stock Crítico',
-                'mensaje': f'{productos_criticos.count()} producto(s) con stock crítico',
-                'productos': productos_criticos
+                'mensaje': f"{conteo['critico']} producto(s) con stock crítico",
+                'productos': Producto.objects.filter(estado_stock='critico')
             })
-        if productos_bajos.exists():
+        if conteo['bajo']:
             alertas.append({
                 'tipo': 'info',
                 'titulo': 'Stock Bajo',
-                'mensaje': f'{productos_bajos.count()} producto(s) con stock bajo',
-                'productos': productos_bajos
+                'mensaje': f"{conteo['bajo']} producto(s) con stock bajo",
+                'productos': Producto.objects.filter(estado_stock='bajo')
             })
         return alertas
     except Exception as e:
@@ -828,6 +850,7 @@ def verificar_alertas_stock(request):
         return []
 
 @login_required
+@presupuesto(queries=15, ms=500)
 def lista_productos(request):
     """Vista mejorada de lista de productos con filtros y KPIs LINO V3."""
     from gestion.utils.kpi_builder import prepare_product_kpis
@@ -841,29 +864,16 @@ def lista_productos(request):
     
     # Aplicar filtros
     if query:
-        productos = productos.filter(
-            Q(nombre__icontains=query) | 
-            Q(descripcion__icontains=query) |
-            Q(marca__icontains=query)
-        )
+        productos = search.filtrar(productos, query)
     
     if categoria_seleccionada:
         productos = productos.filter(categoria=categoria_seleccionada)
     
-    if estado_stock:
-        if estado_stock == 'agotado':
-            productos = productos.filter(stock=0)
-        elif estado_stock == 'critico':
-            productos = productos.filter(stock__gt=0, stock__lte=F('stock_minimo'))
-        elif estado_stock == 'bajo':
-            productos = productos.filter(stock__gt=F('stock_minimo'), stock__lte=F('stock_minimo') * 2)
-        elif estado_stock == 'normal':
-            productos = productos.filter(stock__gt=F('stock_minimo') * 2)
+    if estado_stock in dict(ESTADOS_STOCK):
+        productos = productos.filter(estado_stock=estado_stock)
     
-    # Paginación
-    paginator = Paginator(productos.order_by('nombre'), 25)
-    page_number = request.GET.get('page', 1)
-    productos_paginados = paginator.get_page(page_number)
+    # Paginación por keyset (nombre, id)
+    productos_paginados = paginar(request, productos, orden=('nombre', 'id'))
     
     # Preparar KPIs usando utility
     kpis = prepare_product_kpis(Producto.objects.all())
@@ -915,17 +925,15 @@ def crear_producto(request):
                     # Si el producto usa receta, verificar materias primas y producir
                     if stock_inicial and stock_inicial > 0:
                         if producto.tipo_producto == 'receta' and producto.receta:
-                            # Verificar stock de materias primas
-                            ok, faltantes = producto.verificar_stock_materias_primas(stock_inicial)
-                            if not ok:
-                                faltantes_str = ", ".join([f"{f['materia_prima']} (necesaria: {f['necesaria']} {f['unidad']}, disponible: {f['disponible']})" for f in faltantes])
+                            # Descontar materias primas (valida el stock con una lectura bloqueada)
+                            from .services.produccion_service import MateriaPrimaInsuficienteError
+                            try:
+                                producto.descontar_materias_primas(stock_inicial, request.user)
+                            except MateriaPrimaInsuficienteError as e:
+                                faltantes_str = ", ".join([f"{f['materia_prima']} (necesaria: {f['necesaria']} {f['unidad']}, disponible: {f['disponible']})" for f in e.faltantes])
                                 messages.error(request, f"No hay suficiente stock de materias primas para producir {stock_inicial} unidades: {faltantes_str}")
-                                # Eliminar el producto recién creado
-                                producto.delete()
+                                # La transacción revierte el producto recién creado
                                 raise Exception("Stock de materias primas insuficiente")
-                            
-                            # Descontar materias primas y actualizar stock
-                            producto.descontar_materias_primas(stock_inicial, request.user)
                             producto.stock = stock_inicial
                             producto.save()
                         else:
@@ -1031,12 +1039,13 @@ def editar_producto(request, pk):
                     cantidad_a_producir = form.cleaned_data.get('cantidad_a_producir', 0)
                     if cantidad_a_producir and cantidad_a_producir > 0:
                         # PRODUCCIÓN: Descontar materias primas y aumentar stock
-                        ok, faltantes = producto.verificar_stock_materias_primas(cantidad_a_producir)
-                        if not ok:
-                            faltantes_str = ", ".join([f"{f['materia_prima']} (necesaria: {f['necesaria']} {f['unidad']}, disponible: {f['disponible']})" for f in faltantes])
+                        from .services.produccion_service import MateriaPrimaInsuficienteError
+                        try:
+                            producto.descontar_materias_primas(cantidad_a_producir, request.user)
+                        except MateriaPrimaInsuficienteError as e:
+                            faltantes_str = ", ".join([f"{f['materia_prima']} (necesaria: {f['necesaria']} {f['unidad']}, disponible: {f['disponible']})" for f in e.faltantes])
                             messages.error(request, f"No hay suficiente stock de materias primas para producir {cantidad_a_producir} unidades: {faltantes_str}")
                             raise Exception("Stock de materias primas insuficiente")
-                        producto.descontar_materias_primas(cantidad_a_producir, request.user)
                         producto.stock += cantidad_a_producir
                         messages.info(request, f'✅ Producidas {cantidad_a_producir} unidades desde materias primas')
                     
@@ -1125,7 +1134,6 @@ def eliminar_producto(request, pk):
 def lista_ventas(request):
     """Vista de lista de ventas con KPIs LINO V3"""
     from gestion.utils.kpi_builder import prepare_ventas_kpis
-    from django.core.paginator import Paginator
     
     ventas = Venta.objects.filter(eliminada=False)  # Solo ventas activas
     
@@ -1135,10 +1143,8 @@ def lista_ventas(request):
     fecha_fin = request.GET.get('fecha_fin')
     
     if query:
-        ventas = ventas.filter(
-            Q(cliente__icontains=query) |
-            Q(detalles__producto__nombre__icontains=query)
-        ).distinct()
+        # Índice de búsqueda: cliente + productos vendidos, sin JOIN ni DISTINCT
+        ventas = search.filtrar(ventas, query)
     
     if fecha_inicio:
         ventas = ventas.filter(fecha__date__gte=fecha_inicio)
@@ -1146,20 +1152,15 @@ def lista_ventas(request):
     if fecha_fin:
         ventas = ventas.filter(fecha__date__lte=fecha_fin)
     
-    # Ventas del mes para KPIs
-    ventas_mes = Venta.objects.filter(
-        eliminada=False,
-        fecha__month=timezone.now().month,
-        fecha__year=timezone.now().year
-    )
+    # Ventas del mes para KPIs (rango sobre el índice de fecha, no __month/__year)
+    inicio_mes = timezone.localtime().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    ventas_mes = Venta.objects.filter(eliminada=False, fecha__gte=inicio_mes)
     
     # Preparar KPIs
     kpis = prepare_ventas_kpis(ventas_mes)
     
-    # Paginación
-    paginator = Paginator(ventas.order_by('-fecha'), 25)
-    page_number = request.GET.get('page', 1)
-    ventas_paginadas = paginator.get_page(page_number)
+    # Paginación por keyset (fecha, id): sin OFFSET ni COUNT completo
+    ventas_paginadas = paginar(request, ventas.prefetch_related('detalles'), orden=('-fecha', '-id'))
     
     # Clientes activos (únicos)
     clientes_activos = ventas.exclude(cliente__isnull=True).exclude(cliente__exact='').values('cliente').distinct().count()
@@ -1430,10 +1431,10 @@ def exportar_productos(request):
         messages.error(request, 'No tienes permiso para exportar productos.')
         return redirect('gestion:lista_productos')
     try:
-        producto_resource = ProductoResource()
-        dataset = producto_resource.export()
-        response = HttpResponse(dataset.xlsx, content_type='application/vnd.ms-excel')
-        response['Content-Disposition'] = f'attachment; filename="productos_{datetime.now().strftime("%Y%m%d")}.xlsx"'
+        from gestion.services.export_service import ExportService
+        # Streaming: ?formato=csv o xlsx (default)
+        service = ExportService.desde_resource(ProductoResource(), titulo='Productos')
+        response = service.respuesta(request.GET.get('formato'), 'productos')
         # Auditoría: registrar acción
         # LogProducto.objects.create(usuario=request.user, accion='exportar', descripcion='Exportación de productos a Excel')
         return response
@@ -1447,10 +1448,10 @@ def exportar_ventas(request):
         messages.error(request, 'No tienes permiso para exportar ventas.')
         return redirect('gestion:lista_ventas')
     try:
-        venta_resource = VentaResource()
-        dataset = venta_resource.export()
-        response = HttpResponse(dataset.xlsx, content_type='application/vnd.ms-excel')
-        response['Content-Disposition'] = f'attachment; filename="ventas_{datetime.now().strftime("%Y%m%d")}.xlsx"'
+        from gestion.services.export_service import ExportService
+        # Streaming: ?formato=csv o xlsx (default)
+        service = ExportService.desde_resource(VentaResource(), titulo='Ventas')
+        response = service.respuesta(request.GET.get('formato'), 'ventas')
         # Auditoría: registrar acción
         # LogVenta.objects.create(usuario=request.user, accion='exportar', descripcion='Exportación de ventas a Excel')
         return response
@@ -1458,6 +1459,25 @@ def exportar_ventas(request):
         messages.error(request, f'Error inesperado al exportar ventas: {str(e)}')
         return redirect('gestion:lista_ventas')
 
+@login_required
+def exportar_ventas_detalle(request):
+    """Exporta las líneas de venta (producto, cantidad, precio) de las ventas activas."""
+    if not request.user.has_perm('gestion.export_venta'):
+        messages.error(request, 'No tienes permiso para exportar ventas.')
+        return redirect('gestion:lista_ventas')
+    try:
+        from gestion.services.export_service import ExportService
+        detalles = VentaDetalle.objects.filter(
+            venta__eliminada=False
+        ).select_related('venta', 'producto').order_by('venta_id', 'id')
+        service = ExportService.desde_resource(
+            VentaDetalleResource(), queryset=detalles, titulo='Detalle de Ventas'
+        )
+        return service.respuesta(request.GET.get('formato'), 'ventas_detalle')
+    except Exception as e:
+        messages.error(request, f'Error inesperado al exportar ventas: {str(e)}')
+        return redirect('gestion:lista_ventas')
+
 @login_required
 def reportes(request):
     """
@@ -1468,7 +1488,16 @@ def reportes(request):
 
 # ==================== VISTAS MATERIAS PRIMAS ====================
 
+# Filtros de la lista de materias primas → estados de stock persistidos
+# ('bajo' en esta pantalla es stock > 0 y ≤ mínimo)
+FILTROS_ESTADO_MP = {
+    'agotado': ['agotado'],
+    'bajo': ['critico'],
+    'normal': ['bajo', 'normal'],
+}
+
 @login_required
+@presupuesto(queries=15, ms=500)
 def lista_materias_primas(request):
     """Vista para listar materias primas con filtros"""
     materias_primas = MateriaPrima.objects.filter(activo=True)
@@ -1477,39 +1506,23 @@ def lista_materias_primas(request):
     estado_stock = request.GET.get('estado_stock')
     
     if query:
-        materias_primas = materias_primas.filter(
-            Q(nombre__icontains=query) | 
-            Q(descripcion__icontains=query) |
-            Q(proveedor__icontains=query)
-        )
+        materias_primas = search.filtrar(materias_primas, query)
     
     if proveedor:
         materias_primas = materias_primas.filter(proveedor__icontains=proveedor)
     
-    if estado_stock:
-        if estado_stock == 'agotado':
-            materias_primas = materias_primas.filter(stock_actual=0)
-        elif estado_stock == 'bajo':
-            materias_primas = materias_primas.filter(stock_actual__gt=0, stock_actual__lte=F('stock_minimo'))
-        elif estado_stock == 'normal':
-            materias_primas = materias_primas.filter(stock_actual__gt=F('stock_minimo'))
-    
-    # Estadísticas para KPIs
-    total_materias = MateriaPrima.objects.filter(activo=True).count()
-    con_stock = MateriaPrima.objects.filter(activo=True, stock_actual__gt=0).count()
-    stock_bajo = MateriaPrima.objects.filter(
-        activo=True, 
-        stock_actual__gt=0, 
-        stock_actual__lte=F('stock_minimo')
-    ).count()
-    valor_total = MateriaPrima.objects.filter(activo=True).aggregate(
-        total=Sum(F('stock_actual') * F('costo_unitario'))
-    )['total'] or 0
+    if estado_stock in FILTROS_ESTADO_MP:
+        materias_primas = materias_primas.filter(estado_stock__in=FILTROS_ESTADO_MP[estado_stock])
+    
+    # Estadísticas para KPIs (un único GROUP BY estado_stock)
+    conteo = resumen_estados_stock(
+        MateriaPrima.objects.filter(activo=True), valor=F('stock_actual') * F('costo_unitario')
+    )
     
     stats = {
-        'con_stock': con_stock,
-        'stock_bajo': stock_bajo,
-        'valor_total': valor_total
+        'con_stock': conteo['total'] - conteo['agotado'],
+        'stock_bajo': conteo['critico'],
+        'valor_total': conteo['valor']
     }
     
     # Obtener proveedores únicos para el filtro
@@ -1546,25 +1559,13 @@ def lista_inventario(request):
 
         # Aplicar filtros (lógica reutilizada)
         if query:
-            materias_primas = materias_primas.filter(
-                Q(nombre__icontains=query) |
-                Q(descripcion__icontains=query) |
-                Q(proveedor__icontains=query)
-            )
+            materias_primas = search.filtrar(materias_primas, query)
 
         if proveedor_seleccionado:
             materias_primas = materias_primas.filter(proveedor__icontains=proveedor_seleccionado)
 
-        if estado_stock:
-            if estado_stock == 'agotado':
-                materias_primas = materias_primas.filter(stock_actual=0)
-            elif estado_stock == 'bajo':
-                materias_primas = materias_primas.filter(
-                    stock_actual__gt=0, 
-                    stock_actual__lte=F('stock_minimo')
-                )
-            elif estado_stock == 'normal':
-                materias_primas = materias_primas.filter(stock_actual__gt=F('stock_minimo'))
+        if estado_stock in FILTROS_ESTADO_MP:
+            materias_primas = materias_primas.filter(estado_stock__in=FILTROS_ESTADO_MP[estado_stock])
 
         # Proveedores únicos para filtros
         all_materias = MateriaPrima.objects.filter(activo=True)
@@ -1576,11 +1577,8 @@ def lista_inventario(request):
 
         total_proveedores = len(set(proveedores))
 
-        # Paginación eficiente
-        from django.core.paginator import Paginator
-        paginator = Paginator(materias_primas, 25)
-        page_number = request.GET.get('page', 1)
-        materias_paginadas = paginator.get_page(page_number)
+        # Paginación por keyset (nombre, id)
+        materias_paginadas = paginar(request, materias_primas, orden=('nombre', 'id'))
 
         context = {
             'materias_primas': materias_paginadas,
@@ -1589,8 +1587,8 @@ def lista_inventario(request):
             # KPIs inteligentes del servicio
             'kpis': kpis,
             # KPIs legacy para compatibilidad
-            'total_materias': all_materias.count(),
-            'con_stock': all_materias.filter(stock_actual__gt=0).count(),
+            'total_materias': kpis['stock_critico']['total'],
+            'con_stock': kpis['stock_critico']['con_stock'],
             'stock_bajo': kpis['stock_critico']['cantidad'],
             'stock_critico': kpis['stock_critico']['cantidad'],
             'valor_total': kpis['valor_total']['valor'],
@@ -1654,10 +1652,15 @@ def editar_materia_prima(request, pk):
             try:
                 with transaction.atomic():
                     materia_prima = form.save()
-                    # Registrar movimiento si cambió el stock
+                    # Registrar movimiento (y mover lotes) si cambió el stock
                     if stock_anterior != materia_prima.stock_actual:
                         diferencia = materia_prima.stock_actual - stock_anterior
                         tipo_mov = 'entrada' if diferencia > 0 else 'salida'
+                        from gestion.services.lotes_service import LoteAllocator
+                        costo = LoteAllocator().ajustar(
+                            materia_prima, stock_anterior, materia_prima.stock_actual,
+                            motivo='Ajuste manual'
+                        )
                         MovimientoMateriaPrima.objects.create(
                             materia_prima=materia_prima,
                             tipo_movimiento='ajuste',
@@ -1665,6 +1668,7 @@ def editar_materia_prima(request, pk):
                             cantidad_anterior=stock_anterior,
                             cantidad_nueva=materia_prima.stock_actual,
                             motivo=f'Ajuste manual - {tipo_mov}',
+                            costo_total=costo,
                             usuario=request.user
                         )
                     # Auditoría: registrar acción
@@ -1691,7 +1695,8 @@ def detalle_materia_prima(request, pk):
         return redirect('gestion:lista_inventario')
     try:
         materia_prima = get_object_or_404(MateriaPrima, pk=pk)
-        movimientos = materia_prima.movimientos.all()[:20]  # Últimos 20 movimientos
+        # Movimientos paginados por keyset (fecha, id), 20 por página
+        movimientos = paginar(request, materia_prima.movimientos.all(), por_pagina=20)
         productos_relacionados = ProductoMateriaPrima.objects.filter(materia_prima=materia_prima)
         # Importar el modelo de lotes y obtener los lotes FIFO de esta materia prima
         from .models import LoteMateriaPrima
@@ -1723,37 +1728,33 @@ def movimiento_materia_prima(request, pk):
                 movimiento = form.save(commit=False)
                 movimiento.usuario = request.user
                 movimiento.cantidad_anterior = materia_prima.stock_actual
-                # Actualizar stock según tipo de movimiento
-                if movimiento.tipo_movimiento in ['entrada', 'devolucion']:
-                    materia_prima.stock_actual += movimiento.cantidad
-                elif movimiento.tipo_movimiento in ['salida', 'produccion']:
-                    if materia_prima.stock_actual >= movimiento.cantidad:
-                        # FIFO: descontar de lotes
-                        from .models import LoteMateriaPrima
-                        cantidad_restante = float(movimiento.cantidad)
-                        lotes = LoteMateriaPrima.objects.filter(materia_prima=materia_prima, cantidad_disponible__gt=0).order_by('fecha_entrada', 'id')
-                        for lote in lotes:
-                            if cantidad_restante <= 0:
-                                break
-                            disponible = float(lote.cantidad_disponible)
-                            a_consumir = min(disponible, cantidad_restante)
-                            lote.cantidad_disponible = disponible - a_consumir
-                            if lote.cantidad_disponible == 0:
-                                lote.fecha_consumo = timezone.now().date()
-                            lote.save()
-                            cantidad_restante -= a_consumir
-                        materia_prima.stock_actual -= movimiento.cantidad
-                    else:
-                        messages.error(request, 'No hay suficiente stock disponible.')
-                        return render(request, 'modules/materias_primas/materias_primas/movimiento.html', {
-                            'form': form,
-                            'materia_prima': materia_prima
-                        })
-                elif movimiento.tipo_movimiento == 'ajuste':
-                    materia_prima.stock_actual = movimiento.cantidad
-                movimiento.cantidad_nueva = materia_prima.stock_actual
-                # Guardar ambos objetos
+                if movimiento.tipo_movimiento in ['salida', 'produccion'] and materia_prima.stock_actual < movimiento.cantidad:
+                    messages.error(request, 'No hay suficiente stock disponible.')
+                    return render(request, 'modules/materias_primas/materias_primas/movimiento.html', {
+                        'form': form,
+                        'materia_prima': materia_prima
+                    })
+                # Actualizar stock y lotes según tipo de movimiento
+                from gestion.services.lotes_service import LoteAllocator
+                lotes = LoteAllocator()
                 with transaction.atomic():
+                    if movimiento.tipo_movimiento in ['entrada', 'devolucion']:
+                        lotes.registrar_entrada(
+                            materia_prima, movimiento.cantidad,
+                            observaciones=f'{movimiento.get_tipo_movimiento_display()} manual'
+                        )
+                        materia_prima.stock_actual += movimiento.cantidad
+                    elif movimiento.tipo_movimiento in ['salida', 'produccion']:
+                        # FIFO/FEFO: descontar de lotes con su costo real
+                        movimiento.costo_total = lotes.consumir_materia(materia_prima, movimiento.cantidad)['costo']
+                        materia_prima.stock_actual -= movimiento.cantidad
+                    elif movimiento.tipo_movimiento == 'ajuste':
+                        movimiento.costo_total = lotes.ajustar(
+                            materia_prima, materia_prima.stock_actual, movimiento.cantidad
+                        )
+                        materia_prima.stock_actual = movimiento.cantidad
+                    movimiento.cantidad_nueva = materia_prima.stock_actual
+                    # Guardar ambos objetos
                     materia_prima.save()
                     movimiento.save()
                 # Auditoría: registrar acción
@@ -1865,21 +1866,9 @@ def reporte_costos_produccion(request):
         messages.error(request, 'No tienes permiso para ver reportes de costos de producción.')
         return redirect('gestion:panel_control')
     try:
-        # Analiza productos con receta y calcula margen de ganancia
-        productos_con_receta = Producto.objects.filter(recetas__isnull=False).distinct()
-        productos_analisis = []
-        for producto in productos_con_receta:
-            costo_materias = producto.costo_materias_primas
-            margen_ganancia = producto.precio - costo_materias
-            porcentaje_margen = (margen_ganancia / producto.precio * 100) if producto.precio > 0 else 0
-            productos_analisis.append({
-                'producto': producto,
-                'costo_materias': costo_materias,
-                'precio_venta': producto.precio,
-                'margen_ganancia': margen_ganancia,
-                'porcentaje_margen': porcentaje_margen,
-            })
-        productos_analisis.sort(key=lambda x: x['porcentaje_margen'], reverse=True)
+        # Costo de materias primas y margen de todos los productos con receta en una query
+        from gestion.services.reporte_jobs import analisis_costos_produccion
+        productos_analisis = analisis_costos_produccion()
         context = {
             'productos_analisis': productos_analisis,
             'total_productos': len(productos_analisis),
@@ -1897,49 +1886,28 @@ def exportar_materias_primas_excel(request):
         messages.error(request, 'No tienes permiso para exportar materias primas.')
         return redirect('gestion:lista_inventario')
     try:
-        # Exporta materias primas a Excel con formato y estilos
-        import openpyxl
-        from openpyxl.styles import Font, PatternFill
-        from django.http import HttpResponse
-        from datetime import datetime
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Materias Primas"
+        # Exporta materias primas a Excel (o CSV con ?formato=csv) en streaming
+        from gestion.services.export_service import ExportService
         headers = ['Nombre', 'Unidad', 'Stock Actual', 'Stock Mínimo', 'Costo Unitario', 
                    'Valor Total', 'Proveedor', 'Estado Stock']
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-        materias_primas = MateriaPrima.objects.filter(activo=True)
-        for row, mp in enumerate(materias_primas, 2):
-            ws.cell(row=row, column=1, value=mp.nombre)
-            ws.cell(row=row, column=2, value=mp.get_unidad_medida_display())
-            ws.cell(row=row, column=3, value=float(mp.stock_actual))
-            ws.cell(row=row, column=4, value=float(mp.stock_minimo))
-            ws.cell(row=row, column=5, value=float(mp.costo_unitario))
-            ws.cell(row=row, column=6, value=float(mp.valor_total_stock))
-            ws.cell(row=row, column=7, value=mp.proveedor or '')
-            ws.cell(row=row, column=8, value='Crítico' if mp.necesita_restock else 'Normal')
-        # Ajusta ancho de columnas automáticamente
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        materias_primas = MateriaPrima.objects.filter(activo=True).iterator(
+            chunk_size=ExportService.CHUNK_SIZE
+        )
+        filas = (
+            [
+                mp.nombre,
+                mp.get_unidad_medida_display(),
+                float(mp.stock_actual),
+                float(mp.stock_minimo),
+                float(mp.costo_unitario),
+                float(mp.valor_total_stock),
+                mp.proveedor or '',
+                'Crítico' if mp.necesita_restock else 'Normal',
+            ]
+            for mp in materias_primas
         )
-        response['Content-Disposition'] = f'attachment; filename="materias_primas_{datetime.now().strftime("%Y%m%d")}.xlsx"'
-        wb.save(response)
+        service = ExportService(headers, filas, titulo='Materias Primas')
+        response = service.respuesta(request.GET.get('formato'), 'materias_primas')
         # Auditoría: acción de exportación de materias primas (descomentar si se implementa logging)
         # LogMateriaPrima.objects.create(usuario=request.user, accion='exportar', descripcion='Exportación de materias primas a Excel')
         return response
@@ -1948,96 +1916,87 @@ def exportar_materias_primas_excel(request):
         return redirect('gestion:lista_inventario')
 
 @login_required
-def exportar_reporte_pdf(request, tipo_reporte):
+def exportar_reporte_pdf(request, tipo_reporte, formato='pdf'):
+    """
+    Pide un reporte PDF / XLSX. La generación corre en segundo plano
+    (ReporteJob): si el archivo ya existe para los datos actuales se descarga
+    directo; si no, se muestra una página que consulta el estado del job.
+    """
     if not request.user.has_perm('gestion.export_reporte'):
         messages.error(request, 'No tienes permiso para exportar reportes.')
         return redirect('gestion:reportes')
+    from gestion.services.reporte_jobs import ReporteJobService
     try:
-        from reportlab.lib.pagesizes import letter, A4
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib import colors
-        from reportlab.lib.units import inch
-        from io import BytesIO
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        elements = []
-        styles = getSampleStyleSheet()
-        # Título
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            spaceAfter=30,
-            alignment=1  # Centrado
+        job = ReporteJobService.solicitar(
+            tipo_reporte, formato, parametros=request.GET.dict(), usuario=request.user
         )
-        if tipo_reporte == 'stock_materias':
-            title = Paragraph("Reporte de Stock - Materias Primas", title_style)
-            elements.append(title)
-            elements.append(Spacer(1, 12))
-            # Datos
-            materias_primas = MateriaPrima.objects.filter(activo=True)
-            data = [['Nombre', 'Stock Actual', 'Stock Mínimo', 'Estado']]
-            for mp in materias_primas:
-                estado = 'CRÍTICO' if mp.necesita_restock else 'Normal'
-                data.append([
-                    mp.nombre,
-                    f"{mp.stock_actual} {mp.get_unidad_medida_display()}",
-                    f"{mp.stock_minimo} {mp.get_unidad_medida_display()}",
-                    estado
-                ])
-            table = Table(data)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 14),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            elements.append(table)
-        elif tipo_reporte == 'costos_produccion':
-            title = Paragraph("Reporte de Costos de Producción", title_style)
-            elements.append(title)
-            elements.append(Spacer(1, 12))
-            productos_con_receta = Producto.objects.filter(recetas__isnull=False).distinct()
-            data = [['Producto', 'Costo Materias', 'Precio Venta', 'Margen', '% Margen']]
-            for producto in productos_con_receta:
-                costo_materias = producto.costo_materias_primas
-                margen = producto.precio - costo_materias
-                porcentaje = (margen / producto.precio * 100) if producto.precio > 0 else 0
-                data.append([
-                    producto.nombre,
-                    f"${costo_materias:.2f}",
-                    f"${producto.precio:.2f}",
-                    f"${margen:.2f}",
-                    f"{porcentaje:.1f}%"
-                ])
-            table = Table(data)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 14),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            elements.append(table)
-        # Construir PDF
-        doc.build(elements)
-        buffer.seek(0)
-        response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="reporte_{tipo_reporte}_{datetime.now().strftime("%Y%m%d")}.pdf"'
-        # Auditoría: acción de exportación de reporte PDF (descomentar si se implementa logging)
-        # LogReporte.objects.create(usuario=request.user, accion='exportar', descripcion=f'Exportación de reporte PDF: {tipo_reporte}')
-        return response
-    except Exception as e:
-        messages.error(request, f'Error inesperado al exportar el reporte PDF: {str(e)}')
+    except ValueError as e:
+        messages.error(request, str(e))
         return redirect('gestion:reportes')
+    if job.estado == 'completado':
+        return redirect('gestion:descargar_reporte', job_id=job.pk)
+    # Auditoría: acción de exportación de reporte (descomentar si se implementa logging)
+    # LogReporte.objects.create(usuario=request.user, accion='exportar', descripcion=f'Exportación de reporte: {tipo_reporte}')
+    return render(request, 'modules/reportes/reporte_job.html', {
+        'job': job,
+        'estado_url': reverse('gestion:estado_reporte', args=[job.pk]),
+    })
+
+def _reporte_job_json(job):
+    data = {
+        'id': str(job.pk),
+        'tipo': job.tipo,
+        'formato': job.formato,
+        'estado': job.estado,
+        'estado_display': job.get_estado_display(),
+        'error': job.error,
+        'download_url': None,
+    }
+    if job.estado == 'completado':
+        data['download_url'] = reverse('gestion:descargar_reporte', args=[job.pk])
+    return data
+
+@login_required
+@require_POST
+def solicitar_reporte(request, tipo_reporte):
+    """API: registra el pedido de un reporte y devuelve el job (202 si queda pendiente)."""
+    if not request.user.has_perm('gestion.export_reporte'):
+        return JsonResponse({'error': 'No tienes permiso para exportar reportes.'}, status=403)
+    from gestion.services.reporte_jobs import ReporteJobService
+    try:
+        job = ReporteJobService.solicitar(
+            tipo_reporte, request.POST.get('formato', 'pdf'), parametros=request.POST.dict(), usuario=request.user
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    data = _reporte_job_json(job)
+    data['estado_url'] = reverse('gestion:estado_reporte', args=[job.pk])
+    return JsonResponse(data, status=200 if job.estado == 'completado' else 202)
+
+@login_required
+@require_GET
+def estado_reporte(request, job_id):
+    """API: estado de un ReporteJob (la UI lo consulta cada pocos segundos)."""
+    if not request.user.has_perm('gestion.export_reporte'):
+        return JsonResponse({'error': 'No tienes permiso para exportar reportes.'}, status=403)
+    from gestion.models import ReporteJob
+    job = get_object_or_404(ReporteJob, pk=job_id)
+    return JsonResponse(_reporte_job_json(job))
+
+@login_required
+def descargar_reporte(request, job_id):
+    """Descarga el archivo de un ReporteJob completado."""
+    if not request.user.has_perm('gestion.export_reporte'):
+        messages.error(request, 'No tienes permiso para exportar reportes.')
+        return redirect('gestion:reportes')
+    from django.http import FileResponse, Http404
+    from gestion.models import ReporteJob
+    from gestion.services.reporte_jobs import ruta_archivo
+    job = get_object_or_404(ReporteJob, pk=job_id, estado='completado')
+    ruta = ruta_archivo(job)
+    if not ruta.exists():
+        raise Http404('El archivo del reporte ya no está disponible')
+    return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=job.nombre_descarga)
 
 # ====== API ENDPOINTS ======
 
@@ -2074,13 +2033,13 @@ def api_verificar_stock_producto(request, producto_id):
 
 
 @login_required
+@presupuesto(queries=15, ms=500)
 def lista_compras(request):
     """Vista para listar compras con KPIs LINO V3"""
     from gestion.utils.kpi_builder import prepare_compras_kpis
-    from django.core.paginator import Paginator
     
     try:
-        compras = Compra.objects.all().order_by('-fecha_compra')
+        compras = Compra.objects.all()
         
         # Filtros opcionales
         materia_prima_id = request.GET.get('materia_prima')
@@ -2094,28 +2053,24 @@ def lista_compras(request):
         if proveedor:
             compras = compras.filter(proveedor__icontains=proveedor)
         if q:
-            compras = compras.filter(
-                Q(proveedor__icontains=q) |
-                Q(materia_prima__nombre__icontains=q)
-            )
+            compras = search.filtrar(compras, q)
         if fecha_inicio:
             compras = compras.filter(fecha_compra__gte=fecha_inicio)
         if fecha_fin:
             compras = compras.filter(fecha_compra__lte=fecha_fin)
         
         # Compras del mes para KPIs
-        compras_mes = Compra.objects.filter(
-            fecha_compra__month=timezone.now().month,
-            fecha_compra__year=timezone.now().year
-        )
+        compras_mes = Compra.objects.filter(fecha_compra__gte=timezone.localdate().replace(day=1))
         
         # Preparar KPIs
         kpis = prepare_compras_kpis(compras_mes)
         
-        # Paginación
-        paginator = Paginator(compras, 25)
-        page_number = request.GET.get('page', 1)
-        compras_paginadas = paginator.get_page(page_number)
+        # Paginación por keyset (fecha_compra, id)
+        compras_paginadas = paginar(
+            request,
+            compras.select_related('materia_prima').prefetch_related('detalles'),
+            orden=('-fecha_compra', '-id'),
+        )
         
         materias_primas = MateriaPrima.objects.all()
         
@@ -2145,11 +2100,11 @@ def api_costo_receta(request, pk):
     """API endpoint para obtener el costo total de una receta."""
     try:
         receta = get_object_or_404(Receta, pk=pk)
-        costo_total = receta.costo_total()
+        costo_total = receta.costo_cache
         
         # También devolver información detallada de ingredientes para debug
         ingredientes = []
-        for ingrediente in receta.recetamateriaprima_set.all():
+        for ingrediente in receta.recetamateriaprima_set.select_related('materia_prima'):
             costo_ingrediente = ingrediente.cantidad * ingrediente.materia_prima.costo_unitario
             ingredientes.append({
                 'nombre': ingrediente.materia_prima.nombre,
@@ -2688,12 +2643,11 @@ def lista_compras_lino(request):
         return redirect('gestion:panel_control')
 
 @login_required
+@presupuesto(queries=12, ms=500)
 def reportes_lino(request):
     """Vista migrada de reportes usando el sistema de diseño Lino"""
     try:
-        from datetime import datetime, timedelta
-        from django.db.models import Sum, Count, Avg
-        from decimal import Decimal
+        from datetime import datetime
         
         hoy = datetime.now().date()
         
@@ -2709,142 +2663,24 @@ def reportes_lino(request):
             fecha_desde = hoy.replace(day=1)
             fecha_hasta = hoy
         
-        # Calcular mes anterior para comparación
-        dias_periodo = (fecha_hasta - fecha_desde).days
-        fecha_desde_anterior = fecha_desde - timedelta(days=dias_periodo + 1)
-        fecha_hasta_anterior = fecha_desde - timedelta(days=1)
-        
-        # Cálculos del período actual
-        ventas = Venta.objects.filter(fecha__range=[fecha_desde, fecha_hasta])
-        compras = Compra.objects.filter(fecha_compra__range=[fecha_desde, fecha_hasta])
-        
-        # Cálculos del período anterior
-        ventas_anterior = Venta.objects.filter(fecha__range=[fecha_desde_anterior, fecha_hasta_anterior])
-        compras_anterior = Compra.objects.filter(fecha_compra__range=[fecha_desde_anterior, fecha_hasta_anterior])
-        
-        # Productos y materias primas (no filtrados por fecha)
-        productos = Producto.objects.all()
-        materias_primas = MateriaPrima.objects.all()
-        
-        # === PERÍODO ACTUAL ===
-        ingresos_totales = sum(Decimal(str(venta.total)) for venta in ventas)
-        # Calcular gastos desde detalles o precio_mayoreo legacy
-        gastos_totales = Decimal('0')
-        for compra in compras:
-            if compra.precio_mayoreo:
-                gastos_totales += Decimal(str(compra.precio_mayoreo))
-            else:
-                # Calcular desde detalles
-                for detalle in compra.detalles.all():
-                    gastos_totales += Decimal(str(detalle.precio_unitario)) * Decimal(str(detalle.cantidad))
-        
-        ganancia_neta = ingresos_totales - gastos_totales
-        total_ventas = ventas.count()
-        
-        # === PERÍODO ANTERIOR ===
-        ingresos_anterior = sum(Decimal(str(venta.total)) for venta in ventas_anterior)
-        # Calcular gastos desde detalles o precio_mayoreo legacy
-        gastos_anterior = Decimal('0')
-        for compra in compras_anterior:
-            if compra.precio_mayoreo:
-                gastos_anterior += Decimal(str(compra.precio_mayoreo))
-            else:
-                # Calcular desde detalles
-                for detalle in compra.detalles.all():
-                    gastos_anterior += Decimal(str(detalle.precio_unitario)) * Decimal(str(detalle.cantidad))
-        
-        ganancia_anterior = ingresos_anterior - gastos_anterior
-        total_ventas_anterior = ventas_anterior.count()
-        
-        # === CALCULAR VARIACIONES ===
-        def calcular_variacion(actual, anterior):
-            if anterior > 0:
-                return float(((actual - anterior) / anterior) * 100)
-            elif actual > 0:
-                return 100.0  # Crecimiento del 100% si no había datos anteriores
-            else:
-                return 0.0
-        
-        variacion_ingresos = calcular_variacion(ingresos_totales, ingresos_anterior)
-        variacion_gastos = calcular_variacion(gastos_totales, gastos_anterior)
-        variacion_ganancia = calcular_variacion(ganancia_neta, ganancia_anterior)
-        variacion_ventas = calcular_variacion(total_ventas, total_ventas_anterior)
-        
-        # Calcular margen y ROI
-        margen_porcentaje = float((ganancia_neta / ingresos_totales) * 100) if ingresos_totales > 0 else 0
-        roi = float((ganancia_neta / gastos_totales) * 100) if gastos_totales > 0 else 0
-        
-        # Métricas adicionales
-        ticket_promedio = float(ingresos_totales / total_ventas) if total_ventas > 0 else 0
-        ticket_promedio_anterior = float(ingresos_anterior / total_ventas_anterior) if total_ventas_anterior > 0 else 0
-        variacion_ticket = calcular_variacion(ticket_promedio, ticket_promedio_anterior)
-        
-        # Productos y stock
-        productos_criticos = productos.filter(stock__lte=F('stock_minimo')).count()
-        valor_inventario = sum((Decimal(str(p.precio or 0)) * Decimal(str(p.stock or 0))) for p in productos)
-        
-        # Proveedores activos
-        proveedores_activos = len(set(mp.proveedor for mp in materias_primas if mp.proveedor))
-        
-        # Alertas
-        alertas = []
-        if productos_criticos > 0:
-            alertas.append({
-                'tipo': 'warning',
-                'titulo': 'Stock Crítico',
-                'descripcion': f'{productos_criticos} productos requieren reposición'
-            })
-        
-        if ganancia_neta < 0:
-            alertas.append({
-                'tipo': 'danger',
-                'titulo': 'Pérdidas Detectadas',
-                'descripcion': 'La ganancia neta es negativa, revisa los costos'
-            })
-        
-        if variacion_ingresos < -10:
-            alertas.append({
-                'tipo': 'warning',
-                'titulo': 'Caída en Ventas',
-                'descripcion': f'Los ingresos bajaron {abs(variacion_ingresos):.1f}% vs período anterior'
-            })
+        # Métricas del período + comparación contra el período anterior
+        from gestion.services.reportes_service import ReportesService
+        reporte = ReportesService(fecha_desde, fecha_hasta).get_reporte()
 
         context = {
             # Filtros
             'fecha_desde': fecha_desde.strftime('%Y-%m-%d'),
             'fecha_hasta': fecha_hasta.strftime('%Y-%m-%d'),
             
-            # Período actual
-            'ingresos_totales': float(ingresos_totales),
-            'gastos_totales': float(gastos_totales),
-            'ganancia_neta': float(ganancia_neta),
-            'margen_porcentaje': margen_porcentaje,
-            'roi': roi,
-            'total_ventas': total_ventas,
-            'total_compras': compras.count(),
-            'ticket_promedio': ticket_promedio,
-            
-            # Variaciones vs período anterior
-            'variacion_ingresos': variacion_ingresos,
-            'variacion_gastos': variacion_gastos,
-            'variacion_ganancia': variacion_ganancia,
-            'variacion_ventas': variacion_ventas,
-            'variacion_ticket': variacion_ticket,
-            
-            # Inventario y productos
-            'total_productos': productos.count(),
-            'productos_criticos': productos_criticos,
-            'valor_inventario': float(valor_inventario),
-            'proveedores_activos': proveedores_activos,
+            **reporte,
             
             # Campos legacy (mantener compatibilidad)
-            'margen_bruto': margen_porcentaje,
-            'inversion_total': float(gastos_totales),
-            'crecimiento_ventas': variacion_ingresos,
+            'margen_bruto': reporte['margen_porcentaje'],
+            'inversion_total': reporte['gastos_totales'],
+            'crecimiento_ventas': reporte['variacion_ingresos'],
             'rotacion_inventario': 'N/A',
             'clientes_recurrentes': 0,
             'productos_top_count': 5,
-            'alertas': alertas,
         }
 
         return render(request, 'modules/reportes/dashboard_enterprise.html', context)
@@ -2921,6 +2757,7 @@ def lista_ventas_lino(request):
 # ==================== VISTAS DE ANALYTICS Y CONTROL DE RENTABILIDAD ====================
 
 @login_required
+@presupuesto(queries=15, ms=800)
 def dashboard_rentabilidad(request):
     """
     Dashboard principal de control de rentabilidad con objetivos de negocio.
@@ -3196,77 +3033,24 @@ def aplicar_precio_sugerido(request, producto_id):
 def crear_venta_v3(request):
     """Vista V3 para crear ventas con diseño moderno"""
     if request.method == 'POST':
+        from .services.venta_posting_service import VentaPostingService
+        
         try:
-            with transaction.atomic():
-                # 🔍 VALIDAR STOCK ANTES DE CREAR LA VENTA
-                productos_data = request.POST
-                productos_validados = []
-                index = 0
-                
-                # Primera pasada: validar todo
-                while f'productos[{index}][producto_id]' in productos_data:
-                    producto_id = productos_data.get(f'productos[{index}][producto_id]')
-                    cantidad = Decimal(productos_data.get(f'productos[{index}][cantidad]', '0'))
-                    precio = Decimal(productos_data.get(f'productos[{index}][precio_unitario]', '0'))
-                    subtotal = Decimal(productos_data.get(f'productos[{index}][subtotal]', '0'))
-                    
-                    if producto_id and cantidad > 0:
-                        producto = Producto.objects.get(id=producto_id)
-                        
-                        # ✅ Verificar stock ANTES de crear venta
-                        if producto.stock < cantidad:
-                            messages.error(
-                                request, 
-                                f'❌ Stock insuficiente para {producto.nombre}. '
-                                f'Disponible: {producto.stock}, Solicitado: {cantidad}'
-                            )
-                            # ⚠️ IMPORTANTE: raise para hacer rollback del transaction
-                            raise ValueError(f'Stock insuficiente para {producto.nombre}')
-                        
-                        productos_validados.append({
-                            'producto': producto,
-                            'cantidad': cantidad,
-                            'precio': precio,
-                            'subtotal': subtotal
-                        })
-                    
-                    index += 1
-                
-                # ✅ Si llegamos aquí, todo validó correctamente
-                # Segunda pasada: crear la venta y procesar
-                venta = Venta.objects.create(
-                    cliente=request.POST.get('cliente'),
-                    fecha=request.POST.get('fecha'),
-                    total=Decimal(request.POST.get('total', '0')),
-                    usuario=request.user
-                )
-                
-                # Procesar productos validados
-                for item in productos_validados:
-                    # Crear detalle
-                    VentaDetalle.objects.create(
-                        venta=venta,
-                        producto=item['producto'],
-                        cantidad=item['cantidad'],
-                        precio_unitario=item['precio'],
-                        subtotal=item['subtotal']
-                    )
-                    
-                    # 🔧 FIX BUG #1: Descuento de stock ahora SOLO aquí (signal desactivado)
-                    # Usar F() expression para evitar race conditions en concurrencia
-                    from django.db.models import F
-                    Producto.objects.filter(id=item['producto'].id).update(
-                        stock=F('stock') - item['cantidad']
-                    )
-                
-                # Recalcular total de la venta (antes lo hacía el signal)
-                venta.calcular_total()
-                
-                messages.success(request, f'✅ Venta #{venta.id} registrada exitosamente')
-                return redirect('gestion:lista_ventas')
+            # 🚀 Registro set-based: queries constantes sin importar las líneas
+            service = VentaPostingService(usuario=request.user)
+            lineas = service.parsear_lineas_post(request.POST)
+            venta = service.registrar_venta(
+                lineas,
+                cliente=request.POST.get('cliente'),
+                fecha=request.POST.get('fecha') or None,
+            )
+            
+            messages.success(request, f'✅ Venta #{venta.id} registrada exitosamente')
+            return redirect('gestion:lista_ventas')
                 
         except ValueError as ve:
-            # Error de validación (stock insuficiente, etc.)
+            # Error de validación (stock insuficiente, etc.) - rollback automático
+            messages.error(request, f'❌ {str(ve)}')
             return redirect('gestion:crear_venta')
         except Exception as e:
             messages.error(request, f'❌ Error al crear venta: {str(e)}')
@@ -3284,6 +3068,71 @@ def crear_venta_v3(request):
     return render(request, 'modules/ventas/form_v3_natural.html', context)
 
 
+def _registrar_compra_v3(post, usuario):
+    """
+    Crea la compra y sus detalles desde el formulario V3 en una transacción.
+    Returns: (compra, cantidad de detalles)
+    """
+    from gestion.models import CompraDetalle
+    
+    with transaction.atomic():
+        # 1. Crear la compra principal
+        compra = Compra.objects.create(
+            proveedor=post.get('proveedor'),
+            usuario=usuario,
+            observaciones=post.get('observaciones', ''),
+            total=Decimal('0.00')  # Se calculará después
+        )
+        
+        # 2. Procesar los detalles (materias primas)
+        # El frontend envía: materia_prima_1, cantidad_1, precio_unitario_1, etc.
+        detalle_count = 0
+        i = 1
+        
+        while True:
+            # Buscar si existe materia_prima_{i}
+            materia_prima_id = post.get(f'materia_prima_{i}')
+            
+            if not materia_prima_id:
+                break  # No hay más detalles
+            
+            # Obtener datos del detalle
+            cantidad = post.get(f'cantidad_{i}')
+            precio_unitario = post.get(f'precio_unitario_{i}')
+            
+            # Validar que no estén vacíos
+            if not cantidad or not precio_unitario:
+                i += 1
+                continue
+            
+            # Crear el detalle
+            materia_prima = MateriaPrima.objects.get(id=materia_prima_id)
+            
+            CompraDetalle.objects.create(
+                compra=compra,
+                materia_prima=materia_prima,
+                cantidad=Decimal(cantidad),
+                precio_unitario=Decimal(precio_unitario),
+                subtotal=Decimal(cantidad) * Decimal(precio_unitario)
+            )
+            # El CompraDetalle.save() automáticamente:
+            # - Actualiza stock
+            # - Recalcula costo unitario
+            # - Crea lote FIFO
+            # - Actualiza total de compra
+            
+            detalle_count += 1
+            i += 1
+        
+        # 3. Validar que haya al menos 1 detalle
+        if detalle_count == 0:
+            raise ValueError("Debe agregar al menos una materia prima a la compra")
+        
+        # 4. Recalcular total (por si acaso)
+        compra.calcular_total()
+    return compra, detalle_count
+
+
 @login_required
 def crear_compra_v3(request):
     """
@@ -3292,71 +3141,17 @@ def crear_compra_v3(request):
     """
     if request.method == 'POST':
         try:
-            with transaction.atomic():
-                # 1. Crear la compra principal
-                compra = Compra.objects.create(
-                    proveedor=request.POST.get('proveedor'),
-                    usuario=request.user,
-                    observaciones=request.POST.get('observaciones', ''),
-                    total=Decimal('0.00')  # Se calculará después
-                )
-                
-                # 2. Procesar los detalles (materias primas)
-                # El frontend envía: materia_prima_1, cantidad_1, precio_unitario_1, etc.
-                detalle_count = 0
-                i = 1
-                
-                while True:
-                    # Buscar si existe materia_prima_{i}
-                    materia_prima_id = request.POST.get(f'materia_prima_{i}')
-                    
-                    if not materia_prima_id:
-                        break  # No hay más detalles
-                    
-                    # Obtener datos del detalle
-                    cantidad = request.POST.get(f'cantidad_{i}')
-                    precio_unitario = request.POST.get(f'precio_unitario_{i}')
-                    
-                    # Validar que no estén vacíos
-                    if not cantidad or not precio_unitario:
-                        i += 1
-                        continue
-                    
-                    # Crear el detalle
-                    from gestion.models import CompraDetalle
-                    materia_prima = MateriaPrima.objects.get(id=materia_prima_id)
-                    
-                    CompraDetalle.objects.create(
-                        compra=compra,
-                        materia_prima=materia_prima,
-                        cantidad=Decimal(cantidad),
-                        precio_unitario=Decimal(precio_unitario),
-                        subtotal=Decimal(cantidad) * Decimal(precio_unitario)
-                    )
-                    # El CompraDetalle.save() automáticamente:
-                    # - Actualiza stock
-                    # - Recalcula costo unitario
-                    # - Crea lote FIFO
-                    # - Actualiza total de compra
-                    
-                    detalle_count += 1
-                    i += 1
-                
-                # 3. Validar que haya al menos 1 detalle
-                if detalle_count == 0:
-                    raise ValueError("Debe agregar al menos una materia prima a la compra")
-                
-                # 4. Recalcular total (por si acaso)
-                compra.calcular_total()
-                
-                # 5. Mensaje de éxito
-                messages.success(
-                    request, 
-                    f'✅ Compra registrada exitosamente. '
-                    f'{detalle_count} materia(s) prima(s) agregadas. '
-                    f'Total: ${compra.total}'
-                )
-                return redirect('gestion:lista_compras')
+            # Escritura serializada y reintentada ante locks de SQLite
+            compra, detalle_count = ejecutar_escritura(_registrar_compra_v3, request.POST, request.user)
+            
+            # 5. Mensaje de éxito
+            messages.success(
+                request, 
+                f'✅ Compra registrada exitosamente. '
+                f'{detalle_count} materia(s) prima(s) agregadas. '
+                f'Total: ${compra.total}'
+            )
+            return redirect('gestion:lista_compras')
                 
         except ValueError as e:
             messages.error(request, f'❌ Error de validación: {str(e)}')
@@ -3455,6 +3250,10 @@ def eliminar_compra(request, pk):
                         cantidad_revertida = compra.cantidad_mayoreo
                         unidad = materia_prima.get_unidad_medida_display()
                         
+                        # 📊 Descontar del resumen diario de compras
+                        from gestion.models import ResumenDiario
+                        ResumenDiario.acumular(compra.fecha_compra, compras_total=-compra.total)
+                        
                         # 5. HARD DELETE
                         compra.delete()
                         
@@ -3515,6 +3314,10 @@ def eliminar_compra(request, pk):
                                 usuario=request.user
                             )
                         
+                        # 📊 Descontar del resumen diario de compras
+                        from gestion.models import ResumenDiario
+                        ResumenDiario.acumular(compra.fecha_compra, compras_total=-total_revertido)
+                        
                         # 5. HARD DELETE (elimina compra y detalles en cascada)
                         compra.delete()
                         
@@ -3606,7 +3409,7 @@ def crear_receta_v3(request):
 
 
 # ==================== IMPORTAR FUNCIONES API ====================
-from .api import api_productos, api_inventario, api_ventas
+from .api import api_productos, api_inventario, api_ventas, api_buscar, api_lista
 
 
 # ============================================
@@ -3653,6 +3456,7 @@ def alertas_no_leidas_api(request):
         }
     """
     from .services.alertas_service import AlertasService
+    from .services.alertas_tiempo_real import serializar_alerta
     
     service = AlertasService()
     alertas = service.get_alertas_usuario(
@@ -3661,20 +3465,42 @@ def alertas_no_leidas_api(request):
         limit=5
     )
     
-    # Serializar alertas a JSON
-    data = [{
-        'id': a.id,
-        'tipo': a.tipo,
-        'nivel': a.nivel,
-        'titulo': a.titulo,
-        'mensaje': a.mensaje,
-        'fecha': a.fecha_creacion.strftime('%d/%m/%Y %H:%M'),
-        'icono': a.get_icono() if hasattr(a, 'get_icono') else 'bi-info-circle',
-    } for a in alertas]
+    # Serializar alertas a JSON (mismo formato que el stream SSE)
+    data = [serializar_alerta(a) for a in alertas]
     
     return JsonResponse({'alertas': data})
 
 
+@login_required
+async def alertas_stream(request):
+    """
+    SSE: Empuja el count de alertas no leídas y las alertas nuevas al navbar
+    
+    Bajo ASGI mantiene la conexión abierta y solo consulta la base cuando
+    cambia la versión del contador en cache. Bajo WSGI responde un único
+    evento con `retry` de 60s: EventSource se reconecta solo y el count
+    sale del cache.
+    
+    Eventos:
+        event: alertas
+        data: {"count": 5, "nuevas": [{...formato de alertas_no_leidas_api...}]}
+    """
+    from asgiref.sync import sync_to_async
+    from django.core.handlers.asgi import ASGIRequest
+    from django.http import StreamingHttpResponse
+    from .services.alertas_tiempo_real import eventos_alertas, snapshot
+    
+    usuario = await request.auser()
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(eventos_alertas(usuario.id), content_type='text/event-stream')
+    else:
+        contenido = await sync_to_async(snapshot)(usuario.id, retry=60000)
+        response = HttpResponse(contenido, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: no bufferear el stream
+    return response
+
+
 @require_POST
 @login_required
 def marcar_alerta_leida(request, alerta_id):
@@ -3841,7 +3667,7 @@ def lista_ajustes(request):
         ajustes = ajustes.filter(materia_prima__isnull=False)
     
     context = {
-        'ajustes': ajustes,
+        'ajustes': paginar(request, ajustes, orden=('-fecha', '-id')),
         'tipo_filtro': tipo_filtro,
         'item_tipo_filtro': item_tipo_filtro,
         'tipos_ajuste': AjusteInventario.TIPO_CHOICES,
@@ -3860,14 +3686,20 @@ def crear_ajuste_producto(request, producto_id=None):
     if request.method == 'POST':
         form = AjusteProductoForm(request.POST)
         if form.is_valid():
-            ajuste = form.save(commit=False)
-            ajuste.usuario = request.user
-            ajuste.save()
+            def registrar_ajuste():
+                with transaction.atomic():
+                    ajuste = form.save(commit=False)
+                    ajuste.usuario = request.user
+                    ajuste.save()
+                    
+                    # IMPORTANTE: Actualizar el stock del producto
+                    producto = ajuste.producto
+                    producto.stock = ajuste.stock_nuevo
+                    producto.save()
+                return ajuste
             
-            # IMPORTANTE: Actualizar el stock del producto
-            producto = ajuste.producto
-            producto.stock = ajuste.stock_nuevo
-            producto.save()
+            # Escritura serializada y reintentada ante locks de SQLite
+            ajuste = ejecutar_escritura(registrar_ajuste)
             
             messages.success(
                 request,
@@ -3909,14 +3741,25 @@ def crear_ajuste_materia_prima(request, mp_id=None):
     if request.method == 'POST':
         form = AjusteMateriaPrimaForm(request.POST)
         if form.is_valid():
-            ajuste = form.save(commit=False)
-            ajuste.usuario = request.user
-            ajuste.save()
+            def registrar_ajuste():
+                with transaction.atomic():
+                    ajuste = form.save(commit=False)
+                    ajuste.usuario = request.user
+                    ajuste.save()
+                    
+                    # IMPORTANTE: Actualizar el stock de la materia prima y sus lotes
+                    from gestion.services.lotes_service import LoteAllocator
+                    mp = ajuste.materia_prima
+                    LoteAllocator().ajustar(
+                        mp, ajuste.stock_anterior, ajuste.stock_nuevo,
+                        motivo=f'Ajuste {ajuste.tipo_display}'
+                    )
+                    mp.stock_actual = ajuste.stock_nuevo
+                    mp.save()
+                return ajuste
             
-            # IMPORTANTE: Actualizar el stock de la materia prima
-            mp = ajuste.materia_prima
-            mp.stock_actual = ajuste.stock_nuevo
-            mp.save()
+            # Escritura serializada y reintentada ante locks de SQLite
+            ajuste = ejecutar_escritura(registrar_ajuste)
             
             messages.success(
                 request,
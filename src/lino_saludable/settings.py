@@ -59,6 +59,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # WhiteNoise debe ir después de SecurityMiddleware
+    'gestion.perf.PerfMiddleware',  # Queries/latencia por vista (ver /gestion/sistema/perf/)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -94,6 +95,43 @@ WSGI_APPLICATION = 'lino_saludable.wsgi.application'
 
 import dj_database_url
 
+# ============================================================
+# 🗄️ SQLITE EN PRODUCCIÓN (varios workers)
+# ============================================================
+# Perfil para servir SQLite con varios workers de gunicorn sin
+# "database is locked":
+# - journal_mode=WAL: los lectores no bloquean al escritor ni viceversa
+# - synchronous=NORMAL: fsync solo en los checkpoints (seguro con WAL)
+# - mmap_size / cache_size: lecturas desde memoria en lugar de read()
+# - busy_timeout: esperar el lock en lugar de fallar de inmediato
+# - BEGIN IMMEDIATE: toma el lock de escritura al abrir la transacción;
+#   con DEFERRED, una transacción que lee y luego escribe falla sin
+#   respetar busy_timeout si otro proceso escribió en el medio
+# Se activa con LINO_SQLITE_PRODUCCION=True (siempre en settings_production),
+# tanto para db.sqlite3 como para un DATABASE_URL sqlite://.
+# Las escrituras de ventas, compras y ajustes además pasan por
+# gestion.escrituras (serialización por proceso + reintentos).
+LINO_SQLITE_PRODUCCION = os.environ.get('LINO_SQLITE_PRODUCCION', 'False') == 'True'
+LINO_SQLITE_BUSY_TIMEOUT = int(os.environ.get('LINO_SQLITE_BUSY_TIMEOUT', '5000'))  # ms
+LINO_SQLITE_MMAP_MB = int(os.environ.get('LINO_SQLITE_MMAP_MB', '256'))
+LINO_SQLITE_CACHE_MB = int(os.environ.get('LINO_SQLITE_CACHE_MB', '64'))
+SQLITE_OPCIONES_PRODUCCION = {
+    'init_command': ';'.join([
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        f'PRAGMA mmap_size={LINO_SQLITE_MMAP_MB * 1024 * 1024}',
+        f'PRAGMA cache_size=-{LINO_SQLITE_CACHE_MB * 1024}',  # negativo = KiB
+        f'PRAGMA busy_timeout={LINO_SQLITE_BUSY_TIMEOUT}',
+    ]),
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': LINO_SQLITE_BUSY_TIMEOUT / 1000,  # segundos (mismo valor que busy_timeout)
+}
+
+# Escrituras serializadas con reintento (gestion.escrituras)
+LINO_ESCRITURAS_SERIALIZADAS = os.environ.get('LINO_ESCRITURAS_SERIALIZADAS', 'True') == 'True'
+LINO_ESCRITURAS_REINTENTOS = int(os.environ.get('LINO_ESCRITURAS_REINTENTOS', '5'))
+LINO_ESCRITURAS_ESPERA_MS = int(os.environ.get('LINO_ESCRITURAS_ESPERA_MS', '50'))  # se duplica en cada reintento
+
 # Usar DATABASE_URL si está disponible (Railway), sino SQLite
 if os.environ.get('DATABASE_URL'):
     DATABASES = {
@@ -107,10 +145,13 @@ else:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
+            'NAME': os.environ.get('LINO_SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
         }
     }
 
+if LINO_SQLITE_PRODUCCION and DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['OPTIONS'] = {**DATABASES['default'].get('OPTIONS', {}), **SQLITE_OPCIONES_PRODUCCION}
+
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
 ]
@@ -192,7 +233,15 @@ RATELIMIT_USE_CACHE = 'default'
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
-    }
+    },
+    # Contador de alertas no leídas por usuario (badge + stream SSE).
+    # Solo se usa si el backend es compartido (Redis): con LocMem el badge
+    # hace un COUNT por request y el stream consulta la base en cada intervalo.
+    'alertas': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'lino-alertas',
+        'TIMEOUT': None,
+    },
 }
 
 # PRODUCCIÓN: Usar Redis (descomentar y configurar)
@@ -209,6 +258,54 @@ RATELIMIT_VENTAS = '30/h'  # 30 ventas por hora
 RATELIMIT_COMPRAS = '20/h'  # 20 compras por hora
 RATELIMIT_PRODUCTOS = '50/h'  # 50 productos creados/editados por hora
 
+# ============================================================
+# 🧮 RECÁLCULO DE COSTOS DIFERIDO
+# ============================================================
+# Si está activo, los cambios de precio de materias primas se encolan en
+# RecalculoPendiente y los procesa `manage.py procesar_recalculos`
+# (o el hilo interno si LINO_RECALCULO_THREAD=True) en lugar de
+# recalcular los productos durante el request de la compra. El hilo lo
+# arrancan wsgi.py / asgi.py: no corre en migrate, shell ni otros comandos.
+LINO_RECALCULO_DIFERIDO = os.environ.get('LINO_RECALCULO_DIFERIDO', 'False') == 'True'
+LINO_RECALCULO_THREAD = os.environ.get('LINO_RECALCULO_THREAD', 'False') == 'True'
+LINO_RECALCULO_INTERVALO = int(os.environ.get('LINO_RECALCULO_INTERVALO', '30'))  # segundos
+
+# ============================================================
+# ⏱️ INSTRUMENTACIÓN DE RENDIMIENTO (gestion.perf)
+# ============================================================
+# PerfMiddleware mide queries, tiempo SQL, render de templates y latencia
+# de cada vista. Los presupuestos se declaran con @presupuesto en la vista.
+# El header Server-Timing solo se envía a usuarios staff.
+LINO_PERF_ENABLE = os.environ.get('LINO_PERF_ENABLE', 'True') == 'True'
+LINO_PERF_ESTRICTO = os.environ.get('LINO_PERF_ESTRICTO', 'False') == 'True'  # Lanza excepción si se excede el presupuesto
+LINO_PERF_UMBRAL_DUPLICADAS = int(os.environ.get('LINO_PERF_UMBRAL_DUPLICADAS', '5'))  # Repeticiones = N+1
+LINO_PERF_VENTANA = int(os.environ.get('LINO_PERF_VENTANA', '200'))  # Requests recordados por vista
+LINO_PERF_DUMP = os.environ.get('LINO_PERF_DUMP', '')  # Ruta del volcado JSON (vacío = deshabilitado)
+LINO_PERF_DUMP_INTERVALO = int(os.environ.get('LINO_PERF_DUMP_INTERVALO', '60'))  # segundos
+
+# ============================================================
+# 🔔 ALERTAS EN TIEMPO REAL (SSE)
+# ============================================================
+# /gestion/api/alertas/stream/ empuja el contador de alertas no leídas.
+# Requiere servir bajo ASGI para mantener la conexión abierta, por ejemplo:
+#   gunicorn lino_saludable.asgi:application -k uvicorn.workers.UvicornWorker
+# Bajo WSGI responde un único evento y el navegador se reconecta cada 60s.
+LINO_ALERTAS_CACHE = 'alertas'
+LINO_ALERTAS_SSE_INTERVALO = float(os.environ.get('LINO_ALERTAS_SSE_INTERVALO', '1'))  # segundos entre lecturas del cache
+LINO_ALERTAS_SSE_DURACION = int(os.environ.get('LINO_ALERTAS_SSE_DURACION', '300'))  # segundos por conexión
+
+# ============================================================
+# 📄 REPORTES EN SEGUNDO PLANO (ReporteJob)
+# ============================================================
+# Los PDF / XLSX se generan fuera del request y se guardan en
+# LINO_REPORTES_DIR, reutilizándose mientras los datos no cambien.
+# Por defecto los genera un pool de hilos de cada proceso web (el deploy
+# de Railway no corre otro proceso). Con un worker aparte
+# (`manage.py procesar_reportes --loop --hilos N`) usar LINO_REPORTES_THREAD=False.
+LINO_REPORTES_DIR = os.environ.get('LINO_REPORTES_DIR', os.path.join(BASE_DIR, 'reportes_generados'))
+LINO_REPORTES_THREAD = os.environ.get('LINO_REPORTES_THREAD', 'True') == 'True'
+LINO_REPORTES_HILOS = int(os.environ.get('LINO_REPORTES_HILOS', '2'))
+
 # ============================================================
 # 📝 LOGGING - Para ver errores en Railway
 # ============================================================
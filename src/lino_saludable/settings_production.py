@@ -6,6 +6,7 @@ IMPORTANTE: Configurar las siguientes variables de entorno:
 - SECRET_KEY: Clave secreta única (generar nueva, no usar la de desarrollo)
 - ALLOWED_HOSTS: Dominio del servidor (ej: lino.miempresa.com)
 - DB_NAME, DB_USER, DB_PASSWORD: Credenciales de PostgreSQL (opcional)
+- LINO_SQLITE_PATH: Ruta del archivo SQLite (opcional, default: db.sqlite3)
 """
 import os
 from .settings import *
@@ -27,13 +28,11 @@ ALLOWED_HOSTS = [host.strip() for host in ALLOWED_HOSTS_STR.split(',')]
 ALLOWED_HOSTS.extend(['127.0.0.1', 'localhost'])  # Siempre permitir local
 
 # ==================== BASE DE DATOS DE PRODUCCIÓN ====================
-# Opción 1: SQLite (Simple, para empezar)
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
+# Opción 1: SQLite con el perfil de producción (WAL, BEGIN IMMEDIATE,
+# busy_timeout; ver SQLITE_OPCIONES_PRODUCCION en settings.py), ya sea
+# db.sqlite3 / LINO_SQLITE_PATH o un DATABASE_URL sqlite://
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['OPTIONS'] = {**DATABASES['default'].get('OPTIONS', {}), **SQLITE_OPCIONES_PRODUCCION}
 
 # Opción 2: PostgreSQL (Recomendado para producción seria)
 # Descomentar si se usa PostgreSQL:
@@ -179,7 +178,14 @@ CACHES = {
         'OPTIONS': {
             'MAX_CONNECTIONS': 50,
         }
-    }
+    },
+    # Contador de alertas no leídas por usuario, compartido entre workers
+    'alertas': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+        'KEY_PREFIX': 'lino',
+        'TIMEOUT': None,
+    },
 }
 
 # Alternativa si no tienes Redis: usar locmem (solo 1 worker de Gunicorn)
@@ -190,6 +196,12 @@ CACHES = {
 #     }
 # }
 
+# ==================== 📄 REPORTES EN SEGUNDO PLANO ====================
+# Por defecto los genera un pool de hilos de cada worker de Gunicorn. Si se
+# agrega un proceso aparte, poner LINO_REPORTES_THREAD=False y correr:
+#   python manage.py procesar_reportes --loop --hilos 2
+LINO_REPORTES_THREAD = os.environ.get('LINO_REPORTES_THREAD', 'True') == 'True'
+
 # ==================== 🛡️ RATE LIMITING ====================
 RATELIMIT_ENABLE = True  # ACTIVADO en producción
 RATELIMIT_USE_CACHE = 'default'
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lino_saludable.settings')
 
 application = get_wsgi_application()
+
+# Hilos de fondo opcionales: solo en los procesos que sirven requests
+from gestion.services.recalculo_service import iniciar_worker_si_configurado  # noqa: E402
+
+iniciar_worker_si_configurado()
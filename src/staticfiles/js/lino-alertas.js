@@ -3,11 +3,12 @@
  * Sistema de notificaciones real-time con AJAX
  * 
  * Funciones principales:
- * - updateAlertasBadge(): Actualiza contador navbar cada 60s
+ * - startAlertasStream(): Recibe count y alertas nuevas por SSE (push)
+ * - updateAlertasBadge(): Actualiza contador navbar (AJAX, desde cache)
  * - toggleAlertasPanel(): Abre/cierra panel slide-in
  * - loadAlertasPanel(): Carga alertas vía AJAX
  * - marcarAlertaLeida(): Marca alerta leída sin reload
- * - startAlertasPolling(): Auto-update cada 60 segundos
+ * - startAlertasPolling(): Respaldo cada 60 segundos si no hay EventSource
  * 
  * @version 1.0
  * @date 2025-11-04
@@ -21,15 +22,50 @@ console.log('[LINO Alertas] Script cargado');
 
 let alertasPanelOpen = false;
 let alertasPollingInterval = null;
+let alertasStream = null;
+let alertasStreamErrores = 0;
 const POLLING_INTERVAL = 60000; // 60 segundos
+const STREAM_URL = '/gestion/api/alertas/stream/';
+const STREAM_MAX_ERRORES = 3; // Errores seguidos antes de volver al polling
 
 // ==========================================
 // ACTUALIZAR BADGE CONTADOR
 // ==========================================
 
 /**
- * Actualiza el badge del navbar con el count de alertas no leídas
- * Se ejecuta cada 60 segundos automáticamente
+ * Pinta el badge del navbar con el count de alertas no leídas
+ * @param {number} count - Cantidad de alertas no leídas
+ */
+function renderAlertasBadge(count) {
+    const badge = document.getElementById('alertas-badge');
+    const bell = document.getElementById('alertas-bell');
+    
+    if (!badge || !bell) {
+        console.warn('[LINO Alertas] Elementos badge/bell no encontrados en DOM');
+        return;
+    }
+    
+    if (count > 0) {
+        badge.textContent = count > 99 ? '99+' : count;
+        badge.style.display = 'inline-block';
+        
+        // Animación shake solo si hay nuevas alertas
+        const oldCount = parseInt(badge.dataset.lastCount || '0');
+        if (count > oldCount) {
+            bell.classList.add('has-new');
+            setTimeout(() => bell.classList.remove('has-new'), 500);
+        }
+    } else {
+        badge.style.display = 'none';
+        bell.classList.remove('has-new');
+    }
+    badge.dataset.lastCount = count;
+    
+    console.log(`[LINO Alertas] Badge actualizado: ${count} alertas`);
+}
+
+/**
+ * Actualiza el badge del navbar vía AJAX (el count sale del cache del servidor)
  */
 async function updateAlertasBadge() {
     try {
@@ -40,32 +76,7 @@ async function updateAlertasBadge() {
         }
         
         const data = await response.json();
-        const badge = document.getElementById('alertas-badge');
-        const bell = document.getElementById('alertas-bell');
-        
-        if (!badge || !bell) {
-            console.warn('[LINO Alertas] Elementos badge/bell no encontrados en DOM');
-            return;
-        }
-        
-        if (data.count > 0) {
-            badge.textContent = data.count > 99 ? '99+' : data.count;
-            badge.style.display = 'inline-block';
-            
-            // Animación shake solo si hay nuevas alertas
-            const oldCount = parseInt(badge.dataset.lastCount || '0');
-            if (data.count > oldCount) {
-                bell.classList.add('has-new');
-                setTimeout(() => bell.classList.remove('has-new'), 500);
-            }
-            
-            badge.dataset.lastCount = data.count;
-        } else {
-            badge.style.display = 'none';
-            bell.classList.remove('has-new');
-        }
-        
-        console.log(`[LINO Alertas] Badge actualizado: ${data.count} alertas`);
+        renderAlertasBadge(data.count);
         
     } catch (error) {
         console.error('[LINO Alertas] Error updating badge:', error);
@@ -233,8 +244,10 @@ async function marcarAlertaLeida(alertaId) {
         const data = await response.json();
         
         if (data.success) {
-            // Actualizar badge inmediatamente
-            updateAlertasBadge();
+            // Con SSE el nuevo count llega solo; sin stream, actualizar ya
+            if (!alertasStream) {
+                updateAlertasBadge();
+            }
             
             // Recargar panel para mostrar nuevas alertas
             if (alertasPanelOpen) {
@@ -254,12 +267,62 @@ async function marcarAlertaLeida(alertaId) {
 }
 
 // ==========================================
-// POLLING AUTO-UPDATE
+// STREAM SSE (PUSH)
+// ==========================================
+
+/**
+ * Abre el stream SSE de alertas. El servidor empuja el count y las alertas
+ * nuevas solo cuando cambian; si EventSource no está disponible o el
+ * stream falla varias veces seguidas, vuelve al polling.
+ */
+function startAlertasStream() {
+    if (!window.EventSource) {
+        startAlertasPolling();
+        return;
+    }
+    
+    stopAlertasStream();
+    alertasStream = new EventSource(STREAM_URL);
+    
+    alertasStream.addEventListener('alertas', function(event) {
+        alertasStreamErrores = 0;
+        const data = JSON.parse(event.data);
+        renderAlertasBadge(data.count);
+        
+        if (data.nuevas.length > 0 && alertasPanelOpen) {
+            loadAlertasPanel();
+        }
+    });
+    
+    alertasStream.onerror = function() {
+        alertasStreamErrores += 1;
+        if (alertasStreamErrores >= STREAM_MAX_ERRORES) {
+            console.warn('[LINO Alertas] Stream SSE no disponible, usando polling');
+            stopAlertasStream();
+            startAlertasPolling();
+        }
+    };
+    
+    console.log('[LINO Alertas] Stream SSE iniciado');
+}
+
+/**
+ * Cierra el stream SSE
+ */
+function stopAlertasStream() {
+    if (alertasStream) {
+        alertasStream.close();
+        alertasStream = null;
+    }
+}
+
+// ==========================================
+// POLLING AUTO-UPDATE (RESPALDO)
 // ==========================================
 
 /**
  * Inicia el polling cada 60 segundos para actualizar el badge
- * Se ejecuta automáticamente al cargar la página
+ * Respaldo cuando el stream SSE no está disponible
  */
 function startAlertasPolling() {
     // Update inmediato
@@ -355,8 +418,8 @@ function showToast(message, type = 'info') {
 document.addEventListener('DOMContentLoaded', function() {
     console.log('[LINO Alertas] DOM ready, iniciando sistema');
     
-    // Iniciar polling automático
-    startAlertasPolling();
+    // Iniciar stream SSE (con polling de respaldo)
+    startAlertasStream();
     
     // Event listener para cerrar panel con ESC
     document.addEventListener('keydown', function(e) {
@@ -370,6 +433,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
 // Cleanup al salir de la página
 window.addEventListener('beforeunload', function() {
+    stopAlertasStream();
     stopAlertasPolling();
 });
 
@@ -0,0 +1,133 @@
+"""
+Tests para AlertasEngine - Generación de alertas en bloque
+===========================================================
+
+Verifica que:
+1. Las alertas de stock, margen, stock muerto y oportunidades se generan para todos los usuarios
+2. No se duplican alertas no leídas entre ejecuciones
+3. La cantidad de queries no depende de productos ni usuarios
+4. El comando generar_alertas reporta tiempos por tipo
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from gestion.models import Alerta, MateriaPrima, Producto
+from gestion.services.alertas_engine import AlertasEngine
+from gestion.services.alertas_service import AlertasService
+from gestion.services.venta_posting_service import VentaPostingService
+
+
+class TestAlertasEngine(TestCase):
+
+    def setUp(self):
+        self.usuarios = [
+            User.objects.create_user(username=f'empleado{i}', password='test_pass')
+            for i in range(3)
+        ]
+        self.avena = MateriaPrima.objects.create(
+            nombre='Avena', unidad_medida='kg', costo_unitario=Decimal('1000')
+        )
+
+    def _producto(self, nombre, **kwargs):
+        datos = {'precio': 1000, 'stock': 50, 'stock_minimo': 5, 'categoria': 'test'}
+        datos.update(kwargs)
+        return Producto.objects.create(nombre=nombre, **datos)
+
+    def test_alertas_por_tipo_para_todos_los_usuarios(self):
+        agotado = self._producto('Granola agotada', stock=0)
+        critico = self._producto('Granola crítica', stock=3)
+        # Costo real 1000 × 1.2 = 1200 > precio 1000 → margen negativo
+        perdida = self._producto(
+            'Avena a pérdida', materia_prima_asociada=self.avena, cantidad_fraccion=Decimal('1.2')
+        )
+
+        resultado, tiempos = AlertasService.generar_alertas_bulk(self.usuarios)
+
+        for usuario in self.usuarios:
+            claves = set(Alerta.objects.filter(usuario=usuario).values_list('tipo', 'producto_id'))
+            self.assertIn(('stock_agotado', agotado.id), claves)
+            self.assertIn(('stock_critico', critico.id), claves)
+            self.assertIn(('margen_negativo', perdida.id), claves)
+            # Sin ventas nunca: todo producto con stock es stock muerto
+            self.assertIn(('stock_muerto', critico.id), claves)
+            self.assertNotIn(('stock_muerto', agotado.id), claves)
+
+        self.assertEqual(resultado['stock'], 2 * len(self.usuarios))
+        self.assertEqual(resultado['total'], Alerta.objects.count())
+        self.assertEqual(
+            set(tiempos), {'stock', 'vencimiento', 'rentabilidad', 'stock_muerto', 'oportunidades', 'persistencia'}
+        )
+
+    def test_stock_muerto_y_oportunidades_por_ventas(self):
+        vendido = self._producto(
+            'Mix vendido', stock=200, materia_prima_asociada=self.avena, cantidad_fraccion=Decimal('0.8')
+        )
+        antiguo = self._producto('Mix antiguo', stock=200)
+        service = VentaPostingService(usuario=self.usuarios[0])
+        service.registrar_venta([
+            {'producto_id': vendido.id, 'cantidad': 25, 'precio_unitario': Decimal('1000')}
+        ])
+        service.registrar_venta([
+            {'producto_id': antiguo.id, 'cantidad': 1, 'precio_unitario': Decimal('1000')}
+        ], fecha=timezone.now() - timedelta(days=90))
+
+        engine = AlertasEngine(self.usuarios[:1])
+        engine.generar(['stock_muerto', 'oportunidades'])
+
+        alertas = {a.tipo: a for a in Alerta.objects.all() if a.producto_id in (vendido.id, antiguo.id)}
+        self.assertEqual(alertas['stock_muerto'].producto, antiguo)
+        self.assertIn('Sin ventas hace 90 días', alertas['stock_muerto'].mensaje)
+        self.assertEqual(alertas['oportunidad_venta'].producto, vendido)
+        # (800 × 1.40 - 1000) × 25 unidades
+        self.assertEqual(alertas['oportunidad_venta'].valor_impacto, Decimal('3000.00'))
+
+    def test_no_duplica_alertas_no_leidas(self):
+        self._producto('Granola agotada', stock=0)
+
+        self.assertEqual(AlertasService.generar_alertas_stock(self.usuarios[0]), 1)
+        self.assertEqual(AlertasService.generar_alertas_stock(self.usuarios[0]), 0)
+
+        # Una vez leída, la condición vuelve a generar alerta
+        Alerta.objects.update(leida=True)
+        resultado, _ = AlertasService.generar_alertas_bulk(self.usuarios, ['stock'])
+        self.assertEqual(resultado['stock'], len(self.usuarios))
+
+    def test_queries_constantes(self):
+        def contar_queries():
+            Alerta.objects.all().delete()
+            with CaptureQueriesContext(connection) as ctx:
+                AlertasEngine(User.objects.all()).generar()
+            # El INSERT se parte en lotes según el límite de parámetros de SQLite
+            return len([q for q in ctx.captured_queries if not q['sql'].startswith('INSERT')])
+
+        self._producto('Granola 0', stock=0)
+        antes = contar_queries()
+        for i in range(1, 10):
+            self._producto(f'Granola {i}', stock=i % 3, materia_prima_asociada=self.avena,
+                           cantidad_fraccion=Decimal('1.5'))
+        User.objects.create_user(username='nuevo', password='test_pass')
+
+        self.assertEqual(contar_queries(), antes)
+
+    def test_comando_reporta_tiempos(self):
+        self._producto('Granola agotada', stock=0)
+        salida = StringIO()
+
+        call_command('generar_alertas', stdout=salida)
+
+        texto = salida.getvalue()
+        self.assertIn('persistencia', texto)
+        self.assertIn('stock:', texto)
+        self.assertEqual(
+            Alerta.objects.filter(tipo='stock_agotado').count(),
+            User.objects.filter(is_active=True).count()
+        )
@@ -0,0 +1,159 @@
+"""
+Tests para alertas en tiempo real - ContadorAlertas y stream SSE
+=================================================================
+
+Verifica que:
+1. El contador por usuario se calcula una vez y luego se lee del cache
+2. Crear, marcar leída y borrar alertas ajusta el contador sin COUNT
+3. El bulk_create de AlertasEngine también actualiza el contador
+4. Bajo WSGI el endpoint SSE responde un único evento con retry
+5. Bajo ASGI el stream empuja el count y las alertas nuevas al cambiar
+6. Con un cache local (LocMem) el contador sale siempre de la base
+"""
+
+import json
+import tempfile
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from gestion.models import Alerta, Producto
+from gestion.services.alertas_engine import AlertasEngine
+from gestion.services.alertas_tiempo_real import ContadorAlertas
+
+
+def _eventos(contenido):
+    """Datos de los eventos `alertas` de un texto SSE."""
+    return [
+        json.loads(linea[len('data: '):])
+        for linea in contenido.splitlines() if linea.startswith('data: ')
+    ]
+
+
+@override_settings(LINO_ALERTAS_SSE_INTERVALO=0.01, LINO_ALERTAS_SSE_DURACION=5)
+class TestAlertasTiempoReal(TestCase):
+
+    def setUp(self):
+        # Cache compartido entre procesos (como Redis): el contador se sirve del cache
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        compartido = override_settings(CACHES={**settings.CACHES, 'alertas': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': directorio.name,
+            'TIMEOUT': None,
+        }})
+        compartido.enable()
+        self.addCleanup(compartido.disable)
+        caches['alertas'].clear()
+        self.usuario = User.objects.create_superuser(username='admin_alertas', password='test_pass')
+        self.producto = Producto.objects.create(nombre='Granola', precio=100, stock=0, stock_minimo=5, categoria='test')
+
+    def _alerta(self, **extra):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Alerta.objects.create(
+                tipo='stock_agotado', nivel='danger', usuario=self.usuario, producto=self.producto,
+                titulo='Sin stock', mensaje='Granola agotada', **extra
+            )
+
+    def _queries_alerta(self, funcion):
+        with CaptureQueriesContext(connection) as ctx:
+            resultado = funcion()
+        return resultado, [q for q in ctx.captured_queries if 'gestion_alerta' in q['sql']]
+
+    def test_contador_en_cache(self):
+        self._alerta()
+
+        valor, queries = self._queries_alerta(lambda: ContadorAlertas.obtener(self.usuario.id))
+        self.assertEqual((valor, len(queries)), (1, 1))
+
+        valor, queries = self._queries_alerta(lambda: ContadorAlertas.obtener(self.usuario.id))
+        self.assertEqual((valor, queries), (1, []))
+
+        self.client.force_login(self.usuario)
+        response, queries = self._queries_alerta(lambda: self.client.get(reverse('gestion:alertas_count')))
+        self.assertEqual(response.json(), {'count': 1})
+        self.assertEqual(queries, [])
+
+    def test_escrituras_ajustan_el_contador(self):
+        primera = self._alerta()
+        self.assertEqual(ContadorAlertas.obtener(self.usuario.id), 1)
+        version = ContadorAlertas.version(self.usuario.id)
+
+        segunda = self._alerta()
+        self._alerta(leida=True)
+        valor, queries = self._queries_alerta(lambda: ContadorAlertas.obtener(self.usuario.id))
+        self.assertEqual((valor, queries), (2, []))
+        self.assertEqual(ContadorAlertas.version(self.usuario.id), version + 2)
+
+        self.client.force_login(self.usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('gestion:marcar_alerta_leida', args=[primera.id]))
+        self.assertEqual(ContadorAlertas.obtener(self.usuario.id), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Alerta.objects.get(pk=segunda.pk).archivar()
+        self.assertEqual(ContadorAlertas.obtener(self.usuario.id), 0)
+
+        tercera = self._alerta()
+        with self.captureOnCommitCallbacks(execute=True):
+            Alerta.objects.filter(pk=tercera.pk).delete()
+        valor, queries = self._queries_alerta(lambda: ContadorAlertas.obtener(self.usuario.id))
+        self.assertEqual((valor, queries), (0, []))
+
+    def test_bulk_create_del_engine(self):
+        self.assertEqual(ContadorAlertas.obtener(self.usuario.id), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = AlertasEngine([self.usuario]).generar(['stock'])
+
+        self.assertEqual(resultado['total'], 1)
+        valor, queries = self._queries_alerta(lambda: ContadorAlertas.obtener(self.usuario.id))
+        self.assertEqual((valor, queries), (1, []))
+
+    def test_sse_bajo_wsgi(self):
+        self._alerta()
+        url = reverse('gestion:alertas_stream')
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(self.usuario)
+        response = self.client.get(url)
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        contenido = response.content.decode()
+        self.assertIn('retry: 60000', contenido)
+        self.assertEqual(_eventos(contenido), [{'count': 1, 'nuevas': []}])
+
+    async def test_sse_bajo_asgi(self):
+        await sync_to_async(self.async_client.force_login)(self.usuario)
+        response = await self.async_client.get(reverse('gestion:alertas_stream'))
+        self.assertTrue(response.streaming)
+        stream = aiter(response.streaming_content)
+
+        inicial = (await anext(stream)).decode()
+        self.assertEqual(_eventos(inicial), [{'count': 0, 'nuevas': []}])
+
+        alerta = await sync_to_async(self._alerta)()
+        evento = (await anext(stream)).decode()
+        datos = _eventos(evento)[0]
+        self.assertEqual(datos['count'], 1)
+        self.assertEqual([nueva['id'] for nueva in datos['nuevas']], [alerta.id])
+        await stream.aclose()
+
+    def test_sin_cache_compartido_cuenta_en_la_base(self):
+        with override_settings(CACHES={**settings.CACHES, 'alertas': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'test-alertas-local',
+        }}):
+            primera = self._alerta()
+            self.assertEqual(ContadorAlertas.obtener(self.usuario.id), 1)
+
+            # Otro proceso (otro worker, generar_alertas) marca la alerta como leída
+            Alerta.objects.filter(pk=primera.pk).update(leida=True)
+            valor, queries = self._queries_alerta(lambda: ContadorAlertas.obtener(self.usuario.id))
+            self.assertEqual((valor, len(queries)), (0, 1))
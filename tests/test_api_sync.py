@@ -0,0 +1,107 @@
+"""
+Tests para las APIs de sincronización incremental (?since=<cursor>)
+====================================================================
+
+Verifica que:
+1. La paginación por cursor recorre toda la tabla sin repetir filas
+2. Un poll sin cambios devuelve 304 con If-None-Match
+3. Los cambios (incluidas ventas eliminadas) aparecen en el delta
+4. items_count sale de una anotación (queries constantes)
+"""
+
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from gestion.models import Producto
+from gestion.services.venta_posting_service import VentaPostingService
+
+
+class TestApiSync(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='tablet', password='test_pass')
+        self.productos = [
+            Producto.objects.create(
+                nombre=f'Semillas {i}', precio=100, stock=50, stock_minimo=1, categoria='test'
+            )
+            for i in range(5)
+        ]
+
+    def test_paginacion_por_cursor(self):
+        vistos = []
+        cursor = None
+        while True:
+            params = {'limit': 2}
+            if cursor:
+                params['since'] = cursor
+            data = self.client.get('/gestion/api/productos/', params).json()
+            vistos += [p['id'] for p in data['data']]
+            cursor = data['next_cursor']
+            if not data['has_more']:
+                break
+
+        self.assertEqual(vistos, [p.id for p in self.productos])
+
+    def test_poll_sin_cambios_devuelve_304(self):
+        respuesta = self.client.get('/gestion/api/productos/')
+        cursor = respuesta.json()['next_cursor']
+
+        delta = self.client.get('/gestion/api/productos/', {'since': cursor})
+        self.assertEqual(delta.json()['count'], 0)
+
+        poll = self.client.get(
+            '/gestion/api/productos/', {'since': cursor}, HTTP_IF_NONE_MATCH=delta['ETag']
+        )
+        self.assertEqual(poll.status_code, 304)
+        self.assertEqual(poll.content, b'')
+
+        # Una venta descuenta stock vía UPDATE masivo y debe invalidar el ETag
+        VentaPostingService(usuario=self.usuario).registrar_venta([
+            {'producto_id': self.productos[2].id, 'cantidad': 1, 'precio_unitario': Decimal('100')},
+        ])
+        poll = self.client.get(
+            '/gestion/api/productos/', {'since': cursor}, HTTP_IF_NONE_MATCH=delta['ETag']
+        )
+        self.assertEqual(poll.status_code, 200)
+        self.assertEqual([p['id'] for p in poll.json()['data']], [self.productos[2].id])
+
+    def test_delta_de_ventas_incluye_eliminadas(self):
+        service = VentaPostingService(usuario=self.usuario)
+        venta = service.registrar_venta([
+            {'producto_id': p.id, 'cantidad': 1, 'precio_unitario': Decimal('100')}
+            for p in self.productos
+        ])
+        cursor = self.client.get('/gestion/api/ventas/').json()['next_cursor']
+
+        venta.eliminar_venta(self.usuario, 'prueba')
+        data = self.client.get('/gestion/api/ventas/', {'since': cursor}).json()['data']
+
+        self.assertEqual(len(data), 1)
+        self.assertTrue(data[0]['eliminada'])
+        self.assertEqual(data[0]['items_count'], len(self.productos))
+
+    def test_items_count_con_queries_constantes(self):
+        service = VentaPostingService(usuario=self.usuario)
+
+        def contar_queries():
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get('/gestion/api/ventas/')
+            return len(ctx.captured_queries)
+
+        service.registrar_venta([
+            {'producto_id': self.productos[0].id, 'cantidad': 1, 'precio_unitario': Decimal('100')}
+        ])
+        antes = contar_queries()
+        for _ in range(10):
+            service.registrar_venta([
+                {'producto_id': self.productos[0].id, 'cantidad': 1, 'precio_unitario': Decimal('100')}
+            ])
+        self.assertEqual(contar_queries(), antes)
+
+    def test_cursor_invalido(self):
+        respuesta = self.client.get('/gestion/api/productos/', {'since': 'no-es-un-cursor'})
+        self.assertEqual(respuesta.status_code, 400)
@@ -0,0 +1,104 @@
+"""
+Tests para gestion.search - Índice de búsqueda de texto
+========================================================
+
+Verifica que:
+1. La búsqueda ignora mayúsculas y acentos y acepta prefijos
+2. Los signals mantienen el índice al crear, renombrar y borrar
+3. lista_ventas encuentra ventas por cliente y por producto vendido, sin duplicados
+4. buscar() y api_buscar devuelven resultados rankeados
+5. Un save() que no toca campos indexados no escribe en el índice
+"""
+
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from gestion import search
+from gestion.models import DocumentoBusqueda, MateriaPrima, Producto, Venta
+from gestion.services.venta_posting_service import VentaPostingService
+
+
+class TestBusqueda(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser(username='admin_busqueda', password='test_pass')
+        base = dict(precio=100, stock=50, stock_minimo=5, categoria='test')
+        self.almendras = Producto.objects.create(nombre='Almendras Tostadas', marca='Lino', **base)
+        self.pasta = Producto.objects.create(nombre='PASTA DE ALMENDRÁ', **base)
+        self.nueces = Producto.objects.create(nombre='Nueces', descripcion='Mariposa extra', **base)
+
+    def _nombres(self, consulta):
+        return set(search.filtrar(Producto.objects.all(), consulta).values_list('nombre', flat=True))
+
+    def test_sin_acentos_ni_mayusculas(self):
+        self.assertEqual(self._nombres('almendra'), {'Almendras Tostadas', 'PASTA DE ALMENDRÁ'})
+        self.assertEqual(self._nombres('ALMENDRÁS tost'), {'Almendras Tostadas'})
+        self.assertEqual(self._nombres('mariposa'), {'Nueces'})
+        self.assertEqual(self._nombres('castañas'), set())
+        self.assertEqual(self._nombres('   '), {'Almendras Tostadas', 'PASTA DE ALMENDRÁ', 'Nueces'})
+
+    def test_signals_mantienen_el_indice(self):
+        self.nueces.nombre = 'Nueces Peladas'
+        self.nueces.save()
+        self.assertEqual(self._nombres('peladas'), {'Nueces Peladas'})
+
+        self.pasta.delete()
+        self.assertEqual(self._nombres('almendra'), {'Almendras Tostadas'})
+        self.assertFalse(DocumentoBusqueda.objects.filter(tipo='producto', objeto_id=self.pasta.pk).exists())
+
+        materia = MateriaPrima.objects.create(nombre='Harina de Algarroba', unidad_medida='kg', proveedor='Molino Sur')
+        encontradas = search.filtrar(MateriaPrima.objects.all(), 'molino')
+        self.assertEqual(list(encontradas), [materia])
+
+    def test_lista_ventas_por_cliente_y_producto(self):
+        servicio = VentaPostingService(usuario=self.usuario)
+        linea = lambda producto: {'producto_id': producto.id, 'cantidad': 1, 'precio_unitario': Decimal('100')}
+        # Dos líneas del mismo producto buscado: la venta debe aparecer una sola vez
+        con_almendras = servicio.registrar_venta([linea(self.almendras), linea(self.pasta)])
+        de_cliente = servicio.registrar_venta([linea(self.nueces)], cliente='Almacén Ñandú')
+        servicio.registrar_venta([linea(self.nueces)])
+
+        self.client.force_login(self.usuario)
+        response = self.client.get(reverse('gestion:lista_ventas'), {'q': 'almendra'})
+        self.assertEqual([v.id for v in response.context['ventas']], [con_almendras.id])
+
+        response = self.client.get(reverse('gestion:lista_ventas'), {'q': 'nandu'})
+        self.assertEqual([v.id for v in response.context['ventas']], [de_cliente.id])
+
+        # Las ventas eliminadas siguen indexadas pero la lista no las muestra
+        Venta.todos.filter(pk=de_cliente.pk).update(eliminada=True)
+        response = self.client.get(reverse('gestion:lista_ventas'), {'q': 'nandu'})
+        self.assertEqual(list(response.context['ventas']), [])
+
+    def test_buscar_y_api(self):
+        resultados = search.buscar('almendra tostada')
+        self.assertEqual([(r['tipo'], r['objeto']) for r in resultados], [('producto', self.almendras)])
+
+        resultados = search.buscar('almendra', tipos=['producto'], limite=1)
+        self.assertEqual(len(resultados), 1)
+        self.assertGreater(resultados[0]['puntaje'], 0)
+        self.assertEqual(search.buscar('almendra', tipos=['compra']), [])
+
+        url = reverse('gestion:api_buscar')
+        self.assertEqual(self.client.get(url, {'q': 'almendra'}).status_code, 302)
+        self.client.force_login(self.usuario)
+        data = self.client.get(url, {'q': 'almendra', 'tipos': 'producto'}).json()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual({item['id'] for item in data['data']}, {self.almendras.id, self.pasta.id})
+
+    def test_save_sin_campos_indexados_y_reindexar(self):
+        self.almendras.stock = 10
+        with CaptureQueriesContext(connection) as ctx:
+            self.almendras.save(update_fields=['stock', 'estado_stock'])
+        self.assertFalse([q for q in ctx.captured_queries if 'gestion_documentobusqueda' in q['sql']])
+
+        DocumentoBusqueda.objects.all().delete()
+        self.assertEqual(self._nombres('almendra'), set())
+        conteos = search.reindexar(['producto', 'materia_prima'])
+        self.assertEqual(conteos, {'producto': 3, 'materia_prima': 0})
+        self.assertEqual(self._nombres('almendra'), {'Almendras Tostadas', 'PASTA DE ALMENDRÁ'})
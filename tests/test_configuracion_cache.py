@@ -0,0 +1,86 @@
+"""
+Tests para ConfiguracionCostos.get_config() - Singleton cacheado
+================================================================
+
+Verifica que:
+1. Con cache compartido la configuración se lee de la DB una sola vez por proceso
+2. Guardarla invalida el caché (post_save)
+3. Un cambio de sello de versión (otro worker la guardó) fuerza la relectura
+4. Sin cache compartido (DummyCache / LocMem) cada llamada lee la fila
+5. Cada llamada devuelve una copia: modificarla no afecta a otros hilos
+"""
+
+import tempfile
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from gestion.models import Producto, ConfiguracionCostos
+
+
+class TestConfiguracionCache(TestCase):
+
+    def setUp(self):
+        # Cache compartido entre procesos (como Redis)
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        compartido = override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directorio.name}
+        })
+        compartido.enable()
+        self.addCleanup(compartido.disable)
+        # Los rollbacks de TestCase no disparan señales: partir de un caché limpio
+        ConfiguracionCostos.invalidar_cache()
+
+    def test_una_sola_query_por_proceso(self):
+        ConfiguracionCostos.get_config()
+        producto = Producto.objects.create(
+            nombre='Nueces 250g', precio=1000, stock=5, stock_minimo=1,
+            categoria='test', costo_base=Decimal('500.00')
+        )
+
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(20):
+                producto.calcular_costo_unitario()
+                producto.calcular_precio_venta()
+
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_save_invalida_el_cache(self):
+        config = ConfiguracionCostos.get_config()
+
+        editable = ConfiguracionCostos.objects.get(pk=config.pk)
+        editable.margen_objetivo = Decimal('42.00')
+        editable.save()
+
+        self.assertEqual(ConfiguracionCostos.get_config().margen_objetivo, Decimal('42.00'))
+
+    def test_sello_compartido_fuerza_relectura(self):
+        config = ConfiguracionCostos.get_config()
+        # Otro worker guardó la configuración: solo cambia el sello compartido
+        ConfiguracionCostos.objects.filter(pk=config.pk).update(margen_objetivo=Decimal('50.00'))
+        self.assertNotEqual(ConfiguracionCostos.get_config().margen_objetivo, Decimal('50.00'))
+        cache.set(ConfiguracionCostos.CACHE_VERSION_KEY, 'otro-worker')
+
+        self.assertEqual(ConfiguracionCostos.get_config().margen_objetivo, Decimal('50.00'))
+
+    def test_sin_cache_compartido_lee_la_fila(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            config = ConfiguracionCostos.get_config()
+            # Otro worker guardó: con LocMem su sello no llega a este proceso
+            ConfiguracionCostos.objects.filter(pk=config.pk).update(margen_objetivo=Decimal('60.00'))
+
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(ConfiguracionCostos.get_config().margen_objetivo, Decimal('60.00'))
+            self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_devuelve_una_copia(self):
+        config = ConfiguracionCostos.get_config()
+        config.margen_objetivo = Decimal('99.00')
+
+        otra = ConfiguracionCostos.get_config()
+        self.assertIsNot(otra, config)
+        self.assertNotEqual(otra.margen_objetivo, Decimal('99.00'))
@@ -0,0 +1,155 @@
+"""
+Tests para los contadores de ventas de Producto
+================================================
+
+Verifica que:
+1. Registrar una venta suma última venta, unidades de 7/30 días e ingresos del mes en el mismo UPDATE del stock
+2. El soft delete descuenta la venta (y retrocede la última venta) y la restauración la vuelve a sumar
+3. envejecer_contadores_ventas saca de las ventanas las ventas viejas y --completo rehace todo el historial
+4. Un save() de una instancia cargada antes de la venta no pisa los contadores (y reinserta una fila borrada)
+5. Stock muerto y rotación lenta salen de un filtro por rango sobre ultima_venta (sin stock no cuenta)
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from gestion.analytics import AnalyticsRentabilidad
+from gestion.models import Producto, Venta, VentaDetalle, ventanas_contadores
+from gestion.services.alertas_engine import AlertasEngine
+from gestion.services.inventario_service import InventarioService
+from gestion.services.marketing_service import MarketingService
+from gestion.services.venta_posting_service import VentaPostingService
+
+
+class TestContadoresVentas(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser(username='admin_contadores', password='test_pass')
+        self.servicio = VentaPostingService(usuario=self.usuario)
+        self.ahora = timezone.now()
+        base = dict(precio=100, costo_base=Decimal('40'), stock_minimo=1, categoria='test', tipo_producto='reventa')
+        self.granola = Producto.objects.create(nombre='Granola', stock=100, **base)
+        self.yogur = Producto.objects.create(nombre='Yogur', stock=100, **base)
+        self.miel = Producto.objects.create(nombre='Miel', stock=10, **base)
+        self.nueces = Producto.objects.create(nombre='Nueces', stock=0, **base)
+
+    def _vender(self, *lineas, dias_atras=0):
+        return self.servicio.registrar_venta(
+            [{'producto_id': p.id, 'cantidad': c, 'precio_unitario': Decimal('100')} for p, c in lineas],
+            fecha=self.ahora - timedelta(days=dias_atras),
+        )
+
+    def _contadores(self, producto):
+        producto.refresh_from_db()
+        return (producto.ultima_venta, producto.unidades_7d, producto.unidades_30d, producto.ingresos_mes)
+
+    def test_registrar_venta_suma_contadores(self):
+        anterior = self._vender((self.granola, 4), dias_atras=10)
+        with CaptureQueriesContext(connection) as ctx:
+            venta = self._vender((self.granola, 3), (self.yogur, 2), (self.granola, 1))
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "gestion_producto"')]
+        self.assertEqual(len(updates), 1)
+
+        # La venta de hace 10 días suma al mes solo si cae en el mes en curso
+        ingresos_anterior = Decimal('400') if 'ingresos_mes' in ventanas_contadores(anterior.fecha) else 0
+        self.assertEqual(self._contadores(self.granola), (venta.fecha, 4, 8, Decimal('400') + ingresos_anterior))
+        self.assertEqual(self._contadores(self.yogur), (venta.fecha, 2, 2, Decimal('200')))
+        self.assertEqual(self._contadores(self.miel), (None, 0, 0, Decimal('0')))
+
+        # Una venta vieja no retrocede la última venta ni entra en las ventanas
+        self._vender((self.granola, 5), dias_atras=40)
+        self.assertEqual(self._contadores(self.granola)[:3], (venta.fecha, 4, 8))
+
+    def test_soft_delete_y_restauracion(self):
+        anterior = self._vender((self.granola, 2), dias_atras=3)
+        venta = self._vender((self.granola, 1), (self.yogur, 5))
+        antes = self._contadores(self.granola), self._contadores(self.yogur)
+
+        venta.eliminar_venta(self.usuario, 'Error de carga')
+        self.assertEqual(self._contadores(self.granola)[:3], (anterior.fecha, 2, 2))
+        self.assertEqual(self._contadores(self.yogur), (None, 0, 0, Decimal('0')))
+
+        # Eliminar dos veces no descuenta dos veces
+        venta.eliminar_venta(self.usuario)
+        self.assertEqual(self._contadores(self.granola)[1], 2)
+
+        venta.restaurar_venta(self.usuario)
+        self.assertEqual((self._contadores(self.granola), self._contadores(self.yogur)), antes)
+
+    def test_envejecer_y_reconstruir(self):
+        hoy = timezone.localdate()
+        self._vender((self.granola, 3))
+        self._vender((self.granola, 4), dias_atras=10)
+        # Carga directa de una línea (sin posting): también suma
+        venta = Venta.objects.create(usuario=self.usuario, total=Decimal('200'))
+        VentaDetalle.objects.create(
+            venta=venta, producto=self.yogur, cantidad=2, precio_unitario=Decimal('100'), subtotal=Decimal('200'),
+        )
+        self.assertEqual(self._contadores(self.yogur)[1:3], (2, 2))
+        incremental = [self._contadores(p) for p in (self.granola, self.yogur, self.miel)]
+
+        # Corrida de la misma noche: no cambia nada
+        salida = StringIO()
+        call_command('envejecer_contadores_ventas', stdout=salida)
+        self.assertIn('0 productos actualizados', salida.getvalue())
+
+        # Ocho días después las ventas de hoy salen de la ventana de 7 días
+        call_command('envejecer_contadores_ventas', '--hoy', (hoy + timedelta(days=8)).isoformat(), stdout=StringIO())
+        self.assertEqual(self._contadores(self.granola)[:3], (incremental[0][0], 0, 7))
+        # Cuarenta días después no queda nada en las ventanas, pero la última venta se conserva
+        call_command('envejecer_contadores_ventas', '--hoy', (hoy + timedelta(days=40)).isoformat(), stdout=StringIO())
+        self.assertEqual(self._contadores(self.granola), (incremental[0][0], 0, 0, Decimal('0')))
+
+        Producto.objects.update(ultima_venta=None, unidades_7d=99)
+        call_command('envejecer_contadores_ventas', '--completo', stdout=StringIO())
+        self.assertEqual([self._contadores(p) for p in (self.granola, self.yogur, self.miel)], incremental)
+
+    def test_save_no_pisa_contadores(self):
+        cargado = Producto.objects.get(pk=self.granola.pk)
+        venta = self._vender((self.granola, 3))
+
+        cargado.precio = 120
+        cargado.save()
+
+        self.assertEqual(Producto.objects.get(pk=self.granola.pk).precio, 120)
+        self.assertEqual(self._contadores(self.granola), (venta.fecha, 3, 3, Decimal('300')))
+
+        # Si otro request borró la fila, save() la vuelve a insertar
+        Producto.objects.filter(pk=self.miel.pk).delete()
+        self.miel.precio = 150
+        self.miel.save()
+        self.assertEqual(Producto.objects.get(pk=self.miel.pk).precio, 150)
+
+    def test_stock_muerto_y_rotacion_lenta(self):
+        self._vender((self.granola, 1))
+        self._vender((self.yogur, 1), dias_atras=70)
+
+        lentos = InventarioService().get_productos_rotacion_lenta()
+        self.assertEqual([(f['producto'], f['dias_sin_venta']) for f in lentos], [(self.miel, 999), (self.yogur, 70)])
+        self.yogur.refresh_from_db()
+        self.assertAlmostEqual(lentos[1]['valor_inmovilizado'], float(self.yogur.calcular_costo_unitario() * 99), places=2)
+        self.assertEqual(InventarioService().get_productos_rotacion_lenta(dias_sin_venta=90)[0]['producto'], self.miel)
+
+        with CaptureQueriesContext(connection) as ctx:
+            baja_rotacion = MarketingService().get_productos_baja_rotacion()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(
+            sorted((f['producto_nombre'], f['dias_sin_venta']) for f in baja_rotacion),
+            [('Miel', 999), ('Yogur', 70)],
+        )
+
+        muertos = AlertasEngine([self.usuario]).candidatas_stock_muerto()
+        self.assertEqual({c['producto'] for c in muertos}, {self.yogur, self.miel})
+
+        sin_rotacion = next(
+            a for a in AnalyticsRentabilidad().get_alertas_rentabilidad() if a['tipo'] == 'sin_rotacion'
+        )
+        self.assertEqual(set(sin_rotacion['productos']), {self.yogur, self.miel})
@@ -0,0 +1,166 @@
+"""
+Tests para CoocurrenciaProducto - Pares de productos vendidos juntos
+=====================================================================
+
+Verifica que:
+1. Registrar una venta suma sus pares (las dos direcciones y la diagonal)
+2. El soft delete descuenta los pares y la restauración los vuelve a sumar
+3. rebuild_coocurrencias reproduce el mismo estado que el mantenimiento incremental
+4. Los pares frecuentes y el cross-selling de un producto son una sola query
+5. Registrar una venta cuesta las mismas queries con pares nuevos o existentes
+6. Las líneas guardadas una a una (formularios, admin, shell) suman los mismos pares que rebuild
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from gestion.models import CoocurrenciaProducto, Producto, Venta, VentaDetalle
+from gestion.services.marketing_service import MarketingService
+from gestion.services.venta_posting_service import VentaPostingService
+
+
+class TestCoocurrencias(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser(username='admin_cooc', password='test_pass')
+        self.servicio = VentaPostingService(usuario=self.usuario)
+        base = dict(precio=100, stock=100, stock_minimo=1, categoria='test')
+        self.granola, self.yogur, self.miel, self.nueces = [
+            Producto.objects.create(nombre=nombre, **base)
+            for nombre in ('Granola', 'Yogur', 'Miel', 'Nueces')
+        ]
+
+    def _vender(self, *productos, fecha=None):
+        lineas = [
+            {'producto_id': p.id, 'cantidad': 1, 'precio_unitario': Decimal('100')}
+            for p in productos
+        ]
+        return self.servicio.registrar_venta(lineas, fecha=fecha)
+
+    def _pares(self):
+        return {
+            (c.producto_id, c.relacionado_id): c.ventas
+            for c in CoocurrenciaProducto.objects.all()
+        }
+
+    def test_registrar_venta_suma_pares(self):
+        ayer = timezone.now() - timedelta(days=1)
+        self._vender(self.granola, self.yogur, fecha=ayer)
+        # Producto repetido en la canasta: cuenta una sola vez
+        venta = self._vender(self.granola, self.yogur, self.granola, self.miel)
+
+        g, y, m = self.granola.id, self.yogur.id, self.miel.id
+        self.assertEqual(self._pares(), {
+            (g, g): 2, (y, y): 2, (m, m): 1,
+            (g, y): 2, (y, g): 2,
+            (g, m): 1, (m, g): 1,
+            (y, m): 1, (m, y): 1,
+        })
+        par = CoocurrenciaProducto.objects.get(producto=self.granola, relacionado=self.yogur)
+        self.assertEqual(par.ultima_venta, venta.fecha)
+
+        # Una venta anterior no retrocede la última venta en común
+        self._vender(self.granola, self.yogur, fecha=ayer - timedelta(days=1))
+        par.refresh_from_db()
+        self.assertEqual((par.ventas, par.ultima_venta), (3, venta.fecha))
+
+    def test_soft_delete_y_restauracion(self):
+        self._vender(self.granola, self.yogur)
+        venta = self._vender(self.granola, self.yogur, self.miel)
+        antes = self._pares()
+
+        venta.eliminar_venta(self.usuario, 'Error de carga')
+        g, y = self.granola.id, self.yogur.id
+        self.assertEqual(self._pares(), {(g, g): 1, (y, y): 1, (g, y): 1, (y, g): 1})
+        self.assertFalse(CoocurrenciaProducto.objects.filter(producto=self.miel).exists())
+
+        # Eliminar dos veces no descuenta dos veces
+        venta.eliminar_venta(self.usuario)
+        self.assertEqual(self._pares()[(g, y)], 1)
+
+        venta.restaurar_venta(self.usuario)
+        self.assertEqual(self._pares(), antes)
+
+    def test_rebuild_coincide_con_incremental(self):
+        self._vender(self.granola, self.yogur, self.miel)
+        self._vender(self.granola, self.nueces)
+        self._vender(self.yogur, self.miel)
+        self._vender(self.granola, self.miel).eliminar_venta(self.usuario)
+        incremental = self._pares()
+        ultimas = dict(
+            CoocurrenciaProducto.objects.filter(relacionado=self.granola).values_list('producto_id', 'ultima_venta')
+        )
+
+        CoocurrenciaProducto.objects.filter(producto=self.nueces).delete()
+        salida = StringIO()
+        call_command('rebuild_coocurrencias', stdout=salida)
+
+        self.assertIn(f'{len(incremental)} pares reconstruidos', salida.getvalue())
+        self.assertEqual(self._pares(), incremental)
+        # Sin bajas de por medio, la última venta también coincide
+        par = CoocurrenciaProducto.objects.get(producto=self.nueces, relacionado=self.granola)
+        self.assertEqual(par.ultima_venta, ultimas[self.nueces.id])
+
+    def test_consultas_de_una_sola_query(self):
+        for _ in range(4):
+            self._vender(self.granola, self.yogur)
+        self._vender(self.granola, self.miel)
+        self._vender(self.granola, self.yogur, self.nueces)
+        servicio = MarketingService()
+
+        with CaptureQueriesContext(connection) as ctx:
+            pares = servicio.get_cross_selling_recommendations(limit=2)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(len(pares), 2)
+        self.assertEqual((pares[0]['recomendacion'], pares[0]['frecuencia']), ('Combo: Granola + Yogur', 5))
+        self.assertEqual(pares[1]['frecuencia'], 1)
+
+        with CaptureQueriesContext(connection) as ctx:
+            relacionados = servicio.get_cross_selling_recommendations(producto_id=self.yogur.id)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        # Yogur está en 5 ventas: Granola en las 5, Nueces en 1 (20% < 30%)
+        self.assertEqual(
+            [(r['producto_nombre'], r['coincidencias'], r['porcentaje'], r['emoji']) for r in relacionados],
+            [('Granola', 5, 100.0, '⭐')],
+        )
+        self.assertEqual(servicio.get_cross_selling_recommendations(producto_id=self.miel.id + 100), [])
+
+    def test_queries_constantes_con_pares_nuevos(self):
+        self._vender(self.granola, self.yogur, self.miel)
+
+        def queries_cooc(*productos):
+            with CaptureQueriesContext(connection) as ctx:
+                self._vender(*productos)
+            return [q for q in ctx.captured_queries if 'gestion_coocurrenciaproducto' in q['sql']]
+
+        existentes = queries_cooc(self.granola, self.yogur, self.miel)
+        nuevos = queries_cooc(self.granola, self.yogur, self.miel, self.nueces)
+        self.assertEqual(len(existentes), 2)
+        self.assertEqual(len(nuevos), 2)
+        self.assertEqual(self._pares()[(self.nueces.id, self.granola.id)], 1)
+        self.assertEqual(self._pares()[(self.granola.id, self.yogur.id)], 3)
+
+    def test_lineas_guardadas_una_a_una(self):
+        self._vender(self.granola, self.yogur)
+        venta = Venta.objects.create(usuario=self.usuario, total=Decimal('400'))
+        for producto in (self.granola, self.miel, self.granola, self.nueces):
+            VentaDetalle.objects.create(
+                venta=venta, producto=producto, cantidad=1, precio_unitario=Decimal('100'), subtotal=Decimal('100'),
+            )
+
+        g, y, m, n = self.granola.id, self.yogur.id, self.miel.id, self.nueces.id
+        incremental = self._pares()
+        self.assertEqual(incremental[(g, g)], 2)
+        self.assertEqual((incremental[(g, m)], incremental[(m, n)], incremental[(n, n)]), (1, 1, 1))
+        self.assertNotIn((y, m), incremental)
+
+        CoocurrenciaProducto.reconstruir()
+        self.assertEqual(self._pares(), incremental)
@@ -0,0 +1,82 @@
+"""
+Tests para CostGraph - Propagación de costos por grafo de dependencias
+======================================================================
+
+Verifica que al cambiar el precio de una materia prima:
+1. Se recalculan recetas y cadenas multinivel de fraccionados
+2. Los costos coinciden con Producto.calcular_costo_unitario()
+3. Los cambios se aplican en bloque (queries constantes)
+"""
+
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from gestion.models import (
+    Producto, MateriaPrima, Receta, RecetaMateriaPrima, ConfiguracionCostos, HistorialCosto
+)
+from gestion.services.cost_graph import CostGraph
+
+
+class TestCostGraph(TestCase):
+
+    def setUp(self):
+        ConfiguracionCostos.objects.create(actualizar_automaticamente=True)
+        self.harina = MateriaPrima.objects.create(
+            nombre='Harina integral', unidad_medida='kg', costo_unitario=Decimal('800.00')
+        )
+        receta = Receta.objects.create(nombre='Pan')
+        RecetaMateriaPrima.objects.create(receta=receta, materia_prima=self.harina, cantidad=Decimal('1.000'))
+
+        base = dict(stock=10, stock_minimo=1, categoria='test')
+        self.pan = Producto.objects.create(
+            nombre='Pan integral 1kg', precio=1000, tipo_producto='receta',
+            tiene_receta=True, receta=receta, **base
+        )
+        self.medio = Producto.objects.create(
+            nombre='Pan 500g', precio=500, tipo_producto='fraccionamiento',
+            producto_origen=self.pan, factor_conversion=Decimal('2'), **base
+        )
+        self.cuarto = Producto.objects.create(
+            nombre='Pan 250g', precio=250, tipo_producto='fraccionamiento',
+            producto_origen=self.medio, factor_conversion=Decimal('2'), **base
+        )
+        self.ajeno = Producto.objects.create(nombre='Miel', precio=300, costo_base=Decimal('200'), **base)
+
+    def test_grafo_en_orden_topologico(self):
+        orden = list(CostGraph([self.harina]).productos_afectados())
+
+        self.assertEqual(orden, [self.pan.id, self.medio.id, self.cuarto.id])
+
+    def test_cambio_de_precio_propaga_a_toda_la_cadena(self):
+        self.harina.costo_unitario = Decimal('1200.00')
+        self.harina.save()
+
+        for producto in (self.pan, self.medio, self.cuarto):
+            producto.refresh_from_db()
+            self.assertEqual(producto.costo_base, producto.calcular_costo_unitario().quantize(Decimal('0.01')))
+        self.assertEqual(self.cuarto.costo_base, Decimal('300.00'))
+        self.assertEqual(
+            HistorialCosto.objects.filter(materia_prima_afectada=self.harina).count(), 3
+        )
+        self.assertFalse(HistorialCosto.objects.filter(producto=self.ajeno).exists())
+
+    def test_queries_constantes_por_cantidad_de_productos(self):
+        def contar_queries(precio):
+            self.harina.costo_unitario = Decimal(precio)
+            with CaptureQueriesContext(connection) as ctx:
+                CostGraph([self.harina]).propagar()
+            return len(ctx.captured_queries)
+
+        ConfiguracionCostos.get_config()  # Calentar el caché de configuración
+        antes = contar_queries('900.00')
+        for i in range(20):
+            Producto.objects.create(
+                nombre=f'Pan 100g {i}', precio=100, stock=1, stock_minimo=1, categoria='test',
+                tipo_producto='fraccionamiento', producto_origen=self.pan, factor_conversion=Decimal('10')
+            )
+        MateriaPrima.objects.filter(pk=self.harina.pk).update(costo_unitario=Decimal('1000.00'))
+
+        self.assertEqual(contar_queries('1000.00'), antes)
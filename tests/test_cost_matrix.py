@@ -0,0 +1,99 @@
+"""
+Tests para CostMatrix - Evaluador de costos en bloque
+======================================================
+
+Verifica que:
+1. El costo de la matriz coincide con Producto.calcular_costo_unitario()
+2. Las ventas del mes se agregan en un único GROUP BY
+3. RentabilidadService ejecuta una cantidad de queries constante
+"""
+
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from gestion.models import (
+    Producto, MateriaPrima, Receta, RecetaMateriaPrima, ConfiguracionCostos
+)
+from gestion.services.cost_matrix import CostMatrix
+from gestion.services.rentabilidad_service import RentabilidadService
+from gestion.services.venta_posting_service import VentaPostingService
+
+
+class TestCostMatrix(TestCase):
+
+    def setUp(self):
+        ConfiguracionCostos.objects.create(
+            incluir_costos_indirectos=True,
+            costo_envases_por_kg=Decimal('10.00'),
+            costo_etiquetas_por_unidad=Decimal('2.00'),
+            tiempo_fraccionamiento_por_kg=Decimal('6.00'),
+            valor_hora_trabajo=Decimal('600.00'),
+        )
+        self.harina = MateriaPrima.objects.create(
+            nombre='Harina integral', unidad_medida='kg', costo_unitario=Decimal('800.00')
+        )
+        self.azucar = MateriaPrima.objects.create(
+            nombre='Azúcar mascabo', unidad_medida='kg', costo_unitario=Decimal('1500.00')
+        )
+        receta = Receta.objects.create(nombre='Galletas')
+        RecetaMateriaPrima.objects.create(receta=receta, materia_prima=self.harina, cantidad=Decimal('0.500'))
+        RecetaMateriaPrima.objects.create(receta=receta, materia_prima=self.azucar, cantidad=Decimal('0.200'))
+
+        base = dict(stock=50, stock_minimo=1, categoria='test')
+        self.reventa = Producto.objects.create(
+            nombre='Harina 500g', precio=900, tipo_producto='reventa',
+            materia_prima_asociada=self.harina, cantidad_fraccion=Decimal('0.500'), **base
+        )
+        self.bolsa = Producto.objects.create(
+            nombre='Bolsa 5kg', precio=5000, tipo_producto='reventa', costo_base=Decimal('3000.00'), **base
+        )
+        self.fraccion = Producto.objects.create(
+            nombre='Fracción 1kg', precio=1500, tipo_producto='fraccionamiento',
+            producto_origen=self.bolsa, factor_conversion=Decimal('5'), **base
+        )
+        self.galletas = Producto.objects.create(
+            nombre='Galletas caseras', precio=2000, tipo_producto='receta',
+            tiene_receta=True, receta=receta, **base
+        )
+
+    def test_costos_coinciden_con_calculo_individual(self):
+        matriz = CostMatrix()
+
+        for producto in Producto.objects.all():
+            self.assertEqual(
+                matriz.costo(producto.id), producto.calcular_costo_unitario(), producto.nombre
+            )
+
+    def test_ventas_del_mes_agrupadas(self):
+        usuario = User.objects.create_user(username='cajero', password='test_pass')
+        VentaPostingService(usuario=usuario).registrar_venta([
+            {'producto_id': self.galletas.id, 'cantidad': 3, 'precio_unitario': Decimal('2000')},
+        ])
+
+        service = RentabilidadService()
+        self.assertEqual(service.matriz.ventas(self.galletas.id), (3, Decimal('6000.00')))
+        self.assertEqual(service.matriz.ventas(self.reventa.id), (0, Decimal('0')))
+
+    def test_queries_constantes_por_cantidad_de_productos(self):
+        """El dashboard de rentabilidad no debe crecer en queries con el catálogo."""
+        def contar_queries():
+            with CaptureQueriesContext(connection) as ctx:
+                service = RentabilidadService()
+                service.get_kpis_rentabilidad()
+                service.get_objetivo_margen_analisis()
+                service.get_productos_rentabilidad()
+            return len(ctx.captured_queries)
+
+        ConfiguracionCostos.get_config()  # Calentar el caché de configuración
+        antes = contar_queries()
+        for i in range(30):
+            Producto.objects.create(
+                nombre=f'Extra {i}', precio=100, stock=1, stock_minimo=1, categoria='test',
+                materia_prima_asociada=self.azucar, cantidad_fraccion=Decimal('0.050')
+            )
+
+        self.assertEqual(contar_queries(), antes)
@@ -0,0 +1,126 @@
+"""
+Tests para el costo congelado en VentaDetalle
+==============================================
+
+Verifica que:
+1. Registrar una venta congela el costo unitario y el método de cada línea
+2. Cambiar el costo después de vender no altera el CMV ni el margen del mes
+3. backfill_costos_venta completa solo las líneas sin costo, marcadas como estimadas
+4. El ROI y la rotación suman cantidad × costo congelado en SQL
+5. Congelar el costo no agrega queries por línea (los productos origen se cargan juntos)
+"""
+
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from gestion.models import MateriaPrima, Producto, Venta, VentaDetalle
+from gestion.services.analytics_service import AnalyticsService
+from gestion.services.dashboard_service import DashboardService
+from gestion.services.venta_posting_service import VentaPostingService
+
+
+class TestCostoVenta(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser(username='admin_costos', password='test_pass')
+        self.servicio = VentaPostingService(usuario=self.usuario)
+        base = dict(stock=100, stock_minimo=1, categoria='test')
+        self.avena = MateriaPrima.objects.create(
+            nombre='Avena', unidad_medida='kg', costo_unitario=Decimal('2000'),
+            stock_actual=Decimal('50'), stock_minimo=Decimal('5'),
+        )
+        self.granola = Producto.objects.create(
+            nombre='Granola', precio=1000, tipo_producto='reventa', costo_base=Decimal('400'), **base
+        )
+        self.avena_250 = Producto.objects.create(
+            nombre='Avena 250g', precio=900, tipo_producto='reventa',
+            materia_prima_asociada=self.avena, cantidad_fraccion=0.25, **base
+        )
+        self.avena_50 = Producto.objects.create(
+            nombre='Avena 50g', precio=300, tipo_producto='fraccionamiento',
+            producto_origen=self.avena_250, factor_conversion=5, **base
+        )
+
+    def _vender(self, *lineas):
+        return self.servicio.registrar_venta([
+            {'producto_id': p.id, 'cantidad': cantidad, 'precio_unitario': Decimal(str(p.precio))}
+            for p, cantidad in lineas
+        ])
+
+    def test_registrar_venta_congela_costo(self):
+        venta = self._vender((self.granola, 2), (self.avena_250, 1), (self.avena_50, 3))
+
+        detalles = {d.producto_id: d for d in venta.detalles.all()}
+        for producto, metodo in ((self.granola, 'costo_base'), (self.avena_250, 'materia_prima'), (self.avena_50, 'fraccionamiento')):
+            detalle = detalles[producto.id]
+            self.assertEqual(detalle.costo_unitario, producto.calcular_costo_unitario().quantize(Decimal('0.01')))
+            self.assertEqual(detalle.metodo_costo, metodo)
+
+        # Las líneas cargadas una a una también congelan el costo
+        suelta = VentaDetalle.objects.create(
+            venta=venta, producto=self.granola, cantidad=1, precio_unitario=1000, subtotal=1000
+        )
+        self.assertEqual((suelta.costo_unitario, suelta.metodo_costo), (detalles[self.granola.id].costo_unitario, 'costo_base'))
+
+    def test_cambio_de_costo_no_altera_el_historico(self):
+        self._vender((self.granola, 2))
+        costo_vendido = AnalyticsService().calcular_roi()['ganancia_neta']
+        margen = DashboardService().get_top_productos()[0]['margen']
+
+        self.granola.costo_base = Decimal('900')
+        self.granola.save()
+
+        self.assertEqual(AnalyticsService().calcular_roi()['ganancia_neta'], costo_vendido)
+        self.assertEqual(DashboardService().get_top_productos()[0]['margen'], margen)
+
+    def test_backfill_completa_lineas_sin_costo(self):
+        self._vender((self.granola, 1))
+        VentaDetalle.objects.update(costo_unitario=None, metodo_costo='')
+        self._vender((self.avena_250, 2))
+        congelado = VentaDetalle.objects.get(producto=self.avena_250).costo_unitario
+
+        salida = StringIO()
+        call_command('backfill_costos_venta', lote=1, stdout=salida)
+        self.assertIn('1 líneas de venta completadas', salida.getvalue())
+
+        granola = VentaDetalle.objects.get(producto=self.granola)
+        self.assertEqual(granola.costo_unitario, self.granola.calcular_costo_unitario().quantize(Decimal('0.01')))
+        self.assertEqual(granola.metodo_costo, 'estimado')
+        self.assertEqual(VentaDetalle.objects.get(producto=self.avena_250).costo_unitario, congelado)
+
+        salida = StringIO()
+        call_command('backfill_costos_venta', stdout=salida)
+        self.assertIn('ya tienen costo', salida.getvalue())
+
+    def test_reportes_en_sql_con_costo_congelado(self):
+        self._vender((self.granola, 2), (self.avena_250, 1))
+        eliminada = self._vender((self.granola, 5))
+        eliminada.eliminar_venta(self.usuario, 'Error')
+
+        esperado = sum(
+            d.cantidad * d.costo_unitario for d in VentaDetalle.objects.filter(venta__eliminada=False)
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            roi = AnalyticsService().calcular_roi()
+        self.assertEqual(len(ctx.captured_queries), 3)
+        self.assertAlmostEqual(roi['ganancia_neta'], float(Venta.objects.get(eliminada=False).total - esperado))
+
+        rotacion = AnalyticsService().calcular_rotacion_inventario()
+        self.assertAlmostEqual(rotacion['costo_ventas_mes'], float(esperado))
+
+    def test_queries_constantes_al_congelar_costos(self):
+        def queries(*lineas):
+            with CaptureQueriesContext(connection) as ctx:
+                self._vender(*lineas)
+            return len(ctx.captured_queries)
+
+        self._vender((self.granola, 1))  # calienta el cache de ConfiguracionCostos
+        una = queries((self.avena_50, 1))
+        varias = queries((self.avena_50, 1), (self.avena_50, 2), (self.granola, 3))
+        self.assertEqual(una, varias)
@@ -0,0 +1,135 @@
+"""
+Tests para DemandMatrix - Demanda diaria del catálogo con NumPy
+================================================================
+
+Verifica que:
+1. La matriz acumula las unidades por producto y día, sin ventas eliminadas ni fuera de ventana
+2. La cobertura y su mediana coinciden con stock / (ventas de 30 días / 30)
+3. Las clases ABC siguen el importe acumulado y las XYZ la variabilidad diaria
+4. Los KPIs de inventario conservan sus claves y valores con la matriz
+5. Los KPIs de lista_inventario cuestan las mismas queries con 3 o 30 productos
+"""
+
+import math
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from gestion.models import MateriaPrima, Producto, Venta, VentaDetalle
+from gestion.services.demand_matrix import DemandMatrix
+from gestion.services.inventario_service import InventarioService
+
+
+class TestDemandMatrix(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser(username='admin_demanda', password='test_pass')
+        self.hoy = timezone.now().date()
+        base = dict(stock_minimo=1, categoria='test', tipo_producto='reventa')
+        self.granola = Producto.objects.create(nombre='Granola', precio=100, costo_base=Decimal('40'), stock=60, **base)
+        self.yogur = Producto.objects.create(nombre='Yogur', precio=50, costo_base=Decimal('20'), stock=10, **base)
+        self.quinoa = Producto.objects.create(nombre='Quinoa', precio=80, costo_base=Decimal('30'), stock=5, **base)
+
+    def _vender(self, producto, cantidad, dias_atras=0, eliminada=False):
+        """Venta directa (sin posting) de `cantidad` unidades hace `dias_atras` días."""
+        fecha = timezone.make_aware(datetime.combine(self.hoy - timedelta(days=dias_atras), time(12)))
+        total = producto.precio * cantidad
+        venta = Venta.todos.create(usuario=self.usuario, total=total, eliminada=eliminada)
+        Venta.todos.filter(pk=venta.pk).update(fecha=fecha)
+        VentaDetalle.objects.create(
+            venta=venta, producto=producto, cantidad=cantidad,
+            precio_unitario=producto.precio, subtotal=total,
+        )
+
+    def test_matriz_por_producto_y_dia(self):
+        self._vender(self.granola, 3)
+        self._vender(self.granola, 2)
+        self._vender(self.granola, 4, dias_atras=10)
+        self._vender(self.granola, 50, dias_atras=1, eliminada=True)
+        self._vender(self.yogur, 7, dias_atras=61)  # fuera de la ventana
+
+        matriz = DemandMatrix(hoy=self.hoy, dias=60)
+        granola, yogur = matriz.posicion(self.granola.id), matriz.posicion(self.yogur.id)
+
+        self.assertEqual(matriz.unidades.shape, (3, 61))
+        self.assertEqual(matriz.unidades[granola, -1], 5)
+        self.assertEqual(matriz.unidades[granola, -11], 4)
+        self.assertEqual(matriz.unidades[granola].sum(), 9)
+        self.assertEqual(matriz.unidades[yogur].sum(), 0)
+        self.assertEqual(matriz.importes[granola], 900)
+        self.assertEqual(list(matriz.unidades_desde(self.hoy - timedelta(days=5))[[granola, yogur]]), [5, 0])
+        self.assertEqual(matriz.costo_vendido(self.hoy), (self.granola.calcular_costo_unitario() * 5).quantize(Decimal('0.01')))
+
+    def test_cobertura_y_mediana(self):
+        self._vender(self.granola, 30, dias_atras=5)   # 1 u/día → 60 días
+        self._vender(self.yogur, 15, dias_atras=20)    # 0.5 u/día → 20 días
+        self._vender(self.quinoa, 6, dias_atras=40)    # fuera de los 30 días
+
+        matriz = DemandMatrix(hoy=self.hoy)
+        cobertura = matriz.cobertura(dias=30)
+
+        self.assertAlmostEqual(cobertura[matriz.posicion(self.granola.id)], 60)
+        self.assertAlmostEqual(cobertura[matriz.posicion(self.yogur.id)], 20)
+        self.assertTrue(math.isnan(cobertura[matriz.posicion(self.quinoa.id)]))
+        self.assertAlmostEqual(matriz.mediana_cobertura(dias=30), 40)
+        self.assertEqual(list(matriz.sin_movimiento(self.hoy - timedelta(days=30))), [matriz.posicion(self.quinoa.id)])
+
+    def test_clases_abc_y_xyz(self):
+        for dias_atras in range(61):
+            self._vender(self.granola, 2, dias_atras=dias_atras)    # 12.200 $, todos los días igual
+        self._vender(self.yogur, 40, dias_atras=3)                   # 2.000 $, un solo día
+        self._vender(self.quinoa, 1, dias_atras=3)                   # 80 $
+
+        matriz = DemandMatrix(hoy=self.hoy)
+
+        self.assertEqual(matriz.clasificacion(), {
+            self.granola.id: 'AX', self.yogur.id: 'BZ', self.quinoa.id: 'CZ',
+        })
+        resumen = InventarioService().get_clasificacion_abc_xyz()
+        self.assertEqual(resumen['matriz'], {'AX': 1, 'BZ': 1, 'CZ': 1})
+        self.assertEqual(resumen['sin_ventas'], 0)
+
+    def test_kpis_inventario_con_la_matriz(self):
+        MateriaPrima.objects.create(
+            nombre='Avena', unidad_medida='kg', costo_unitario=Decimal('100'),
+            stock_actual=Decimal('20'), stock_minimo=Decimal('5'),
+        )
+        self._vender(self.granola, 30)
+        self._vender(self.yogur, 15)
+
+        servicio = InventarioService()
+        kpis = servicio.get_kpis_inventario()
+
+        # Granola 60 / 1 u/día = 60 días, Yogur 10 / 0.5 u/día = 20 días (< 30 objetivo)
+        self.assertEqual((kpis['cobertura_dias']['dias'], kpis['cobertura_dias']['productos_criticos']), (40.0, 1))
+        self.assertEqual((kpis['valor_total']['valor'], kpis['valor_total']['productos']), (2000.0, 1))
+        self.assertAlmostEqual(servicio._calcular_ventas_diarias_promedio(self.yogur), 0.5)
+
+        # El costo vendido usa el mismo costo unitario que Producto.calcular_costo_unitario()
+        esperado = self.granola.calcular_costo_unitario() * 30 + self.yogur.calcular_costo_unitario() * 15
+        self.assertAlmostEqual(kpis['rotacion']['costo_vendido_mes'], float(esperado), places=2)
+        self.assertEqual(kpis['rotacion']['productos_rotacion_lenta'], [self.quinoa])
+        lentos = servicio.get_productos_rotacion_lenta()
+        self.assertEqual([fila['producto'] for fila in lentos], [self.quinoa])
+
+    def test_queries_constantes_por_cantidad_de_productos(self):
+        def queries_kpis():
+            with CaptureQueriesContext(connection) as ctx:
+                InventarioService().get_kpis_inventario()
+            return len(ctx.captured_queries)
+
+        self._vender(self.granola, 3)
+        pocos = queries_kpis()
+
+        for i in range(27):
+            producto = Producto.objects.create(
+                nombre=f'Producto {i}', precio=10, stock=i + 1, stock_minimo=1, categoria='test'
+            )
+            self._vender(producto, 1, dias_atras=i)
+
+        self.assertEqual(queries_kpis(), pocos)
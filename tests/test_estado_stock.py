@@ -0,0 +1,114 @@
+"""
+Tests para la columna estado_stock de Producto y MateriaPrima
+==============================================================
+
+Verifica que:
+1. save() mantiene estado_stock sincronizado (también con update_fields)
+2. La venta set-based actualiza el estado en el mismo UPDATE del stock
+3. Los filtros de lista_productos y lista_materias_primas usan la columna
+4. Los KPIs de productos e inventario salen de un único GROUP BY
+"""
+
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from gestion.models import MateriaPrima, Producto, resumen_estados_stock
+from gestion.services.inventario_service import InventarioService
+from gestion.services.venta_posting_service import VentaPostingService
+from gestion.utils.kpi_builder import prepare_product_kpis
+
+
+class TestEstadoStock(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser(username='admin_estado', password='test_pass')
+        base = dict(precio=100, stock_minimo=5, categoria='test')
+        self.agotado = Producto.objects.create(nombre='Quinoa', stock=0, **base)
+        self.critico = Producto.objects.create(nombre='Amaranto', stock=4, **base)
+        self.bajo = Producto.objects.create(nombre='Mijo', stock=9, **base)
+        self.normal = Producto.objects.create(nombre='Trigo sarraceno', stock=50, **base)
+
+    def test_save_sincroniza_estado(self):
+        estados = dict(Producto.objects.values_list('nombre', 'estado_stock'))
+        self.assertEqual(estados, {
+            'Quinoa': 'agotado', 'Amaranto': 'critico', 'Mijo': 'bajo', 'Trigo sarraceno': 'normal'
+        })
+
+        self.normal.stock = 3
+        self.normal.save(update_fields=['stock'])
+        self.normal.refresh_from_db()
+        self.assertEqual(self.normal.estado_stock, 'critico')
+
+        materia = MateriaPrima.objects.create(
+            nombre='Chía', unidad_medida='kg', stock_actual=Decimal('2'), stock_minimo=Decimal('10')
+        )
+        self.assertEqual(materia.estado_stock, 'critico')
+        materia.stock_actual = Decimal('0')
+        materia.save()
+        self.assertEqual(MateriaPrima.objects.get(pk=materia.pk).estado_stock, 'agotado')
+
+    def test_venta_actualiza_estado_en_el_mismo_update(self):
+        servicio = VentaPostingService(usuario=self.usuario)
+        lineas = [
+            {'producto_id': self.normal.id, 'cantidad': 41, 'precio_unitario': Decimal('100')},
+            {'producto_id': self.critico.id, 'cantidad': 4, 'precio_unitario': Decimal('100')},
+        ]
+
+        with CaptureQueriesContext(connection) as ctx:
+            servicio.registrar_venta(lineas)
+
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "gestion_producto"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('estado_stock', updates[0])
+        estados = dict(Producto.objects.values_list('id', 'estado_stock'))
+        self.assertEqual(estados[self.normal.id], 'bajo')
+        self.assertEqual(estados[self.critico.id], 'agotado')
+
+    def test_filtros_de_listas(self):
+        self.client.force_login(self.usuario)
+
+        response = self.client.get('/gestion/productos/', {'estado_stock': 'bajo'})
+        self.assertEqual([p.nombre for p in response.context['productos']], ['Mijo'])
+
+        MateriaPrima.objects.create(nombre='Avena', unidad_medida='kg', stock_actual=Decimal('3'), stock_minimo=Decimal('5'))
+        MateriaPrima.objects.create(nombre='Sésamo', unidad_medida='kg', stock_actual=Decimal('8'), stock_minimo=Decimal('5'))
+        response = self.client.get('/gestion/materias-primas/', {'estado_stock': 'bajo'})
+        self.assertEqual([m.nombre for m in response.context['materias_primas']], ['Avena'])
+        self.assertEqual(response.context['stats']['stock_bajo'], 1)
+        self.assertEqual(response.context['stats']['con_stock'], 2)
+
+    def test_kpis_en_una_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            kpis = prepare_product_kpis(Producto.objects.all())
+
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIn('GROUP BY', ctx.captured_queries[0]['sql'])
+        valores = {kpi['badge']: kpi['value'] for kpi in kpis}
+        self.assertEqual(valores['Total Productos'], 4)
+        self.assertEqual(valores['Con Stock'], 3)
+        self.assertEqual(valores['Stock Bajo'], 2)
+        self.assertEqual(valores['Valor Total'], '$6,300')
+
+        resumen = resumen_estados_stock(Producto.objects.filter(categoria='test'))
+        self.assertEqual((resumen['agotado'], resumen['bajo'], resumen['total']), (1, 1, 4))
+
+    def test_stock_critico_de_inventario(self):
+        MateriaPrima.objects.create(nombre='Lino', unidad_medida='kg', stock_actual=Decimal('0'), stock_minimo=Decimal('5'))
+        MateriaPrima.objects.create(nombre='Girasol', unidad_medida='kg', stock_actual=Decimal('4'), stock_minimo=Decimal('5'))
+        MateriaPrima.objects.create(nombre='Maní', unidad_medida='kg', stock_actual=Decimal('40'), stock_minimo=Decimal('5'))
+        MateriaPrima.objects.create(
+            nombre='Inactiva', unidad_medida='kg', stock_actual=Decimal('0'), stock_minimo=Decimal('5'), activo=False
+        )
+
+        critico = InventarioService()._contar_stock_critico()
+
+        self.assertEqual(critico['cantidad'], 2)
+        self.assertEqual(critico['agotados'], 1)
+        self.assertEqual(critico['solo_bajos'], 1)
+        self.assertEqual(critico['total'], 3)
+        self.assertEqual(critico['estado'], 'critico')
+        self.assertEqual({m.nombre for m in critico['productos']}, {'Lino', 'Girasol'})
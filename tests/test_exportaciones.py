@@ -0,0 +1,91 @@
+"""
+Tests para ExportService - Exportaciones en streaming
+======================================================
+
+Verifica que:
+1. El CSV se entrega como StreamingHttpResponse con todas las filas
+2. El XLSX (write_only) es válido y trae anchos de columna precalculados
+3. La exportación de detalle de ventas usa una cantidad de queries constante
+"""
+
+import io
+from decimal import Decimal
+
+import openpyxl
+from django.contrib.auth.models import User
+from django.db import connection
+from django.http import StreamingHttpResponse
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from gestion.models import Producto, MateriaPrima
+from gestion.services.venta_posting_service import VentaPostingService
+
+
+class TestExportaciones(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser(username='admin_test', password='test_pass')
+        self.client.login(username='admin_test', password='test_pass')
+        self.productos = [
+            Producto.objects.create(
+                nombre=f'Mix de frutos secos {i}', precio=100, stock=100,
+                stock_minimo=1, categoria='test'
+            )
+            for i in range(3)
+        ]
+
+    def _vender(self, cantidad_ventas):
+        service = VentaPostingService(usuario=self.usuario)
+        for _ in range(cantidad_ventas):
+            service.registrar_venta([
+                {'producto_id': p.id, 'cantidad': 1, 'precio_unitario': Decimal('100')}
+                for p in self.productos
+            ])
+
+    @staticmethod
+    def _contenido(response):
+        if response.streaming:
+            return b''.join(response.streaming_content)
+        return response.content
+
+    def test_csv_en_streaming(self):
+        self._vender(4)
+
+        response = self.client.get('/gestion/ventas/exportar/?formato=csv')
+
+        self.assertIsInstance(response, StreamingHttpResponse)
+        lineas = self._contenido(response).decode('utf-8-sig').strip().splitlines()
+        self.assertEqual(lineas[0], 'id,cliente,total,fecha')
+        self.assertEqual(len(lineas), 5)
+
+    def test_xlsx_write_only_con_anchos(self):
+        MateriaPrima.objects.create(
+            nombre='Harina de almendras extra fina', unidad_medida='kg',
+            stock_actual=Decimal('5'), costo_unitario=Decimal('9000')
+        )
+
+        response = self.client.get('/gestion/exportar/materias-primas/excel/')
+
+        self.assertEqual(response.status_code, 200)
+        wb = openpyxl.load_workbook(io.BytesIO(self._contenido(response)))
+        ws = wb['Materias Primas']
+        self.assertEqual(ws['A1'].value, 'Nombre')
+        self.assertEqual(ws['A2'].value, 'Harina de almendras extra fina')
+        self.assertEqual(ws.column_dimensions['A'].width, len('Harina de almendras extra fina') + 2)
+
+    def test_detalle_de_ventas_queries_constantes(self):
+        def exportar():
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get('/gestion/ventas/exportar/detalle/?formato=csv')
+                contenido = self._contenido(response)
+            return contenido.decode('utf-8-sig').strip().splitlines(), len(ctx.captured_queries)
+
+        self._vender(1)
+        lineas, queries_antes = exportar()
+        self.assertEqual(len(lineas), 1 + len(self.productos))
+
+        self._vender(10)
+        lineas, queries_despues = exportar()
+        self.assertEqual(len(lineas), 1 + 11 * len(self.productos))
+        self.assertEqual(queries_despues, queries_antes)
@@ -0,0 +1,131 @@
+"""
+Tests para generar_dataset y benchmark_lino
+============================================
+
+Verifica que:
+1. El dataset trae recetas, fraccionados, ventas con varias líneas y ventas eliminadas
+2. Los totales de cada venta coinciden con sus detalles y las compras quedan repartidas en el tiempo
+3. Se puede volver a generar sobre datos existentes (o limpiarlos con --limpiar, aunque haya compras,
+   ajustes y producción cargados a mano)
+4. benchmark_lino escribe un JSON con una medición por vista
+"""
+
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, F, Sum
+from django.test import TestCase
+
+from gestion.management.commands.benchmark_lino import BENCHMARKS
+from gestion.models import (
+    AjusteInventario, Compra, CompraDetalle, HistorialPreciosMateriaPrima, LoteMateriaPrima, MateriaPrima,
+    MovimientoMateriaPrima, Producto, ProductoMateriaPrima, Receta, RecetaMateriaPrima, ResumenDiario, Venta,
+    VentaDetalle,
+)
+from gestion.services.produccion_service import OrdenProduccion
+
+
+class TestGenerarDataset(TestCase):
+
+    def _generar(self, **opciones):
+        parametros = {'productos': 40, 'ventas': 300, 'compras': 30, 'dias': 60, 'lote': 100}
+        parametros.update(opciones)
+        call_command('generar_dataset', stdout=StringIO(), **parametros)
+
+    def test_catalogo_y_movimientos(self):
+        self._generar()
+
+        tipos = set(Producto.objects.values_list('tipo_producto', flat=True))
+        self.assertEqual(tipos, {'reventa', 'fraccionamiento', 'receta'})
+        self.assertFalse(Producto.objects.filter(
+            tipo_producto='fraccionamiento', producto_origen__isnull=True
+        ).exists())
+        self.assertFalse(Producto.objects.filter(tiene_receta=True, receta__isnull=True).exists())
+
+        self.assertEqual(Venta.todos.count(), 300)
+        self.assertTrue(Venta.todos.filter(eliminada=True).exists())
+        lineas = Venta.todos.annotate(n=Count('detalles')).values_list('n', flat=True)
+        self.assertGreater(max(lineas), 1)
+        self.assertEqual(min(lineas), 1)
+
+    def test_totales_y_fechas_consistentes(self):
+        self._generar()
+
+        descuadradas = Venta.todos.annotate(suma=Sum('detalles__subtotal')).exclude(total=F('suma'))
+        self.assertFalse(descuadradas.exists())
+        self.assertGreater(Compra.objects.values('fecha_compra').distinct().count(), 1)
+        self.assertTrue(ResumenDiario.objects.exists())
+
+        # Los ids de ventas siguen el orden cronológico
+        fechas = list(Venta.todos.order_by('id').values_list('fecha', flat=True))
+        self.assertEqual(fechas, sorted(fechas))
+
+    def test_regenerar_y_limpiar(self):
+        self._generar(productos=20, ventas=50, compras=5)
+        self._generar(productos=20, ventas=50, compras=5)
+        self.assertEqual(Producto.objects.count(), 40)
+        self.assertEqual(VentaDetalle.objects.values('venta_id').distinct().count(), 100)
+
+        self._generar(productos=20, ventas=50, compras=5, limpiar=True)
+        self.assertEqual(Producto.objects.count(), 20)
+        self.assertEqual(Venta.todos.count(), 50)
+        self.assertEqual(MateriaPrima.objects.count(), 20)
+
+    def test_limpiar_con_compras_ajustes_y_produccion(self):
+        usuario = User.objects.create_superuser(username='admin_dataset', password='test_pass')
+        harina = MateriaPrima.objects.create(
+            nombre='Harina manual', unidad_medida='kg', stock_actual=Decimal('5'),
+            stock_minimo=Decimal('1'), costo_unitario=Decimal('1000'),
+        )
+        compra = Compra.objects.create(proveedor='Molino Sur', usuario=usuario)
+        CompraDetalle.objects.create(
+            compra=compra, materia_prima=harina, cantidad=Decimal('10'), precio_unitario=Decimal('1200'), subtotal=0,
+        )
+        receta = Receta.objects.create(nombre='Pan manual')
+        RecetaMateriaPrima.objects.create(receta=receta, materia_prima=harina, cantidad=Decimal('0.5'), unidad='kg')
+        pan = Producto.objects.create(
+            nombre='Pan manual', precio=2000, stock=0, stock_minimo=1, categoria='test',
+            tipo_producto='receta', tiene_receta=True, receta=receta,
+        )
+        ProductoMateriaPrima.objects.create(producto=pan, materia_prima=harina, cantidad_necesaria=Decimal('0.5'))
+        AjusteInventario.objects.create(
+            materia_prima=harina, stock_anterior=Decimal('15'), stock_nuevo=Decimal('14'),
+            diferencia=Decimal('-1'), tipo='MERMA', razon='Bolsa rota', usuario=usuario,
+        )
+        OrdenProduccion(usuario=usuario).agregar(pan, 4).ejecutar()
+        for modelo in (LoteMateriaPrima, MovimientoMateriaPrima, HistorialPreciosMateriaPrima):
+            self.assertTrue(modelo.objects.filter(materia_prima=harina).exists(), modelo.__name__)
+
+        self._generar(productos=20, ventas=50, compras=5, limpiar=True)
+
+        self.assertFalse(MateriaPrima.objects.filter(nombre='Harina manual').exists())
+        self.assertFalse(Producto.objects.filter(nombre='Pan manual').exists())
+        for modelo in (AjusteInventario, ProductoMateriaPrima):
+            self.assertFalse(modelo.objects.exists(), modelo.__name__)
+        # Las FK de SQLite se verifican al commit: forzar el chequeo dentro del TestCase
+        connection.check_constraints()
+
+    def test_benchmark_sobre_bd_actual(self):
+        self._generar(productos=20, ventas=50, compras=5)
+
+        with tempfile.TemporaryDirectory() as directorio:
+            salida = os.path.join(directorio, 'bench.json')
+            call_command('benchmark_lino', bd_actual=True, repeticiones=1, salida=salida, stdout=StringIO())
+            with open(salida, encoding='utf-8') as archivo:
+                resultado = json.load(archivo)
+
+        escala = resultado['escalas'][0]
+        self.assertEqual(escala['ventas'], 50)
+        self.assertEqual([fila['vista'] for fila in escala['resultados']], [b[0] for b in BENCHMARKS])
+        for fila in escala['resultados']:
+            self.assertIn(fila['status'], (200, 302), fila['vista'])
+            self.assertGreater(fila['queries'], 0)
+        # Las ventas del benchmark se revierten
+        self.assertEqual(Venta.todos.count(), 50)
+
@@ -0,0 +1,124 @@
+"""
+Tests para LoteAllocator - Consumo FIFO/FEFO de lotes de materia prima
+=======================================================================
+
+Verifica que:
+1. Los lotes se consumen en orden FIFO y el costo es el real de cada lote
+2. Los lotes con vencimiento se consumen primero (FEFO)
+3. La lectura y escritura de lotes es constante sin importar cuántos haya
+4. Lo que no cubren los lotes se valoriza al costo promedio (sin_lote)
+5. Producción y ajustes de inventario mantienen los lotes alineados con el stock
+"""
+
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from gestion.models import (
+    LoteMateriaPrima, MateriaPrima, MovimientoMateriaPrima, Producto, Receta, RecetaMateriaPrima
+)
+from gestion.services.lotes_service import LoteAllocator
+
+
+class TestLoteAllocator(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser(username='admin_lotes', password='test_pass')
+        self.avena = MateriaPrima.objects.create(
+            nombre='Avena', unidad_medida='kg', stock_actual=Decimal('20'), costo_unitario=Decimal('150.00')
+        )
+        self.viejo = self._lote(self.avena, '10', '100.00', date(2026, 1, 10))
+        self.nuevo = self._lote(self.avena, '10', '200.00', date(2026, 2, 10))
+
+    def _lote(self, materia, cantidad, precio, entrada, vencimiento=None):
+        return LoteMateriaPrima.objects.create(
+            materia_prima=materia, cantidad=Decimal(cantidad), cantidad_disponible=Decimal(cantidad),
+            precio_unitario=Decimal(precio), fecha_entrada=entrada, fecha_vencimiento=vencimiento,
+        )
+
+    def _disponible(self, materia):
+        return materia.lotes.aggregate(total=Sum('cantidad_disponible'))['total']
+
+    def test_fifo_con_costo_real(self):
+        asignacion = LoteAllocator(fecha=date(2026, 3, 1)).consumir_materia(self.avena, Decimal('15'))
+
+        self.assertEqual(asignacion['costo'], Decimal('2000.00'))
+        self.assertEqual(asignacion['sin_lote'], Decimal('0'))
+        self.assertEqual([lote_id for lote_id, _, _ in asignacion['lotes']], [self.viejo.id, self.nuevo.id])
+
+        self.viejo.refresh_from_db()
+        self.nuevo.refresh_from_db()
+        self.assertEqual(self.viejo.cantidad_disponible, Decimal('0'))
+        self.assertEqual(self.viejo.fecha_consumo, date(2026, 3, 1))
+        self.assertEqual(self.nuevo.cantidad_disponible, Decimal('5'))
+        self.assertIsNone(self.nuevo.fecha_consumo)
+
+    def test_fefo_prioriza_vencimiento(self):
+        por_vencer = self._lote(self.avena, '4', '300.00', date(2026, 2, 20), vencimiento=date(2026, 4, 1))
+
+        asignacion = LoteAllocator().consumir_materia(self.avena, Decimal('6'))
+
+        self.assertEqual(asignacion['lotes'][0][0], por_vencer.id)
+        self.assertEqual(asignacion['costo'], Decimal('1400.00'))  # 4 × 300 + 2 × 100
+
+    def test_queries_constantes(self):
+        otras = []
+        for i in range(3):
+            materia = MateriaPrima.objects.create(nombre=f'Semilla {i}', unidad_medida='kg')
+            for dia in range(1, 9):
+                self._lote(materia, '1', '50.00', date(2026, 1, dia))
+            otras.append(materia)
+
+        requerimientos = {materia.id: Decimal('6.5') for materia in otras}
+        requerimientos[self.avena.id] = Decimal('12')
+        with CaptureQueriesContext(connection) as ctx:
+            asignaciones = LoteAllocator().consumir(requerimientos)
+
+        sql_lotes = [q['sql'] for q in ctx.captured_queries if 'gestion_lotemateriaprima' in q['sql']]
+        self.assertEqual(len(sql_lotes), 2)  # SELECT + bulk UPDATE
+        self.assertEqual(asignaciones[otras[0].id]['costo'], Decimal('325.00'))
+        self.assertEqual(self._disponible(otras[0]), Decimal('1.5'))
+
+    def test_faltante_al_costo_promedio(self):
+        asignacion = LoteAllocator().consumir_materia(self.avena, Decimal('25'))
+
+        self.assertEqual(asignacion['sin_lote'], Decimal('5'))
+        # 10 × 100 + 10 × 200 + 5 × 150 (costo promedio de respaldo)
+        self.assertEqual(asignacion['costo'], Decimal('3750.00'))
+
+    def test_produccion_y_ajuste_mantienen_lotes(self):
+        receta = Receta.objects.create(nombre='Granola')
+        RecetaMateriaPrima.objects.create(receta=receta, materia_prima=self.avena, cantidad=Decimal('0.500'))
+        granola = Producto.objects.create(
+            nombre='Granola 500g', precio=3000, stock=0, stock_minimo=1, categoria='test',
+            tipo_producto='receta', tiene_receta=True, receta=receta
+        )
+
+        costo = granola.descontar_materias_primas(24, self.usuario)
+
+        self.assertEqual(costo, Decimal('1400.00'))  # 10 × 100 + 2 × 200
+        movimiento = MovimientoMateriaPrima.objects.get(materia_prima=self.avena, tipo_movimiento='produccion')
+        self.assertEqual(movimiento.costo_total, Decimal('1400.00'))
+        self.avena.refresh_from_db()
+        self.assertEqual(self.avena.stock_actual, Decimal('8.00'))
+        self.assertEqual(self._disponible(self.avena), self.avena.stock_actual)
+
+        # Ajuste por merma: baja de 8 a 5 consumiendo lotes
+        self.client.force_login(self.usuario)
+        self.client.post(reverse('gestion:crear_ajuste_mp_directo', args=[self.avena.id]), {
+            'materia_prima': self.avena.id, 'stock_nuevo': '5', 'tipo': 'MERMA', 'razon': 'Bolsa rota',
+        })
+        self.avena.refresh_from_db()
+        self.assertEqual(self.avena.stock_actual, Decimal('5.00'))
+        self.assertEqual(self._disponible(self.avena), Decimal('5.00'))
+
+        # Ajuste positivo: crea un lote al costo promedio
+        LoteAllocator().ajustar(self.avena, Decimal('5'), Decimal('7'))
+        self.assertEqual(self._disponible(self.avena), Decimal('7.00'))
+        self.assertTrue(self.avena.lotes.filter(precio_unitario=Decimal('150.00')).exists())
@@ -0,0 +1,155 @@
+"""
+Tests para OrdenProduccion - Producción de varios productos en bloque
+======================================================================
+
+Verifica que:
+1. La orden explota las recetas, agrega la demanda por materia prima y suma el stock producido
+2. Los movimientos encadenan el stock anterior/nuevo y reparten el costo real de los lotes
+3. Si una materia prima no alcanza no se descuenta nada (MateriaPrimaInsuficienteError)
+4. Las queries son las mismas para 2 o 12 productos
+5. descontar_materias_primas y el comando producir usan la orden
+"""
+
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from gestion.models import (
+    LoteMateriaPrima, MateriaPrima, MovimientoMateriaPrima, Producto, Receta, RecetaMateriaPrima
+)
+from gestion.services.produccion_service import MateriaPrimaInsuficienteError, OrdenProduccion
+
+
+class TestOrdenProduccion(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser(username='admin_produccion', password='test_pass')
+        base = dict(unidad_medida='kg', stock_minimo=Decimal('2'))
+        self.harina = MateriaPrima.objects.create(
+            nombre='Harina', stock_actual=Decimal('20'), costo_unitario=Decimal('1000'), **base
+        )
+        self.miel = MateriaPrima.objects.create(
+            nombre='Miel', stock_actual=Decimal('5'), costo_unitario=Decimal('4000'), **base
+        )
+        self.avena = MateriaPrima.objects.create(
+            nombre='Avena', stock_actual=Decimal('10'), costo_unitario=Decimal('2000'), **base
+        )
+        self.pan = self._producto_receta('Pan de Miel', (self.harina, '0.500'), (self.miel, '0.100'))
+        self.galletas = self._producto_receta('Galletas', (self.harina, '0.200'), (self.avena, '0.100'))
+        self.avena_500 = Producto.objects.create(
+            nombre='Avena 500g', precio=1500, stock=2, stock_minimo=1, categoria='test',
+            tipo_producto='reventa', materia_prima_asociada=self.avena, cantidad_fraccion=Decimal('0.5'),
+        )
+
+    def _producto_receta(self, nombre, *ingredientes):
+        receta = Receta.objects.create(nombre=nombre)
+        for materia, cantidad in ingredientes:
+            RecetaMateriaPrima.objects.create(
+                receta=receta, materia_prima=materia, cantidad=Decimal(cantidad), unidad='kg'
+            )
+        return Producto.objects.create(
+            nombre=nombre, precio=3000, stock=0, stock_minimo=5, categoria='test',
+            tipo_producto='receta', tiene_receta=True, receta=receta,
+        )
+
+    def _stock(self, *materias):
+        return [MateriaPrima.objects.get(pk=m.pk).stock_actual for m in materias]
+
+    def test_orden_agrega_demanda_y_suma_stock(self):
+        orden = OrdenProduccion(usuario=self.usuario)
+        orden.agregar(self.pan, 10).agregar(self.galletas.id, 20).agregar(self.avena_500, 4)
+        orden.agregar(self.pan, 2)
+
+        self.assertEqual(OrdenProduccion.requerimientos(orden.consumos()), {
+            self.harina.id: Decimal('10.00'),  # 12 × 0.5 + 20 × 0.2
+            self.miel.id: Decimal('1.20'),
+            self.avena.id: Decimal('4.00'),    # 20 × 0.1 + 4 × 0.5
+        })
+        orden.ejecutar()
+
+        self.assertEqual(self._stock(self.harina, self.miel, self.avena), [Decimal('10'), Decimal('3.80'), Decimal('6')])
+        self.assertEqual(MateriaPrima.objects.get(pk=self.miel.pk).estado_stock, 'bajo')  # 3.8 ≤ 2 × 2
+        self.assertEqual(
+            dict(Producto.objects.filter(pk__in=[self.pan.pk, self.galletas.pk, self.avena_500.pk]).values_list('pk', 'stock')),
+            {self.pan.pk: 12, self.galletas.pk: 20, self.avena_500.pk: 6},
+        )
+        self.assertEqual(Producto.objects.get(pk=self.pan.pk).estado_stock, 'normal')
+        self.assertEqual(self.pan.stock, 12)  # instancia reflejada en memoria
+
+    def test_movimientos_encadenados_con_costo_de_lotes(self):
+        LoteMateriaPrima.objects.create(
+            materia_prima=self.harina, cantidad=Decimal('4'), cantidad_disponible=Decimal('4'),
+            precio_unitario=Decimal('500'), fecha_entrada=date(2026, 1, 10),
+        )
+        resultado = OrdenProduccion(usuario=self.usuario).agregar(self.pan, 10).agregar(self.galletas, 10).ejecutar()
+
+        movimientos = MovimientoMateriaPrima.objects.filter(materia_prima=self.harina).order_by('id')
+        self.assertEqual(
+            [(m.cantidad, m.cantidad_anterior, m.cantidad_nueva, m.tipo_movimiento) for m in movimientos],
+            [(Decimal('5'), Decimal('20'), Decimal('15'), 'produccion'), (Decimal('2'), Decimal('15'), Decimal('13'), 'produccion')],
+        )
+        # Harina: 4 × 500 (lote) + 3 × 1000 (sin lote) = 5000, repartido 5/7 y 2/7
+        self.assertEqual([m.costo_total for m in movimientos], [Decimal('3571.43'), Decimal('1428.57')])
+        self.assertEqual(movimientos[0].usuario, self.usuario)
+        self.assertEqual(
+            resultado['costo_total'],
+            MovimientoMateriaPrima.objects.aggregate(total=Sum('costo_total'))['total'],
+        )
+        self.assertEqual(resultado['costos'][self.pan.pk], Decimal('3571.43') + Decimal('4000.00'))
+
+    def test_faltante_no_descuenta_nada(self):
+        orden = OrdenProduccion(usuario=self.usuario).agregar(self.pan, 10).agregar(self.galletas, 120)
+
+        self.assertEqual([f['materia_prima'] for f in orden.verificar()], ['Harina', 'Avena'])
+        with self.assertRaises(MateriaPrimaInsuficienteError) as ctx:
+            orden.ejecutar()
+
+        self.assertEqual(ctx.exception.faltantes[0]['necesaria'], 29.0)
+        self.assertEqual(self._stock(self.harina, self.miel, self.avena), [Decimal('20'), Decimal('5'), Decimal('10')])
+        self.assertFalse(MovimientoMateriaPrima.objects.exists())
+        self.assertEqual(Producto.objects.get(pk=self.pan.pk).stock, 0)
+
+        sin_receta = Producto.objects.create(
+            nombre='Sin receta', precio=10, stock=0, stock_minimo=1, categoria='test', tipo_producto='receta'
+        )
+        with self.assertRaises(ValueError):
+            OrdenProduccion().agregar(sin_receta, 1).ejecutar()
+
+    def test_queries_constantes(self):
+        def queries(*productos):
+            orden = OrdenProduccion(usuario=self.usuario)
+            for producto in productos:
+                orden.agregar(producto.id, 1)
+            with CaptureQueriesContext(connection) as ctx:
+                orden.ejecutar()
+            return len(ctx.captured_queries)
+
+        pocos = queries(self.pan, self.avena_500)
+        MateriaPrima.objects.update(stock_actual=Decimal('500'))
+        muchos = [self._producto_receta(f'Pan {i}', (self.harina, '0.1'), (self.miel, '0.1'), (self.avena, '0.1')) for i in range(10)]
+        self.assertEqual(queries(self.pan, self.avena_500, *muchos), pocos)
+
+    def test_caminos_existentes_usan_la_orden(self):
+        costo = self.pan.descontar_materias_primas(4, self.usuario)
+        self.assertEqual(costo, Decimal('3600.00'))  # 2 × 1000 + 0.4 × 4000
+        self.assertEqual(self._stock(self.harina, self.miel), [Decimal('18'), Decimal('4.60')])
+        self.assertEqual(Producto.objects.get(pk=self.pan.pk).stock, 0)
+        with self.assertRaises(MateriaPrimaInsuficienteError):
+            self.pan.descontar_materias_primas(100, self.usuario)
+
+        salida = StringIO()
+        call_command('producir', f'{self.pan.id}:6', f'{self.avena_500.id}:2', usuario='admin_produccion', stdout=salida)
+        self.assertIn('Producidas 8 unidades de 2 productos', salida.getvalue())
+        self.assertEqual(Producto.objects.get(pk=self.pan.pk).stock, 6)
+        self.assertEqual(self._stock(self.harina, self.avena), [Decimal('15'), Decimal('9')])
+
+        with self.assertRaises(CommandError):
+            call_command('producir', f'{self.galletas.id}:500', stdout=StringIO())
+        self.assertEqual(Producto.objects.get(pk=self.galletas.pk).stock, 0)
@@ -0,0 +1,131 @@
+"""
+Tests para gestion.paginacion - Paginación por keyset
+======================================================
+
+Verifica que:
+1. Las páginas recorren todas las filas una sola vez, también con fechas repetidas
+2. El cursor anterior devuelve exactamente la página previa
+3. Ninguna query usa OFFSET y el total se cuenta de forma acotada
+4. Un cursor inválido vuelve a la primera página en las vistas y da 400 en la API
+5. La API de listas expone los mismos cursores que las vistas HTML
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from gestion.models import MateriaPrima, MovimientoMateriaPrima, Venta
+from gestion.paginacion import CursorInvalido, KeysetPaginator
+
+
+class TestPaginacionKeyset(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser(username='admin_paginacion', password='test_pass')
+        ahora = timezone.now()
+        # De a tres ventas por instante: el desempate lo da el id
+        self.ventas = [
+            Venta.objects.create(fecha=ahora - timedelta(hours=i // 3), total=Decimal('100'), cliente=f'Cliente {i}')
+            for i in range(12)
+        ]
+
+    def _recorrer(self, paginator):
+        ids, cursor = [], None
+        while True:
+            pagina = paginator.pagina(cursor)
+            ids.extend(venta.id for venta in pagina)
+            if not pagina.has_next:
+                return ids
+            cursor = pagina.next_cursor
+
+    def test_recorre_todo_sin_repetir(self):
+        paginator = KeysetPaginator(Venta.objects.all(), orden=('-fecha', '-id'), por_pagina=5)
+
+        esperado = list(Venta.objects.order_by('-fecha', '-id').values_list('id', flat=True))
+        self.assertEqual(self._recorrer(paginator), esperado)
+
+        primera = paginator.pagina()
+        self.assertFalse(primera.has_previous)
+        self.assertEqual((primera.total, primera.total_exacto, primera.total_texto), (12, True, '12'))
+
+    def test_cursor_anterior(self):
+        paginator = KeysetPaginator(Venta.objects.all(), orden=('-fecha', '-id'), por_pagina=5)
+        primera = paginator.pagina()
+        segunda = paginator.pagina(primera.next_cursor)
+        tercera = paginator.pagina(segunda.next_cursor)
+
+        self.assertEqual(len(tercera), 2)
+        self.assertFalse(tercera.has_next)
+        volver = paginator.pagina(tercera.previous_cursor)
+        self.assertEqual(list(volver), list(segunda))
+        self.assertTrue(volver.has_next)
+        inicio = paginator.pagina(volver.previous_cursor)
+        self.assertEqual(list(inicio), list(primera))
+        self.assertFalse(inicio.has_previous)
+
+    def test_sin_offset_y_total_acotado(self):
+        paginator = KeysetPaginator(Venta.objects.all(), orden=('-fecha', '-id'), por_pagina=5, limite_conteo=8)
+        cursor = paginator.pagina().next_cursor
+
+        with CaptureQueriesContext(connection) as ctx:
+            pagina = paginator.pagina(cursor)
+
+        self.assertEqual(len(ctx.captured_queries), 2)  # página + conteo acotado
+        for query in ctx.captured_queries:
+            self.assertNotIn('OFFSET', query['sql'])
+        self.assertIn('LIMIT 9', ctx.captured_queries[1]['sql'])
+        self.assertEqual((pagina.total, pagina.total_exacto, pagina.total_texto), (8, False, '8+'))
+
+        with self.assertRaises(CursorInvalido):
+            paginator.pagina('no-es-un-cursor')
+
+    def test_vista_con_cursor(self):
+        self.client.force_login(self.usuario)
+        url = reverse('gestion:lista_ventas')
+
+        primera = self.client.get(url, {'q': 'cliente'}).context['ventas']
+        self.assertEqual(len(primera), 12)
+
+        for _ in range(20):
+            Venta.objects.create(total=Decimal('50'))
+        primera = self.client.get(url).context['ventas']
+        self.assertTrue(primera.has_next)
+        segunda = self.client.get(url, {'cursor': primera.next_cursor}).context['ventas']
+        self.assertTrue(set(v.id for v in primera).isdisjoint(v.id for v in segunda))
+        self.assertEqual(len(primera) + len(segunda), 32)
+
+        # Cursor corrupto: primera página en lugar de error
+        response = self.client.get(url, {'cursor': '%%%'})
+        self.assertEqual(list(response.context['ventas']), list(primera))
+
+    def test_api_listas(self):
+        materia = MateriaPrima.objects.create(nombre='Avena', unidad_medida='kg')
+        otra = MateriaPrima.objects.create(nombre='Chía', unidad_medida='kg')
+        for i in range(3):
+            MovimientoMateriaPrima.objects.create(materia_prima=materia, tipo_movimiento='entrada', cantidad=i + 1)
+        MovimientoMateriaPrima.objects.create(materia_prima=otra, tipo_movimiento='entrada', cantidad=1)
+
+        url = reverse('gestion:api_lista', args=['ventas'])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.usuario)
+
+        data = self.client.get(url, {'limit': 10}).json()
+        self.assertEqual((data['count'], data['total'], data['has_next']), (10, 12, True))
+        resto = self.client.get(url, {'limit': 10, 'cursor': data['next_cursor']}).json()
+        self.assertEqual(resto['count'], 2)
+        self.assertFalse(resto['has_next'])
+        self.assertEqual(data['data'][0]['id'], self.ventas[2].id)
+
+        movimientos = self.client.get(
+            reverse('gestion:api_lista', args=['movimientos']), {'materia_prima': materia.id}
+        ).json()
+        self.assertEqual([m['cantidad'] for m in movimientos['data']], ['3.00', '2.00', '1.00'])
+
+        self.assertEqual(self.client.get(url, {'cursor': 'xyz'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('gestion:api_lista', args=['usuarios'])).status_code, 404)
@@ -0,0 +1,106 @@
+"""
+Tests para PerfMiddleware - Instrumentación de queries y latencia por vista
+============================================================================
+
+Verifica que:
+1. Cada vista queda registrada con queries, SQL, templates y latencia (Server-Timing solo para staff)
+2. Las queries repetidas se detectan como firmas N+1
+3. Los presupuestos declarados con @presupuesto se controlan (modo estricto)
+4. La página /gestion/sistema/perf/ es solo para staff y exporta JSON
+5. El volcado JSON se escribe de forma atómica
+"""
+
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from gestion import views
+from gestion.models import Producto
+from gestion.perf import Colector, PresupuestoExcedido, registro
+
+
+class TestPerfMiddleware(TestCase):
+
+    def setUp(self):
+        registro.limpiar()
+        self.staff = User.objects.create_superuser(username='admin_perf', password='test_pass')
+        self.empleado = User.objects.create_user(username='empleado_perf', password='test_pass')
+        for i in range(3):
+            Producto.objects.create(
+                nombre=f'Chía {i}', precio=100, stock=10, stock_minimo=1, categoria='test'
+            )
+
+    def _fila(self, vista):
+        return next(fila for fila in registro.resumen() if fila['vista'] == vista)
+
+    def test_registra_metricas_por_vista(self):
+        self.client.force_login(self.empleado)
+
+        response = self.client.get('/gestion/productos/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+        fila = self._fila('gestion:lista_productos')
+        self.assertEqual(fila['requests'], 1)
+        self.assertGreater(fila['queries_max'], 0)
+        self.assertGreater(fila['template_prom_ms'], 0)
+        self.assertEqual(fila['presupuesto'], {'queries': 15, 'ms': 500})
+
+        # Solo el staff recibe el detalle de queries y tiempos
+        self.client.force_login(self.staff)
+        self.assertIn('db;dur=', self.client.get('/gestion/productos/')['Server-Timing'])
+        self.client.logout()
+        self.assertNotIn('Server-Timing', self.client.get('/accounts/login/'))
+
+    def test_detecta_firmas_n_mas_uno(self):
+        colector = Colector()
+        ejecutar = mock.Mock(return_value=None)
+        for producto_id in range(6):
+            colector(ejecutar, 'SELECT * FROM gestion_producto WHERE id = %s', [producto_id], False, {})
+        colector(ejecutar, 'SELECT COUNT(*) FROM gestion_venta', [], False, {})
+
+        self.assertEqual(colector.queries, 7)
+        self.assertEqual(
+            colector.duplicadas(umbral=5),
+            {'SELECT * FROM gestion_producto WHERE id = %s': 6}
+        )
+
+    @override_settings(LINO_PERF_ESTRICTO=True)
+    def test_presupuesto_excedido_en_modo_estricto(self):
+        self.client.force_login(self.empleado)
+
+        with mock.patch.dict(views.lista_productos.perf_presupuesto, {'queries': 1}):
+            with self.assertRaises(PresupuestoExcedido):
+                self.client.get('/gestion/productos/')
+
+        self.assertEqual(self._fila('gestion:lista_productos')['excedidos'], 1)
+
+    def test_pagina_solo_staff_y_json(self):
+        self.client.force_login(self.empleado)
+        self.assertEqual(self.client.get('/gestion/sistema/perf/').status_code, 302)
+
+        self.client.force_login(self.staff)
+        self.client.get('/gestion/productos/')
+        self.assertEqual(self.client.get('/gestion/sistema/perf/').status_code, 200)
+
+        data = self.client.get('/gestion/sistema/perf/', {'formato': 'json'}).json()
+        self.assertIn('gestion:lista_productos', [fila['vista'] for fila in data['vistas']])
+
+    def test_volcado_json(self):
+        self.client.force_login(self.empleado)
+        self.client.get('/gestion/productos/')
+
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, 'perf.json')
+            self.assertTrue(registro.volcar(ruta))
+            # Dentro del intervalo no se vuelve a escribir
+            self.assertFalse(registro.volcar(ruta, intervalo=60))
+
+            with open(ruta, encoding='utf-8') as archivo:
+                contenido = json.load(archivo)
+            self.assertEqual(contenido['vistas'][0]['vista'], 'gestion:lista_productos')
+            self.assertEqual(os.listdir(directorio), ['perf.json'])
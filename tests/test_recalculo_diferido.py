@@ -0,0 +1,93 @@
+"""
+Tests para RecalculoPendiente - Cola de recálculo de costos diferido
+====================================================================
+
+Verifica que con LINO_RECALCULO_DIFERIDO:
+1. Un cambio de precio de materia prima se encola sin tocar productos
+2. procesar_recalculos agrupa varios cambios de la misma materia prima
+3. Sin el modo diferido se mantiene el recálculo sincrónico
+4. LINO_RECALCULO_THREAD no arranca el hilo al cargar las apps (migrate, shell, comandos),
+   solo desde el entry point web
+"""
+
+import threading
+from decimal import Decimal
+from io import StringIO
+
+from django.apps import apps
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from gestion.models import (
+    Producto, MateriaPrima, ConfiguracionCostos, HistorialCosto, RecalculoPendiente
+)
+from gestion.services import recalculo_service
+
+
+class TestRecalculoDiferido(TestCase):
+
+    def setUp(self):
+        ConfiguracionCostos.objects.create(actualizar_automaticamente=True)
+        self.almendra = MateriaPrima.objects.create(
+            nombre='Almendra granel', unidad_medida='kg', costo_unitario=Decimal('10000.00')
+        )
+        self.producto = Producto.objects.create(
+            nombre='Almendras 250g', precio=3500, stock=10, stock_minimo=1, categoria='test',
+            materia_prima_asociada=self.almendra, cantidad_fraccion=Decimal('0.250')
+        )
+
+    def _cambiar_precio(self, precio):
+        self.almendra.costo_unitario = Decimal(precio)
+        self.almendra.save()
+
+    @override_settings(LINO_RECALCULO_DIFERIDO=True)
+    def test_cambio_de_precio_se_encola(self):
+        self._cambiar_precio('12000.00')
+
+        evento = RecalculoPendiente.objects.get()
+        self.assertEqual(evento.precio_anterior, Decimal('10000.00'))
+        self.assertEqual(evento.precio_nuevo, Decimal('12000.00'))
+        self.assertFalse(HistorialCosto.objects.exists())
+
+    @override_settings(LINO_RECALCULO_DIFERIDO=True)
+    def test_worker_agrupa_cambios_de_la_misma_materia(self):
+        self._cambiar_precio('12000.00')
+        self._cambiar_precio('14000.00')
+        self.assertEqual(RecalculoPendiente.objects.filter(procesado=False).count(), 2)
+
+        call_command('procesar_recalculos', stdout=StringIO())
+
+        self.assertFalse(RecalculoPendiente.objects.filter(procesado=False).exists())
+        # Un único recálculo con el precio vigente
+        historial = HistorialCosto.objects.get(producto=self.producto)
+        self.producto.refresh_from_db()
+        self.assertEqual(historial.costo_nuevo, self.producto.costo_base)
+        self.assertEqual(
+            self.producto.costo_base.quantize(Decimal('0.01')),
+            self.producto.calcular_costo_unitario().quantize(Decimal('0.01'))
+        )
+
+    def test_modo_sincronico_por_defecto(self):
+        self._cambiar_precio('12000.00')
+
+        self.assertFalse(RecalculoPendiente.objects.exists())
+        self.assertTrue(HistorialCosto.objects.filter(producto=self.producto).exists())
+
+    @override_settings(LINO_RECALCULO_THREAD=True, LINO_RECALCULO_INTERVALO=3600)
+    def test_hilo_solo_desde_el_entry_point_web(self):
+        def hilos_recalculo():
+            return [h for h in threading.enumerate() if h.name == 'lino-recalculo-costos']
+
+        apps.get_app_config('gestion').ready()
+        self.assertEqual(hilos_recalculo(), [])
+
+        hilo = recalculo_service.iniciar_worker_si_configurado()
+        try:
+            self.assertEqual(hilos_recalculo(), [hilo])
+        finally:
+            hilo.detener.set()
+            hilo.join()
+            recalculo_service._worker = None
+
+        with override_settings(LINO_RECALCULO_THREAD=False):
+            self.assertIsNone(recalculo_service.iniciar_worker_si_configurado())
@@ -0,0 +1,151 @@
+"""
+Tests para Receta.costo_cache - Costo de recetas persistido
+============================================================
+
+Verifica que:
+1. Altas, cambios y bajas de ingredientes recalculan costo_cache y su versión
+2. Un cambio de costo de materia prima actualiza en un UPDATE todas las recetas que la usan
+3. Los cambios vía receta.materias_primas (add/remove/clear) también se reflejan
+4. La lista de recetas, sus KPIs y el admin cuestan las mismas queries con 2 o 12 recetas
+5. El costo de los productos con receta (CostMatrix y calcular_costo_unitario) lee la columna
+"""
+
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from gestion.models import MateriaPrima, Producto, Receta, RecetaMateriaPrima
+from gestion.services.cost_matrix import CostMatrix
+
+
+class TestRecetaCostoCache(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser(username='admin_recetas', password='test_pass')
+        base = dict(unidad_medida='kg', stock_actual=Decimal('50'), stock_minimo=Decimal('5'))
+        self.harina = MateriaPrima.objects.create(nombre='Harina', costo_unitario=Decimal('1000'), **base)
+        self.miel = MateriaPrima.objects.create(nombre='Miel', costo_unitario=Decimal('5000'), **base)
+        self.pan = Receta.objects.create(nombre='Pan de Miel', creador=self.usuario)
+        self.galletas = Receta.objects.create(nombre='Galletas', creador=self.usuario)
+
+    def _ingrediente(self, receta, materia, cantidad):
+        return RecetaMateriaPrima.objects.create(
+            receta=receta, materia_prima=materia, cantidad=Decimal(cantidad), unidad='kg'
+        )
+
+    def _refrescar(self, *recetas):
+        for receta in recetas:
+            receta.refresh_from_db()
+
+    def test_ingredientes_recalculan_el_cache(self):
+        self.assertEqual((self.pan.costo_cache, self.pan.costo_version), (Decimal('0.00'), 0))
+
+        harina = self._ingrediente(self.pan, self.harina, '0.500')
+        self._ingrediente(self.pan, self.miel, '0.125')
+        self._refrescar(self.pan)
+        # 0.5 × 1000 + 0.125 × 5000 = 1125
+        self.assertEqual((self.pan.costo_cache, self.pan.costo_version), (Decimal('1125.00'), 2))
+        self.assertEqual(self.pan.calcular_costo_total(), Decimal('1125'))
+
+        harina.cantidad = Decimal('0.250')
+        harina.save()
+        self._refrescar(self.pan)
+        self.assertEqual(self.pan.costo_cache, Decimal('875.00'))
+
+        # Guardar sin cambios no avanza la versión
+        version = self.pan.costo_version
+        harina.save()
+        self._refrescar(self.pan)
+        self.assertEqual(self.pan.costo_version, version)
+
+        harina.delete()
+        self._refrescar(self.pan)
+        self.assertEqual((self.pan.costo_cache, self.pan.costo_version), (Decimal('625.00'), version + 1))
+
+    def test_cambio_de_costo_de_materia_prima(self):
+        self._ingrediente(self.pan, self.harina, '0.500')
+        self._ingrediente(self.galletas, self.harina, '0.200')
+        self._ingrediente(self.galletas, self.miel, '0.100')
+        otra = Receta.objects.create(nombre='Dulce de Miel')
+        self._ingrediente(otra, self.miel, '1')
+        self._refrescar(otra)
+        version_otra = otra.costo_version
+
+        self.harina.costo_unitario = Decimal('2000')
+        with CaptureQueriesContext(connection) as ctx:
+            self.harina.save()
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "gestion_receta"')]
+        self.assertEqual(len(updates), 1)
+
+        self._refrescar(self.pan, self.galletas, otra)
+        self.assertEqual(self.pan.costo_cache, Decimal('1000.00'))
+        self.assertEqual(self.galletas.costo_cache, Decimal('900.00'))
+        self.assertEqual((otra.costo_cache, otra.costo_version), (Decimal('5000.00'), version_otra))
+
+    def test_cambios_via_m2m(self):
+        self.pan.materias_primas.add(self.harina, through_defaults={'cantidad': Decimal('2'), 'unidad': 'kg'})
+        self._refrescar(self.pan)
+        self.assertEqual(self.pan.costo_cache, Decimal('2000.00'))
+
+        self.miel.recetas_materia.add(self.pan, through_defaults={'cantidad': Decimal('1'), 'unidad': 'kg'})
+        self._refrescar(self.pan)
+        self.assertEqual(self.pan.costo_cache, Decimal('7000.00'))
+
+        self.pan.materias_primas.remove(self.miel)
+        self._refrescar(self.pan)
+        self.assertEqual(self.pan.costo_cache, Decimal('2000.00'))
+
+        self.pan.materias_primas.clear()
+        self._refrescar(self.pan)
+        self.assertEqual(self.pan.costo_cache, Decimal('0.00'))
+
+    def test_lista_kpis_y_admin_sin_n_mas_1(self):
+        self.client.force_login(self.usuario)
+        self._ingrediente(self.pan, self.harina, '1')
+
+        def queries(url):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            return len(ctx.captured_queries), response
+
+        lista, response = queries(reverse('gestion:lista_recetas'))
+        admin, _ = queries(reverse('admin:gestion_receta_changelist'))
+        detalle, _ = queries(reverse('gestion:detalle_receta', args=[self.pan.pk]))
+        costo = next(kpi for kpi in response.context['kpis'] if kpi['badge'] == 'Costo Promedio')
+        self.assertEqual(costo['value'], '$500')
+
+        for i in range(10):
+            receta = Receta.objects.create(nombre=f'Receta {i}')
+            self._ingrediente(receta, self.harina, '0.1')
+            self._ingrediente(receta, self.miel, '0.1')
+        self._ingrediente(self.pan, self.miel, '1')
+
+        self.assertEqual(queries(reverse('gestion:lista_recetas'))[0], lista)
+        self.assertEqual(queries(reverse('gestion:detalle_receta', args=[self.pan.pk]))[0], detalle)
+        self.assertEqual(queries(reverse('admin:gestion_receta_changelist'))[0], admin)
+
+    def test_costo_de_productos_con_receta(self):
+        self._ingrediente(self.pan, self.harina, '0.500')
+        producto = Producto.objects.create(
+            nombre='Pan de Miel x unidad', precio=3000, stock=10, stock_minimo=1, categoria='test',
+            tipo_producto='receta', tiene_receta=True, receta=self.pan,
+        )
+        producto = Producto.objects.select_related('receta').get(pk=producto.pk)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(producto.receta.costo_total(), Decimal('500.00'))
+        self.assertEqual(ctx.captured_queries, [])
+
+        matriz = CostMatrix(productos=[producto])
+        self.assertEqual(matriz.costo(producto.pk), producto.calcular_costo_unitario())
+
+        self.harina.costo_unitario = Decimal('3000')
+        self.harina.save()
+        producto = Producto.objects.select_related('receta').get(pk=producto.pk)
+        self.assertEqual(producto.receta.costo_total(), Decimal('1500.00'))
+        self.assertEqual(CostMatrix(productos=[producto]).costo(producto.pk), producto.calcular_costo_unitario())
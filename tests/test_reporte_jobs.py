@@ -0,0 +1,171 @@
+"""
+Tests para ReporteJob - Reportes PDF / XLSX en segundo plano
+=============================================================
+
+Verifica que:
+1. El worker genera el PDF y el XLSX pedidos y marca los jobs completados
+2. Un pedido con los mismos datos se sirve del archivo ya generado, y un cambio de datos genera otro
+3. Los pedidos iguales en curso se reutilizan y los parámetros ajenos al reporte no cambian la clave
+4. La vista de exportación muestra la página de espera, el estado se consulta por JSON y luego se descarga
+5. El análisis de costos de producción es una sola query y los errores se reintentan hasta MAX_INTENTOS
+6. Con el pool interno cada pedido pendiente se encola al confirmar (también si se repite)
+"""
+
+import shutil
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from gestion.models import MateriaPrima, Producto, ProductoMateriaPrima, ReporteJob
+from gestion.services import reporte_jobs
+from gestion.services.reporte_jobs import ReporteJobService, analisis_costos_produccion, ruta_archivo
+
+
+class TestReporteJobs(TestCase):
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        ajustes = override_settings(LINO_REPORTES_DIR=directorio, LINO_REPORTES_THREAD=False)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        self.usuario = User.objects.create_superuser(username='admin_reportes', password='test_pass')
+        self.harina = MateriaPrima.objects.create(
+            nombre='Harina Integral', unidad_medida='kg', costo_unitario=Decimal('200'),
+            stock_actual=Decimal('2'), stock_minimo=Decimal('5'),
+        )
+        self.miel = MateriaPrima.objects.create(
+            nombre='Miel', unidad_medida='kg', costo_unitario=Decimal('1000'),
+            stock_actual=Decimal('50'), stock_minimo=Decimal('5'),
+        )
+        self.pan = Producto.objects.create(nombre='Pan de Miel', precio=1000, stock=10, stock_minimo=1, categoria='panificados')
+        self.galletas = Producto.objects.create(nombre='Galletas', precio=500, stock=10, stock_minimo=1, categoria='galletas')
+        ProductoMateriaPrima.objects.create(producto=self.pan, materia_prima=self.harina, cantidad_necesaria=Decimal('0.5'))
+        ProductoMateriaPrima.objects.create(producto=self.pan, materia_prima=self.miel, cantidad_necesaria=Decimal('0.2'))
+        ProductoMateriaPrima.objects.create(producto=self.galletas, materia_prima=self.harina, cantidad_necesaria=Decimal('1'))
+
+    def test_worker_genera_pdf_y_xlsx(self):
+        pdf = ReporteJobService.solicitar('costos_produccion', 'pdf', usuario=self.usuario)
+        xlsx = ReporteJobService.solicitar('stock_materias', 'xlsx')
+        self.assertEqual((pdf.estado, xlsx.estado), ('pendiente', 'pendiente'))
+
+        salida = StringIO()
+        call_command('procesar_reportes', hilos=1, stdout=salida)
+        self.assertIn('2 reportes generados de 2', salida.getvalue())
+
+        pdf.refresh_from_db()
+        xlsx.refresh_from_db()
+        self.assertEqual((pdf.estado, pdf.intentos, xlsx.estado), ('completado', 1, 'completado'))
+        self.assertTrue(ruta_archivo(pdf).read_bytes().startswith(b'%PDF'))
+        self.assertTrue(ruta_archivo(xlsx).read_bytes().startswith(b'PK'))  # zip de openpyxl
+        self.assertEqual(ReporteJobService().procesar_pendientes()['jobs'], 0)
+
+    def test_archivo_reutilizado_mientras_no_cambien_los_datos(self):
+        primero = ReporteJobService.solicitar('stock_materias', 'pdf')
+        ReporteJobService().procesar_pendientes()
+
+        with mock.patch.object(reporte_jobs, 'generar_archivo') as generar:
+            segundo = ReporteJobService.solicitar('stock_materias', 'pdf')
+        generar.assert_not_called()
+        self.assertEqual((segundo.pk, segundo.estado), (primero.pk, 'completado'))
+
+        # Aunque se purguen los jobs, el archivo en disco se sigue sirviendo
+        ReporteJob.objects.all().delete()
+        with mock.patch.object(reporte_jobs, 'generar_archivo') as generar:
+            segundo = ReporteJobService.solicitar('stock_materias', 'pdf')
+        generar.assert_not_called()
+        self.assertEqual(segundo.estado, 'completado')
+
+        # Cambiar una materia prima cambia la versión de los datos: nuevo archivo
+        self.harina.stock_actual = Decimal('100')
+        self.harina.save()
+        tercero = ReporteJobService.solicitar('stock_materias', 'pdf')
+        self.assertEqual(tercero.estado, 'pendiente')
+        self.assertNotEqual(tercero.archivo, segundo.archivo)
+
+    def test_pedidos_en_curso_y_parametros(self):
+        primero = ReporteJobService.solicitar('costos_produccion', 'xlsx', parametros={'csrfmiddlewaretoken': 'x'})
+        repetido = ReporteJobService.solicitar('costos_produccion', 'xlsx', parametros={'categoria': ''})
+        self.assertEqual(repetido.pk, primero.pk)
+        self.assertEqual(primero.parametros, {})
+
+        filtrado = ReporteJobService.solicitar('costos_produccion', 'xlsx', parametros={'categoria': 'galletas'})
+        self.assertNotEqual(filtrado.clave, primero.clave)
+        self.assertEqual(ReporteJob.objects.filter(estado='pendiente').count(), 2)
+
+        with self.assertRaises(ValueError):
+            ReporteJobService.solicitar('ventas_secretas', 'pdf')
+        with self.assertRaises(ValueError):
+            ReporteJobService.solicitar('costos_produccion', 'docx')
+
+    @override_settings(LINO_REPORTES_THREAD=True)
+    def test_pool_interno_encola_los_pendientes(self):
+        with mock.patch.object(reporte_jobs, 'pool') as pool:
+            with self.captureOnCommitCallbacks(execute=True):
+                job = ReporteJobService.solicitar('stock_materias', 'pdf')
+            pool.return_value.submit.assert_called_once_with(reporte_jobs._procesar_en_hilo, job.pk)
+
+            # El proceso que lo recibió pudo reiniciarse: el pedido repetido lo vuelve a encolar
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(ReporteJobService.solicitar('stock_materias', 'pdf').pk, job.pk)
+            self.assertEqual(pool.return_value.submit.call_count, 2)
+
+            # Ya completado, se sirve sin encolar
+            ReporteJobService().procesar(job.pk)
+            self.assertIsNone(ReporteJobService().procesar(job.pk))
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(ReporteJobService.solicitar('stock_materias', 'pdf').estado, 'completado')
+            self.assertEqual(pool.return_value.submit.call_count, 2)
+
+    def test_vistas_polling_y_descarga(self):
+        url = reverse('gestion:exportar_reporte_pdf', args=['costos_produccion'])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.usuario)
+
+        response = self.client.get(url)
+        self.assertTemplateUsed(response, 'modules/reportes/reporte_job.html')
+        job = response.context['job']
+        estado = self.client.get(reverse('gestion:estado_reporte', args=[job.pk])).json()
+        self.assertEqual((estado['estado'], estado['download_url']), ('pendiente', None))
+
+        ReporteJobService().procesar_pendientes()
+        estado = self.client.get(reverse('gestion:estado_reporte', args=[job.pk])).json()
+        self.assertEqual(estado['estado'], 'completado')
+        descarga = self.client.get(estado['download_url'])
+        self.assertIn('attachment', descarga['Content-Disposition'])
+        self.assertTrue(b''.join(descarga.streaming_content).startswith(b'%PDF'))
+
+        # Con el archivo ya generado, la exportación redirige directo a la descarga
+        self.assertRedirects(self.client.get(url), estado['download_url'], fetch_redirect_response=False)
+
+        api = reverse('gestion:solicitar_reporte', args=['stock_materias'])
+        response = self.client.post(api, {'formato': 'xlsx', 'solo_criticos': '1'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['estado'], 'pendiente')
+        self.assertEqual(self.client.post(api, {'formato': 'odt'}).status_code, 400)
+
+    def test_analisis_en_una_query_y_reintentos(self):
+        with CaptureQueriesContext(connection) as ctx:
+            analisis = analisis_costos_produccion()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        # Pan: 0.5 × 200 + 0.2 × 1000 = 300 → 70% de margen; Galletas: 200 → 60%
+        self.assertEqual(
+            [(fila['producto'].nombre, fila['costo_materias'], fila['porcentaje_margen']) for fila in analisis],
+            [('Pan de Miel', Decimal('300'), Decimal('70')), ('Galletas', Decimal('200'), Decimal('60'))],
+        )
+
+        job = ReporteJobService.solicitar('costos_produccion', 'pdf')
+        with mock.patch.object(reporte_jobs, 'generar_archivo', side_effect=OSError('Disco lleno')):
+            for _ in range(ReporteJob.MAX_INTENTOS):
+                ReporteJobService().procesar_pendientes()
+        job.refresh_from_db()
+        self.assertEqual((job.estado, job.intentos, job.error), ('error', ReporteJob.MAX_INTENTOS, 'Disco lleno'))
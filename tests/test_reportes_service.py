@@ -0,0 +1,94 @@
+"""
+Tests para ReportesService - Reporte financiero con agregaciones condicionales
+==============================================================================
+
+Verifica que:
+1. Ingresos y gastos (compras legacy y con detalles) coinciden con el cálculo manual
+2. El período anterior sale de la misma agregación
+3. La cantidad de queries no depende del volumen de ventas
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from gestion.models import Producto, MateriaPrima, Compra, CompraDetalle, Venta
+from gestion.services.reportes_service import ReportesService
+from gestion.services.venta_posting_service import VentaPostingService
+
+
+class TestReportesService(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='duenio', password='test_pass')
+        self.hoy = timezone.localdate()
+        self.desde = self.hoy - timedelta(days=6)
+        self.producto = Producto.objects.create(
+            nombre='Granola 500g', precio=1000, stock=500, stock_minimo=1, categoria='test'
+        )
+        self.materia = MateriaPrima.objects.create(
+            nombre='Avena', unidad_medida='kg', proveedor='Molino Sur'
+        )
+
+    def _vender(self, cantidad, dias_atras=0):
+        venta = VentaPostingService(usuario=self.usuario).registrar_venta([
+            {'producto_id': self.producto.id, 'cantidad': cantidad, 'precio_unitario': Decimal('1000')}
+        ])
+        if dias_atras:
+            Venta.objects.filter(pk=venta.pk).update(fecha=timezone.now() - timedelta(days=dias_atras))
+        return venta
+
+    def test_ingresos_y_gastos_del_periodo(self):
+        self._vender(2)
+        self._vender(1, dias_atras=10)  # Período anterior
+
+        compra = Compra.objects.create(proveedor='Molino Sur', usuario=self.usuario)
+        CompraDetalle.objects.create(
+            compra=compra, materia_prima=self.materia,
+            cantidad=Decimal('10'), precio_unitario=Decimal('50'), subtotal=0
+        )
+        Compra.objects.create(
+            proveedor='Legacy', materia_prima=self.materia,
+            cantidad_mayoreo=Decimal('5'), precio_mayoreo=Decimal('300')
+        )
+
+        reporte = ReportesService(self.desde, self.hoy).get_reporte()
+
+        self.assertEqual(reporte['ingresos_totales'], 2000.0)
+        self.assertEqual(reporte['total_ventas'], 1)
+        self.assertEqual(reporte['gastos_totales'], 800.0)
+        self.assertEqual(reporte['total_compras'], 2)
+        self.assertEqual(reporte['variacion_ingresos'], 100.0)
+        self.assertEqual(reporte['proveedores_activos'], 1)
+        self.assertEqual(reporte['valor_inventario'], 1000.0 * 497)
+
+    def test_queries_constantes_por_volumen_de_ventas(self):
+        def contar_queries():
+            with CaptureQueriesContext(connection) as ctx:
+                ReportesService(self.desde, self.hoy).get_reporte()
+            return len(ctx.captured_queries)
+
+        self._vender(1)
+        antes = contar_queries()
+        for i in range(15):
+            self._vender(1, dias_atras=i % 12)
+
+        self.assertEqual(contar_queries(), antes)
+        self.assertLessEqual(antes, 5)
+
+    def test_vista_reportes(self):
+        self._vender(3)
+        self.client.force_login(self.usuario)
+
+        response = self.client.get('/gestion/reportes/', {
+            'fecha_desde': self.desde.isoformat(), 'fecha_hasta': self.hoy.isoformat()
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['ingresos_totales'], 3000.0)
+        self.assertEqual(response.context['margen_bruto'], response.context['margen_porcentaje'])
@@ -0,0 +1,134 @@
+"""
+Tests para ResumenDiario - Rollup materializado del dashboard
+==============================================================
+
+Verifica que el resumen diario se mantiene incrementalmente al registrar,
+eliminar y restaurar ventas y al registrar compras, y que coincide con la
+reconstrucción completa (rebuild_rollups), también para ventas cargadas
+línea por línea (formularios, admin, shell) y compras legacy.
+"""
+
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from gestion.models import Producto, MateriaPrima, Compra, CompraDetalle, ResumenDiario, Venta, VentaDetalle
+from gestion.services import DashboardService
+from gestion.services.venta_posting_service import VentaPostingService
+
+
+class TestResumenDiario(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='admin_test', password='test_pass')
+        self.producto = Producto.objects.create(
+            nombre='Almendras 250g', stock=50, precio=100.00, stock_minimo=1, categoria='test'
+        )
+        self.hoy = timezone.localdate()
+
+    def _vender(self, cantidad=2):
+        return VentaPostingService(usuario=self.usuario).registrar_venta([{
+            'producto_id': self.producto.id,
+            'cantidad': cantidad,
+            'precio_unitario': Decimal('100.00'),
+        }])
+
+    def _resumen_hoy(self):
+        return ResumenDiario.objects.get(fecha=self.hoy)
+
+    def test_venta_acumula_en_el_dia(self):
+        self._vender(2)
+        self._vender(3)
+
+        resumen = self._resumen_hoy()
+        self.assertEqual(resumen.ventas_total, Decimal('500.00'))
+        self.assertEqual(resumen.ventas_count, 2)
+        self.assertEqual(resumen.unidades_vendidas, 5)
+
+    def test_eliminar_y_restaurar_venta(self):
+        venta = self._vender(2)
+
+        venta.eliminar_venta(self.usuario, 'error de carga')
+        resumen = self._resumen_hoy()
+        self.assertEqual(resumen.ventas_total, Decimal('0.00'))
+        self.assertEqual(resumen.ventas_count, 0)
+        self.assertEqual(resumen.unidades_vendidas, 0)
+
+        venta.restaurar_venta(self.usuario)
+        resumen = self._resumen_hoy()
+        self.assertEqual(resumen.ventas_total, Decimal('200.00'))
+        self.assertEqual(resumen.unidades_vendidas, 2)
+
+    def test_compra_detalle_acumula_compras(self):
+        materia = MateriaPrima.objects.create(nombre='Almendra granel', unidad_medida='kg')
+        compra = Compra.objects.create(proveedor='Proveedor X', usuario=self.usuario)
+        CompraDetalle.objects.create(
+            compra=compra, materia_prima=materia,
+            cantidad=Decimal('10'), precio_unitario=Decimal('50'), subtotal=0
+        )
+
+        self.assertEqual(
+            ResumenDiario.objects.get(fecha=compra.fecha_compra).compras_total,
+            Decimal('500.00')
+        )
+
+    def test_rebuild_coincide_con_incremental(self):
+        self._vender(2)
+        self._vender(4).eliminar_venta(self.usuario)
+        incremental = self._resumen_hoy()
+
+        call_command('rebuild_rollups', verbosity=0)
+
+        reconstruido = self._resumen_hoy()
+        self.assertEqual(reconstruido.ventas_total, incremental.ventas_total)
+        self.assertEqual(reconstruido.ventas_count, incremental.ventas_count)
+        self.assertEqual(reconstruido.unidades_vendidas, incremental.unidades_vendidas)
+
+    def test_todas_las_vias_coinciden_con_rebuild(self):
+        def _valores():
+            resumen = self._resumen_hoy()
+            return resumen.ventas_total, resumen.ventas_count, resumen.unidades_vendidas, resumen.compras_total
+
+        self._vender(2)
+        # Venta cargada línea por línea y con el total calculado al final
+        venta = Venta.objects.create(cliente='Mostrador', usuario=self.usuario)
+        VentaDetalle.objects.create(
+            venta=venta, producto=self.producto, cantidad=3, precio_unitario=Decimal('100'), subtotal=Decimal('300')
+        )
+        VentaDetalle.objects.create(
+            venta=venta, producto=self.producto, cantidad=1, precio_unitario=Decimal('90'), subtotal=Decimal('90')
+        )
+        Venta.objects.get(pk=venta.pk).calcular_total()
+        # Venta del admin sin líneas
+        Venta.objects.create(total=Decimal('50'))
+        # Compra legacy y compra con detalles
+        materia = MateriaPrima.objects.create(nombre='Almendra granel', unidad_medida='kg')
+        Compra.objects.create(
+            proveedor='Proveedor X', materia_prima=materia,
+            cantidad_mayoreo=Decimal('4'), precio_mayoreo=Decimal('120'),
+        )
+        compra = Compra.objects.create(proveedor='Proveedor Y', usuario=self.usuario)
+        CompraDetalle.objects.create(
+            compra=compra, materia_prima=materia,
+            cantidad=Decimal('10'), precio_unitario=Decimal('50'), subtotal=0
+        )
+
+        incremental = _valores()
+        self.assertEqual(incremental, (Decimal('640.00'), 3, 6, Decimal('620.00')))
+
+        ResumenDiario.reconstruir()
+        self.assertEqual(_valores(), incremental)
+
+    def test_dashboard_lee_el_rollup(self):
+        self._vender(3)
+
+        service = DashboardService(usuario=self.usuario)
+        resumen_hoy = service.get_resumen_hoy()
+
+        self.assertEqual(resumen_hoy['total_ventas'], 300.0)
+        self.assertEqual(resumen_hoy['productos_vendidos'], 3)
+        self.assertEqual(service._get_sparkline_ventas()[-1], 300.0)
+        self.assertEqual(service.get_kpis_principales()['ventas_mes']['total'], 300.0)
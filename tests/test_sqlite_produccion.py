@@ -0,0 +1,126 @@
+"""
+Tests para el perfil SQLite de producción y gestion.escrituras
+================================================================
+
+Verifica que:
+1. Cada conexión con SQLITE_OPCIONES_PRODUCCION queda en WAL, synchronous=NORMAL, con mmap, cache y busy_timeout
+2. settings_production aplica el perfil a la base SQLite en lugar de fijar una propia
+3. Las escrituras se reintentan ante "database is locked" y no ante otros errores
+4. Dentro de una transacción abierta la escritura se ejecuta una sola vez (sin reintentos)
+5. stress_ventas: con el perfil de producción ninguna venta concurrente queda bloqueada
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import warnings
+from pathlib import Path
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import TransactionTestCase, override_settings
+
+from gestion.escrituras import ejecutar_escritura, escritura_serializada
+
+SRC = Path(__file__).resolve().parent.parent / 'src'
+
+
+class Intermitente:
+    """Falla con `error` las primeras `fallas` llamadas."""
+
+    def __init__(self, fallas, error='database is locked'):
+        self.fallas = fallas
+        self.error = error
+        self.llamadas = 0
+
+    def __call__(self):
+        self.llamadas += 1
+        if self.llamadas <= self.fallas:
+            raise OperationalError(self.error)
+        return 'ok'
+
+
+@override_settings(LINO_ESCRITURAS_SERIALIZADAS=True, LINO_ESCRITURAS_REINTENTOS=4, LINO_ESCRITURAS_ESPERA_MS=1)
+class TestSqliteProduccion(TransactionTestCase):
+
+    def test_pragmas_por_conexion(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            base = DatabaseWrapper({
+                **connection.settings_dict,
+                'NAME': os.path.join(directorio, 'lino.sqlite3'),
+                'OPTIONS': settings.SQLITE_OPCIONES_PRODUCCION,
+            }, alias='perfil_produccion')
+            try:
+                with base.cursor() as cursor:
+                    valores = {}
+                    for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size'):
+                        cursor.execute(f'PRAGMA {pragma}')
+                        valores[pragma] = cursor.fetchone()[0]
+                self.assertEqual(base.transaction_mode, 'IMMEDIATE')
+            finally:
+                base.close()
+
+        self.assertEqual(valores, {
+            'journal_mode': 'wal',
+            'synchronous': 1,  # NORMAL
+            'busy_timeout': settings.LINO_SQLITE_BUSY_TIMEOUT,
+            'mmap_size': settings.LINO_SQLITE_MMAP_MB * 1024 * 1024,
+            'cache_size': -settings.LINO_SQLITE_CACHE_MB * 1024,
+        })
+
+    def test_settings_production_usa_el_perfil(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')  # SECRET_KEY de desarrollo
+            from lino_saludable import settings_production
+        base = settings_production.DATABASES['default']
+        if base['ENGINE'] == 'django.db.backends.sqlite3':
+            self.assertEqual(base['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+            self.assertIn('PRAGMA journal_mode=WAL', base['OPTIONS']['init_command'])
+
+    def test_reintenta_solo_bloqueos(self):
+        funcion = Intermitente(fallas=2)
+        self.assertEqual(ejecutar_escritura(funcion), 'ok')
+        self.assertEqual(funcion.llamadas, 3)
+
+        siempre = Intermitente(fallas=10)
+        with self.assertRaises(OperationalError):
+            ejecutar_escritura(siempre)
+        self.assertEqual(siempre.llamadas, 4)
+
+        otro_error = Intermitente(fallas=1, error='no such table: gestion_venta')
+        with self.assertRaises(OperationalError):
+            ejecutar_escritura(otro_error)
+        self.assertEqual(otro_error.llamadas, 1)
+
+        with override_settings(LINO_ESCRITURAS_SERIALIZADAS=False):
+            desactivada = Intermitente(fallas=1)
+            with self.assertRaises(OperationalError):
+                escritura_serializada(desactivada)()
+            self.assertEqual(desactivada.llamadas, 1)
+
+    def test_sin_reintentos_dentro_de_una_transaccion(self):
+        funcion = Intermitente(fallas=1)
+        with self.assertRaises(OperationalError):
+            with transaction.atomic():
+                ejecutar_escritura(funcion)
+        self.assertEqual(funcion.llamadas, 1)
+
+    def test_stress_ventas_sin_bloqueos_en_produccion(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            salida = os.path.join(directorio, 'stress.json')
+            proceso = subprocess.run(
+                [sys.executable, 'manage.py', 'stress_ventas', '--procesos', '3', '--hilos', '2',
+                 '--ventas', '5', '--productos', '10', '--json', salida],
+                cwd=SRC, capture_output=True, text=True, timeout=300,
+            )
+            self.assertEqual(proceso.returncode, 0, proceso.stderr)
+            with open(salida, encoding='utf-8') as archivo:
+                resultados = {r['perfil']: r for r in json.load(archivo)}
+
+        produccion = resultados['produccion']
+        self.assertEqual((produccion['ok'], produccion['bloqueos'], produccion['errores']), (30, 0, 0))
+        base = resultados['base']
+        self.assertEqual(base['ok'] + base['bloqueos'] + base['errores'], base['intentadas'])
@@ -0,0 +1,155 @@
+"""
+Tests para VentaPostingService - Registro de ventas set-based
+==============================================================
+
+Verifica que:
+1. El stock se descuenta correctamente en un único UPDATE
+2. Una línea sin stock suficiente aborta toda la venta
+3. La cantidad de queries es constante sin importar el tamaño de la canasta
+4. Las cantidades fraccionarias, en cero o negativas se rechazan (también desde el POST)
+"""
+
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from gestion.models import Producto, Venta, VentaDetalle
+from gestion.services.venta_posting_service import (
+    VentaPostingService, StockInsuficienteError
+)
+
+
+def _crear_productos(cantidad, stock=100):
+    return [
+        Producto.objects.create(
+            nombre=f'Producto Canasta {i}',
+            stock=stock,
+            precio=100.00,
+            stock_minimo=1,
+            categoria='test'
+        )
+        for i in range(cantidad)
+    ]
+
+
+def _lineas(productos, cantidad=2):
+    return [
+        {
+            'producto_id': p.id,
+            'cantidad': cantidad,
+            'precio_unitario': Decimal('100.00'),
+            'subtotal': Decimal('100.00') * cantidad,
+        }
+        for p in productos
+    ]
+
+
+class TestVentaPostingService(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='cajero', password='test_pass')
+        self.service = VentaPostingService(usuario=self.usuario)
+
+    def test_registra_venta_y_descuenta_stock(self):
+        productos = _crear_productos(3, stock=10)
+
+        venta = self.service.registrar_venta(_lineas(productos, cantidad=3), cliente='Ana')
+
+        self.assertEqual(venta.total, Decimal('900.00'))
+        self.assertEqual(VentaDetalle.objects.filter(venta=venta).count(), 3)
+        for producto in productos:
+            producto.refresh_from_db()
+            self.assertEqual(producto.stock, 7)
+
+    def test_producto_repetido_suma_demanda(self):
+        producto = _crear_productos(1, stock=5)[0]
+        lineas = _lineas([producto, producto], cantidad=3)
+
+        with self.assertRaises(StockInsuficienteError):
+            self.service.registrar_venta(lineas)
+
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 5)
+
+    def test_stock_insuficiente_hace_rollback(self):
+        productos = _crear_productos(2, stock=10)
+        productos[1].stock = 1
+        productos[1].save()
+
+        with self.assertRaises(StockInsuficienteError):
+            self.service.registrar_venta(_lineas(productos, cantidad=2))
+
+        self.assertEqual(Venta.objects.count(), 0)
+        productos[0].refresh_from_db()
+        self.assertEqual(productos[0].stock, 10)
+
+    def test_cantidades_no_enteras_se_rechazan(self):
+        producto = _crear_productos(1, stock=10)[0]
+
+        for cantidad in (Decimal('0.5'), Decimal('1.9'), 0, -1):
+            with self.assertRaises(ValueError):
+                self.service.registrar_venta(_lineas([producto], cantidad=cantidad))
+
+        lineas = VentaPostingService.parsear_lineas_post({
+            'productos[0][producto_id]': str(producto.id),
+            'productos[0][cantidad]': '0.5',
+            'productos[0][precio_unitario]': '100',
+            'productos[0][subtotal]': '50',
+            'productos[1][producto_id]': '',
+        })
+        self.assertEqual([linea['cantidad'] for linea in lineas], [Decimal('0.5')])
+        with self.assertRaisesMessage(ValueError, 'unidades enteras'):
+            self.service.registrar_venta(lineas)
+
+        self.assertEqual((Venta.objects.count(), VentaDetalle.objects.count()), (0, 0))
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 10)
+
+        # 2.0 es una cantidad entera
+        self.service.registrar_venta(_lineas([producto], cantidad=Decimal('2.0')))
+        self.assertEqual(VentaDetalle.objects.get().cantidad, 2)
+
+    def test_queries_constantes_por_tamano_de_canasta(self):
+        """Benchmark: 1, 10 y 40 líneas deben ejecutar la misma cantidad de queries."""
+        productos = _crear_productos(40)
+        resultados = {}
+
+        # Calentar: la primera venta del día crea la fila de ResumenDiario
+        self.service.registrar_venta(_lineas(productos[:1]))
+
+        for tamano in (1, 10, 40):
+            with CaptureQueriesContext(connection) as ctx:
+                inicio = time.perf_counter()
+                self.service.registrar_venta(_lineas(productos[:tamano]))
+                duracion_ms = (time.perf_counter() - inicio) * 1000
+            resultados[tamano] = (len(ctx.captured_queries), duracion_ms)
+
+        queries = {tamano: q for tamano, (q, _) in resultados.items()}
+        self.assertEqual(
+            len(set(queries.values())), 1,
+            f'Queries/ms por tamaño de canasta: {resultados}'
+        )
+
+    def test_vista_crear_venta_v3_usa_el_servicio(self):
+        productos = _crear_productos(2, stock=10)
+        self.client.login(username='cajero', password='test_pass')
+
+        data = {'cliente': 'Mostrador', 'fecha': '2025-12-09', 'total': '400'}
+        for i, p in enumerate(productos):
+            data.update({
+                f'productos[{i}][producto_id]': p.id,
+                f'productos[{i}][cantidad]': '2',
+                f'productos[{i}][precio_unitario]': '100',
+                f'productos[{i}][subtotal]': '200',
+            })
+
+        response = self.client.post('/gestion/ventas/crear/', data)
+
+        self.assertEqual(response.status_code, 302)
+        venta = Venta.objects.get()
+        self.assertEqual(venta.total, Decimal('400.00'))
+        self.assertEqual(venta.detalles.count(), 2)